@@ -194,7 +194,7 @@ def render_admin_audit_page() -> str:
           const details = item.details ? JSON.stringify(item.details) : "";
           const row = document.createElement("tr");
           row.innerHTML = `
-            <td><code>${ui.esc(item.id ?? "—")}</code></td>
+            <td><code>${ui.esc(item.buffered ? "—" : (item.id ?? "—"))}</code></td>
             <td><code>${ui.esc(item.ts || "—")}</code></td>
             <td><span class="badge ${statusClass(st)}">${ui.esc(statusLabel(st))}</span></td>
             <td><code>${ui.esc(item.actor || "—")}</code></td>
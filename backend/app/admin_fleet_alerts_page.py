@@ -8,6 +8,7 @@ def render_admin_fleet_alerts_page() -> str:
         
         <span class="chip" id="roleBadge">роль: —</span>
         <span class="chip">оперативний triage алертів</span>
+        <span class="chip" id="streamState">потік: —</span>
       
 """
     toolbar_html = """
@@ -1317,7 +1318,21 @@ def render_admin_fleet_alerts_page() -> str:
   refreshPresetCockpitTimelineHint();
   refreshPresetRolloutHint();
   loadWhoami().then(refresh);
-  setInterval(() => { if (ui.byId("auto").checked) refresh(); }, 10000);
+  function alertDeltaRelevant(batch) {
+    // The alert list only changes with alert deltas (opened / closed / acked / silenced).
+    const centralFilter = selectedCentral();
+    const codeFilter = selectedCode();
+    return batch.some((item) => {
+      if (item.type !== "alert") return false;
+      if (centralFilter && String(item.central_id || "") !== centralFilter) return false;
+      return !codeFilter || String(item.code || "") === codeFilter;
+    });
+  }
+  ui.subscribeFleetStream({
+    onDelta: (batch) => { if (ui.byId("auto").checked && alertDeltaRelevant(batch)) refresh(); },
+    onPoll: () => { if (ui.byId("auto").checked) refresh(); },
+    onState: (state) => ui.setText("streamState", state === "live" ? "потік: live" : "потік: опитування 10с"),
+  });
 """.strip()
     return render_admin_shell(
         title='Адмін-панель Passengers — Оперативні алерти',
@@ -8,6 +8,7 @@ def render_admin_fleet_page() -> str:
         <span class="chip">heartbeat центральних вузлів</span>
         <span class="chip" id="roleBadge">роль: —</span>
         <span class="chip" id="updatedAt">оновлено: —</span>
+        <span class="chip" id="streamState">потік: —</span>
 """
     toolbar_html = """
         <div class="toolbarMain">
@@ -1791,7 +1792,19 @@ def render_admin_fleet_page() -> str:
   refreshPresetCockpitTimelineHint();
   refreshPresetRolloutHint();
   loadWhoami().then(refresh);
-  setInterval(() => { if (ui.byId("auto").checked) refresh(); }, 10000);
+  function fleetDeltaRelevant(batch) {
+    const centralFilter = alertCentral();
+    const codeFilter = alertCode();
+    return batch.some((item) => {
+      if (centralFilter && String(item.central_id || "") !== centralFilter) return false;
+      return !codeFilter || item.type === "central" || String(item.code || "") === codeFilter;
+    });
+  }
+  ui.subscribeFleetStream({
+    onDelta: (batch) => { if (ui.byId("auto").checked && fleetDeltaRelevant(batch)) refresh(); },
+    onPoll: () => { if (ui.byId("auto").checked) refresh(); },
+    onState: (state) => ui.setText("streamState", state === "live" ? "потік: live" : "потік: опитування 10с"),
+  });
 """.strip()
     return render_admin_shell(
         title='Адмін-панель Passengers — Флот',
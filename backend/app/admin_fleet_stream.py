@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator
+
+FLEET_STREAM_BACKLOG = 1024
+FLEET_STREAM_QUEUE_MAX = 256
+FLEET_STREAM_KEEPALIVE_SEC = 15.0
+FLEET_STREAM_RETRY_MS = 5000
+
+
+def _normalize_severity(value: Any) -> str:
+    normalized = str(value or "").strip().lower()
+    return normalized if normalized in {"good", "warn", "bad"} else "bad"
+
+
+def _central_fingerprint(central: dict[str, Any]) -> dict[str, Any]:
+    # Only what the fleet pages render as state; age_sec/ts_received change on every heartbeat
+    # and would turn each ingest into a delta.
+    health = central.get("health") if isinstance(central.get("health"), dict) else {}
+    queue = central.get("queue") if isinstance(central.get("queue"), dict) else {}
+    doors = central.get("doors") if isinstance(central.get("doors"), list) else []
+    alerts: dict[str, dict[str, Any]] = {}
+    for raw_alert in central.get("alerts") if isinstance(central.get("alerts"), list) else []:
+        if not isinstance(raw_alert, dict):
+            continue
+        alerts[str(raw_alert.get("code") or "alert")] = {
+            "severity": _normalize_severity(raw_alert.get("severity")),
+            "silenced": bool(raw_alert.get("silenced", False)),
+            "acked": bool(raw_alert.get("acked_at")),
+        }
+    return {
+        "vehicle_id": str(central.get("vehicle_id") or ""),
+        "severity": _normalize_severity(health.get("severity")),
+        "pending": _to_int(queue.get("pending_batches")) > 0,
+        "doors_unreachable": sum(1 for door in doors if isinstance(door, dict) and door.get("reachable") is False),
+        "alerts": alerts,
+    }
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+class _Subscriber:
+    def __init__(self, queue_max: int) -> None:
+        self.queue: asyncio.Queue[tuple[int, str, dict[str, Any]]] = asyncio.Queue(maxsize=queue_max)
+
+
+class FleetEventBus:
+    """In-process fan-out of fleet deltas to SSE subscribers.
+
+    Events are published from the event loop (heartbeat ingest, incident sweep, alert actions) and
+    kept in a bounded backlog so a reconnecting browser can resume from `Last-Event-ID`. A subscriber
+    that falls behind, or resumes from an id older than the backlog, gets a `resync` event and
+    reloads the page data once instead of replaying a partial history.
+    """
+
+    def __init__(self, *, backlog: int = FLEET_STREAM_BACKLOG, queue_max: int = FLEET_STREAM_QUEUE_MAX) -> None:
+        # Ids are seeded from the wall clock so ids issued after a restart are never below ids a
+        # browser kept from the previous process (those resume as a resync).
+        self._next_id = int(time.time() * 1000)
+        self._backlog: deque[tuple[int, str, dict[str, Any]]] = deque(maxlen=max(16, int(backlog)))
+        self._queue_max = max(16, int(queue_max))
+        self._subscribers: set[_Subscriber] = set()
+        self._centrals: dict[str, dict[str, Any]] = {}
+        self.published = 0
+        self.overflows = 0
+
+    def publish(self, event: str, data: dict[str, Any]) -> int:
+        event_id = self._next_id
+        self._next_id += 1
+        item = (event_id, event, data)
+        self._backlog.append(item)
+        self.published += 1
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._overflow(sub)
+        return event_id
+
+    def _overflow(self, sub: _Subscriber) -> None:
+        self.overflows += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait((self.last_event_id, "resync", {"reason": "overflow"}))
+
+    def publish_central(self, central: dict[str, Any]) -> None:
+        central_id = str(central.get("central_id") or "")
+        if not central_id:
+            return
+        current = _central_fingerprint(central)
+        previous = self._centrals.get(central_id)
+        if previous == current:
+            return
+        self._centrals[central_id] = current
+        prev_alerts: dict[str, dict[str, Any]] = previous["alerts"] if previous else {}
+        for code, alert in current["alerts"].items():
+            before = prev_alerts.get(code)
+            if before == alert:
+                continue
+            self.publish(
+                "alert",
+                {
+                    "central_id": central_id,
+                    "vehicle_id": current["vehicle_id"],
+                    "code": code,
+                    "change": "opened" if before is None else "updated",
+                    **alert,
+                },
+            )
+        for code, alert in prev_alerts.items():
+            if code in current["alerts"]:
+                continue
+            self.publish(
+                "alert",
+                {"central_id": central_id, "vehicle_id": current["vehicle_id"], "code": code, "change": "closed", **alert},
+            )
+        self.publish(
+            "central",
+            {
+                "central_id": central_id,
+                "vehicle_id": current["vehicle_id"],
+                "severity": current["severity"],
+                "prev_severity": previous["severity"] if previous else None,
+                "alerts_total": len(current["alerts"]),
+                "pending": current["pending"],
+                "doors_unreachable": current["doors_unreachable"],
+            },
+        )
+
+    def publish_centrals(self, centrals: list[dict[str, Any]]) -> None:
+        for central in centrals:
+            self.publish_central(central)
+
+    def publish_incident_changes(self, changes: list[dict[str, Any]] | None) -> None:
+        for change in changes or []:
+            self.publish("incident", dict(change))
+
+    def subscribe(self, last_event_id: int | None) -> tuple[_Subscriber, list[tuple[int, str, dict[str, Any]]] | None]:
+        # Returns the backlog to replay after `last_event_id`, or None when the gap cannot be replayed.
+        sub = _Subscriber(self._queue_max)
+        self._subscribers.add(sub)
+        if last_event_id is None:
+            return sub, []
+        if last_event_id >= self._next_id:
+            return sub, None
+        if last_event_id == self._next_id - 1:
+            return sub, []
+        if not self._backlog or last_event_id < self._backlog[0][0] - 1:
+            return sub, None
+        return sub, [item for item in self._backlog if item[0] > last_event_id]
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "overflows": self.overflows,
+            "backlog": len(self._backlog),
+            "last_event_id": self.last_event_id,
+            "centrals_tracked": len(self._centrals),
+        }
+
+
+fleet_events = FleetEventBus()
+
+
+def format_sse(event_id: int, event: str, data: dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def parse_last_event_id(value: str | None) -> int | None:
+    try:
+        return int(str(value or "").strip())
+    except ValueError:
+        return None
+
+
+async def fleet_event_stream(
+    bus: FleetEventBus,
+    *,
+    last_event_id: int | None,
+    is_disconnected: Any,
+    keepalive_sec: float = FLEET_STREAM_KEEPALIVE_SEC,
+) -> AsyncIterator[str]:
+    sub, replay = bus.subscribe(last_event_id)
+    # Anything published from here on is already in the subscriber queue.
+    head_id = bus.last_event_id
+    try:
+        yield f"retry: {FLEET_STREAM_RETRY_MS}\n\n"
+        if replay is None:
+            yield format_sse(head_id, "resync", {"reason": "gap"})
+        else:
+            for item in replay:
+                yield format_sse(*item)
+        yield format_sse(head_id, "ready", {"replayed": len(replay or [])})
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), timeout=keepalive_sec)
+            except asyncio.TimeoutError:
+                # Comment frame: keeps proxies (nginx proxy_read_timeout 30s) from closing an idle stream.
+                if await is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(*item)
+    finally:
+        bus.unsubscribe(sub)
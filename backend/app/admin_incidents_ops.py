@@ -8,19 +8,11 @@ from app.db import (
     get_central_heartbeat_history,
     get_incident_by_key,
     list_alert_actions,
-    list_central_heartbeats,
     list_incident_notifications,
     list_incidents,
-    sync_incidents,
 )
 
 
-def _sync_summary(sync_result: dict[str, Any]) -> dict[str, Any]:
-    summary = {key: value for key, value in sync_result.items() if key != "notify"}
-    summary["notify_total"] = len(sync_result.get("notify") or [])
-    return summary
-
-
 async def build_incidents_response(
     *,
     db_path: str,
@@ -33,8 +25,6 @@ async def build_incidents_response(
     include_resolved: bool,
     limit: int,
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(db_path)
-    sync_result = await sync_incidents(db_path, centrals=centrals)
     incidents = await list_incidents(
         db_path,
         status=status,
@@ -73,7 +63,6 @@ async def build_incidents_response(
         "status": "ok",
         "totals": totals,
         "incidents": incidents,
-        "sync": _sync_summary(sync_result),
     }
 
 
@@ -84,8 +73,6 @@ async def build_incident_detail_response(
     code: str,
     limit: int,
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(db_path)
-    sync_result = await sync_incidents(db_path, centrals=centrals)
     incident = await get_incident_by_key(db_path, central_id=central_id, code=code)
     if incident is None:
         raise HTTPException(status_code=404, detail="incident_not_found")
@@ -118,7 +105,6 @@ async def build_incident_detail_response(
         "actions": actions,
         "notifications": notifications,
         "history_hits": history_hits,
-        "sync": _sync_summary(sync_result),
     }
 
 
@@ -132,6 +118,7 @@ async def build_incident_notifications_response(
     since_ts: str | None,
     q: str | None,
     limit: int,
+    delivery: dict[str, Any] | None = None,
 ) -> dict[str, Any]:
     notifications = await list_incident_notifications(
         db_path,
@@ -143,7 +130,11 @@ async def build_incident_notifications_response(
         q=q,
         limit=limit,
     )
-    return {"status": "ok", "total": len(notifications), "notifications": notifications}
+    result: dict[str, Any] = {"status": "ok", "total": len(notifications), "notifications": notifications}
+    if delivery is not None:
+        # Outbox backlog and delivery latency: the log above only has finished deliveries.
+        result["delivery"] = delivery
+    return result
 
 
 async def build_alert_actions_response(
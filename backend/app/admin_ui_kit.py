@@ -11652,6 +11652,69 @@ quality=${quality.status_label} ${quality.passed}/${quality.total} policy=${qual
           }, delayMs);
         };
       }
+      function subscribeFleetStream(options = {}) {
+        // Live fleet deltas over SSE (/api/admin/fleet/stream). `onPoll` runs every `pollMs` only while
+        // the stream is down; deltas are batched for `debounceMs` before `onDelta(batch)`.
+        const url = String(options.url || "/api/admin/fleet/stream");
+        const pollMs = Math.max(1000, Number(options.pollMs) || 10000);
+        const reopenMs = Math.max(pollMs, Number(options.reopenMs) || 30000);
+        const onDelta = typeof options.onDelta === "function" ? options.onDelta : () => {};
+        const onPoll = typeof options.onPoll === "function" ? options.onPoll : () => {};
+        const onState = typeof options.onState === "function" ? options.onState : () => {};
+        let pending = [];
+        let pollTimer = null;
+        let reopenTimer = null;
+        let source = null;
+        const flush = debounce(() => {
+          const batch = pending;
+          pending = [];
+          if (batch.length) onDelta(batch);
+        }, Math.max(0, Number(options.debounceMs ?? 800)));
+        function startPolling() {
+          if (pollTimer !== null) return;
+          pollTimer = setInterval(() => onPoll(), pollMs);
+          onState("polling");
+        }
+        function stopPolling() {
+          if (pollTimer === null) return;
+          clearInterval(pollTimer);
+          pollTimer = null;
+        }
+        function push(type, event) {
+          let data = {};
+          try { data = JSON.parse(event.data || "{}"); } catch (_error) { data = {}; }
+          pending.push({ type, ...data });
+          flush();
+        }
+        function open() {
+          reopenTimer = null;
+          source = new EventSource(url);
+          source.addEventListener("ready", () => { stopPolling(); onState("live"); });
+          source.addEventListener("central", (event) => push("central", event));
+          source.addEventListener("alert", (event) => push("alert", event));
+          source.addEventListener("incident", (event) => push("incident", event));
+          source.addEventListener("resync", () => { pending = []; onPoll(); });
+          source.addEventListener("error", () => {
+            startPolling();
+            // CLOSED means the browser gave up (HTTP error); reconnect ourselves later.
+            if (source && source.readyState === EventSource.CLOSED && reopenTimer === null) {
+              reopenTimer = setTimeout(open, reopenMs);
+            }
+          });
+        }
+        if (typeof EventSource !== "function") {
+          startPolling();
+          return { close: stopPolling };
+        }
+        open();
+        return {
+          close() {
+            stopPolling();
+            if (reopenTimer !== null) clearTimeout(reopenTimer);
+            if (source) source.close();
+          },
+        };
+      }
       function bindEnterRefresh(inputIds, refresh) {
         for (const id of inputIds) {
           const node = byId(id);
@@ -11846,6 +11909,7 @@ quality=${quality.status_label} ${quality.passed}/${quality.total} policy=${qual
         closeCommandPalette,
         bindCommandPalette,
         debounce,
+        subscribeFleetStream,
         bindEnterRefresh,
         bindDebouncedInputs,
         bindClearFilters,
@@ -6,7 +6,7 @@ from typing import Any
 from app.db import (
     get_client_notification_settings,
     get_client_profile,
-    list_central_heartbeats,
+    get_fleet_snapshot,
     list_incidents,
     upsert_client_notification_settings,
     upsert_client_profile,
@@ -237,7 +237,7 @@ async def build_client_home_response(
     vehicle_ids = _normalize_scope_ids(scope.get("vehicle_ids"))
 
     centrals = _scope_filter(
-        await list_central_heartbeats(db_path),
+        await get_fleet_snapshot(db_path),
         central_ids=central_ids,
         vehicle_ids=vehicle_ids,
     )
@@ -323,7 +323,7 @@ async def build_client_vehicles_response(
     central_ids = _normalize_scope_ids(scope.get("central_ids"))
     vehicle_ids = _normalize_scope_ids(scope.get("vehicle_ids"))
     centrals = _scope_filter(
-        await list_central_heartbeats(db_path),
+        await get_fleet_snapshot(db_path),
         central_ids=central_ids,
         vehicle_ids=vehicle_ids,
     )
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import sqlite3
+import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import aiosqlite
 
+from app.db_pool import db_reader, db_writer
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
@@ -32,9 +36,267 @@ class HeartbeatResult:
     ts_received: str
 
 
+_HEARTBEAT_HEALTH_VER = 1
+_HEARTBEAT_HEALTH_BACKFILL_BATCH = 500
+_HEARTBEAT_HEALTH_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("stop_mode", "TEXT"),
+    ("pending_oldest_created_at", "TEXT"),
+    ("pending_oldest_age_sec", "INTEGER"),
+    ("wg_latest_handshake_age_sec", "INTEGER"),
+    ("gps_fix", "INTEGER"),
+    ("gps_lat", "REAL"),
+    ("gps_lon", "REAL"),
+    ("gps_updated_at", "TEXT"),
+    ("gps_age_sec", "INTEGER"),
+    ("gps_source", "TEXT"),
+    ("health_severity", "TEXT"),
+    ("health_alerts_total", "INTEGER NOT NULL DEFAULT 0"),
+    ("health_alerts_warn", "INTEGER NOT NULL DEFAULT 0"),
+    ("health_alerts_bad", "INTEGER NOT NULL DEFAULT 0"),
+    ("alerts_json", "TEXT NOT NULL DEFAULT '[]'"),
+    ("health_ver", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+async def _ensure_columns(
+    db: aiosqlite.Connection,
+    table_name: str,
+    columns: tuple[tuple[str, str], ...],
+) -> None:
+    async with db.execute(f"PRAGMA table_info({table_name});") as cursor:
+        existing = {str(row[1]) for row in await cursor.fetchall()}
+    for column_name, column_type in columns:
+        if column_name not in existing:
+            await db.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};")
+
+
+async def _backfill_heartbeat_health(
+    db: aiosqlite.Connection,
+    table_name: str,
+    *,
+    skip_downsampled: bool = False,
+) -> int:
+    # Rows written before health materialization (or under an older _HEARTBEAT_HEALTH_VER)
+    # are re-derived from raw_json in small batches, one commit per batch. The table is walked
+    # once by rowid (health_ver has no index), and a schema_meta marker skips the pass on
+    # later startups. Downsampled history rows no longer carry raw_json and keep their stored fields.
+    marker_key = f"heartbeat_health_backfill:{table_name}"
+    async with db.execute("SELECT value FROM schema_meta WHERE key = ?;", (marker_key,)) as cursor:
+        marker = await cursor.fetchone()
+    if marker is not None and _to_int(marker[0], 0) >= _HEARTBEAT_HEALTH_VER:
+        return 0
+    extra_where = "AND downsampled = 0" if skip_downsampled else ""
+    updated = 0
+    last_rowid = 0
+    while True:
+        async with db.execute(
+            f"""
+            SELECT
+              rowid, time_sync, collector_state, uplink_state, flush_timer_state, wg_state,
+              pending_batches, doors_json, raw_json
+            FROM {table_name}
+            WHERE rowid > ? AND health_ver < ? {extra_where}
+            ORDER BY rowid
+            LIMIT ?;
+            """,
+            (last_rowid, _HEARTBEAT_HEALTH_VER, _HEARTBEAT_HEALTH_BACKFILL_BATCH),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            await db.execute(
+                """
+                INSERT INTO schema_meta(key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at;
+                """,
+                (marker_key, str(_HEARTBEAT_HEALTH_VER), utc_now_iso()),
+            )
+            await db.commit()
+            return updated
+        last_rowid = int(rows[-1][0])
+
+        for row in rows:
+            try:
+                raw_payload = json.loads(row[8] or "{}")
+            except Exception:
+                raw_payload = {}
+            if not isinstance(raw_payload, dict):
+                raw_payload = {}
+            try:
+                doors = json.loads(row[7] or "[]")
+            except Exception:
+                doors = []
+            health = _materialize_heartbeat_health(
+                time_sync=row[1],
+                services={
+                    "passengers-collector": row[2],
+                    "passengers-central-uplink": row[3],
+                    "passengers-central-flush.timer": row[4],
+                    "wg-quick@wg0": row[5],
+                },
+                pending_batches=_to_int(row[6], 0),
+                raw_queue=raw_payload.get("queue"),
+                raw_gps=raw_payload.get("gps"),
+                raw_doors=doors,
+            )
+            await db.execute(
+                f"""
+                UPDATE {table_name}
+                SET {", ".join(f"{name} = ?" for name in _HEARTBEAT_HEALTH_FIELDS)}
+                WHERE rowid = ?;
+                """,
+                (*(health[name] for name in _HEARTBEAT_HEALTH_FIELDS), row[0]),
+            )
+            updated += 1
+        await db.commit()
+
+
+FLEET_METRICS_ROLLUP_BUCKETS: tuple[int, ...] = (60, 300, 3600)
+_WG_STALE_AGE_SEC = 300
+_ROLLUP_NOTIFICATION_COLUMNS = {
+    "sent": "notifications_sent",
+    "failed": "notifications_failed",
+    "skipped": "notifications_skipped",
+}
+
+
+def _epoch_from_iso(value: str | None) -> int | None:
+    dt = _parse_iso_utc(value)
+    return int(dt.timestamp()) if dt is not None else None
+
+
+async def _upsert_central_rollups(
+    db: aiosqlite.Connection,
+    *,
+    central_id: str,
+    ts_received: str,
+    severity: str,
+    alerts_total: int,
+    pending_batches: int,
+    wg_latest_handshake_age_sec: int | None,
+) -> None:
+    epoch = _epoch_from_iso(ts_received)
+    if epoch is None:
+        return
+    wg_stale = 1 if _to_int(wg_latest_handshake_age_sec, -1) >= _WG_STALE_AGE_SEC else 0
+    # Each bucket keeps the latest sample per central, same as the raw bucketing it replaces.
+    await db.executemany(
+        """
+        INSERT INTO fleet_metrics_rollup_centrals(
+          bucket_sec, bucket_start, central_id, ts_received,
+          severity, alerts_total, pending_batches, wg_stale
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(bucket_sec, bucket_start, central_id) DO UPDATE SET
+          ts_received=excluded.ts_received,
+          severity=excluded.severity,
+          alerts_total=excluded.alerts_total,
+          pending_batches=excluded.pending_batches,
+          wg_stale=excluded.wg_stale
+        WHERE excluded.ts_received >= fleet_metrics_rollup_centrals.ts_received;
+        """,
+        [
+            (
+                bucket_sec,
+                (epoch // bucket_sec) * bucket_sec,
+                central_id,
+                ts_received,
+                severity,
+                max(0, alerts_total),
+                max(0, pending_batches),
+                wg_stale,
+            )
+            for bucket_sec in FLEET_METRICS_ROLLUP_BUCKETS
+        ],
+    )
+
+
+async def _bump_event_rollups(db: aiosqlite.Connection, *, ts: str, column: str) -> None:
+    epoch = _epoch_from_iso(ts)
+    if epoch is None:
+        return
+    await db.executemany(
+        f"""
+        INSERT INTO fleet_metrics_rollup_events(bucket_sec, bucket_start, {column})
+        VALUES (?, ?, 1)
+        ON CONFLICT(bucket_sec, bucket_start) DO UPDATE SET
+          {column} = {column} + 1;
+        """,
+        [(bucket_sec, (epoch // bucket_sec) * bucket_sec) for bucket_sec in FLEET_METRICS_ROLLUP_BUCKETS],
+    )
+
+
+async def _backfill_fleet_metrics_rollups(db: aiosqlite.Connection) -> None:
+    # One-time seed for databases created before the rollup tables existed.
+    async with db.execute("SELECT 1 FROM fleet_metrics_rollup_centrals LIMIT 1;") as cursor:
+        has_centrals = await cursor.fetchone() is not None
+    async with db.execute("SELECT 1 FROM fleet_metrics_rollup_events LIMIT 1;") as cursor:
+        has_events = await cursor.fetchone() is not None
+
+    for bucket_sec in FLEET_METRICS_ROLLUP_BUCKETS:
+        if not has_centrals:
+            await db.execute(
+                """
+                INSERT OR REPLACE INTO fleet_metrics_rollup_centrals(
+                  bucket_sec, bucket_start, central_id, ts_received,
+                  severity, alerts_total, pending_batches, wg_stale
+                )
+                SELECT ?, bucket_start, central_id, ts_received,
+                       severity, alerts_total, pending_batches, wg_stale
+                FROM (
+                  SELECT
+                    (CAST(strftime('%s', ts_received) AS INTEGER) / ?) * ? AS bucket_start,
+                    central_id,
+                    ts_received,
+                    COALESCE(health_severity, 'good') AS severity,
+                    MAX(0, health_alerts_total) AS alerts_total,
+                    MAX(0, pending_batches) AS pending_batches,
+                    CASE WHEN COALESCE(wg_latest_handshake_age_sec, -1) >= ? THEN 1 ELSE 0 END AS wg_stale,
+                    ROW_NUMBER() OVER (
+                      PARTITION BY CAST(strftime('%s', ts_received) AS INTEGER) / ?, central_id
+                      ORDER BY ts_received DESC, id DESC
+                    ) AS rn
+                  FROM central_heartbeat_history
+                  WHERE strftime('%s', ts_received) IS NOT NULL
+                )
+                WHERE rn = 1;
+                """,
+                (bucket_sec, bucket_sec, bucket_sec, _WG_STALE_AGE_SEC, bucket_sec),
+            )
+        if not has_events:
+            await db.execute(
+                """
+                INSERT OR REPLACE INTO fleet_metrics_rollup_events(
+                  bucket_sec, bucket_start,
+                  notifications_sent, notifications_failed, notifications_skipped, alert_actions
+                )
+                SELECT ?, bucket_start, SUM(sent), SUM(failed), SUM(skipped), SUM(actions)
+                FROM (
+                  SELECT
+                    (CAST(strftime('%s', ts) AS INTEGER) / ?) * ? AS bucket_start,
+                    status = 'sent' AS sent,
+                    status = 'failed' AS failed,
+                    status = 'skipped' AS skipped,
+                    0 AS actions
+                  FROM incident_notifications
+                  WHERE strftime('%s', ts) IS NOT NULL
+                  UNION ALL
+                  SELECT
+                    (CAST(strftime('%s', ts) AS INTEGER) / ?) * ? AS bucket_start,
+                    0, 0, 0, 1
+                  FROM alert_actions
+                  WHERE strftime('%s', ts) IS NOT NULL
+                )
+                GROUP BY bucket_start;
+                """,
+                (bucket_sec, bucket_sec, bucket_sec, bucket_sec, bucket_sec),
+            )
+    await db.commit()
+
+
 async def init_db(db_path: str) -> None:
     ensure_parent_dir(db_path)
     async with aiosqlite.connect(db_path) as db:
+        # Only takes effect on a fresh file; existing databases need a one-off VACUUM to switch.
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         await db.execute("PRAGMA journal_mode=WAL;")
         await db.execute("PRAGMA synchronous=NORMAL;")
         await db.execute("PRAGMA foreign_keys=ON;")
@@ -92,7 +354,23 @@ async def init_db(db_path: str) -> None:
               sent_batches INTEGER NOT NULL DEFAULT 0,
               last_event_ts_received TEXT,
               doors_json TEXT NOT NULL,
-              raw_json TEXT NOT NULL
+              raw_json TEXT NOT NULL,
+              stop_mode TEXT,
+              pending_oldest_created_at TEXT,
+              pending_oldest_age_sec INTEGER,
+              wg_latest_handshake_age_sec INTEGER,
+              gps_fix INTEGER,
+              gps_lat REAL,
+              gps_lon REAL,
+              gps_updated_at TEXT,
+              gps_age_sec INTEGER,
+              gps_source TEXT,
+              health_severity TEXT,
+              health_alerts_total INTEGER NOT NULL DEFAULT 0,
+              health_alerts_warn INTEGER NOT NULL DEFAULT 0,
+              health_alerts_bad INTEGER NOT NULL DEFAULT 0,
+              alerts_json TEXT NOT NULL DEFAULT '[]',
+              health_ver INTEGER NOT NULL DEFAULT 0
             );
             """
         )
@@ -120,7 +398,24 @@ async def init_db(db_path: str) -> None:
               sent_batches INTEGER NOT NULL DEFAULT 0,
               last_event_ts_received TEXT,
               doors_json TEXT NOT NULL,
-              raw_json TEXT NOT NULL
+              raw_json TEXT NOT NULL,
+              stop_mode TEXT,
+              pending_oldest_created_at TEXT,
+              pending_oldest_age_sec INTEGER,
+              wg_latest_handshake_age_sec INTEGER,
+              gps_fix INTEGER,
+              gps_lat REAL,
+              gps_lon REAL,
+              gps_updated_at TEXT,
+              gps_age_sec INTEGER,
+              gps_source TEXT,
+              health_severity TEXT,
+              health_alerts_total INTEGER NOT NULL DEFAULT 0,
+              health_alerts_warn INTEGER NOT NULL DEFAULT 0,
+              health_alerts_bad INTEGER NOT NULL DEFAULT 0,
+              alerts_json TEXT NOT NULL DEFAULT '[]',
+              health_ver INTEGER NOT NULL DEFAULT 0,
+              downsampled INTEGER NOT NULL DEFAULT 0
             );
             """
         )
@@ -130,6 +425,64 @@ async def init_db(db_path: str) -> None:
             ON central_heartbeat_history(central_id, ts_received DESC);
             """
         )
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_central_heartbeat_history_ts
+            ON central_heartbeat_history(ts_received);
+            """
+        )
+        await _ensure_columns(db, "central_heartbeat_history", (("downsampled", "INTEGER NOT NULL DEFAULT 0"),))
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_central_heartbeat_history_raw_ts
+            ON central_heartbeat_history(ts_received) WHERE downsampled = 0;
+            """
+        )
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_meta (
+              key TEXT PRIMARY KEY,
+              value TEXT NOT NULL,
+              updated_at TEXT NOT NULL
+            );
+            """
+        )
+        for table_name in ("central_heartbeats", "central_heartbeat_history"):
+            await _ensure_columns(db, table_name, _HEARTBEAT_HEALTH_COLUMNS)
+            await _backfill_heartbeat_health(
+                db,
+                table_name,
+                skip_downsampled=table_name == "central_heartbeat_history",
+            )
+
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fleet_metrics_rollup_centrals (
+              bucket_sec INTEGER NOT NULL,
+              bucket_start INTEGER NOT NULL,
+              central_id TEXT NOT NULL,
+              ts_received TEXT NOT NULL,
+              severity TEXT NOT NULL,
+              alerts_total INTEGER NOT NULL DEFAULT 0,
+              pending_batches INTEGER NOT NULL DEFAULT 0,
+              wg_stale INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY(bucket_sec, bucket_start, central_id)
+            ) WITHOUT ROWID;
+            """
+        )
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fleet_metrics_rollup_events (
+              bucket_sec INTEGER NOT NULL,
+              bucket_start INTEGER NOT NULL,
+              notifications_sent INTEGER NOT NULL DEFAULT 0,
+              notifications_failed INTEGER NOT NULL DEFAULT 0,
+              notifications_skipped INTEGER NOT NULL DEFAULT 0,
+              alert_actions INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY(bucket_sec, bucket_start)
+            ) WITHOUT ROWID;
+            """
+        )
 
         await db.execute(
             """
@@ -242,6 +595,32 @@ async def init_db(db_path: str) -> None:
             ON incident_notifications(status, channel, ts DESC);
             """
         )
+        # Incident notifications waiting for the delivery worker; a row is deleted once its outcome
+        # lands in incident_notifications.
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              created_at TEXT NOT NULL,
+              channel TEXT NOT NULL,
+              central_id TEXT NOT NULL,
+              code TEXT NOT NULL,
+              severity TEXT NOT NULL,
+              event TEXT NOT NULL,
+              subject TEXT NOT NULL,
+              body TEXT NOT NULL,
+              attempts INTEGER NOT NULL DEFAULT 0,
+              next_attempt_at TEXT NOT NULL,
+              last_error TEXT
+            );
+            """
+        )
+        await db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+            ON notification_outbox(next_attempt_at, id);
+            """
+        )
         await db.execute(
             """
             CREATE TABLE IF NOT EXISTS notification_settings (
@@ -339,6 +718,8 @@ async def init_db(db_path: str) -> None:
             """
         )
 
+        await _backfill_fleet_metrics_rollups(db)
+
         defaults = {
             "notify_telegram": "1",
             "notify_email": "0",
@@ -360,58 +741,52 @@ async def init_db(db_path: str) -> None:
         await db.commit()
 
 
-async def ingest_stop(db_path: str, payload: dict[str, Any]) -> IngestResult:
-    ts_received = utc_now_iso()
-    batch_id = str(payload["batch_id"])
-    vehicle_id = str(payload["vehicle_id"])
-    schema_ver = int(payload.get("schema_ver", 1))
+_STOP_INSERT_SQL = """
+    INSERT INTO stops(
+      batch_id, schema_ver, vehicle_id, ts_sent, ts_received,
+      stop_id, ts_start, ts_end, gps_lat, gps_lon, raw_json
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+_STOP_DOOR_INSERT_SQL = """
+    INSERT INTO stop_door_counts(batch_id, door_id, in_count, out_count)
+    VALUES (?, ?, ?, ?);
+"""
+INGEST_STOPS_BATCH_MAX = 500
 
+
+def _stop_rows(payload: dict[str, Any], *, ts_received: str) -> tuple[tuple[Any, ...], list[tuple[Any, ...]]]:
+    batch_id = str(payload["batch_id"])
     stop = payload.get("stop") or {}
     gps = stop.get("gps") or {}
+    stop_row = (
+        batch_id,
+        int(payload.get("schema_ver", 1)),
+        str(payload["vehicle_id"]),
+        payload.get("ts_sent"),
+        ts_received,
+        stop.get("stop_id"),
+        stop.get("ts_start"),
+        stop.get("ts_end"),
+        gps.get("lat"),
+        gps.get("lon"),
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+    )
+    door_rows = [
+        (batch_id, int(door_item["door_id"]), int(door_item["in"]), int(door_item["out"]))
+        for door_item in payload.get("doors") or []
+    ]
+    return stop_row, door_rows
 
-    doors = payload.get("doors") or []
-    raw_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
 
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("PRAGMA foreign_keys=ON;")
+async def ingest_stop(db_path: str, payload: dict[str, Any]) -> IngestResult:
+    ts_received = utc_now_iso()
+    stop_row, door_rows = _stop_rows(payload, ts_received=ts_received)
+
+    async with db_writer(db_path) as db:
         try:
             await db.execute("BEGIN;")
-            await db.execute(
-                """
-                INSERT INTO stops(
-                  batch_id, schema_ver, vehicle_id, ts_sent, ts_received,
-                  stop_id, ts_start, ts_end, gps_lat, gps_lon, raw_json
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-                """,
-                (
-                    batch_id,
-                    schema_ver,
-                    vehicle_id,
-                    payload.get("ts_sent"),
-                    ts_received,
-                    stop.get("stop_id"),
-                    stop.get("ts_start"),
-                    stop.get("ts_end"),
-                    gps.get("lat"),
-                    gps.get("lon"),
-                    raw_json,
-                ),
-            )
-
-            for door_item in doors:
-                await db.execute(
-                    """
-                    INSERT INTO stop_door_counts(batch_id, door_id, in_count, out_count)
-                    VALUES (?, ?, ?, ?);
-                    """,
-                    (
-                        batch_id,
-                        int(door_item["door_id"]),
-                        int(door_item["in"]),
-                        int(door_item["out"]),
-                    ),
-                )
-
+            await db.execute(_STOP_INSERT_SQL, stop_row)
+            await db.executemany(_STOP_DOOR_INSERT_SQL, door_rows)
             await db.commit()
             return IngestResult(status="stored", ts_received=ts_received)
         except sqlite3.IntegrityError:
@@ -419,10 +794,60 @@ async def ingest_stop(db_path: str, payload: dict[str, Any]) -> IngestResult:
             return IngestResult(status="duplicate", ts_received=ts_received)
 
 
+async def ingest_stops_batch(db_path: str, payloads: list[dict[str, Any]]) -> dict[str, Any]:
+    ts_received = utc_now_iso()
+    rows = [_stop_rows(payload, ts_received=ts_received) for payload in payloads[:INGEST_STOPS_BATCH_MAX]]
+    batch_ids = [stop_row[0] for stop_row, _ in rows]
+    statuses: dict[int, str] = {}
+
+    async with db_writer(db_path) as db:
+        try:
+            await db.execute("BEGIN;")
+            existing: set[str] = set()
+            unique_ids = sorted(set(batch_ids))
+            for offset in range(0, len(unique_ids), 500):
+                chunk = unique_ids[offset : offset + 500]
+                async with db.execute(
+                    f"SELECT batch_id FROM stops WHERE batch_id IN ({', '.join('?' for _ in chunk)});",
+                    tuple(chunk),
+                ) as cursor:
+                    existing.update(str(row["batch_id"]) for row in await cursor.fetchall())
+
+            stop_rows: list[tuple[Any, ...]] = []
+            door_rows: list[tuple[Any, ...]] = []
+            for index, (stop_row, item_door_rows) in enumerate(rows):
+                if stop_row[0] in existing:
+                    statuses[index] = "duplicate"
+                    continue
+                # A batch_id repeated inside the request is stored once, like a retried POST.
+                existing.add(stop_row[0])
+                statuses[index] = "stored"
+                stop_rows.append(stop_row)
+                door_rows.extend(item_door_rows)
+
+            await db.executemany(_STOP_INSERT_SQL, stop_rows)
+            await db.executemany(_STOP_DOOR_INSERT_SQL, door_rows)
+            await db.commit()
+        except sqlite3.IntegrityError:
+            # Only malformed payloads (e.g. a door listed twice) get here; isolate them one by one.
+            await db.rollback()
+            statuses = {}
+
+    if not statuses:
+        for index, payload in enumerate(payloads[: len(rows)]):
+            statuses[index] = (await ingest_stop(db_path, payload)).status
+
+    results = [{"batch_id": batch_id, "status": statuses[index]} for index, batch_id in enumerate(batch_ids)]
+    return {
+        "ts_received": ts_received,
+        "stored": sum(1 for item in results if item["status"] == "stored"),
+        "duplicate": sum(1 for item in results if item["status"] == "duplicate"),
+        "results": results,
+    }
+
+
 async def stats_vehicle(db_path: str, vehicle_id: str) -> dict[str, Any]:
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("PRAGMA foreign_keys=ON;")
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
 
         async with db.execute(
             "SELECT COUNT(*) AS batches FROM stops WHERE vehicle_id = ?;",
@@ -475,83 +900,89 @@ async def ingest_central_heartbeat(db_path: str, payload: dict[str, Any]) -> Hea
     pending_batches = _to_int(queue.get("pending_batches"), 0)
     sent_batches = _to_int(queue.get("sent_batches"), 0)
     last_event_ts_received = queue.get("last_event_ts_received")
-    doors_json = json.dumps(doors, ensure_ascii=False, separators=(",", ":"))
     raw_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    health = _materialize_heartbeat_health(
+        time_sync=time_sync,
+        services={
+            "passengers-collector": collector_state,
+            "passengers-central-uplink": uplink_state,
+            "passengers-central-flush.timer": flush_timer_state,
+            "wg-quick@wg0": wg_state,
+        },
+        pending_batches=pending_batches,
+        raw_queue=queue,
+        raw_gps=payload.get("gps"),
+        raw_doors=doors,
+    )
 
-    async with aiosqlite.connect(db_path) as db:
+    base_columns = (
+        "central_id",
+        "vehicle_id",
+        "schema_ver",
+        "ts_sent",
+        "ts_received",
+        "time_sync",
+        "collector_state",
+        "uplink_state",
+        "flush_timer_state",
+        "wg_state",
+        "events_total",
+        "pending_batches",
+        "sent_batches",
+        "last_event_ts_received",
+        "raw_json",
+    )
+    columns = base_columns + _HEARTBEAT_HEALTH_FIELDS
+    values = (
+        central_id,
+        vehicle_id,
+        schema_ver,
+        ts_sent,
+        ts_received,
+        time_sync,
+        collector_state,
+        uplink_state,
+        flush_timer_state,
+        wg_state,
+        events_total,
+        pending_batches,
+        sent_batches,
+        last_event_ts_received,
+        raw_json,
+        *(health[name] for name in _HEARTBEAT_HEALTH_FIELDS),
+    )
+    column_list = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    update_list = ",\n              ".join(f"{name}=excluded.{name}" for name in columns if name != "central_id")
+
+    async with db_writer(db_path) as db:
         await db.execute(
-            """
-            INSERT INTO central_heartbeats(
-              central_id, vehicle_id, schema_ver, ts_sent, ts_received, time_sync,
-              collector_state, uplink_state, flush_timer_state, wg_state,
-              events_total, pending_batches, sent_batches, last_event_ts_received,
-              doors_json, raw_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            f"""
+            INSERT INTO central_heartbeats({column_list})
+            VALUES ({placeholders})
             ON CONFLICT(central_id) DO UPDATE SET
-              vehicle_id=excluded.vehicle_id,
-              schema_ver=excluded.schema_ver,
-              ts_sent=excluded.ts_sent,
-              ts_received=excluded.ts_received,
-              time_sync=excluded.time_sync,
-              collector_state=excluded.collector_state,
-              uplink_state=excluded.uplink_state,
-              flush_timer_state=excluded.flush_timer_state,
-              wg_state=excluded.wg_state,
-              events_total=excluded.events_total,
-              pending_batches=excluded.pending_batches,
-              sent_batches=excluded.sent_batches,
-              last_event_ts_received=excluded.last_event_ts_received,
-              doors_json=excluded.doors_json,
-              raw_json=excluded.raw_json;
+              {update_list};
             """,
-            (
-                central_id,
-                vehicle_id,
-                schema_ver,
-                ts_sent,
-                ts_received,
-                time_sync,
-                collector_state,
-                uplink_state,
-                flush_timer_state,
-                wg_state,
-                events_total,
-                pending_batches,
-                sent_batches,
-                last_event_ts_received,
-                doors_json,
-                raw_json,
-            ),
+            values,
         )
         await db.execute(
-            """
-            INSERT INTO central_heartbeat_history(
-              central_id, vehicle_id, schema_ver, ts_sent, ts_received, time_sync,
-              collector_state, uplink_state, flush_timer_state, wg_state,
-              events_total, pending_batches, sent_batches, last_event_ts_received,
-              doors_json, raw_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            f"""
+            INSERT INTO central_heartbeat_history({column_list})
+            VALUES ({placeholders});
             """,
-            (
-                central_id,
-                vehicle_id,
-                schema_ver,
-                ts_sent,
-                ts_received,
-                time_sync,
-                collector_state,
-                uplink_state,
-                flush_timer_state,
-                wg_state,
-                events_total,
-                pending_batches,
-                sent_batches,
-                last_event_ts_received,
-                doors_json,
-                raw_json,
-            ),
+            values,
+        )
+        await _upsert_central_rollups(
+            db,
+            central_id=central_id,
+            ts_received=ts_received,
+            severity=health["health_severity"],
+            alerts_total=health["health_alerts_total"],
+            pending_batches=pending_batches,
+            wg_latest_handshake_age_sec=health["wg_latest_handshake_age_sec"],
         )
         await db.commit()
+        bump_fleet_generation(db_path)
 
     return HeartbeatResult(status="stored", ts_received=ts_received)
 
@@ -584,18 +1015,24 @@ def _state_to_dict(row: aiosqlite.Row, now_dt: datetime) -> dict[str, Any]:
     }
 
 
-async def _get_alert_states(db_path: str) -> dict[tuple[str, str], dict[str, Any]]:
+async def _get_alert_states(
+    db_path: str,
+    *,
+    central_id: str | None = None,
+) -> dict[tuple[str, str], dict[str, Any]]:
     now_dt = datetime.now(timezone.utc)
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT
-              central_id, code, acked_at, acked_by, ack_note,
-              silenced_until, silenced_by, silence_note, updated_at
-            FROM alert_states;
-            """
-        ) as cursor:
+    query = """
+        SELECT
+          central_id, code, acked_at, acked_by, ack_note,
+          silenced_until, silenced_by, silence_note, updated_at
+        FROM alert_states
+    """
+    params: list[Any] = []
+    if central_id:
+        query += " WHERE central_id = ?"
+        params.append(str(central_id))
+    async with db_reader(db_path) as db:
+        async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
     result: dict[tuple[str, str], dict[str, Any]] = {}
@@ -674,6 +1111,16 @@ def _normalize_door_item(raw: Any) -> dict[str, Any]:
     }
 
 
+def _build_heartbeat_age_alerts(age_sec: int | None) -> list[dict[str, str]]:
+    if age_sec is None:
+        return [_new_alert(severity="bad", code="heartbeat_missing", message="Heartbeat timestamp missing or invalid")]
+    if age_sec > 240:
+        return [_new_alert(severity="bad", code="heartbeat_stale", message=f"Last heartbeat is {age_sec}s old")]
+    if age_sec > 90:
+        return [_new_alert(severity="warn", code="heartbeat_slow", message=f"Last heartbeat is {age_sec}s old")]
+    return []
+
+
 def _build_central_alerts(
     *,
     age_sec: int | None,
@@ -682,18 +1129,10 @@ def _build_central_alerts(
     queue: dict[str, Any],
     doors: list[dict[str, Any]],
 ) -> tuple[list[dict[str, str]], str]:
-    alerts: list[dict[str, str]] = []
+    alerts = _build_heartbeat_age_alerts(age_sec)
     severity = "good"
-
-    if age_sec is None:
-        alerts.append(_new_alert(severity="bad", code="heartbeat_missing", message="Heartbeat timestamp missing or invalid"))
-        severity = _merge_severity(severity, "bad")
-    elif age_sec > 240:
-        alerts.append(_new_alert(severity="bad", code="heartbeat_stale", message=f"Last heartbeat is {age_sec}s old"))
-        severity = _merge_severity(severity, "bad")
-    elif age_sec > 90:
-        alerts.append(_new_alert(severity="warn", code="heartbeat_slow", message=f"Last heartbeat is {age_sec}s old"))
-        severity = _merge_severity(severity, "warn")
+    for alert in alerts:
+        severity = _merge_severity(severity, alert["severity"])
 
     if str(time_sync or "").strip().lower() != "synced":
         alerts.append(
@@ -883,405 +1322,369 @@ def _build_central_alerts(
     return alerts, severity
 
 
-async def list_central_heartbeats(db_path: str) -> list[dict[str, Any]]:
-    now = datetime.now(timezone.utc)
-    states_map = await _get_alert_states(db_path)
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT
-              central_id, vehicle_id, schema_ver, ts_sent, ts_received, time_sync,
-              collector_state, uplink_state, flush_timer_state, wg_state,
-              events_total, pending_batches, sent_batches, last_event_ts_received,
-              doors_json, raw_json
-            FROM central_heartbeats
-            ORDER BY ts_received DESC;
-            """
-        ) as cursor:
-            rows = await cursor.fetchall()
+_HEARTBEAT_HEALTH_FIELDS: tuple[str, ...] = (
+    "doors_json",
+    "stop_mode",
+    "pending_oldest_created_at",
+    "pending_oldest_age_sec",
+    "wg_latest_handshake_age_sec",
+    "gps_fix",
+    "gps_lat",
+    "gps_lon",
+    "gps_updated_at",
+    "gps_age_sec",
+    "gps_source",
+    "health_severity",
+    "health_alerts_total",
+    "health_alerts_warn",
+    "health_alerts_bad",
+    "alerts_json",
+    "health_ver",
+)
+
+
+def _to_float_or_none(value: Any) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except Exception:
+        return None
 
-    result: list[dict[str, Any]] = []
-    for row in rows:
-        ts_received = row["ts_received"]
-        ts_dt = _parse_iso_utc(ts_received)
-        age_sec = int((now - ts_dt).total_seconds()) if ts_dt else None
-        doors_raw = row["doors_json"] or "[]"
-        try:
-            doors = json.loads(doors_raw)
-            if not isinstance(doors, list):
-                doors = []
-        except Exception:
-            doors = []
-        normalized_doors = [_normalize_door_item(item) for item in doors]
-
-        services = {
-            "passengers-collector": row["collector_state"],
-            "passengers-central-uplink": row["uplink_state"],
-            "passengers-central-flush.timer": row["flush_timer_state"],
-            "wg-quick@wg0": row["wg_state"],
-        }
-        stop_mode = "timer"
-        pending_oldest_age_sec: int | None = None
-        pending_oldest_created_at: str | None = None
-        wg_latest_handshake_age_sec: int | None = None
-        gps: dict[str, Any] | None = None
-        try:
-            raw_payload = json.loads(row["raw_json"] or "{}")
-            if isinstance(raw_payload, dict):
-                raw_queue = raw_payload.get("queue")
-                if isinstance(raw_queue, dict):
-                    parsed_mode = str(raw_queue.get("stop_mode") or "").strip().lower()
-                    if parsed_mode:
-                        stop_mode = parsed_mode
-                    pending_oldest_created_at = raw_queue.get("pending_oldest_created_at")
-                    parsed_pending_age = _to_int(raw_queue.get("pending_oldest_age_sec"), -1)
-                    if parsed_pending_age >= 0:
-                        pending_oldest_age_sec = parsed_pending_age
-                    parsed_wg_age = _to_int(raw_queue.get("wg_latest_handshake_age_sec"), -1)
-                    if parsed_wg_age >= 0:
-                        wg_latest_handshake_age_sec = parsed_wg_age
-                raw_gps = raw_payload.get("gps")
-                if isinstance(raw_gps, dict):
-                    gps = {
-                        "fix": bool(raw_gps.get("fix", False)),
-                        "lat": raw_gps.get("lat"),
-                        "lon": raw_gps.get("lon"),
-                        "updated_at": raw_gps.get("updated_at"),
-                        "age_sec": raw_gps.get("age_sec"),
-                        "source": raw_gps.get("source"),
-                    }
-        except Exception:
-            pass
-        queue = {
-            "events_total": row["events_total"],
-            "pending_batches": row["pending_batches"],
-            "sent_batches": row["sent_batches"],
-            "last_event_ts_received": row["last_event_ts_received"],
-            "pending_oldest_created_at": pending_oldest_created_at,
-            "pending_oldest_age_sec": pending_oldest_age_sec,
-            "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
-            "stop_mode": stop_mode,
-        }
-        alerts, severity = _build_central_alerts(
-            age_sec=age_sec,
-            time_sync=row["time_sync"],
-            services=services,
-            queue=queue,
-            doors=normalized_doors,
-        )
-        del severity
-
-        central_id = str(row["central_id"])
-        alerts_enriched: list[dict[str, Any]] = []
-        for alert in alerts:
-            code = str(alert.get("code") or "alert")
-            state = states_map.get((central_id, code), {})
-            alerts_enriched.append(
-                {
-                    "severity": str(alert.get("severity") or "bad"),
-                    "code": code,
-                    "message": str(alert.get("message") or ""),
-                    "acked_at": state.get("acked_at"),
-                    "acked_by": state.get("acked_by"),
-                    "ack_note": state.get("ack_note"),
-                    "silenced_until": state.get("silenced_until"),
-                    "silenced_by": state.get("silenced_by"),
-                    "silence_note": state.get("silence_note"),
-                    "silenced": bool(state.get("silenced", False)),
-                }
-            )
 
-        active_alerts = [item for item in alerts_enriched if not item.get("silenced")]
-        severity = "good"
-        for alert in active_alerts:
-            severity = _merge_severity(severity, str(alert.get("severity") or "bad"))
+def _to_str_or_none(value: Any) -> str | None:
+    if value is None:
+        return None
+    return str(value)
 
-        by_severity = {"good": 0, "warn": 0, "bad": 0}
-        for alert in active_alerts:
-            alert_level = str(alert.get("severity") or "bad")
-            if alert_level in by_severity:
-                by_severity[alert_level] += 1
 
-        result.append(
-            {
-                "central_id": central_id,
-                "vehicle_id": row["vehicle_id"],
-                "schema_ver": row["schema_ver"],
-                "ts_sent": row["ts_sent"],
-                "ts_received": ts_received,
-                "age_sec": age_sec,
-                "time_sync": row["time_sync"],
-                "gps": gps,
-                "services": services,
-                "queue": queue,
-                "doors": normalized_doors,
-                "alerts": alerts_enriched,
-                "health": {
-                    "severity": severity,
-                    "alerts_total": len(active_alerts),
-                    "alerts_all_total": len(alerts_enriched),
-                    "alerts_silenced": len(alerts_enriched) - len(active_alerts),
-                    "alerts_warn": by_severity["warn"],
-                    "alerts_bad": by_severity["bad"],
-                },
-            }
-        )
+def _materialize_heartbeat_health(
+    *,
+    time_sync: str | None,
+    services: dict[str, Any],
+    pending_batches: int,
+    raw_queue: Any,
+    raw_gps: Any,
+    raw_doors: Any,
+) -> dict[str, Any]:
+    # Everything a reader needs except heartbeat age (which depends on "now") is derived once here,
+    # so list/history readers never touch raw_json or re-run the alert rules.
+    queue_in = raw_queue if isinstance(raw_queue, dict) else {}
+    stop_mode = str(queue_in.get("stop_mode") or "").strip().lower() or "timer"
+    parsed_pending_age = _to_int(queue_in.get("pending_oldest_age_sec"), -1)
+    parsed_wg_age = _to_int(queue_in.get("wg_latest_handshake_age_sec"), -1)
+    pending_oldest_age_sec = parsed_pending_age if parsed_pending_age >= 0 else None
+    wg_latest_handshake_age_sec = parsed_wg_age if parsed_wg_age >= 0 else None
+    normalized_doors = [_normalize_door_item(item) for item in (raw_doors if isinstance(raw_doors, list) else [])]
+
+    alerts, severity = _build_central_alerts(
+        age_sec=0,
+        time_sync=time_sync,
+        services={key: str(value) for key, value in services.items()},
+        queue={
+            "pending_batches": pending_batches,
+            "pending_oldest_age_sec": pending_oldest_age_sec,
+            "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
+            "stop_mode": stop_mode,
+        },
+        doors=normalized_doors,
+    )
 
-    return result
+    gps = raw_gps if isinstance(raw_gps, dict) else None
+    gps_age = _to_int(gps.get("age_sec"), -1) if gps is not None and gps.get("age_sec") is not None else -1
+    return {
+        "doors_json": json.dumps(normalized_doors, ensure_ascii=False, separators=(",", ":")),
+        "stop_mode": stop_mode,
+        "pending_oldest_created_at": _to_str_or_none(queue_in.get("pending_oldest_created_at")),
+        "pending_oldest_age_sec": pending_oldest_age_sec,
+        "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
+        "gps_fix": (1 if bool(gps.get("fix", False)) else 0) if gps is not None else None,
+        "gps_lat": _to_float_or_none(gps.get("lat")) if gps is not None else None,
+        "gps_lon": _to_float_or_none(gps.get("lon")) if gps is not None else None,
+        "gps_updated_at": _to_str_or_none(gps.get("updated_at")) if gps is not None else None,
+        "gps_age_sec": gps_age if gps_age >= 0 else None,
+        "gps_source": _to_str_or_none(gps.get("source")) if gps is not None else None,
+        "health_severity": severity,
+        "health_alerts_total": len(alerts),
+        "health_alerts_warn": sum(1 for item in alerts if item["severity"] == "warn"),
+        "health_alerts_bad": sum(1 for item in alerts if item["severity"] == "bad"),
+        "alerts_json": json.dumps(alerts, ensure_ascii=False, separators=(",", ":")),
+        "health_ver": _HEARTBEAT_HEALTH_VER,
+    }
 
 
-async def get_central_heartbeat_history(db_path: str, central_id: str, *, limit: int = 120) -> list[dict[str, Any]]:
-    now = datetime.now(timezone.utc)
-    states_map = await _get_alert_states(db_path)
-    bounded_limit = max(1, min(int(limit), 1000))
+_CENTRAL_SELECT_COLUMNS = """
+    central_id, vehicle_id, schema_ver, ts_sent, ts_received, time_sync,
+    collector_state, uplink_state, flush_timer_state, wg_state,
+    events_total, pending_batches, sent_batches, last_event_ts_received,
+    doors_json, stop_mode, pending_oldest_created_at, pending_oldest_age_sec,
+    wg_latest_handshake_age_sec, gps_fix, gps_lat, gps_lon, gps_updated_at,
+    gps_age_sec, gps_source, alerts_json
+"""
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT
-              central_id, vehicle_id, schema_ver, ts_sent, ts_received, time_sync,
-              collector_state, uplink_state, flush_timer_state, wg_state,
-              events_total, pending_batches, sent_batches, last_event_ts_received,
-              doors_json, raw_json
-            FROM central_heartbeat_history
-            WHERE central_id = ?
-            ORDER BY ts_received DESC
-            LIMIT ?;
-            """,
-            (central_id, bounded_limit),
-        ) as cursor:
-            rows = await cursor.fetchall()
 
-    result: list[dict[str, Any]] = []
-    for row in rows:
-        ts_received = row["ts_received"]
-        ts_dt = _parse_iso_utc(ts_received)
-        age_sec = int((now - ts_dt).total_seconds()) if ts_dt else None
+def _load_json_list(raw: str | None) -> list[Any]:
+    try:
+        parsed = json.loads(raw or "[]")
+    except Exception:
+        return []
+    return parsed if isinstance(parsed, list) else []
 
-        doors_raw = row["doors_json"] or "[]"
-        try:
-            doors = json.loads(doors_raw)
-            if not isinstance(doors, list):
-                doors = []
-        except Exception:
-            doors = []
-        normalized_doors = [_normalize_door_item(item) for item in doors]
-
-        services = {
-            "passengers-collector": row["collector_state"],
-            "passengers-central-uplink": row["uplink_state"],
-            "passengers-central-flush.timer": row["flush_timer_state"],
-            "wg-quick@wg0": row["wg_state"],
-        }
 
-        stop_mode = "timer"
-        pending_oldest_age_sec: int | None = None
-        pending_oldest_created_at: str | None = None
-        wg_latest_handshake_age_sec: int | None = None
-        try:
-            raw_payload = json.loads(row["raw_json"] or "{}")
-            if isinstance(raw_payload, dict):
-                raw_queue = raw_payload.get("queue")
-                if isinstance(raw_queue, dict):
-                    parsed_mode = str(raw_queue.get("stop_mode") or "").strip().lower()
-                    if parsed_mode:
-                        stop_mode = parsed_mode
-                    pending_oldest_created_at = raw_queue.get("pending_oldest_created_at")
-                    parsed_pending_age = _to_int(raw_queue.get("pending_oldest_age_sec"), -1)
-                    if parsed_pending_age >= 0:
-                        pending_oldest_age_sec = parsed_pending_age
-                    parsed_wg_age = _to_int(raw_queue.get("wg_latest_handshake_age_sec"), -1)
-                    if parsed_wg_age >= 0:
-                        wg_latest_handshake_age_sec = parsed_wg_age
-        except Exception:
-            pass
+def _central_row_to_dict(
+    row: aiosqlite.Row,
+    *,
+    now: datetime,
+    states_map: dict[tuple[str, str], dict[str, Any]],
+    live_age_alerts: bool,
+    include_gps: bool,
+) -> dict[str, Any]:
+    central_id = str(row["central_id"])
+    ts_received = row["ts_received"]
+    ts_dt = _parse_iso_utc(ts_received)
+    age_sec = int((now - ts_dt).total_seconds()) if ts_dt else None
+
+    services = {
+        "passengers-collector": row["collector_state"],
+        "passengers-central-uplink": row["uplink_state"],
+        "passengers-central-flush.timer": row["flush_timer_state"],
+        "wg-quick@wg0": row["wg_state"],
+    }
+    queue = {
+        "events_total": row["events_total"],
+        "pending_batches": row["pending_batches"],
+        "sent_batches": row["sent_batches"],
+        "last_event_ts_received": row["last_event_ts_received"],
+        "pending_oldest_created_at": row["pending_oldest_created_at"],
+        "pending_oldest_age_sec": row["pending_oldest_age_sec"],
+        "wg_latest_handshake_age_sec": row["wg_latest_handshake_age_sec"],
+        "stop_mode": row["stop_mode"] or "timer",
+    }
 
-        queue = {
-            "events_total": row["events_total"],
-            "pending_batches": row["pending_batches"],
-            "sent_batches": row["sent_batches"],
-            "last_event_ts_received": row["last_event_ts_received"],
-            "pending_oldest_created_at": pending_oldest_created_at,
-            "pending_oldest_age_sec": pending_oldest_age_sec,
-            "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
-            "stop_mode": stop_mode,
-        }
+    alerts_raw = _build_heartbeat_age_alerts(age_sec) if live_age_alerts else []
+    alerts_raw.extend(item for item in _load_json_list(row["alerts_json"]) if isinstance(item, dict))
 
-        alerts_raw, _severity = _build_central_alerts(
-            age_sec=0,
-            time_sync=row["time_sync"],
-            services=services,
-            queue=queue,
-            doors=normalized_doors,
+    alerts_enriched: list[dict[str, Any]] = []
+    for alert in alerts_raw:
+        code = str(alert.get("code") or "alert")
+        state = states_map.get((central_id, code), {})
+        alerts_enriched.append(
+            {
+                "severity": str(alert.get("severity") or "bad"),
+                "code": code,
+                "message": str(alert.get("message") or ""),
+                "acked_at": state.get("acked_at"),
+                "acked_by": state.get("acked_by"),
+                "ack_note": state.get("ack_note"),
+                "silenced_until": state.get("silenced_until"),
+                "silenced_by": state.get("silenced_by"),
+                "silence_note": state.get("silence_note"),
+                "silenced": bool(state.get("silenced", False)),
+            }
         )
 
-        alerts_enriched: list[dict[str, Any]] = []
-        for alert in alerts_raw:
-            code = str(alert.get("code") or "alert")
-            state = states_map.get((central_id, code), {})
-            alerts_enriched.append(
-                {
-                    "severity": str(alert.get("severity") or "bad"),
-                    "code": code,
-                    "message": str(alert.get("message") or ""),
-                    "acked_at": state.get("acked_at"),
-                    "acked_by": state.get("acked_by"),
-                    "ack_note": state.get("ack_note"),
-                    "silenced_until": state.get("silenced_until"),
-                    "silenced_by": state.get("silenced_by"),
-                    "silence_note": state.get("silence_note"),
-                    "silenced": bool(state.get("silenced", False)),
-                }
-            )
-
-        active_alerts = [item for item in alerts_enriched if not item.get("silenced")]
-        severity = "good"
-        for alert in active_alerts:
-            severity = _merge_severity(severity, str(alert.get("severity") or "bad"))
-
-        warn_count = sum(1 for item in active_alerts if str(item.get("severity")) == "warn")
-        bad_count = sum(1 for item in active_alerts if str(item.get("severity")) == "bad")
-
-        result.append(
+    active_alerts = [item for item in alerts_enriched if not item.get("silenced")]
+    severity = "good"
+    for alert in active_alerts:
+        severity = _merge_severity(severity, str(alert.get("severity") or "bad"))
+    warn_count = sum(1 for item in active_alerts if str(item.get("severity")) == "warn")
+    bad_count = sum(1 for item in active_alerts if str(item.get("severity")) == "bad")
+
+    item: dict[str, Any] = {
+        "central_id": central_id,
+        "vehicle_id": row["vehicle_id"],
+        "schema_ver": row["schema_ver"],
+        "ts_sent": row["ts_sent"],
+        "ts_received": ts_received,
+        "age_sec": age_sec,
+        "time_sync": row["time_sync"],
+    }
+    if include_gps:
+        item["gps"] = (
             {
-                "central_id": central_id,
-                "vehicle_id": row["vehicle_id"],
-                "schema_ver": row["schema_ver"],
-                "ts_sent": row["ts_sent"],
-                "ts_received": ts_received,
-                "age_sec": age_sec,
-                "time_sync": row["time_sync"],
-                "services": services,
-                "queue": queue,
-                "doors": normalized_doors,
-                "alerts": alerts_enriched,
-                "health": {
-                    "severity": severity,
-                    "alerts_total": len(active_alerts),
-                    "alerts_all_total": len(alerts_enriched),
-                    "alerts_silenced": len(alerts_enriched) - len(active_alerts),
-                    "alerts_warn": warn_count,
-                    "alerts_bad": bad_count,
-                },
+                "fix": bool(row["gps_fix"]),
+                "lat": row["gps_lat"],
+                "lon": row["gps_lon"],
+                "updated_at": row["gps_updated_at"],
+                "age_sec": row["gps_age_sec"],
+                "source": row["gps_source"],
             }
+            if row["gps_fix"] is not None
+            else None
         )
-    return result
+    item.update(
+        {
+            "services": services,
+            "queue": queue,
+            "doors": _load_json_list(row["doors_json"]),
+            "alerts": alerts_enriched,
+            "health": {
+                "severity": severity,
+                "alerts_total": len(active_alerts),
+                "alerts_all_total": len(alerts_enriched),
+                "alerts_silenced": len(alerts_enriched) - len(active_alerts),
+                "alerts_warn": warn_count,
+                "alerts_bad": bad_count,
+            },
+        }
+    )
+    return item
 
 
-async def list_fleet_health_history_samples(
-    db_path: str,
-    *,
-    since_ts: str | None = None,
-    limit: int = 50_000,
-) -> list[dict[str, Any]]:
-    bounded_limit = max(1, min(int(limit), 200_000))
-    query = """
-        SELECT
-          central_id, ts_received, time_sync,
-          collector_state, uplink_state, flush_timer_state, wg_state,
-          events_total, pending_batches, sent_batches, last_event_ts_received,
-          doors_json, raw_json
-        FROM central_heartbeat_history
+def get_fleet_snapshot_max_age_sec() -> float:
+    raw = str(os.environ.get("FLEET_SNAPSHOT_MAX_AGE_SEC", "5")).strip()
+    try:
+        value = float(raw)
+    except Exception:
+        value = 5.0
+    return max(0.0, min(value, 60.0))
+
+
+class _FleetSnapshotCache:
+    def __init__(self) -> None:
+        self.generation = 0
+        self.snapshot: list[dict[str, Any]] | None = None
+        self.snapshot_generation = -1
+        self.built_at = 0.0
+        self.inflight: asyncio.Task[list[dict[str, Any]]] | None = None
+        self.inflight_generation = -1
+        self.hits = 0
+        self.builds = 0
+        self.shared = 0
+        self.build_ms_last = 0.0
+
+
+_fleet_snapshot_caches: dict[str, _FleetSnapshotCache] = {}
+
+
+def _fleet_snapshot_cache(db_path: str) -> _FleetSnapshotCache:
+    cache = _fleet_snapshot_caches.get(db_path)
+    if cache is None:
+        cache = _fleet_snapshot_caches[db_path] = _FleetSnapshotCache()
+    return cache
+
+
+def bump_fleet_generation(db_path: str) -> int:
+    # Called after every committed write that changes list_central_heartbeats() output
+    # (heartbeat ingest, alert ack/silence) or fleet policy, so the next reader rebuilds.
+    cache = _fleet_snapshot_cache(db_path)
+    cache.generation += 1
+    return cache.generation
+
+
+async def _build_fleet_snapshot(db_path: str, cache: _FleetSnapshotCache, generation: int) -> list[dict[str, Any]]:
+    started = time.monotonic()
+    snapshot = await list_central_heartbeats(db_path)
+    cache.builds += 1
+    cache.build_ms_last = round((time.monotonic() - started) * 1000.0, 3)
+    # Stamped with the generation read before the query: a write that lands mid-build
+    # leaves the generation ahead, so the next reader rebuilds instead of trusting it.
+    if generation >= cache.snapshot_generation:
+        cache.snapshot = snapshot
+        cache.snapshot_generation = generation
+        cache.built_at = started
+    return snapshot
+
+
+async def get_fleet_snapshot(db_path: str) -> list[dict[str, Any]]:
+    """Fleet-wide list_central_heartbeats() shared by all readers.
+
+    Rebuilt when the fleet generation moves or the snapshot is older than
+    FLEET_SNAPSHOT_MAX_AGE_SEC (age_sec and age-based alerts keep moving without
+    writes); concurrent readers of a stale snapshot await one build. The central
+    dicts are shared between callers and must be treated as read-only.
     """
-    where_parts: list[str] = []
-    params: list[Any] = []
-    if since_ts:
-        parsed = _parse_iso_utc(str(since_ts))
-        if parsed is not None:
-            where_parts.append("ts_received >= ?")
-            params.append(parsed.isoformat().replace("+00:00", "Z"))
-    if where_parts:
-        query += " WHERE " + " AND ".join(where_parts)
-    query += " ORDER BY ts_received ASC, central_id ASC LIMIT ?;"
-    params.append(bounded_limit)
+    cache = _fleet_snapshot_cache(db_path)
+    generation = cache.generation
+    if (
+        cache.snapshot is not None
+        and cache.snapshot_generation == generation
+        and time.monotonic() - cache.built_at < get_fleet_snapshot_max_age_sec()
+    ):
+        cache.hits += 1
+        return list(cache.snapshot)
+
+    task = cache.inflight
+    if task is not None and not task.done() and cache.inflight_generation == generation:
+        cache.shared += 1
+    else:
+        task = asyncio.ensure_future(_build_fleet_snapshot(db_path, cache, generation))
+        cache.inflight = task
+        cache.inflight_generation = generation
+    # shield: a reader that disconnects must not cancel the build other readers are waiting on.
+    return list(await asyncio.shield(task))
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+
+def fleet_snapshot_metrics(db_path: str) -> dict[str, Any]:
+    cache = _fleet_snapshot_cache(db_path)
+    return {
+        "generation": cache.generation,
+        "snapshot_generation": cache.snapshot_generation,
+        "snapshot_age_sec": round(time.monotonic() - cache.built_at, 3) if cache.snapshot is not None else None,
+        "max_age_sec": get_fleet_snapshot_max_age_sec(),
+        "hits": cache.hits,
+        "builds": cache.builds,
+        "shared": cache.shared,
+        "build_ms_last": cache.build_ms_last,
+    }
+
+
+async def list_central_heartbeats(db_path: str, *, central_id: str | None = None) -> list[dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    states_map = await _get_alert_states(db_path, central_id=central_id)
+    query = f"SELECT {_CENTRAL_SELECT_COLUMNS} FROM central_heartbeats"
+    params: list[Any] = []
+    if central_id:
+        query += " WHERE central_id = ?"
+        params.append(str(central_id))
+    query += " ORDER BY ts_received DESC;"
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
-    samples: list[dict[str, Any]] = []
-    for row in rows:
-        doors_raw = row["doors_json"] or "[]"
-        try:
-            doors = json.loads(doors_raw)
-            if not isinstance(doors, list):
-                doors = []
-        except Exception:
-            doors = []
-        normalized_doors = [_normalize_door_item(item) for item in doors]
-
-        services = {
-            "passengers-collector": row["collector_state"],
-            "passengers-central-uplink": row["uplink_state"],
-            "passengers-central-flush.timer": row["flush_timer_state"],
-            "wg-quick@wg0": row["wg_state"],
-        }
-        stop_mode = "timer"
-        pending_oldest_age_sec: int | None = None
-        pending_oldest_created_at: str | None = None
-        wg_latest_handshake_age_sec: int | None = None
-        try:
-            raw_payload = json.loads(row["raw_json"] or "{}")
-            if isinstance(raw_payload, dict):
-                raw_queue = raw_payload.get("queue")
-                if isinstance(raw_queue, dict):
-                    parsed_mode = str(raw_queue.get("stop_mode") or "").strip().lower()
-                    if parsed_mode:
-                        stop_mode = parsed_mode
-                    pending_oldest_created_at = raw_queue.get("pending_oldest_created_at")
-                    parsed_pending_age = _to_int(raw_queue.get("pending_oldest_age_sec"), -1)
-                    if parsed_pending_age >= 0:
-                        pending_oldest_age_sec = parsed_pending_age
-                    parsed_wg_age = _to_int(raw_queue.get("wg_latest_handshake_age_sec"), -1)
-                    if parsed_wg_age >= 0:
-                        wg_latest_handshake_age_sec = parsed_wg_age
-        except Exception:
-            pass
+    return [
+        _central_row_to_dict(row, now=now, states_map=states_map, live_age_alerts=True, include_gps=True)
+        for row in rows
+    ]
 
-        queue = {
-            "events_total": row["events_total"],
-            "pending_batches": row["pending_batches"],
-            "sent_batches": row["sent_batches"],
-            "last_event_ts_received": row["last_event_ts_received"],
-            "pending_oldest_created_at": pending_oldest_created_at,
-            "pending_oldest_age_sec": pending_oldest_age_sec,
-            "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
-            "stop_mode": stop_mode,
-        }
-        alerts, severity = _build_central_alerts(
-            age_sec=0,
-            time_sync=row["time_sync"],
-            services=services,
-            queue=queue,
-            doors=normalized_doors,
-        )
-        warn_count = sum(1 for item in alerts if str(item.get("severity") or "") == "warn")
-        bad_count = sum(1 for item in alerts if str(item.get("severity") or "") == "bad")
-        samples.append(
-            {
-                "central_id": str(row["central_id"]),
-                "ts_received": row["ts_received"],
-                "severity": severity,
-                "alerts_total": len(alerts),
-                "alerts_warn": warn_count,
-                "alerts_bad": bad_count,
-                "pending_batches": _to_int(row["pending_batches"], 0),
-                "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec,
-            }
-        )
-    return samples
+
+async def get_central_heartbeat_history(db_path: str, central_id: str, *, limit: int = 120) -> list[dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    states_map = await _get_alert_states(db_path, central_id=central_id)
+    bounded_limit = max(1, min(int(limit), 1000))
+
+    async with db_reader(db_path) as db:
+        async with db.execute(
+            f"""
+            SELECT {_CENTRAL_SELECT_COLUMNS}
+            FROM central_heartbeat_history
+            WHERE central_id = ?
+            ORDER BY ts_received DESC
+            LIMIT ?;
+            """,
+            (central_id, bounded_limit),
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [
+        _central_row_to_dict(row, now=now, states_map=states_map, live_age_alerts=False, include_gps=False)
+        for row in rows
+    ]
 
 
 async def sync_incidents(
     db_path: str,
     *,
     centrals: list[dict[str, Any]] | None = None,
+    central_id: str | None = None,
 ) -> dict[str, Any]:
+    # central_id scopes the sync to one central (heartbeat ingest path); without it the
+    # whole fleet is reconciled, which is what the periodic sweep relies on for staleness.
+    scope_central_id = str(central_id or "").strip() or None
     if centrals is None:
-        centrals = await list_central_heartbeats(db_path)
+        centrals = await list_central_heartbeats(db_path, central_id=scope_central_id)
+    if scope_central_id:
+        centrals = [item for item in centrals if str(item.get("central_id") or "") == scope_central_id]
 
     now_iso = utc_now_iso()
     aggregated: dict[tuple[str, str], dict[str, Any]] = {}
@@ -1343,15 +1746,21 @@ async def sync_incidents(
     updated = 0
     resolved = 0
     notify_events: list[dict[str, Any]] = []
+    # Status/severity transitions only (re-seen incidents with the same state are not changes);
+    # the admin fleet stream publishes these as deltas.
+    changes: list[dict[str, Any]] = []
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT central_id, code, status, severity, first_seen_ts, occurrences
-            FROM incidents;
-            """
-        ) as cursor:
+    existing_query = """
+        SELECT central_id, code, status, severity, first_seen_ts, occurrences
+        FROM incidents
+    """
+    existing_params: list[Any] = []
+    if scope_central_id:
+        existing_query += " WHERE central_id = ?"
+        existing_params.append(scope_central_id)
+
+    async with db_writer(db_path) as db:
+        async with db.execute(existing_query, tuple(existing_params)) as cursor:
             existing_rows = await cursor.fetchall()
 
         existing_map: dict[tuple[str, str], aiosqlite.Row] = {}
@@ -1439,6 +1848,19 @@ async def sync_incidents(
                 )
                 inserted += 1
 
+            if prev_status != status or prev_severity != severity:
+                changes.append(
+                    {
+                        "central_id": central_id,
+                        "code": code,
+                        "vehicle_id": vehicle_id,
+                        "status": status,
+                        "prev_status": prev_status,
+                        "severity": severity,
+                        "prev_severity": prev_severity,
+                    }
+                )
+
             candidate = _incident_notify_candidate(severity=severity, code=code)
             opened = previous is None or not _incident_is_active_status(prev_status)
             escalated_to_bad = (
@@ -1481,17 +1903,30 @@ async def sync_incidents(
                 (now_iso, now_iso, key[0], key[1]),
             )
             resolved += 1
+            changes.append(
+                {
+                    "central_id": key[0],
+                    "code": key[1],
+                    "vehicle_id": None,
+                    "status": "resolved",
+                    "prev_status": prev_status,
+                    "severity": str(previous["severity"] or ""),
+                    "prev_severity": str(previous["severity"] or ""),
+                }
+            )
 
         await db.commit()
 
     return {
         "status": "ok",
         "ts_synced": now_iso,
+        "scope": scope_central_id or "fleet",
         "active_total": len(aggregated),
         "inserted": inserted,
         "updated": updated,
         "resolved": resolved,
         "notify": notify_events,
+        "changes": changes,
     }
 
 
@@ -1563,8 +1998,7 @@ async def list_incidents(
     """
     params.append(bounded_limit)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
@@ -1629,8 +2063,7 @@ async def get_incident_by_key(db_path: str, *, central_id: str, code: str) -> di
 
 
 async def get_notification_settings(db_path: str) -> dict[str, str]:
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(
             """
             SELECT key, value
@@ -1671,7 +2104,7 @@ async def update_notification_settings(
         "fleet_health_auto_window",
     }
     ts = utc_now_iso()
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         for key, value in updates.items():
             if key not in allowed:
                 continue
@@ -1686,6 +2119,7 @@ async def update_notification_settings(
                 (key, str(value), ts),
             )
         await db.commit()
+        bump_fleet_generation(db_path)
     return await get_notification_settings(db_path)
 
 
@@ -1716,8 +2150,7 @@ async def get_client_profile(db_path: str, *, client_id: str) -> dict[str, Any]:
     if not normalized_client_id:
         return _default_client_profile()
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(
             """
             SELECT full_name, company, email, phone, locale, updated_at
@@ -1767,7 +2200,7 @@ async def upsert_client_profile(
             merged[key] = value[:255]
 
     ts = utc_now_iso()
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO client_profiles(
@@ -1801,8 +2234,7 @@ async def get_client_notification_settings(db_path: str, *, client_id: str) -> d
     if not normalized_client_id:
         return _default_client_notification_settings()
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(
             """
             SELECT notify_email, notify_sms, notify_push, notify_level, digest_window, updated_at
@@ -1855,7 +2287,7 @@ async def upsert_client_notification_settings(
         merged["digest_window"] = digest if digest in {"off", "1h", "24h"} else "24h"
 
     ts = utc_now_iso()
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO client_notification_settings(
@@ -1910,8 +2342,7 @@ async def list_monitor_policy_overrides(
     query += " ORDER BY central_id ASC LIMIT ?"
     params.append(bounded_limit)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
@@ -1961,7 +2392,7 @@ async def upsert_monitor_policy_override(
             merged[key] = values[key]
 
     ts = utc_now_iso()
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO monitor_policy_overrides(
@@ -1995,6 +2426,7 @@ async def upsert_monitor_policy_override(
             ),
         )
         await db.commit()
+        bump_fleet_generation(db_path)
 
     row = await get_monitor_policy_override(db_path, central_id=central_id)
     if row is None:
@@ -2003,12 +2435,13 @@ async def upsert_monitor_policy_override(
 
 
 async def delete_monitor_policy_override(db_path: str, *, central_id: str) -> bool:
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         cursor = await db.execute(
             "DELETE FROM monitor_policy_overrides WHERE central_id = ?;",
             (str(central_id),),
         )
         await db.commit()
+        bump_fleet_generation(db_path)
         return int(cursor.rowcount or 0) > 0
 
 
@@ -2038,8 +2471,7 @@ async def get_incident_last_notification_state(
     if where_parts:
         query += " WHERE " + " AND ".join(where_parts)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
@@ -2052,6 +2484,34 @@ async def get_incident_last_notification_state(
             "status": row["status"],
             "channel": row["channel"],
         }
+
+    # Not yet delivered notifications count as the latest one, otherwise rate limit and escalation
+    # would enqueue the same incident again while the delivery worker is still retrying it.
+    outbox_query = """
+        SELECT o.central_id, o.code, o.created_at, o.event, o.channel
+        FROM notification_outbox o
+        JOIN (
+          SELECT central_id, code, MAX(id) AS max_id
+          FROM notification_outbox
+          GROUP BY central_id, code
+        ) latest ON latest.max_id = o.id
+    """
+    if where_parts:
+        outbox_query += " WHERE " + " AND ".join(part.replace("n.", "o.") for part in where_parts)
+    async with db_reader(db_path) as db:
+        async with db.execute(outbox_query, tuple(params)) as cursor:
+            outbox_rows = await cursor.fetchall()
+    for row in outbox_rows:
+        key = (str(row["central_id"]), str(row["code"]))
+        logged = result.get(key)
+        if logged and str(logged.get("ts") or "") > str(row["created_at"] or ""):
+            continue
+        result[key] = {
+            "ts": row["created_at"],
+            "event": row["event"],
+            "status": "queued",
+            "channel": row["channel"],
+        }
     return result
 
 
@@ -2067,31 +2527,190 @@ async def record_incident_notification(
     status: str,
     message: str | None,
     error: str | None,
+) -> None:
+    async with db_writer(db_path) as db:
+        await _insert_incident_notification(
+            db,
+            central_id=central_id,
+            code=code,
+            severity=severity,
+            event=event,
+            channel=channel,
+            destination=destination,
+            status=status,
+            message=message,
+            error=error,
+        )
+        await db.commit()
+
+
+async def _insert_incident_notification(
+    db: aiosqlite.Connection,
+    *,
+    central_id: str,
+    code: str,
+    severity: str,
+    event: str,
+    channel: str,
+    destination: str | None,
+    status: str,
+    message: str | None,
+    error: str | None,
 ) -> None:
     ts = utc_now_iso()
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
+    await db.execute(
+        """
+        INSERT INTO incident_notifications(
+          ts, central_id, code, severity, event, channel, destination, status, message, error
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        (
+            ts,
+            str(central_id),
+            str(code),
+            str(severity or "bad"),
+            str(event or "opened"),
+            str(channel or "unknown"),
+            destination,
+            str(status or "unknown"),
+            message,
+            error,
+        ),
+    )
+    rollup_column = _ROLLUP_NOTIFICATION_COLUMNS.get(str(status or "").strip().lower())
+    if rollup_column:
+        await _bump_event_rollups(db, ts=ts, column=rollup_column)
+
+
+async def enqueue_notification_outbox(db_path: str, items: list[dict[str, Any]]) -> int:
+    if not items:
+        return 0
+    now = utc_now_iso()
+    rows = [
+        (
+            now,
+            str(item.get("channel") or "unknown"),
+            str(item.get("central_id") or ""),
+            str(item.get("code") or ""),
+            str(item.get("severity") or "bad"),
+            str(item.get("event") or "opened"),
+            str(item.get("subject") or ""),
+            str(item.get("body") or ""),
+            now,
+        )
+        for item in items
+    ]
+    async with db_writer(db_path) as db:
+        await db.executemany(
+            """
+            INSERT INTO notification_outbox(
+              created_at, channel, central_id, code, severity, event, subject, body, next_attempt_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+            rows,
+        )
+        await db.commit()
+    return len(rows)
+
+
+async def list_due_notification_outbox(db_path: str, *, limit: int = 200) -> list[dict[str, Any]]:
+    async with db_reader(db_path) as db:
+        async with db.execute(
             """
-            INSERT INTO incident_notifications(
-              ts, central_id, code, severity, event, channel, destination, status, message, error
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            SELECT id, created_at, channel, central_id, code, severity, event, subject, body, attempts, last_error
+            FROM notification_outbox
+            WHERE next_attempt_at <= ?
+            ORDER BY id ASC
+            LIMIT ?;
             """,
-            (
-                ts,
-                str(central_id),
-                str(code),
-                str(severity or "bad"),
-                str(event or "opened"),
-                str(channel or "unknown"),
-                destination,
-                str(status or "unknown"),
-                message,
-                error,
-            ),
+            (utc_now_iso(), max(1, int(limit))),
+        ) as cursor:
+            rows = await cursor.fetchall()
+    return [{key: row[key] for key in row.keys()} for row in rows]
+
+
+async def finish_notification_outbox(db_path: str, results: list[dict[str, Any]]) -> None:
+    # Final outcome per outbox row: one log row in incident_notifications, outbox row removed,
+    # both in the same transaction so a restart never re-sends a logged notification.
+    if not results:
+        return
+    async with db_writer(db_path) as db:
+        for item in results:
+            await _insert_incident_notification(
+                db,
+                central_id=str(item.get("central_id") or ""),
+                code=str(item.get("code") or ""),
+                severity=str(item.get("severity") or "bad"),
+                event=str(item.get("event") or "opened"),
+                channel=str(item.get("channel") or "unknown"),
+                destination=item.get("destination"),
+                status=str(item.get("status") or "unknown"),
+                message=item.get("message"),
+                error=item.get("error"),
+            )
+        await db.executemany(
+            "DELETE FROM notification_outbox WHERE id = ?;",
+            [(int(item["id"]),) for item in results],
+        )
+        await db.commit()
+
+
+async def reschedule_notification_outbox(
+    db_path: str,
+    *,
+    ids: list[int],
+    next_attempt_at: str,
+    error: str | None,
+) -> None:
+    if not ids:
+        return
+    async with db_writer(db_path) as db:
+        await db.executemany(
+            """
+            UPDATE notification_outbox
+            SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?;
+            """,
+            [(next_attempt_at, error, int(item_id)) for item_id in ids],
         )
         await db.commit()
 
 
+async def notification_outbox_stats(db_path: str) -> dict[str, Any]:
+    async with db_reader(db_path) as db:
+        async with db.execute(
+            """
+            SELECT
+              channel,
+              COUNT(*) AS pending,
+              SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END) AS retrying,
+              MIN(created_at) AS oldest_created_at
+            FROM notification_outbox
+            GROUP BY channel;
+            """
+        ) as cursor:
+            rows = await cursor.fetchall()
+    now_dt = datetime.now(timezone.utc)
+    channels: dict[str, dict[str, Any]] = {}
+    oldest: str | None = None
+    for row in rows:
+        channels[str(row["channel"])] = {
+            "pending": _to_int(row["pending"]),
+            "retrying": _to_int(row["retrying"]),
+            "oldest_created_at": row["oldest_created_at"],
+        }
+        if row["oldest_created_at"] and (oldest is None or str(row["oldest_created_at"]) < oldest):
+            oldest = str(row["oldest_created_at"])
+    oldest_dt = _parse_iso_utc(oldest)
+    return {
+        "pending": sum(item["pending"] for item in channels.values()),
+        "retrying": sum(item["retrying"] for item in channels.values()),
+        "oldest_created_at": oldest,
+        "oldest_age_sec": max(0, int((now_dt - oldest_dt).total_seconds())) if oldest_dt else None,
+        "channels": channels,
+    }
+
+
 async def list_incident_notifications(
     db_path: str,
     *,
@@ -2145,8 +2764,7 @@ async def list_incident_notifications(
     query += " ORDER BY id DESC LIMIT ?"
     params.append(bounded_limit)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
@@ -2171,8 +2789,7 @@ async def list_incident_notifications(
 
 
 async def get_incident_notification_by_id(db_path: str, *, notification_id: int) -> dict[str, Any] | None:
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(
             """
             SELECT
@@ -2201,6 +2818,62 @@ async def get_incident_notification_by_id(db_path: str, *, notification_id: int)
     }
 
 
+def get_admin_audit_flush_interval_sec() -> float:
+    raw = str(os.environ.get("ADMIN_AUDIT_FLUSH_INTERVAL_MS", "500")).strip()
+    try:
+        value = float(raw)
+    except Exception:
+        value = 500.0
+    return max(0.0, min(value, 10000.0)) / 1000.0
+
+
+def get_admin_audit_batch_max() -> int:
+    raw = str(os.environ.get("ADMIN_AUDIT_BATCH_MAX", "200")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 200
+    return max(1, min(value, 5000))
+
+
+_ADMIN_AUDIT_BUFFER_MAX = 20000
+_ADMIN_AUDIT_COLUMNS = (
+    "id", "ts", "actor", "role", "action", "method", "path", "status", "status_code", "client_ip", "details_json"
+)
+
+
+class _AdminAuditBuffer:
+    def __init__(self) -> None:
+        self.pending: list[tuple[Any, ...]] = []
+        self.inflight: list[tuple[Any, ...]] = []
+        # Held across a flush commit and across list_admin_audit's read + buffer merge, so an
+        # entry is never missed or listed twice while it moves from the buffer to the table.
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.full = asyncio.Event()
+        self.recorded = 0
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: str | None = None
+        self.flush_ms_last = 0.0
+        self.flush_ms_max = 0.0
+        # Entries are (placeholder_id, *row): a negative id that list_admin_audit() reports until the
+        # row is flushed and gets its real id. Never reused within the process, newer is more negative.
+        self.placeholder_seq = 0
+
+
+_admin_audit_buffers: dict[str, _AdminAuditBuffer] = {}
+
+
+def _admin_audit_buffer(db_path: str) -> _AdminAuditBuffer:
+    buffer = _admin_audit_buffers.get(db_path)
+    if buffer is None:
+        buffer = _admin_audit_buffers[db_path] = _AdminAuditBuffer()
+    return buffer
+
+
 async def record_admin_audit(
     db_path: str,
     *,
@@ -2214,31 +2887,154 @@ async def record_admin_audit(
     client_ip: str | None,
     details: dict[str, Any] | None,
 ) -> None:
-    ts = utc_now_iso()
+    # Only buffers the row; run_admin_audit_flusher() inserts it within ADMIN_AUDIT_FLUSH_INTERVAL_MS.
     payload = None
     if details:
         payload = json.dumps(details, ensure_ascii=False, separators=(",", ":"))
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            """
-            INSERT INTO admin_audit_log(
-              ts, actor, role, action, method, path, status, status_code, client_ip, details_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (
-                ts,
-                (actor or "").strip() or None,
-                str(role or "viewer"),
-                str(action or "unknown"),
-                str(method or "GET"),
-                str(path or ""),
-                str(status or "ok"),
-                int(status_code),
-                (client_ip or "").strip() or None,
-                payload,
-            ),
+    buffer = _admin_audit_buffer(db_path)
+    buffer.placeholder_seq += 1
+    buffer.pending.append(
+        (
+            -buffer.placeholder_seq,
+            utc_now_iso(),
+            (actor or "").strip() or None,
+            str(role or "viewer"),
+            str(action or "unknown"),
+            str(method or "GET"),
+            str(path or ""),
+            str(status or "ok"),
+            int(status_code),
+            (client_ip or "").strip() or None,
+            payload,
         )
-        await db.commit()
+    )
+    buffer.recorded += 1
+    if len(buffer.pending) > _ADMIN_AUDIT_BUFFER_MAX:
+        # Writer unavailable for a long time: keep the newest entries.
+        overflow = len(buffer.pending) - _ADMIN_AUDIT_BUFFER_MAX
+        del buffer.pending[:overflow]
+        buffer.dropped += overflow
+    buffer.wakeup.set()
+    if len(buffer.pending) >= get_admin_audit_batch_max():
+        buffer.full.set()
+
+
+async def flush_admin_audit(db_path: str) -> int:
+    buffer = _admin_audit_buffer(db_path)
+    async with buffer.lock:
+        if not buffer.pending:
+            return 0
+        batch, buffer.pending = buffer.pending, []
+        buffer.inflight = batch
+        started = time.monotonic()
+        try:
+            async with db_writer(db_path) as db:
+                await db.executemany(
+                    """
+                    INSERT INTO admin_audit_log(
+                      ts, actor, role, action, method, path, status, status_code, client_ip, details_json
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+                    """,
+                    [item[1:] for item in batch],
+                )
+                await db.commit()
+        except Exception as exc:
+            # Back in front of anything recorded meanwhile; the next flush retries the whole batch.
+            buffer.pending = batch + buffer.pending
+            buffer.errors += 1
+            buffer.last_error = str(exc)[:300]
+            raise
+        finally:
+            buffer.inflight = []
+        buffer.flushed += len(batch)
+        buffer.batches += 1
+        buffer.flush_ms_last = round((time.monotonic() - started) * 1000.0, 3)
+        buffer.flush_ms_max = max(buffer.flush_ms_max, buffer.flush_ms_last)
+        return len(batch)
+
+
+async def run_admin_audit_flusher(db_path: str) -> None:
+    """Background owner of admin_audit_log inserts.
+
+    Sleeps until something is recorded, then gives the burst ADMIN_AUDIT_FLUSH_INTERVAL_MS (or
+    until ADMIN_AUDIT_BATCH_MAX rows are buffered) and inserts it in one transaction, so a
+    scripted run of admin calls costs one write instead of one per request.
+    """
+    buffer = _admin_audit_buffer(db_path)
+    while True:
+        await buffer.wakeup.wait()
+        try:
+            await asyncio.wait_for(buffer.full.wait(), timeout=get_admin_audit_flush_interval_sec())
+        except asyncio.TimeoutError:
+            pass
+        buffer.wakeup.clear()
+        buffer.full.clear()
+        try:
+            # shield: cancelling the flusher at shutdown must not abandon a batch mid-commit;
+            # the shutdown flush waits for it on buffer.lock.
+            await asyncio.shield(flush_admin_audit(db_path))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            buffer.wakeup.set()
+            await asyncio.sleep(1.0)
+
+
+def admin_audit_metrics(db_path: str) -> dict[str, Any]:
+    buffer = _admin_audit_buffer(db_path)
+    return {
+        "buffered": len(buffer.pending) + len(buffer.inflight),
+        "flush_interval_ms": round(get_admin_audit_flush_interval_sec() * 1000.0, 3),
+        "batch_max": get_admin_audit_batch_max(),
+        "recorded": buffer.recorded,
+        "flushed": buffer.flushed,
+        "batches": buffer.batches,
+        "dropped": buffer.dropped,
+        "errors": buffer.errors,
+        "last_error": buffer.last_error,
+        "flush_ms_last": buffer.flush_ms_last,
+        "flush_ms_max": buffer.flush_ms_max,
+    }
+
+
+def _buffered_audit_matches(
+    row: tuple[Any, ...],
+    *,
+    actor: str | None,
+    role: str | None,
+    action: str | None,
+    path: str | None,
+    status: str | None,
+    since_ts: str | None,
+    q: str | None,
+) -> bool:
+    # Python mirror of the WHERE clause list_admin_audit() builds for the table.
+    _, ts, row_actor, row_role, row_action, _, row_path, row_status, _, _, details_json = row
+    if actor and row_actor != str(actor):
+        return False
+    if role:
+        normalized_role = str(role).strip().lower()
+        if normalized_role in {"viewer", "operator", "admin"} and row_role != normalized_role:
+            return False
+    if action and row_action != str(action):
+        return False
+    if path and row_path != str(path):
+        return False
+    if status:
+        normalized_status = str(status).strip().lower()
+        if normalized_status in {"ok", "forbidden", "error"} and row_status != normalized_status:
+            return False
+    if since_ts:
+        parsed = _parse_iso_utc(str(since_ts))
+        if parsed is not None and str(ts) < parsed.isoformat().replace("+00:00", "Z"):
+            return False
+    if q:
+        query_text = str(q).strip().lower()
+        if query_text:
+            haystacks = (row_actor, row_action, row_path, row_status, details_json)
+            if not any(query_text in str(value or "").lower() for value in haystacks):
+                return False
+    return True
 
 
 async def list_admin_audit(
@@ -2298,13 +3094,22 @@ async def list_admin_audit(
     query += " ORDER BY id DESC LIMIT ?"
     params.append(bounded_limit)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(query, tuple(params)) as cursor:
-            rows = await cursor.fetchall()
+    buffer = _admin_audit_buffer(db_path)
+    async with buffer.lock:
+        async with db_reader(db_path) as db:
+            async with db.execute(query, tuple(params)) as cursor:
+                rows = await cursor.fetchall()
+        # Not yet flushed entries are newer than every stored row and carry their negative placeholder id.
+        buffered = [
+            dict(zip(_ADMIN_AUDIT_COLUMNS, item))
+            for item in reversed(buffer.inflight + buffer.pending)
+            if _buffered_audit_matches(
+                item, actor=actor, role=role, action=action, path=path, status=status, since_ts=since_ts, q=q
+            )
+        ]
 
     result: list[dict[str, Any]] = []
-    for row in rows:
+    for row in [*buffered, *rows][:bounded_limit]:
         details: dict[str, Any] | None = None
         raw_details = row["details_json"]
         if raw_details:
@@ -2327,6 +3132,7 @@ async def list_admin_audit(
                 "status_code": row["status_code"],
                 "client_ip": row["client_ip"],
                 "details": details,
+                "buffered": int(row["id"]) < 0,
             }
         )
     return result
@@ -2343,7 +3149,7 @@ async def set_alert_ack(
     ts = utc_now_iso()
     actor_val = (actor or "").strip() or None
     note_val = (note or "").strip() or None
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO alert_states(
@@ -2365,7 +3171,9 @@ async def set_alert_ack(
             """,
             (ts, central_id, code, actor_val, note_val),
         )
+        await _bump_event_rollups(db, ts=ts, column="alert_actions")
         await db.commit()
+        bump_fleet_generation(db_path)
     return await get_alert_state(db_path, central_id=central_id, code=code)
 
 
@@ -2383,7 +3191,7 @@ async def set_alert_silence(
     ts = now_dt.isoformat().replace("+00:00", "Z")
     actor_val = (actor or "").strip() or None
     note_val = (note or "").strip() or None
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO alert_states(
@@ -2405,7 +3213,9 @@ async def set_alert_silence(
             """,
             (ts, central_id, code, actor_val, note_val, until),
         )
+        await _bump_event_rollups(db, ts=ts, column="alert_actions")
         await db.commit()
+        bump_fleet_generation(db_path)
     return await get_alert_state(db_path, central_id=central_id, code=code)
 
 
@@ -2420,7 +3230,7 @@ async def clear_alert_silence(
     ts = utc_now_iso()
     actor_val = (actor or "").strip() or None
     note_val = (note or "").strip() or None
-    async with aiosqlite.connect(db_path) as db:
+    async with db_writer(db_path) as db:
         await db.execute(
             """
             INSERT INTO alert_states(
@@ -2442,14 +3252,15 @@ async def clear_alert_silence(
             """,
             (ts, central_id, code, actor_val, note_val),
         )
+        await _bump_event_rollups(db, ts=ts, column="alert_actions")
         await db.commit()
+        bump_fleet_generation(db_path)
     return await get_alert_state(db_path, central_id=central_id, code=code)
 
 
 async def get_alert_state(db_path: str, *, central_id: str, code: str) -> dict[str, Any]:
     now_dt = datetime.now(timezone.utc)
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(
             """
             SELECT
@@ -2527,8 +3338,7 @@ async def list_alert_actions(
     query += " ORDER BY id DESC LIMIT ?"
     params.append(bounded_limit)
 
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_reader(db_path) as db:
         async with db.execute(query, tuple(params)) as cursor:
             rows = await cursor.fetchall()
 
@@ -2547,3 +3357,309 @@ async def list_alert_actions(
             }
         )
     return result
+
+
+def fleet_metrics_rollup_bucket(bucket_sec: int) -> int:
+    # Coarsest maintained rollup that tiles the requested bucket exactly.
+    for rollup_sec in sorted(FLEET_METRICS_ROLLUP_BUCKETS, reverse=True):
+        if bucket_sec % rollup_sec == 0:
+            return rollup_sec
+    return 0
+
+
+async def list_fleet_metrics_rollup(
+    db_path: str,
+    *,
+    bucket_sec: int,
+    since_ts: str,
+) -> list[dict[str, Any]]:
+    rollup_sec = fleet_metrics_rollup_bucket(int(bucket_sec))
+    since_epoch = _epoch_from_iso(since_ts)
+    if rollup_sec <= 0 or since_epoch is None:
+        raise ValueError("unsupported_rollup_bucket")
+    # The first target bucket usually starts before since_ts. Full buckets come from the coarse
+    # rollup; the partial head bucket is rebuilt from the finest rollup still kept for the
+    # window, starting at the first rollup row that begins at or after since_ts, so samples from
+    # before the window never leak into the first point.
+    first_target = (since_epoch // bucket_sec) * bucket_sec
+    ranges: list[tuple[int, int, int]] = []
+    if first_target < since_epoch:
+        head_candidates = [
+            value
+            for value in FLEET_METRICS_ROLLUP_BUCKETS
+            if bucket_sec % value == 0 and value >= HISTORY_DOWNSAMPLE_SEC
+        ]
+        head_sec = min(head_candidates) if head_candidates else rollup_sec
+        head_start = -(-since_epoch // head_sec) * head_sec
+        full_start = first_target + bucket_sec
+        if head_start < full_start:
+            ranges.append((head_sec, head_start, full_start))
+    else:
+        full_start = first_target
+    ranges.append((rollup_sec, full_start, 2**62))
+
+    central_rows: list[aiosqlite.Row] = []
+    event_rows: list[aiosqlite.Row] = []
+    async with db_reader(db_path) as db:
+        for range_sec, min_start, max_start in ranges:
+            async with db.execute(
+                """
+                SELECT
+                  target AS bucket_start,
+                  COUNT(*) AS centrals,
+                  SUM(severity = 'good') AS good,
+                  SUM(severity = 'warn') AS warn,
+                  SUM(severity NOT IN ('good', 'warn')) AS bad,
+                  SUM(alerts_total) AS alerts_total,
+                  SUM(pending_batches) AS pending_batches_total,
+                  SUM(wg_stale) AS wg_stale
+                FROM (
+                  SELECT
+                    (bucket_start / ?) * ? AS target,
+                    severity, alerts_total, pending_batches, wg_stale,
+                    ROW_NUMBER() OVER (
+                      PARTITION BY bucket_start / ?, central_id
+                      ORDER BY ts_received DESC
+                    ) AS rn
+                  FROM fleet_metrics_rollup_centrals
+                  WHERE bucket_sec = ? AND bucket_start >= ? AND bucket_start < ?
+                )
+                WHERE rn = 1
+                GROUP BY target;
+                """,
+                (bucket_sec, bucket_sec, bucket_sec, range_sec, min_start, max_start),
+            ) as cursor:
+                central_rows.extend(await cursor.fetchall())
+            async with db.execute(
+                """
+                SELECT
+                  (bucket_start / ?) * ? AS target,
+                  SUM(notifications_sent) AS notifications_sent,
+                  SUM(notifications_failed) AS notifications_failed,
+                  SUM(notifications_skipped) AS notifications_skipped,
+                  SUM(alert_actions) AS alert_actions
+                FROM fleet_metrics_rollup_events
+                WHERE bucket_sec = ? AND bucket_start >= ? AND bucket_start < ?
+                GROUP BY target;
+                """,
+                (bucket_sec, bucket_sec, range_sec, min_start, max_start),
+            ) as cursor:
+                event_rows.extend(await cursor.fetchall())
+
+    buckets: dict[int, dict[str, Any]] = {}
+
+    def bucket_for(start: int) -> dict[str, Any]:
+        if start not in buckets:
+            buckets[start] = {
+                "ts_bucket": datetime.fromtimestamp(start, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+                "centrals": 0,
+                "good": 0,
+                "warn": 0,
+                "bad": 0,
+                "alerts_total": 0,
+                "pending_batches_total": 0,
+                "wg_stale": 0,
+                "notifications_sent": 0,
+                "notifications_failed": 0,
+                "notifications_skipped": 0,
+                "alert_actions": 0,
+            }
+        return buckets[start]
+
+    for row in central_rows:
+        item = bucket_for(int(row["bucket_start"]))
+        for key in ("centrals", "good", "warn", "bad", "alerts_total", "pending_batches_total", "wg_stale"):
+            item[key] = _to_int(row[key], 0)
+    for row in event_rows:
+        item = bucket_for(int(row["target"]))
+        for key in ("notifications_sent", "notifications_failed", "notifications_skipped", "alert_actions"):
+            item[key] = _to_int(row[key], 0)
+
+    return [buckets[start] for start in sorted(buckets)]
+
+
+HISTORY_DOWNSAMPLE_SEC = 300
+_HISTORY_SEVERITY_RANK = {"good": 0, "warn": 1}
+_HISTORY_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _history_bound_iso(epoch: int) -> str:
+    # Fixed-width fraction so bounds compare correctly against utc_now_iso() strings.
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+
+def _history_downsample_key(row: aiosqlite.Row) -> tuple[int | None, str]:
+    epoch = _epoch_from_iso(row["ts_received"])
+    if epoch is None:
+        # Unparseable timestamps are never merged with anything.
+        return None, f"{row['central_id']}#{row['id']}"
+    return (epoch // HISTORY_DOWNSAMPLE_SEC) * HISTORY_DOWNSAMPLE_SEC, str(row["central_id"])
+
+
+def _history_keep_rank(row: aiosqlite.Row) -> tuple[int, str, int]:
+    severity = str(row["health_severity"] or "good")
+    return _HISTORY_SEVERITY_RANK.get(severity, 2), str(row["ts_received"]), int(row["id"])
+
+
+async def _downsample_history_batch(
+    db: aiosqlite.Connection,
+    *,
+    raw_cutoff: str,
+    batch_size: int,
+) -> tuple[int, int] | None:
+    async with db.execute(
+        """
+        SELECT id, central_id, ts_received, health_severity
+        FROM central_heartbeat_history
+        WHERE downsampled = 0 AND ts_received < ?
+        ORDER BY ts_received, id
+        LIMIT ?;
+        """,
+        (raw_cutoff, batch_size),
+    ) as cursor:
+        rows = list(await cursor.fetchall())
+    if not rows:
+        return None
+
+    if len(rows) >= batch_size:
+        # The last 5-minute bucket may continue past the LIMIT; leave it for the next batch,
+        # unless it is the only bucket, in which case take it whole.
+        last_bucket = _history_downsample_key(rows[-1])[0]
+        if last_bucket is not None and _history_downsample_key(rows[0])[0] != last_bucket:
+            rows = [row for row in rows if _history_downsample_key(row)[0] != last_bucket]
+        elif last_bucket is not None:
+            async with db.execute(
+                """
+                SELECT id, central_id, ts_received, health_severity
+                FROM central_heartbeat_history
+                WHERE downsampled = 0 AND ts_received >= ? AND ts_received < ?;
+                """,
+                (
+                    _history_bound_iso(last_bucket),
+                    min(raw_cutoff, _history_bound_iso(last_bucket + HISTORY_DOWNSAMPLE_SEC)),
+                ),
+            ) as cursor:
+                rows = list(await cursor.fetchall())
+
+    groups: dict[tuple[int | None, str], list[aiosqlite.Row]] = {}
+    for row in rows:
+        groups.setdefault(_history_downsample_key(row), []).append(row)
+
+    keep_ids: list[tuple[int]] = []
+    drop_ids: list[tuple[int]] = []
+    for group_rows in groups.values():
+        keeper = max(group_rows, key=_history_keep_rank)
+        keep_ids.append((int(keeper["id"]),))
+        drop_ids.extend((int(row["id"]),) for row in group_rows if row is not keeper)
+
+    await db.executemany("DELETE FROM central_heartbeat_history WHERE id = ?;", drop_ids)
+    # Readers only use the materialized columns, so the kept row drops its raw payload.
+    await db.executemany(
+        "UPDATE central_heartbeat_history SET downsampled = 1, raw_json = '{}' WHERE id = ?;",
+        keep_ids,
+    )
+    await db.commit()
+    return len(drop_ids), len(keep_ids)
+
+
+async def prune_central_heartbeat_history(
+    db_path: str,
+    *,
+    raw_retention_days: int,
+    downsample_retention_days: int,
+    batch_size: int = 500,
+    vacuum_pages: int = 2000,
+) -> dict[str, Any]:
+    started = datetime.now(timezone.utc)
+    now_epoch = int(started.timestamp())
+    raw_days = max(1, int(raw_retention_days))
+    keep_days = max(raw_days, int(downsample_retention_days))
+    batch = max(1, int(batch_size))
+    raw_cutoff_epoch = ((now_epoch - raw_days * 86400) // HISTORY_DOWNSAMPLE_SEC) * HISTORY_DOWNSAMPLE_SEC
+    expire_cutoff_epoch = now_epoch - keep_days * 86400
+    raw_cutoff = _history_bound_iso(raw_cutoff_epoch)
+    expire_cutoff = _history_bound_iso(expire_cutoff_epoch)
+
+    result: dict[str, Any] = {
+        "ts_started": started.isoformat().replace("+00:00", "Z"),
+        "raw_cutoff": raw_cutoff,
+        "expire_cutoff": expire_cutoff,
+        "expired_deleted": 0,
+        "downsampled_deleted": 0,
+        "downsampled_kept": 0,
+        "rollups_deleted": 0,
+        "batches": 0,
+    }
+
+    # Every batch takes the shared writer separately, so ingest interleaves between batches.
+    while True:
+        async with db_writer(db_path) as db:
+            cursor = await db.execute(
+                """
+                DELETE FROM central_heartbeat_history
+                WHERE id IN (
+                  SELECT id
+                  FROM central_heartbeat_history
+                  WHERE ts_received < ?
+                  ORDER BY ts_received
+                  LIMIT ?
+                );
+                """,
+                (expire_cutoff, batch),
+            )
+            deleted = max(0, cursor.rowcount)
+            await db.commit()
+        result["expired_deleted"] += deleted
+        result["batches"] += 1
+        if deleted < batch:
+            break
+
+    while True:
+        async with db_writer(db_path) as db:
+            outcome = await _downsample_history_batch(db, raw_cutoff=raw_cutoff, batch_size=batch)
+        if outcome is None:
+            break
+        result["downsampled_deleted"] += outcome[0]
+        result["downsampled_kept"] += outcome[1]
+        result["batches"] += 1
+
+    async with db_writer(db_path) as db:
+        for bucket_sec in FLEET_METRICS_ROLLUP_BUCKETS:
+            # Sub-5-minute rollups are only useful while raw history still backs them.
+            cutoff_epoch = raw_cutoff_epoch if bucket_sec < HISTORY_DOWNSAMPLE_SEC else expire_cutoff_epoch
+            for table_name in ("fleet_metrics_rollup_centrals", "fleet_metrics_rollup_events"):
+                cursor = await db.execute(
+                    f"DELETE FROM {table_name} WHERE bucket_sec = ? AND bucket_start < ?;",
+                    (bucket_sec, cutoff_epoch),
+                )
+                result["rollups_deleted"] += max(0, cursor.rowcount)
+        await db.commit()
+
+        async with db.execute("PRAGMA auto_vacuum;") as cursor:
+            auto_vacuum = _to_int((await cursor.fetchone())[0], 0)
+        async with db.execute("PRAGMA page_size;") as cursor:
+            page_size = _to_int((await cursor.fetchone())[0], 0)
+        async with db.execute("PRAGMA freelist_count;") as cursor:
+            freelist_before = _to_int((await cursor.fetchone())[0], 0)
+        if auto_vacuum == 2 and vacuum_pages > 0 and freelist_before > 0:
+            # sqlite3's execute() steps this pragma once (one page); executescript runs it to completion.
+            await db.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+        async with db.execute("PRAGMA freelist_count;") as cursor:
+            freelist_after = _to_int((await cursor.fetchone())[0], 0)
+        vacuumed_pages = max(0, freelist_before - freelist_after)
+        async with db.execute("PRAGMA page_count;") as cursor:
+            page_count = _to_int((await cursor.fetchone())[0], 0)
+
+    finished = datetime.now(timezone.utc)
+    result.update(
+        {
+            "ts_finished": finished.isoformat().replace("+00:00", "Z"),
+            "duration_ms": int((finished - started).total_seconds() * 1000),
+            "auto_vacuum": _HISTORY_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+            "vacuum_pages": vacuumed_pages,
+            "reclaimed_bytes": vacuumed_pages * page_size,
+            "freelist_bytes": freelist_after * page_size,
+            "db_bytes": page_count * page_size,
+        }
+    )
+    return result
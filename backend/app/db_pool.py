@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import aiosqlite
+
+_WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA busy_timeout=5000;",
+)
+_READER_PRAGMAS = (
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA query_only=ON;",
+)
+_LATENCY_SAMPLES = 512
+
+
+def get_db_pool_readers() -> int:
+    raw = str(os.environ.get("DB_POOL_READERS", "4")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 4
+    return max(1, min(value, 32))
+
+
+class _RoleStats:
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.errors = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.hold_total_ms = 0.0
+        self.hold_max_ms = 0.0
+        self.wait_samples: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.hold_samples: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+
+    def observe(self, *, wait_ms: float, hold_ms: float, failed: bool) -> None:
+        self.acquired += 1
+        if failed:
+            self.errors += 1
+        self.wait_total_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        self.hold_total_ms += hold_ms
+        self.hold_max_ms = max(self.hold_max_ms, hold_ms)
+        self.wait_samples.append(wait_ms)
+        self.hold_samples.append(hold_ms)
+
+    def snapshot(self) -> dict[str, Any]:
+        count = max(1, self.acquired)
+        return {
+            "acquired": self.acquired,
+            "errors": self.errors,
+            "wait_ms_avg": round(self.wait_total_ms / count, 3),
+            "wait_ms_p95": percentile(self.wait_samples, 95),
+            "wait_ms_max": round(self.wait_max_ms, 3),
+            "query_ms_avg": round(self.hold_total_ms / count, 3),
+            "query_ms_p95": percentile(self.hold_samples, 95),
+            "query_ms_max": round(self.hold_max_ms, 3),
+        }
+
+
+def percentile(samples: deque[float], pct: int) -> float:
+    # Shared by the backend's latency stats (pool waits, notification delivery).
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round((pct / 100.0) * (len(ordered) - 1)))))
+    return round(ordered[index], 3)
+
+
+async def _open_connection(db_path: str, pragmas: tuple[str, ...]) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(db_path)
+    conn.row_factory = aiosqlite.Row
+    for pragma in pragmas:
+        await conn.execute(pragma)
+    return conn
+
+
+class DbPool:
+    def __init__(self, db_path: str, *, readers: int) -> None:
+        self.db_path = db_path
+        self.readers_total = max(1, int(readers))
+        self._writer: aiosqlite.Connection | None = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._reader_conns: list[aiosqlite.Connection] = []
+        self._stats = {"writer": _RoleStats(), "reader": _RoleStats()}
+        self._opened_at = time.time()
+
+    async def open(self) -> None:
+        self._writer = await _open_connection(self.db_path, _WRITER_PRAGMAS)
+        for _ in range(self.readers_total):
+            conn = await _open_connection(self.db_path, _READER_PRAGMAS)
+            self._reader_conns.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self) -> None:
+        async with self._writer_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns.clear()
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        started = time.perf_counter()
+        async with self._writer_lock:
+            conn = self._writer
+            if conn is None:
+                raise RuntimeError("db_pool_closed")
+            acquired = time.perf_counter()
+            failed = False
+            try:
+                yield conn
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                # A shared writer must never leak an open transaction to the next caller.
+                if conn.in_transaction:
+                    await conn.rollback()
+                self._stats["writer"].observe(
+                    wait_ms=(acquired - started) * 1000.0,
+                    hold_ms=(time.perf_counter() - acquired) * 1000.0,
+                    failed=failed,
+                )
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        started = time.perf_counter()
+        conn = await self._readers.get()
+        acquired = time.perf_counter()
+        failed = False
+        try:
+            yield conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._readers.put_nowait(conn)
+            self._stats["reader"].observe(
+                wait_ms=(acquired - started) * 1000.0,
+                hold_ms=(time.perf_counter() - acquired) * 1000.0,
+                failed=failed,
+            )
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "uptime_sec": int(time.time() - self._opened_at),
+            "readers_total": self.readers_total,
+            "readers_idle": self._readers.qsize(),
+            "writer_busy": self._writer_lock.locked(),
+            "writer": self._stats["writer"].snapshot(),
+            "reader": self._stats["reader"].snapshot(),
+        }
+
+
+_pools: dict[str, DbPool] = {}
+
+
+async def open_db_pool(db_path: str, *, readers: int | None = None) -> DbPool:
+    existing = _pools.get(db_path)
+    if existing is not None:
+        return existing
+    pool = DbPool(db_path, readers=readers if readers is not None else get_db_pool_readers())
+    await pool.open()
+    _pools[db_path] = pool
+    return pool
+
+
+async def close_db_pools() -> None:
+    while _pools:
+        _, pool = _pools.popitem()
+        await pool.close()
+
+
+def db_pool_metrics(db_path: str) -> dict[str, Any] | None:
+    pool = _pools.get(db_path)
+    return pool.metrics() if pool is not None else None
+
+
+@asynccontextmanager
+async def db_writer(db_path: str) -> AsyncIterator[aiosqlite.Connection]:
+    pool = _pools.get(db_path)
+    if pool is not None:
+        async with pool.writer() as conn:
+            yield conn
+        return
+    # No pool for this path (CLI tools, init before startup): fall back to a one-off connection.
+    conn = await _open_connection(db_path, _WRITER_PRAGMAS)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+@asynccontextmanager
+async def db_reader(db_path: str) -> AsyncIterator[aiosqlite.Connection]:
+    pool = _pools.get(db_path)
+    if pool is not None:
+        async with pool.reader() as conn:
+            yield conn
+        return
+    conn = await _open_connection(db_path, _READER_PRAGMAS)
+    try:
+        yield conn
+    finally:
+        await conn.close()
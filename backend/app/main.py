@@ -1,25 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import os
-import smtplib
-import ssl
+import time
 from datetime import datetime, timedelta, timezone
-from email.message import EmailMessage
 from pathlib import Path
 from typing import Annotated, Any
-from urllib.error import URLError
-from urllib.parse import urlencode
-from urllib.request import Request as UrlRequest, urlopen
 
 from fastapi import Depends, FastAPI, Header, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from starlette.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
 from app.db import (
+    admin_audit_metrics,
     clear_alert_silence,
     delete_monitor_policy_override,
+    enqueue_notification_outbox,
     get_alert_state,
     get_incident_by_key,
     get_incident_notification_by_id,
@@ -31,14 +30,22 @@ from app.db import (
     list_incidents,
     list_alert_actions,
     list_monitor_policy_overrides,
-    list_fleet_health_history_samples,
+    fleet_metrics_rollup_bucket,
+    fleet_snapshot_metrics,
+    flush_admin_audit,
+    get_fleet_snapshot,
+    list_fleet_metrics_rollup,
     get_central_heartbeat_history,
     ingest_central_heartbeat,
     ingest_stop,
+    ingest_stops_batch,
+    INGEST_STOPS_BATCH_MAX,
     init_db,
     list_central_heartbeats,
+    prune_central_heartbeat_history,
     record_incident_notification,
     record_admin_audit,
+    run_admin_audit_flusher,
     set_alert_ack,
     set_alert_silence,
     sync_incidents,
@@ -46,11 +53,13 @@ from app.db import (
     update_notification_settings,
     stats_vehicle,
 )
+from app.db_pool import close_db_pools, db_pool_metrics, open_db_pool
 from app.admin_alerts_ops import (
     build_alert_groups_response,
     build_alerts_response,
 )
 from app.admin_fleet_monitor_ops import collect_monitor_snapshot
+from app.admin_fleet_stream import fleet_event_stream, fleet_events, parse_last_event_id
 from app.admin_fleet_policy_page import render_admin_fleet_policy_page
 from app.admin_fleet_history_page import render_admin_fleet_history_page
 from app.admin_fleet_notifications_page import render_admin_fleet_notifications_page
@@ -107,8 +116,11 @@ from app.client_ops import (
     update_client_notification_settings_response,
     update_client_profile_response,
 )
+from app.notification_delivery import notification_delivery
 from app.webpanel_v2.router import router as webpanel_v2_router
 
+logger = logging.getLogger(__name__)
+
 
 def _split_keys(raw: str) -> set[str]:
     keys: set[str] = set()
@@ -173,6 +185,51 @@ def get_admin_key_roles() -> dict[str, str]:
 def get_db_path() -> str:
     return os.environ.get("DB_PATH", "/data/passengers.sqlite3")
 
+def get_incident_sweep_interval_sec() -> int:
+    raw = str(os.environ.get("INCIDENT_SWEEP_INTERVAL_SEC", "60")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 60
+    return max(15, min(value, 3600))
+
+
+def get_history_raw_retention_days() -> int:
+    raw = str(os.environ.get("HISTORY_RAW_RETENTION_DAYS", "14")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 14
+    return max(1, min(value, 365))
+
+
+def get_history_downsample_retention_days() -> int:
+    raw = str(os.environ.get("HISTORY_DOWNSAMPLE_RETENTION_DAYS", "180")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 180
+    return max(get_history_raw_retention_days(), min(value, 3650))
+
+
+def get_history_retention_interval_sec() -> int:
+    raw = str(os.environ.get("HISTORY_RETENTION_INTERVAL_SEC", "3600")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 3600
+    return max(300, min(value, 86400))
+
+
+def get_history_retention_batch() -> int:
+    raw = str(os.environ.get("HISTORY_RETENTION_BATCH", "500")).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = 500
+    return max(50, min(value, 5000))
+
+
 def get_wg_status_path() -> str:
     return os.environ.get("WG_STATUS_PATH", "/wg/peers.json")
 
@@ -258,67 +315,12 @@ def _notification_message(incident: dict[str, Any]) -> tuple[str, str]:
     return subject, body
 
 
-def _send_telegram_notification(text: str) -> tuple[bool, str | None, str | None]:
-    token = str(os.environ.get("ALERT_TELEGRAM_BOT_TOKEN", "")).strip()
-    chat_id = str(os.environ.get("ALERT_TELEGRAM_CHAT_ID", "")).strip()
-    if not token or not chat_id:
-        return False, None, "telegram_not_configured"
-
-    payload = urlencode({"chat_id": chat_id, "text": text[:3900], "disable_web_page_preview": "true"}).encode("utf-8")
-    request = UrlRequest(
-        f"https://api.telegram.org/bot{token}/sendMessage",
-        data=payload,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        method="POST",
-    )
-    try:
-        with urlopen(request, timeout=10) as response:
-            if int(getattr(response, "status", 200)) >= 400:
-                return False, chat_id, f"telegram_http_{getattr(response, 'status', 'error')}"
-        return True, chat_id, None
-    except URLError as exc:
-        return False, chat_id, f"telegram_error:{exc}"
-    except Exception as exc:
-        return False, chat_id, f"telegram_error:{exc}"
-
-
-def _send_email_notification(*, subject: str, body: str) -> tuple[bool, str | None, str | None]:
-    recipients_raw = str(os.environ.get("ALERT_EMAIL_TO", "")).strip()
-    smtp_host = str(os.environ.get("ALERT_SMTP_HOST", "")).strip()
-    from_email = str(os.environ.get("ALERT_EMAIL_FROM", "")).strip()
-    if not recipients_raw or not smtp_host or not from_email:
-        return False, None, "email_not_configured"
-
-    recipients = [item.strip() for item in recipients_raw.replace(";", ",").split(",") if item.strip()]
-    if not recipients:
-        return False, None, "email_recipients_empty"
-
-    smtp_port = int(str(os.environ.get("ALERT_SMTP_PORT", "587")).strip() or "587")
-    smtp_user = str(os.environ.get("ALERT_SMTP_USER", "")).strip()
-    smtp_pass = str(os.environ.get("ALERT_SMTP_PASS", "")).strip()
-    use_starttls = _bool_env("ALERT_SMTP_STARTTLS", True)
-
-    msg = EmailMessage()
-    msg["From"] = from_email
-    msg["To"] = ", ".join(recipients)
-    msg["Subject"] = subject
-    msg.set_content(body)
-
-    try:
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=12) as smtp:
-            smtp.ehlo()
-            if use_starttls:
-                smtp.starttls(context=ssl.create_default_context())
-                smtp.ehlo()
-            if smtp_user and smtp_pass:
-                smtp.login(smtp_user, smtp_pass)
-            smtp.send_message(msg)
-        return True, ",".join(recipients), None
-    except Exception as exc:
-        return False, ",".join(recipients), f"email_error:{exc}"
-
-
-async def _dispatch_incident_notifications(db_path: str, events: list[dict[str, Any]]) -> dict[str, Any]:
+async def _dispatch_incident_notifications(
+    db_path: str,
+    events: list[dict[str, Any]],
+    *,
+    central_id: str | None = None,
+) -> dict[str, Any]:
     runtime = await _notification_runtime_settings(db_path)
     now_dt = datetime.now(timezone.utc)
     channels: list[str] = []
@@ -329,10 +331,11 @@ async def _dispatch_incident_notifications(db_path: str, events: list[dict[str,
 
     active_incidents = await list_incidents(
         db_path,
+        central_id=central_id,
         include_resolved=False,
         limit=5000,
     )
-    latest_state = await get_incident_last_notification_state(db_path)
+    latest_state = await get_incident_last_notification_state(db_path, central_id=central_id)
 
     merged_events: dict[tuple[str, str, str], dict[str, Any]] = {}
     for incident in events:
@@ -364,7 +367,8 @@ async def _dispatch_incident_notifications(db_path: str, events: list[dict[str,
         escalation_event["event"] = "escalation_policy"
         merged_events[(central_id, code, "escalation_policy")] = escalation_event
 
-    counters = {"total": 0, "sent": 0, "failed": 0, "skipped": 0}
+    counters = {"total": 0, "queued": 0, "skipped": 0}
+    outbox: list[dict[str, Any]] = []
     mute_until_dt = runtime.get("mute_until_dt")
     stale_always_notify = bool(runtime.get("stale_always_notify"))
     min_severity = str(runtime.get("min_severity") or "bad")
@@ -491,42 +495,31 @@ async def _dispatch_incident_notifications(db_path: str, events: list[dict[str,
                 }
             continue
 
+        # Delivery (and its sent/failed log row) belongs to the notification worker.
         for channel in channels:
             counters["total"] += 1
-            if channel == "telegram":
-                ok, destination, error = _send_telegram_notification(f"{subject}\n{body}")
-            else:
-                ok, destination, error = _send_email_notification(subject=subject, body=body)
-
-            if ok:
-                status = "sent"
-                counters["sent"] += 1
-            elif error and error.endswith("not_configured"):
-                status = "skipped"
-                counters["skipped"] += 1
-            else:
-                status = "failed"
-                counters["failed"] += 1
-
-            await record_incident_notification(
-                db_path,
-                central_id=central_id,
-                code=code,
-                severity=severity,
-                event=event_name,
-                channel=channel,
-                destination=destination,
-                status=status,
-                message=subject,
-                error=error,
+            counters["queued"] += 1
+            outbox.append(
+                {
+                    "channel": channel,
+                    "central_id": central_id,
+                    "code": code,
+                    "severity": severity,
+                    "event": event_name,
+                    "subject": subject,
+                    "body": body,
+                }
             )
-
             latest_state[(central_id, code)] = {
                 "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
                 "event": event_name,
-                "status": status,
+                "status": "queued",
                 "channel": channel,
             }
+
+    if outbox:
+        await enqueue_notification_outbox(db_path, outbox)
+        notification_delivery.notify()
     return counters
 
 
@@ -557,9 +550,9 @@ async def _dispatch_test_notification(
     for channel in channels:
         counters["total"] += 1
         if channel == "telegram":
-            ok, destination, error = _send_telegram_notification(f"{subject}\n{body}")
+            ok, destination, error = await notification_delivery.send_telegram(f"{subject}\n{body}")
         else:
-            ok, destination, error = _send_email_notification(subject=subject, body=body)
+            ok, destination, error = await notification_delivery.send_email(subject=subject, body=body)
 
         if ok:
             status = "sent"
@@ -1035,16 +1028,10 @@ def _parse_bucket_to_seconds(bucket_sec: int | None, *, window_sec: int) -> int:
     parsed = max(60, min(parsed, 3600))
     max_points = 600
     min_bucket = max(60, window_sec // max_points)
-    return max(parsed, min_bucket)
-
-
-def _bucket_ts_iso(ts_value: str | None, *, bucket_sec: int) -> str | None:
-    dt = _parse_iso_utc(ts_value)
-    if dt is None:
-        return None
-    epoch = int(dt.timestamp())
-    snapped = (epoch // bucket_sec) * bucket_sec
-    return datetime.fromtimestamp(snapped, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    bucket = max(parsed, min_bucket)
+    # Snap up to a multiple of the coarsest rollup that fits, so buckets tile rollup rows exactly.
+    step = 300 if bucket >= 300 else 60
+    return min(3600, -(-bucket // step) * step)
 
 
 def _build_incident_totals(incidents: list[dict[str, Any]]) -> dict[str, int]:
@@ -1297,7 +1284,7 @@ async def _collect_monitor_snapshot(
         include_centrals=include_centrals,
         limit_alerts=limit_alerts,
         limit_attention=limit_attention,
-        list_central_heartbeats_fn=list_central_heartbeats,
+        list_central_heartbeats_fn=get_fleet_snapshot,
         build_fleet_overview_fn=_build_fleet_overview,
         filter_silenced_alerts_fn=_filter_silenced_alerts,
         list_incidents_fn=list_incidents,
@@ -1363,7 +1350,7 @@ async def _collect_ops_feed(
         limit=max(bounded_limit * 4, 300),
     )
 
-    centrals = await list_central_heartbeats(db_path)
+    centrals = await get_fleet_snapshot(db_path)
     overview = _build_fleet_overview(centrals)
     alerts = _filter_alerts_by_severity(overview["alerts"], severity_filter or None)
     alerts = _filter_alerts_by_identity(
@@ -1587,7 +1574,7 @@ async def _dispatch_fleet_health_notification(
             else:
                 destination = str(os.environ.get("ALERT_EMAIL_TO", "")).strip() or None
         elif normalized == "telegram":
-            ok, destination, error = _send_telegram_notification(text=body[:3900])
+            ok, destination, error = await notification_delivery.send_telegram(body)
             if ok:
                 status = "sent"
                 counters["sent"] += 1
@@ -1598,7 +1585,7 @@ async def _dispatch_fleet_health_notification(
                 status = "failed"
                 counters["failed"] += 1
         else:
-            ok, destination, error = _send_email_notification(subject=subject, body=body)
+            ok, destination, error = await notification_delivery.send_email(subject=subject, body=body)
             if ok:
                 status = "sent"
                 counters["sent"] += 1
@@ -1802,6 +1789,10 @@ class IngestStopPayload(BaseModel):
     doors: list[DoorAgg] = Field(default_factory=list)
 
 
+class IngestStopsBatchPayload(BaseModel):
+    stops: list[IngestStopPayload] = Field(min_length=1, max_length=INGEST_STOPS_BATCH_MAX)
+
+
 class IngestCentralHeartbeatPayload(BaseModel):
     schema_ver: int = 1
     central_id: str = Field(min_length=1)
@@ -1915,9 +1906,202 @@ app.mount("/static/v2", StaticFiles(directory=str(WEBPANEL_V2_DIR / "static")),
 app.include_router(webpanel_v2_router)
 
 
+_background_tasks: list[asyncio.Task[None]] = []
+
+
+async def _sync_fleet_incidents(db_path: str, *, central_id: str | None = None) -> dict[str, Any]:
+    # Every reconcile also feeds /api/admin/fleet/stream: central/alert deltas from the same
+    # heartbeat read, incident transitions from the sync itself.
+    if central_id:
+        centrals = await list_central_heartbeats(db_path, central_id=central_id)
+    else:
+        centrals = await get_fleet_snapshot(db_path)
+    incident_sync = await sync_incidents(db_path, centrals=centrals, central_id=central_id)
+    fleet_events.publish_centrals(centrals)
+    fleet_events.publish_incident_changes(incident_sync.get("changes"))
+    return incident_sync
+
+
+_INCIDENT_RECONCILE_SCOPED_MAX = 8
+
+_incident_reconcile_wakeup = asyncio.Event()
+_incident_reconcile_pending: dict[str, float] = {}
+_incident_reconcile_state: dict[str, Any] = {
+    "runs": 0,
+    "full_runs": 0,
+    "errors": 0,
+    "last_run": None,
+    "last_error": None,
+    "duration_ms_last": 0.0,
+    "duration_ms_max": 0.0,
+    "lag_ms_last": 0.0,
+    "lag_ms_max": 0.0,
+}
+
+
+def _signal_incident_reconcile(central_id: str) -> None:
+    # Ingest only records that the central changed; the reconciler owns the incidents write.
+    _incident_reconcile_pending.setdefault(central_id, time.monotonic())
+    _incident_reconcile_wakeup.set()
+
+
+async def _reconcile_incidents(db_path: str, central_ids: list[str] | None) -> dict[str, int]:
+    totals = {"inserted": 0, "updated": 0, "resolved": 0, "notify_total": 0}
+    scopes: list[str | None] = list(central_ids) if central_ids is not None else [None]
+    for central_id in scopes:
+        incident_sync = await _sync_fleet_incidents(db_path, central_id=central_id)
+        notify = incident_sync.get("notify") or []
+        for key in ("inserted", "updated", "resolved"):
+            totals[key] += _to_int(incident_sync.get(key), 0)
+        totals["notify_total"] += len(notify)
+        await _dispatch_incident_notifications(db_path, notify, central_id=central_id)
+    return totals
+
+
+async def _incident_reconcile_loop() -> None:
+    # Single owner of incident reconciliation: fleet-wide every INCIDENT_SWEEP_INTERVAL_SEC (stale
+    # centrals, age-based escalation) and per central as soon as heartbeat ingest signals a change.
+    # GET endpoints only read the incidents table.
+    next_full = time.monotonic() + get_incident_sweep_interval_sec()
+    while True:
+        try:
+            await asyncio.wait_for(_incident_reconcile_wakeup.wait(), timeout=max(0.0, next_full - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        _incident_reconcile_wakeup.clear()
+        now = time.monotonic()
+        full = now >= next_full
+        if full:
+            next_full = now + get_incident_sweep_interval_sec()
+            # The fleet-wide pass covers every signalled central.
+            pending = dict(_incident_reconcile_pending)
+            _incident_reconcile_pending.clear()
+        elif not _incident_reconcile_pending:
+            continue
+        else:
+            # Oldest signals first, at most _INCIDENT_RECONCILE_SCOPED_MAX per pass: a burst (backend
+            # restart, fleet-wide uplink recovery) stays scoped and only the sweep timer goes fleet-wide.
+            oldest = sorted(_incident_reconcile_pending.items(), key=lambda item: item[1])
+            pending = dict(oldest[:_INCIDENT_RECONCILE_SCOPED_MAX])
+            for central_id in pending:
+                del _incident_reconcile_pending[central_id]
+            if _incident_reconcile_pending:
+                _incident_reconcile_wakeup.set()
+        started = time.monotonic()
+        try:
+            totals = await _reconcile_incidents(get_db_path(), None if full else sorted(pending))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("incident reconcile failed (scope=%s)", "fleet" if full else ",".join(sorted(pending)))
+            # Keep the signals so the next pass retries them.
+            for central_id, signaled_at in pending.items():
+                _incident_reconcile_pending.setdefault(central_id, signaled_at)
+            _incident_reconcile_state["errors"] += 1
+            _incident_reconcile_state["last_error"] = {
+                "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "error": str(exc)[:300],
+            }
+            await asyncio.sleep(1.0)
+            continue
+        finished = time.monotonic()
+        duration_ms = round((finished - started) * 1000.0, 3)
+        lag_ms = round((finished - min(pending.values())) * 1000.0, 3) if pending else 0.0
+        state = _incident_reconcile_state
+        state["runs"] += 1
+        state["full_runs"] += 1 if full else 0
+        state["duration_ms_last"] = duration_ms
+        state["duration_ms_max"] = max(float(state["duration_ms_max"]), duration_ms)
+        state["lag_ms_last"] = lag_ms
+        state["lag_ms_max"] = max(float(state["lag_ms_max"]), lag_ms)
+        state["last_run"] = {
+            "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "scope": "fleet" if full else "centrals",
+            "centrals": len(pending),
+            **totals,
+        }
+
+
+def _incident_reconcile_snapshot() -> dict[str, Any]:
+    pending_since = min(_incident_reconcile_pending.values()) if _incident_reconcile_pending else None
+    return {
+        "interval_sec": get_incident_sweep_interval_sec(),
+        "pending_centrals": len(_incident_reconcile_pending),
+        "pending_age_ms": round((time.monotonic() - pending_since) * 1000.0, 3) if pending_since is not None else 0.0,
+        **_incident_reconcile_state,
+    }
+
+
+_history_retention_state: dict[str, Any] = {
+    "runs": 0,
+    "last_run": None,
+    "last_error": None,
+    "reclaimed_bytes_total": 0,
+    "rows_deleted_total": 0,
+}
+
+
+async def _history_retention_loop() -> None:
+    while True:
+        try:
+            run = await prune_central_heartbeat_history(
+                get_db_path(),
+                raw_retention_days=get_history_raw_retention_days(),
+                downsample_retention_days=get_history_downsample_retention_days(),
+                batch_size=get_history_retention_batch(),
+            )
+            _history_retention_state["runs"] += 1
+            _history_retention_state["last_run"] = run
+            _history_retention_state["last_error"] = None
+            _history_retention_state["reclaimed_bytes_total"] += _to_int(run.get("reclaimed_bytes"), 0)
+            _history_retention_state["rows_deleted_total"] += _to_int(run.get("expired_deleted"), 0) + _to_int(
+                run.get("downsampled_deleted"), 0
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            _history_retention_state["last_error"] = {
+                "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "error": str(exc)[:300],
+            }
+        await asyncio.sleep(get_history_retention_interval_sec())
+
+
+def _history_retention_snapshot() -> dict[str, Any]:
+    return {
+        "raw_retention_days": get_history_raw_retention_days(),
+        "downsample_retention_days": get_history_downsample_retention_days(),
+        "interval_sec": get_history_retention_interval_sec(),
+        **_history_retention_state,
+    }
+
+
 @app.on_event("startup")
 async def _startup() -> None:
     await init_db(get_db_path())
+    await open_db_pool(get_db_path())
+    _background_tasks.append(asyncio.create_task(_incident_reconcile_loop()))
+    _background_tasks.append(asyncio.create_task(_history_retention_loop()))
+    _background_tasks.append(asyncio.create_task(notification_delivery.run(get_db_path)))
+    _background_tasks.append(asyncio.create_task(run_admin_audit_flusher(get_db_path())))
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    while _background_tasks:
+        task = _background_tasks.pop()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    notification_delivery.close()
+    # Audit entries recorded since the last flush interval.
+    try:
+        await flush_admin_audit(get_db_path())
+    except Exception:
+        pass
+    await close_db_pools()
 
 
 @app.get("/health")
@@ -2173,7 +2357,7 @@ async def admin_fleet_overview(
     limit: int = 200,
     _token: str = Depends(require_admin_api_key),
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(get_db_path())
+    centrals = await get_fleet_snapshot(get_db_path())
     overview = _build_fleet_overview(centrals)
     filtered_alerts = _filter_alerts_by_severity(overview["alerts"], severity)
     filtered_alerts = _filter_alerts_by_identity(
@@ -2263,9 +2447,34 @@ async def admin_fleet_health(
         "security": snapshot.get("security"),
         "attention_total": snapshot.get("attention_total", 0),
         "alerts_total": snapshot.get("alerts_total", 0),
+        "db_pool": db_pool_metrics(get_db_path()),
+        "history_retention": _history_retention_snapshot(),
+        "incident_reconcile": _incident_reconcile_snapshot(),
+        "notification_delivery": await notification_delivery.snapshot(get_db_path()),
+        "fleet_snapshot": fleet_snapshot_metrics(get_db_path()),
+        "admin_audit": admin_audit_metrics(get_db_path()),
+        "stream": fleet_events.snapshot(),
     }
 
 
+@app.get("/api/admin/fleet/stream")
+async def admin_fleet_stream(
+    request: Request,
+    last_event_id: Annotated[str | None, Header()] = None,
+    _token: str = Depends(require_admin_api_key),
+) -> StreamingResponse:
+    # Server-sent fleet deltas (central / alert / incident); the fleet pages poll only while disconnected.
+    return StreamingResponse(
+        fleet_event_stream(
+            fleet_events,
+            last_event_id=parse_last_event_id(last_event_id),
+            is_disconnected=request.is_disconnected,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/admin/fleet/health/notify-test")
 async def admin_fleet_health_notify_test(
     payload: FleetHealthNotifyPayload,
@@ -2458,7 +2667,7 @@ async def admin_fleet_alerts(
     limit: int = 200,
     _token: str = Depends(require_admin_api_key),
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(get_db_path())
+    centrals = await get_fleet_snapshot(get_db_path())
     overview = _build_fleet_overview(centrals)
     filtered_alerts = _filter_alerts_by_severity(overview["alerts"], severity)
     filtered_alerts = _filter_alerts_by_identity(
@@ -2485,7 +2694,7 @@ async def admin_fleet_alert_groups(
     limit: int = 200,
     _token: str = Depends(require_admin_api_key),
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(get_db_path())
+    centrals = await get_fleet_snapshot(get_db_path())
     overview = _build_fleet_overview(centrals)
     filtered_alerts = _filter_alerts_by_severity(overview["alerts"], severity)
     filtered_alerts = _filter_alerts_by_identity(
@@ -2507,7 +2716,7 @@ async def admin_fleet_alert_groups(
 
 @app.get("/api/admin/fleet/centrals")
 async def admin_fleet_centrals(_token: str = Depends(require_admin_api_key)) -> dict[str, Any]:
-    return {"status": "ok", "centrals": await list_central_heartbeats(get_db_path())}
+    return {"status": "ok", "centrals": await get_fleet_snapshot(get_db_path())}
 
 
 @app.get("/api/admin/fleet/central/{central_id}")
@@ -2517,7 +2726,7 @@ async def admin_fleet_central_detail(
     actions_limit: int = 120,
     _token: str = Depends(require_admin_api_key),
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(get_db_path())
+    centrals = await get_fleet_snapshot(get_db_path())
     current = next((item for item in centrals if str(item.get("central_id")) == central_id), None)
     history = await get_central_heartbeat_history(get_db_path(), central_id, limit=limit)
     actions = await list_alert_actions(get_db_path(), central_id=central_id, limit=actions_limit)
@@ -2537,9 +2746,8 @@ async def admin_fleet_incidents_sync(
     request: Request,
     _ctx: dict[str, Any] = Depends(require_admin_operator),
 ) -> dict[str, Any]:
-    centrals = await list_central_heartbeats(get_db_path())
-    sync_result = await sync_incidents(get_db_path(), centrals=centrals)
-    summary = {key: value for key, value in sync_result.items() if key != "notify"}
+    sync_result = await _sync_fleet_incidents(get_db_path())
+    summary = {key: value for key, value in sync_result.items() if key not in {"notify", "changes"}}
     summary["notify_total"] = len(sync_result.get("notify") or [])
     await _audit_admin_event(
         ctx=_ctx,
@@ -2581,95 +2789,24 @@ async def admin_fleet_incidents(
 async def admin_fleet_metrics_history(
     window: str = "24h",
     bucket_sec: int | None = None,
-    limit_samples: int = 100_000,
     _token: str = Depends(require_admin_api_key),
 ) -> dict[str, Any]:
     window_seconds = _parse_window_to_seconds(window)
     bucket_seconds = _parse_bucket_to_seconds(bucket_sec, window_sec=window_seconds)
-    bounded_limit = max(1_000, min(int(limit_samples), 200_000))
     since_dt = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
     since_ts = since_dt.isoformat().replace("+00:00", "Z")
 
-    samples = await list_fleet_health_history_samples(
-        get_db_path(),
-        since_ts=since_ts,
-        limit=bounded_limit,
-    )
-    notifications = await list_incident_notifications(
+    buckets = await list_fleet_metrics_rollup(
         get_db_path(),
+        bucket_sec=bucket_seconds,
         since_ts=since_ts,
-        limit=50_000,
     )
-    actions = await list_alert_actions(
-        get_db_path(),
-        since_ts=since_ts,
-        limit=50_000,
-    )
-
-    by_bucket: dict[str, dict[str, dict[str, Any]]] = {}
-    for sample in samples:
-        ts_bucket = _bucket_ts_iso(str(sample.get("ts_received") or ""), bucket_sec=bucket_seconds)
-        central_id = str(sample.get("central_id") or "")
-        if ts_bucket is None or not central_id:
-            continue
-        current = by_bucket.setdefault(ts_bucket, {})
-        current[central_id] = sample
-
-    notif_by_bucket: dict[str, dict[str, int]] = {}
-    for item in notifications:
-        ts_bucket = _bucket_ts_iso(str(item.get("ts") or ""), bucket_sec=bucket_seconds)
-        if ts_bucket is None:
-            continue
-        status_map = notif_by_bucket.setdefault(ts_bucket, {"sent": 0, "failed": 0, "skipped": 0})
-        normalized_status = str(item.get("status") or "").strip().lower()
-        if normalized_status in status_map:
-            status_map[normalized_status] += 1
-
-    actions_by_bucket: dict[str, int] = {}
-    for item in actions:
-        ts_bucket = _bucket_ts_iso(str(item.get("ts") or ""), bucket_sec=bucket_seconds)
-        if ts_bucket is None:
-            continue
-        actions_by_bucket[ts_bucket] = actions_by_bucket.get(ts_bucket, 0) + 1
-
-    bucket_keys = sorted(set(by_bucket.keys()) | set(notif_by_bucket.keys()) | set(actions_by_bucket.keys()))
-    buckets: list[dict[str, Any]] = []
-    for ts_bucket in bucket_keys:
-        bucket_row: dict[str, Any] = {
-            "ts_bucket": ts_bucket,
-            "centrals": 0,
-            "good": 0,
-            "warn": 0,
-            "bad": 0,
-            "alerts_total": 0,
-            "pending_batches_total": 0,
-            "wg_stale": 0,
-            "notifications_sent": 0,
-            "notifications_failed": 0,
-            "notifications_skipped": 0,
-            "alert_actions": actions_by_bucket.get(ts_bucket, 0),
-        }
-        central_rows = by_bucket.get(ts_bucket, {})
-        bucket_row["centrals"] = len(central_rows)
-        for sample in central_rows.values():
-            severity = _normalize_severity(sample.get("severity"))
-            bucket_row[severity] += 1
-            bucket_row["alerts_total"] += max(0, _to_int(sample.get("alerts_total"), 0))
-            bucket_row["pending_batches_total"] += max(0, _to_int(sample.get("pending_batches"), 0))
-            if _to_int(sample.get("wg_latest_handshake_age_sec"), -1) >= 300:
-                bucket_row["wg_stale"] += 1
-
-        notif_counts = notif_by_bucket.get(ts_bucket, {})
-        bucket_row["notifications_sent"] = notif_counts.get("sent", 0)
-        bucket_row["notifications_failed"] = notif_counts.get("failed", 0)
-        bucket_row["notifications_skipped"] = notif_counts.get("skipped", 0)
-        buckets.append(bucket_row)
-
     return {
         "status": "ok",
         "window": window,
         "window_sec": window_seconds,
         "bucket_sec": bucket_seconds,
+        "rollup_sec": fleet_metrics_rollup_bucket(bucket_seconds),
         "since_ts": since_ts,
         "buckets_total": len(buckets),
         "buckets": buckets,
@@ -2711,6 +2848,7 @@ async def admin_fleet_incident_notifications(
         since_ts=since_ts,
         q=q,
         limit=limit,
+        delivery=await notification_delivery.snapshot(get_db_path()),
     )
 
 
@@ -2854,8 +2992,8 @@ async def admin_alert_ack(
         actor=payload.actor,
         note=payload.note,
     )
-    incident_sync = await sync_incidents(get_db_path())
-    sync_summary = {key: value for key, value in incident_sync.items() if key != "notify"}
+    incident_sync = await _sync_fleet_incidents(get_db_path(), central_id=payload.central_id)
+    sync_summary = {key: value for key, value in incident_sync.items() if key not in {"notify", "changes"}}
     sync_summary["notify_total"] = len(incident_sync.get("notify") or [])
     await _audit_admin_event(
         ctx=_ctx,
@@ -2882,8 +3020,8 @@ async def admin_alert_silence(
         actor=payload.actor,
         note=payload.note,
     )
-    incident_sync = await sync_incidents(get_db_path())
-    sync_summary = {key: value for key, value in incident_sync.items() if key != "notify"}
+    incident_sync = await _sync_fleet_incidents(get_db_path(), central_id=payload.central_id)
+    sync_summary = {key: value for key, value in incident_sync.items() if key not in {"notify", "changes"}}
     sync_summary["notify_total"] = len(incident_sync.get("notify") or [])
     await _audit_admin_event(
         ctx=_ctx,
@@ -2914,8 +3052,8 @@ async def admin_alert_unsilence(
         actor=payload.actor,
         note=payload.note,
     )
-    incident_sync = await sync_incidents(get_db_path())
-    sync_summary = {key: value for key, value in incident_sync.items() if key != "notify"}
+    incident_sync = await _sync_fleet_incidents(get_db_path(), central_id=payload.central_id)
+    sync_summary = {key: value for key, value in incident_sync.items() if key not in {"notify", "changes"}}
     sync_summary["notify_total"] = len(incident_sync.get("notify") or [])
     await _audit_admin_event(
         ctx=_ctx,
@@ -2947,24 +3085,28 @@ async def ingest_stops(
     return {"status": result.status, "ts_received": result.ts_received}
 
 
+@app.post("/api/v1/ingest/stops:batch")
+async def ingest_stops_batched(
+    payload: IngestStopsBatchPayload,
+    _token: str = Depends(require_api_key),
+) -> dict[str, Any]:
+    result = await ingest_stops_batch(
+        get_db_path(),
+        [item.model_dump(by_alias=True) for item in payload.stops],
+    )
+    return {"status": "ok", **result}
+
+
 @app.post("/api/v1/ingest/central-heartbeat")
 async def ingest_central_heartbeat_state(
     payload: IngestCentralHeartbeatPayload,
     _token: str = Depends(require_api_key),
 ) -> dict[str, Any]:
     normalized_payload = payload.model_dump(by_alias=True)
+    central_id = str(normalized_payload["central_id"])
     result = await ingest_central_heartbeat(get_db_path(), normalized_payload)
-    centrals = await list_central_heartbeats(get_db_path())
-    incident_sync = await sync_incidents(get_db_path(), centrals=centrals)
-    notifications = await _dispatch_incident_notifications(get_db_path(), incident_sync.get("notify") or [])
-    sync_summary = {key: value for key, value in incident_sync.items() if key != "notify"}
-    sync_summary["notify_total"] = len(incident_sync.get("notify") or [])
-    return {
-        "status": result.status,
-        "ts_received": result.ts_received,
-        "incidents": sync_summary,
-        "notifications": notifications,
-    }
+    _signal_incident_reconcile(central_id)
+    return {"status": result.status, "ts_received": result.ts_received}
 
 
 @app.get("/api/v1/stats/vehicle/{vehicle_id}")
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Any, Callable
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request as UrlRequest, urlopen
+
+from app.db import (
+    finish_notification_outbox,
+    list_due_notification_outbox,
+    notification_outbox_stats,
+    reschedule_notification_outbox,
+)
+from app.db_pool import percentile
+
+TELEGRAM_TEXT_MAX = 3900
+SMTP_NOOP_AFTER_SEC = 30.0
+LATENCY_SAMPLES = 512
+
+_SEVERITY_RANK = {"good": 0, "warn": 1, "bad": 2}
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    return str(raw).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _int_env(name: str, default: int, *, low: int, high: int) -> int:
+    raw = str(os.environ.get(name, str(default))).strip()
+    try:
+        value = int(raw)
+    except Exception:
+        value = default
+    return max(low, min(value, high))
+
+
+def get_notify_digest_window_sec() -> int:
+    return _int_env("NOTIFY_DIGEST_WINDOW_SEC", 5, low=0, high=300)
+
+
+def get_notify_digest_max() -> int:
+    return _int_env("NOTIFY_DIGEST_MAX", 20, low=1, high=200)
+
+
+def get_notify_max_attempts() -> int:
+    return _int_env("NOTIFY_MAX_ATTEMPTS", 6, low=1, high=50)
+
+
+def get_notify_retry_base_sec() -> int:
+    return _int_env("NOTIFY_RETRY_BASE_SEC", 30, low=5, high=3600)
+
+
+def send_telegram_notification(text: str) -> tuple[bool, str | None, str | None]:
+    token = str(os.environ.get("ALERT_TELEGRAM_BOT_TOKEN", "")).strip()
+    chat_id = str(os.environ.get("ALERT_TELEGRAM_CHAT_ID", "")).strip()
+    if not token or not chat_id:
+        return False, None, "telegram_not_configured"
+
+    payload = urlencode(
+        {"chat_id": chat_id, "text": text[:TELEGRAM_TEXT_MAX], "disable_web_page_preview": "true"}
+    ).encode("utf-8")
+    request = UrlRequest(
+        f"https://api.telegram.org/bot{token}/sendMessage",
+        data=payload,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        method="POST",
+    )
+    try:
+        with urlopen(request, timeout=10) as response:
+            if int(getattr(response, "status", 200)) >= 400:
+                return False, chat_id, f"telegram_http_{getattr(response, 'status', 'error')}"
+        return True, chat_id, None
+    except URLError as exc:
+        return False, chat_id, f"telegram_error:{exc}"
+    except Exception as exc:
+        return False, chat_id, f"telegram_error:{exc}"
+
+
+class _SmtpSession:
+    """One SMTP connection reused across sends (STARTTLS + login once, not per message).
+
+    A connection idle for more than SMTP_NOOP_AFTER_SEC is probed with NOOP first; a server that
+    dropped it in between is reconnected once before the send counts as failed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._smtp: smtplib.SMTP | None = None
+        self._key: tuple[Any, ...] | None = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _connection(self, key: tuple[Any, ...]) -> smtplib.SMTP:
+        if self._smtp is not None and self._key == key:
+            if time.monotonic() - self._last_used < SMTP_NOOP_AFTER_SEC:
+                return self._smtp
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except Exception:
+                pass
+        self._close()
+        host, port, user, password, use_starttls = key
+        smtp = smtplib.SMTP(host, port, timeout=12)
+        try:
+            smtp.ehlo()
+            if use_starttls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if user and password:
+                smtp.login(user, password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connects += 1
+        self._smtp = smtp
+        self._key = key
+        return smtp
+
+    def send(self, msg: EmailMessage, key: tuple[Any, ...]) -> None:
+        with self._lock:
+            for attempt in range(2):
+                smtp = self._connection(key)
+                try:
+                    smtp.send_message(msg)
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+                    continue
+                except Exception:
+                    self._close()
+                    raise
+                self._last_used = time.monotonic()
+                return
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+_smtp_session = _SmtpSession()
+
+
+def send_email_notification(*, subject: str, body: str) -> tuple[bool, str | None, str | None]:
+    recipients_raw = str(os.environ.get("ALERT_EMAIL_TO", "")).strip()
+    smtp_host = str(os.environ.get("ALERT_SMTP_HOST", "")).strip()
+    from_email = str(os.environ.get("ALERT_EMAIL_FROM", "")).strip()
+    if not recipients_raw or not smtp_host or not from_email:
+        return False, None, "email_not_configured"
+
+    recipients = [item.strip() for item in recipients_raw.replace(";", ",").split(",") if item.strip()]
+    if not recipients:
+        return False, None, "email_recipients_empty"
+
+    smtp_port = int(str(os.environ.get("ALERT_SMTP_PORT", "587")).strip() or "587")
+    smtp_user = str(os.environ.get("ALERT_SMTP_USER", "")).strip()
+    smtp_pass = str(os.environ.get("ALERT_SMTP_PASS", "")).strip()
+    use_starttls = _bool_env("ALERT_SMTP_STARTTLS", True)
+
+    msg = EmailMessage()
+    msg["From"] = from_email
+    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = subject
+    msg.set_content(body)
+
+    try:
+        _smtp_session.send(msg, (smtp_host, smtp_port, smtp_user, smtp_pass, use_starttls))
+        return True, ",".join(recipients), None
+    except Exception as exc:
+        return False, ",".join(recipients), f"email_error:{exc}"
+
+
+def build_digest(channel: str, items: list[dict[str, Any]]) -> tuple[str, str]:
+    if len(items) == 1:
+        return str(items[0].get("subject") or ""), str(items[0].get("body") or "")
+    worst = max((str(item.get("severity") or "bad").lower() for item in items), key=lambda s: _SEVERITY_RANK.get(s, 2))
+    centrals = sorted({str(item.get("central_id") or "?") for item in items})
+    subject = f"[passengers][{worst.upper()}] {len(items)} incident notifications ({len(centrals)} centrals)"
+    if channel == "telegram":
+        # One line per incident; the full bodies would not fit a Telegram message.
+        lines = [subject]
+        for index, item in enumerate(items):
+            line = f"- {item.get('subject') or ''}"
+            if sum(len(part) + 1 for part in lines) + len(line) > TELEGRAM_TEXT_MAX - 40:
+                lines.append(f"... and {len(items) - index} more")
+                break
+            lines.append(line)
+        return subject, "\n".join(lines[1:])
+    parts = [f"{len(items)} notifications:", *[f"- {item.get('subject') or ''}" for item in items], ""]
+    for item in items:
+        parts.append(f"--- {item.get('subject') or ''}")
+        parts.append(str(item.get("body") or ""))
+    return subject, "\n".join(parts)
+
+
+class NotificationDeliveryWorker:
+    """Delivers the `notification_outbox` written by incident reconciliation.
+
+    Due rows are grouped per channel into one digest (up to NOTIFY_DIGEST_MAX incidents, collected
+    for NOTIFY_DIGEST_WINDOW_SEC after the first wakeup) and sent on a thread pool; Telegram and
+    email go out in parallel. Each incident still gets its own `incident_notifications` row. Failed
+    digests are retried with exponential backoff until NOTIFY_MAX_ATTEMPTS, then logged as failed.
+    """
+
+    def __init__(self, *, max_workers: int = 4) -> None:
+        self._wakeup = asyncio.Event()
+        self._max_workers = max(1, int(max_workers))
+        self._executor: ThreadPoolExecutor | None = None
+        self._latency_ms: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.stats: dict[str, Any] = {
+            "runs": 0,
+            "digests": 0,
+            "sent": 0,
+            "failed": 0,
+            "skipped": 0,
+            "retries": 0,
+            "last_run": None,
+            "last_error": None,
+        }
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run(self, get_db_path: Callable[[], str], *, poll_sec: float = 5.0) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=poll_sec)
+                # Let the rest of a burst (one reconcile pass, a fleet-wide outage) land in the same digest.
+                await asyncio.sleep(get_notify_digest_window_sec())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.deliver_due(get_db_path())
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.stats["last_error"] = {
+                    "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                    "error": str(exc)[:300],
+                }
+
+    async def deliver_due(self, db_path: str) -> dict[str, int]:
+        rows = await list_due_notification_outbox(db_path, limit=500)
+        if not rows:
+            return {"rows": 0, "digests": 0}
+        digest_max = get_notify_digest_max()
+        batches: list[tuple[str, list[dict[str, Any]]]] = []
+        by_channel: dict[str, list[dict[str, Any]]] = {}
+        for row in rows:
+            by_channel.setdefault(str(row["channel"]), []).append(row)
+        for channel, items in by_channel.items():
+            for start in range(0, len(items), digest_max):
+                batches.append((channel, items[start : start + digest_max]))
+
+        outcomes = await asyncio.gather(*(self._send_batch(channel, items) for channel, items in batches))
+        finished: list[dict[str, Any]] = []
+        for (channel, items), (ok, destination, error) in zip(batches, outcomes):
+            if not ok and not (error and error.endswith("not_configured")):
+                retry_items = [item for item in items if _to_int(item.get("attempts")) + 1 < get_notify_max_attempts()]
+                if retry_items:
+                    await self._reschedule(db_path, retry_items, error)
+                final_ids = {item["id"] for item in retry_items}
+                items = [item for item in items if item["id"] not in final_ids]
+            status = "sent" if ok else "skipped" if error and error.endswith("not_configured") else "failed"
+            for item in items:
+                finished.append(
+                    {
+                        "id": item["id"],
+                        "central_id": item["central_id"],
+                        "code": item["code"],
+                        "severity": item["severity"],
+                        "event": item["event"],
+                        "channel": channel,
+                        "destination": destination,
+                        "status": status,
+                        "message": item["subject"],
+                        "error": error,
+                    }
+                )
+                self.stats[status] += 1
+                if ok:
+                    created = _parse_iso_utc(str(item.get("created_at") or ""))
+                    if created is not None:
+                        self._latency_ms.append((datetime.now(timezone.utc) - created).total_seconds() * 1000.0)
+        await finish_notification_outbox(db_path, finished)
+        self.stats["runs"] += 1
+        self.stats["digests"] += len(batches)
+        self.stats["last_run"] = {
+            "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "rows": len(rows),
+            "digests": len(batches),
+            "finished": len(finished),
+        }
+        return {"rows": len(rows), "digests": len(batches)}
+
+    async def _run_blocking(
+        self,
+        fn: Callable[..., tuple[bool, str | None, str | None]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> tuple[bool, str | None, str | None]:
+        # Blocking transports (urlopen, smtplib) never run on the event loop. The pool belongs to
+        # this worker and is created on first use, so a closed worker (or a second one) starts a fresh pool.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="notify")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def send_telegram(self, text: str) -> tuple[bool, str | None, str | None]:
+        return await self._run_blocking(send_telegram_notification, text)
+
+    async def send_email(self, *, subject: str, body: str) -> tuple[bool, str | None, str | None]:
+        return await self._run_blocking(send_email_notification, subject=subject, body=body)
+
+    async def _send_batch(self, channel: str, items: list[dict[str, Any]]) -> tuple[bool, str | None, str | None]:
+        subject, body = build_digest(channel, items)
+        if channel == "telegram":
+            return await self.send_telegram(f"{subject}\n{body}")
+        if channel == "email":
+            return await self.send_email(subject=subject, body=body)
+        return False, None, f"{channel}_not_configured"
+
+    async def _reschedule(self, db_path: str, items: list[dict[str, Any]], error: str | None) -> None:
+        base_sec = get_notify_retry_base_sec()
+        now_dt = datetime.now(timezone.utc)
+        # Rows of one digest share the attempt count in practice; group anyway to keep backoff exact.
+        by_attempts: dict[int, list[int]] = {}
+        for item in items:
+            by_attempts.setdefault(_to_int(item.get("attempts")), []).append(int(item["id"]))
+        for attempts, ids in by_attempts.items():
+            delay_sec = min(base_sec * (2**attempts), 3600)
+            next_attempt_at = (now_dt + timedelta(seconds=delay_sec)).isoformat().replace("+00:00", "Z")
+            await reschedule_notification_outbox(db_path, ids=ids, next_attempt_at=next_attempt_at, error=error)
+        self.stats["retries"] += len(items)
+
+    async def snapshot(self, db_path: str) -> dict[str, Any]:
+        return {
+            "digest_window_sec": get_notify_digest_window_sec(),
+            "digest_max": get_notify_digest_max(),
+            "max_attempts": get_notify_max_attempts(),
+            "smtp_connects": _smtp_session.connects,
+            "latency_ms_p50": percentile(self._latency_ms, 50) if self._latency_ms else None,
+            "latency_ms_p95": percentile(self._latency_ms, 95) if self._latency_ms else None,
+            "latency_ms_max": round(max(self._latency_ms), 3) if self._latency_ms else None,
+            "outbox": await notification_outbox_stats(db_path),
+            **self.stats,
+        }
+
+    def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        _smtp_session.close()
+
+
+def _to_int(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except Exception:
+        return default
+
+
+def _parse_iso_utc(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+
+notification_delivery = NotificationDeliveryWorker()
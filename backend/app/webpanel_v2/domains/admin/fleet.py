@@ -6,7 +6,7 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Request
 from starlette.responses import HTMLResponse
 
-from app.db import list_central_heartbeats, list_incidents
+from app.db import get_fleet_snapshot, list_incidents
 from app.webpanel_v2.core.render import render_admin2, templates
 
 router = APIRouter()
@@ -48,7 +48,7 @@ async def admin2_fleet_monitor_fragment(request: Request, limit: int = 80):
     bounded_limit = max(10, min(int(limit), 300))
     try:
         db_path = _get_db_path()
-        centrals = await list_central_heartbeats(db_path)
+        centrals = await get_fleet_snapshot(db_path)
         incidents = await list_incidents(db_path, include_resolved=False, limit=2000)
     except Exception:
         ctx = {
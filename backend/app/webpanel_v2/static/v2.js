@@ -52,3 +52,52 @@
   });
 })();
 
+
+// Fleet monitor: re-fetch the fragment on SSE fleet deltas; poll every 10s only while the stream is down.
+(() => {
+  const target = document.querySelector("[data-fleet-stream]");
+  if (!target) return;
+  const status = document.getElementById("v2FleetStream");
+  const refresh = () => target.dispatchEvent(new Event("fleetRefresh"));
+  let pollTimer = null;
+  let debounceTimer = null;
+
+  function setState(text) {
+    if (status) status.textContent = text;
+  }
+  function startPolling() {
+    if (pollTimer !== null) return;
+    pollTimer = setInterval(refresh, 10000);
+    setState("потік: опитування 10s");
+  }
+  function stopPolling() {
+    if (pollTimer === null) return;
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+  function scheduleRefresh() {
+    if (debounceTimer !== null) clearTimeout(debounceTimer);
+    debounceTimer = setTimeout(() => {
+      debounceTimer = null;
+      refresh();
+    }, 800);
+  }
+
+  if (typeof EventSource !== "function") {
+    startPolling();
+    return;
+  }
+  function open() {
+    const source = new EventSource(target.getAttribute("data-fleet-stream"));
+    source.addEventListener("ready", () => {
+      stopPolling();
+      setState("потік: live");
+    });
+    for (const type of ["central", "alert", "incident", "resync"]) source.addEventListener(type, scheduleRefresh);
+    source.addEventListener("error", () => {
+      startPolling();
+      if (source.readyState === EventSource.CLOSED) setTimeout(open, 30000);
+    });
+  }
+  open();
+})();
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+# The service runs as the `app` package from the backend directory (uvicorn app.main:app).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.db import init_db  # noqa: E402
+from app.db_pool import close_db_pools, open_db_pool  # noqa: E402
+
+
+@pytest.fixture
+def run_db(tmp_path) -> Callable[[Callable[[str], Awaitable[Any]]], Any]:
+    """Run `body(db_path)` against a fresh database inside one event loop."""
+
+    def run(body: Callable[[str], Awaitable[Any]]) -> Any:
+        db_path = str(tmp_path / "backend.sqlite3")
+
+        async def main() -> Any:
+            await init_db(db_path)
+            await open_db_pool(db_path)
+            try:
+                return await body(db_path)
+            finally:
+                await close_db_pools()
+
+        return asyncio.run(main())
+
+    return run
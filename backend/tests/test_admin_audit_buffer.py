@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import sqlite3
+
+from app.db import admin_audit_metrics, flush_admin_audit, list_admin_audit, record_admin_audit
+
+
+async def _record(db_path: str, action: str, *, actor: str = "ops", status: str = "ok", details: dict | None = None):
+    await record_admin_audit(
+        db_path,
+        actor=actor,
+        role="admin",
+        action=action,
+        method="POST",
+        path=f"/api/admin/{action}",
+        status=status,
+        status_code=200 if status == "ok" else 403,
+        client_ip="10.0.0.1",
+        details=details,
+    )
+
+
+def _stored_actions(db_path: str) -> list[str]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT action FROM admin_audit_log ORDER BY id;")]
+    finally:
+        conn.close()
+
+
+def test_buffered_entries_are_listed_ahead_of_stored_rows(run_db) -> None:
+    async def body(db_path: str) -> None:
+        await _record(db_path, "ack")
+        await _record(db_path, "silence", status="forbidden")
+        assert await flush_admin_audit(db_path) == 2
+        await _record(db_path, "policy_upsert", actor="alice", details={"central_id": "c7"})
+        await _record(db_path, "unsilence")
+
+        items = await list_admin_audit(db_path)
+        assert [item["action"] for item in items] == ["unsilence", "policy_upsert", "silence", "ack"]
+        assert [item["buffered"] for item in items] == [True, True, False, False]
+        buffered_ids = [item["id"] for item in items[:2]]
+        assert all(item_id < 0 for item_id in buffered_ids)
+        assert len(set(buffered_ids)) == 2
+        assert all(item["id"] > 0 for item in items[2:])
+        assert items[1]["details"] == {"central_id": "c7"}
+        # Placeholder ids are stable between reads until the flush.
+        assert [item["id"] for item in (await list_admin_audit(db_path))[:2]] == buffered_ids
+        limited = await list_admin_audit(db_path, limit=3)
+        assert [item["action"] for item in limited] == ["unsilence", "policy_upsert", "silence"]
+        assert _stored_actions(db_path) == ["ack", "silence"]
+
+    run_db(body)
+
+
+def test_buffered_entries_honour_filters(run_db) -> None:
+    async def body(db_path: str) -> None:
+        await _record(db_path, "ack", status="forbidden")
+        await flush_admin_audit(db_path)
+        await _record(db_path, "silence", status="forbidden")
+        await _record(db_path, "policy_upsert", actor="alice", details={"central_id": "c7"})
+
+        forbidden = await list_admin_audit(db_path, status="forbidden")
+        assert [(item["action"], item["buffered"]) for item in forbidden] == [("silence", True), ("ack", False)]
+        assert [item["action"] for item in await list_admin_audit(db_path, actor="alice")] == ["policy_upsert"]
+        assert [item["action"] for item in await list_admin_audit(db_path, q="C7")] == ["policy_upsert"]
+        assert await list_admin_audit(db_path, since_ts="2999-01-01T00:00:00Z") == []
+        assert len(await list_admin_audit(db_path, since_ts="2000-01-01T00:00:00Z")) == 3
+
+    run_db(body)
+
+
+def test_flush_persists_buffer_once(run_db) -> None:
+    async def body(db_path: str) -> None:
+        for n in range(5):
+            await _record(db_path, f"action_{n}")
+        assert admin_audit_metrics(db_path)["buffered"] == 5
+        before = [item["id"] for item in await list_admin_audit(db_path)]
+
+        # The shutdown hook calls the same flush before the pools close.
+        assert await flush_admin_audit(db_path) == 5
+        assert await flush_admin_audit(db_path) == 0
+
+        assert _stored_actions(db_path) == [f"action_{n}" for n in range(5)]
+        items = await list_admin_audit(db_path)
+        assert [item["action"] for item in items] == [f"action_{n}" for n in reversed(range(5))]
+        assert not any(item["buffered"] for item in items)
+        assert all(item["id"] > 0 for item in items)
+        assert all(item_id < 0 for item_id in before)
+        metrics = admin_audit_metrics(db_path)
+        assert (metrics["buffered"], metrics["recorded"], metrics["flushed"], metrics["batches"]) == (0, 5, 5, 1)
+
+    run_db(body)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from app.admin_fleet_stream import FleetEventBus, fleet_event_stream, format_sse, parse_last_event_id
+
+
+def _central(central_id: str, *, severity: str = "good", alerts: list[dict] | None = None) -> dict:
+    return {
+        "central_id": central_id,
+        "vehicle_id": f"bus-{central_id}",
+        "health": {"severity": severity},
+        "queue": {"pending_batches": 0},
+        "doors": [],
+        "alerts": alerts or [],
+    }
+
+
+def _drain(queue: asyncio.Queue) -> list[tuple[int, str, dict]]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_publish_fans_out_to_subscribers() -> None:
+    bus = FleetEventBus()
+    first, replay_first = bus.subscribe(None)
+    second, replay_second = bus.subscribe(None)
+    assert replay_first == [] and replay_second == []
+
+    event_id = bus.publish("incident", {"central_id": "c1"})
+
+    assert event_id == bus.last_event_id
+    assert _drain(first.queue) == [(event_id, "incident", {"central_id": "c1"})]
+    assert _drain(second.queue) == [(event_id, "incident", {"central_id": "c1"})]
+    bus.unsubscribe(second)
+    bus.publish("incident", {"central_id": "c2"})
+    assert len(_drain(first.queue)) == 1
+    assert second.queue.empty()
+    assert bus.snapshot()["subscribers"] == 1
+
+
+def test_resume_replays_backlog_after_last_event_id() -> None:
+    bus = FleetEventBus()
+    ids = [bus.publish("incident", {"n": n}) for n in range(5)]
+
+    _, replay = bus.subscribe(ids[1])
+    assert [item[0] for item in replay] == ids[2:]
+    _, replay = bus.subscribe(ids[-1])
+    assert replay == []
+
+
+def test_resume_outside_backlog_or_from_future_needs_resync() -> None:
+    bus = FleetEventBus(backlog=16)
+    ids = [bus.publish("incident", {"n": n}) for n in range(40)]
+
+    _, replay = bus.subscribe(ids[0])
+    assert replay is None
+    # A browser that kept an id from a different process (ahead of this one) cannot be replayed either.
+    _, replay = bus.subscribe(bus.last_event_id + 100)
+    assert replay is None
+    # The oldest retained event can still be resumed from the id right before it.
+    _, replay = bus.subscribe(ids[-17])
+    assert [item[0] for item in replay] == ids[-16:]
+
+
+def test_slow_subscriber_gets_single_resync_on_overflow() -> None:
+    bus = FleetEventBus(queue_max=16)
+    slow, _ = bus.subscribe(None)
+
+    for n in range(17):
+        bus.publish("incident", {"n": n})
+
+    items = _drain(slow.queue)
+    assert items == [(bus.last_event_id, "resync", {"reason": "overflow"})]
+    assert bus.overflows == 1
+    # The subscriber keeps receiving after the resync marker.
+    bus.publish("incident", {"n": 17})
+    assert [item[1] for item in _drain(slow.queue)] == ["incident"]
+
+
+def test_publish_central_emits_only_state_changes() -> None:
+    bus = FleetEventBus()
+    sub, _ = bus.subscribe(None)
+
+    bus.publish_central(_central("c1"))
+    bus.publish_central({**_central("c1"), "age_sec": 42})
+    assert [item[1] for item in _drain(sub.queue)] == ["central"]
+
+    alert = {"code": "door_offline", "severity": "warn"}
+    bus.publish_central(_central("c1", severity="warn", alerts=[alert]))
+    events = _drain(sub.queue)
+    assert [item[1] for item in events] == ["alert", "central"]
+    assert events[0][2]["change"] == "opened"
+    assert events[1][2]["prev_severity"] == "good"
+
+    bus.publish_central(_central("c1"))
+    events = _drain(sub.queue)
+    assert [(item[1], item[2].get("change")) for item in events] == [("alert", "closed"), ("central", None)]
+
+
+def test_format_sse_and_parse_last_event_id() -> None:
+    frame = format_sse(7, "alert", {"central_id": "c1", "vehicle_id": "автобус"})
+    lines = frame.split("\n")
+    assert lines[:2] == ["id: 7", "event: alert"]
+    assert json.loads(lines[2].removeprefix("data: ")) == {"central_id": "c1", "vehicle_id": "автобус"}
+    assert frame.endswith("\n\n")
+
+    assert parse_last_event_id(" 12 ") == 12
+    assert parse_last_event_id(None) is None
+    assert parse_last_event_id("") is None
+    assert parse_last_event_id("abc") is None
+
+
+def test_stream_sends_resync_for_unreplayable_gap() -> None:
+    async def main() -> list[str]:
+        bus = FleetEventBus()
+        bus.publish("incident", {"n": 0})
+
+        async def connected() -> bool:
+            return False
+
+        stream = fleet_event_stream(bus, last_event_id=bus.last_event_id + 5, is_disconnected=connected)
+        frames = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        assert bus.snapshot()["subscribers"] == 0
+        return frames
+
+    frames = asyncio.run(main())
+    assert frames[0].startswith("retry: ")
+    assert "event: resync" in frames[1]
+    assert "event: ready" in frames[2]
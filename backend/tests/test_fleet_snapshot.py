@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.db import (
+    _fleet_snapshot_cache,
+    clear_alert_silence,
+    delete_monitor_policy_override,
+    fleet_snapshot_metrics,
+    get_fleet_snapshot,
+    ingest_central_heartbeat,
+    set_alert_ack,
+    set_alert_silence,
+    update_notification_settings,
+    upsert_monitor_policy_override,
+)
+
+
+def _heartbeat(central_id: str, *, pending: int = 0) -> dict:
+    return {
+        "central_id": central_id,
+        "vehicle_id": f"bus-{central_id}",
+        "services": {"passengers-collector": "active"},
+        "queue": {"pending_batches": pending},
+        "doors": [],
+    }
+
+
+@pytest.fixture(autouse=True)
+def _default_max_age(monkeypatch) -> None:
+    monkeypatch.setenv("FLEET_SNAPSHOT_MAX_AGE_SEC", "60")
+
+
+def test_concurrent_readers_share_one_build(run_db) -> None:
+    async def body(db_path: str) -> None:
+        await ingest_central_heartbeat(db_path, _heartbeat("c1"))
+        await ingest_central_heartbeat(db_path, _heartbeat("c2"))
+
+        results = await asyncio.gather(*(get_fleet_snapshot(db_path) for _ in range(8)))
+
+        assert all(sorted(c["central_id"] for c in result) == ["c1", "c2"] for result in results)
+        metrics = fleet_snapshot_metrics(db_path)
+        assert metrics["builds"] == 1
+        assert metrics["shared"] == 7
+        await get_fleet_snapshot(db_path)
+        assert fleet_snapshot_metrics(db_path)["hits"] == 1
+
+    run_db(body)
+
+
+def test_every_fleet_write_forces_a_rebuild(run_db) -> None:
+    async def body(db_path: str) -> None:
+        await ingest_central_heartbeat(db_path, _heartbeat("c1"))
+        await get_fleet_snapshot(db_path)
+        writes = [
+            ("ingest", lambda: ingest_central_heartbeat(db_path, _heartbeat("c1", pending=3))),
+            ("ack", lambda: set_alert_ack(db_path, central_id="c1", code="queue_pending", actor="ops", note=None)),
+            (
+                "silence",
+                lambda: set_alert_silence(
+                    db_path, central_id="c1", code="queue_pending", duration_sec=600, actor="ops", note=None
+                ),
+            ),
+            (
+                "unsilence",
+                lambda: clear_alert_silence(db_path, central_id="c1", code="queue_pending", actor="ops", note=None),
+            ),
+            (
+                "policy_upsert",
+                lambda: upsert_monitor_policy_override(db_path, central_id="c1", values={"warn_pending_batches": 1}),
+            ),
+            ("policy_delete", lambda: delete_monitor_policy_override(db_path, central_id="c1")),
+            ("settings", lambda: update_notification_settings(db_path, updates={"monitor_warn_pending_batches": "2"})),
+        ]
+        for name, write in writes:
+            before = fleet_snapshot_metrics(db_path)
+            await write()
+            after_write = fleet_snapshot_metrics(db_path)
+            assert after_write["generation"] > before["generation"], name
+            await get_fleet_snapshot(db_path)
+            after_read = fleet_snapshot_metrics(db_path)
+            assert after_read["builds"] == before["builds"] + 1, name
+            assert after_read["snapshot_generation"] == after_write["generation"], name
+
+    run_db(body)
+
+
+def test_rebuild_reflects_the_write(run_db) -> None:
+    async def body(db_path: str) -> None:
+        await ingest_central_heartbeat(db_path, _heartbeat("c1"))
+        first = await get_fleet_snapshot(db_path)
+        await ingest_central_heartbeat(db_path, _heartbeat("c1", pending=4))
+        second = await get_fleet_snapshot(db_path)
+
+        assert first[0]["queue"]["pending_batches"] == 0
+        assert second[0]["queue"]["pending_batches"] == 4
+
+    run_db(body)
+
+
+def test_snapshot_older_than_max_age_is_rebuilt(run_db, monkeypatch) -> None:
+    async def body(db_path: str) -> None:
+        await ingest_central_heartbeat(db_path, _heartbeat("c1"))
+        await get_fleet_snapshot(db_path)
+        await get_fleet_snapshot(db_path)
+        assert fleet_snapshot_metrics(db_path)["builds"] == 1
+
+        monkeypatch.setenv("FLEET_SNAPSHOT_MAX_AGE_SEC", "5")
+        _fleet_snapshot_cache(db_path).built_at -= 6
+        await get_fleet_snapshot(db_path)
+        assert fleet_snapshot_metrics(db_path)["builds"] == 2
+
+        monkeypatch.setenv("FLEET_SNAPSHOT_MAX_AGE_SEC", "0")
+        await get_fleet_snapshot(db_path)
+        await get_fleet_snapshot(db_path)
+        metrics = fleet_snapshot_metrics(db_path)
+        assert metrics["builds"] == 4
+        assert metrics["generation"] == metrics["snapshot_generation"]
+
+    run_db(body)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+
+import app.main as main
+
+
+def test_signal_burst_is_reconciled_in_scoped_chunks(monkeypatch, tmp_path) -> None:
+    scopes: list[list[str] | None] = []
+
+    async def fake_reconcile(db_path: str, central_ids: list[str] | None) -> dict[str, int]:
+        scopes.append(None if central_ids is None else list(central_ids))
+        return {"inserted": 0, "updated": 0, "resolved": 0, "notify_total": 0}
+
+    monkeypatch.setenv("INCIDENT_SWEEP_INTERVAL_SEC", "60")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "backend.sqlite3"))
+    monkeypatch.setattr(main, "_reconcile_incidents", fake_reconcile)
+    monkeypatch.setattr(main, "_incident_reconcile_pending", {})
+    state = {**main._incident_reconcile_state, "runs": 0, "full_runs": 0}
+    monkeypatch.setattr(main, "_incident_reconcile_state", state)
+
+    async def body() -> None:
+        monkeypatch.setattr(main, "_incident_reconcile_wakeup", asyncio.Event())
+        task = asyncio.create_task(main._incident_reconcile_loop())
+        for n in range(20):
+            main._signal_incident_reconcile(f"c{n:02d}")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not main._incident_reconcile_pending and sum(len(scope or []) for scope in scopes) >= 20:
+                break
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(body())
+
+    assert None not in scopes
+    assert [len(scope) for scope in scopes] == [8, 8, 4]
+    assert sorted(central_id for scope in scopes for central_id in scope) == [f"c{n:02d}" for n in range(20)]
+    assert main._incident_reconcile_state["full_runs"] == 0
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import app.notification_delivery as delivery
+from app.db import enqueue_notification_outbox, get_incident_last_notification_state, list_incident_notifications
+from app.notification_delivery import TELEGRAM_TEXT_MAX, NotificationDeliveryWorker, build_digest
+
+
+def _item(central_id: str, code: str, *, severity: str = "warn", channel: str = "email") -> dict:
+    return {
+        "channel": channel,
+        "central_id": central_id,
+        "code": code,
+        "severity": severity,
+        "event": "opened",
+        "subject": f"[passengers][{severity.upper()}] {central_id} {code}",
+        "body": f"central={central_id}\ncode={code}",
+    }
+
+
+def _outbox(db_path: str) -> list[sqlite3.Row]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT * FROM notification_outbox ORDER BY id;").fetchall()
+    finally:
+        conn.close()
+
+
+def _make_due(db_path: str) -> None:
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE notification_outbox SET next_attempt_at = '2000-01-01T00:00:00Z';")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture(autouse=True)
+def _delivery_env(monkeypatch) -> None:
+    monkeypatch.setenv("NOTIFY_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("NOTIFY_RETRY_BASE_SEC", "30")
+    monkeypatch.setenv("NOTIFY_DIGEST_MAX", "20")
+
+
+def test_build_digest_single_item_is_passed_through() -> None:
+    item = _item("c1", "heartbeat_stale")
+    assert build_digest("email", [item]) == (item["subject"], item["body"])
+
+
+def test_build_digest_groups_items_under_worst_severity() -> None:
+    items = [_item("c1", "a"), _item("c2", "b", severity="bad"), _item("c1", "c", severity="good")]
+
+    subject, body = build_digest("email", items)
+
+    assert subject == "[passengers][BAD] 3 incident notifications (2 centrals)"
+    assert body.splitlines()[:4] == ["3 notifications:", *[f"- {item['subject']}" for item in items]]
+    for item in items:
+        assert f"--- {item['subject']}\n{item['body']}" in body
+
+
+def test_build_digest_telegram_is_one_line_per_item_and_bounded() -> None:
+    items = [_item(f"central-{n:03d}", "heartbeat_stale_with_a_long_code") for n in range(200)]
+
+    subject, body = build_digest("telegram", items)
+
+    assert subject.startswith("[passengers][WARN] 200 incident notifications")
+    lines = body.splitlines()
+    assert lines[0] == f"- {items[0]['subject']}"
+    assert lines[-1].startswith("... and ") and lines[-1].endswith(" more")
+    assert len(f"{subject}\n{body}") <= TELEGRAM_TEXT_MAX
+    shown = len(lines) - 1
+    assert lines[-1] == f"... and {len(items) - shown} more"
+
+
+def test_failed_digest_is_retried_with_backoff_then_logged_failed(run_db, monkeypatch) -> None:
+    calls: list[str] = []
+
+    def failing_send(*, subject: str, body: str) -> tuple[bool, str | None, str | None]:
+        calls.append(subject)
+        return False, "ops@example.com", "email_error:connection refused"
+
+    monkeypatch.setattr(delivery, "send_email_notification", failing_send)
+    worker = NotificationDeliveryWorker()
+
+    async def body(db_path: str) -> None:
+        await enqueue_notification_outbox(db_path, [_item("c1", "a"), _item("c2", "b")])
+
+        before = datetime.now(timezone.utc)
+        assert await worker.deliver_due(db_path) == {"rows": 2, "digests": 1}
+        rows = _outbox(db_path)
+        assert [row["attempts"] for row in rows] == [1, 1]
+        assert all(row["last_error"] == "email_error:connection refused" for row in rows)
+        delay = (datetime.fromisoformat(rows[0]["next_attempt_at"].replace("Z", "+00:00")) - before).total_seconds()
+        assert 29 <= delay <= 31
+        # Not due yet: a second pass sends nothing.
+        assert await worker.deliver_due(db_path) == {"rows": 0, "digests": 0}
+
+        _make_due(db_path)
+        await worker.deliver_due(db_path)
+        rows = _outbox(db_path)
+        assert [row["attempts"] for row in rows] == [2, 2]
+        delay = (datetime.fromisoformat(rows[0]["next_attempt_at"].replace("Z", "+00:00")) - before).total_seconds()
+        assert 59 <= delay <= 61
+
+        state = await get_incident_last_notification_state(db_path)
+        assert state[("c1", "a")]["status"] == "queued"
+
+        _make_due(db_path)
+        await worker.deliver_due(db_path)
+        assert _outbox(db_path) == []
+        logged = await list_incident_notifications(db_path)
+        assert sorted((item["central_id"], item["status"]) for item in logged) == [("c1", "failed"), ("c2", "failed")]
+        assert all(item["error"] == "email_error:connection refused" for item in logged)
+        state = await get_incident_last_notification_state(db_path)
+        assert state[("c1", "a")]["status"] == "failed"
+
+    try:
+        run_db(body)
+    finally:
+        worker.close()
+    assert len(calls) == 3
+    assert worker.stats["retries"] == 4
+    assert worker.stats["failed"] == 2
+
+
+def test_unconfigured_channel_is_skipped_without_retry(run_db, monkeypatch) -> None:
+    for name in ("ALERT_EMAIL_TO", "ALERT_SMTP_HOST", "ALERT_EMAIL_FROM"):
+        monkeypatch.delenv(name, raising=False)
+    worker = NotificationDeliveryWorker()
+
+    async def body(db_path: str) -> None:
+        await enqueue_notification_outbox(db_path, [_item("c1", "a")])
+        await worker.deliver_due(db_path)
+        assert _outbox(db_path) == []
+        logged = await list_incident_notifications(db_path)
+        assert [(item["status"], item["error"]) for item in logged] == [("skipped", "email_not_configured")]
+
+    try:
+        run_db(body)
+    finally:
+        worker.close()
+    assert worker.stats["retries"] == 0
+
+
+def test_queued_row_is_the_last_notification_until_delivered(run_db, monkeypatch) -> None:
+    sent: list[str] = []
+
+    def ok_send(*, subject: str, body: str) -> tuple[bool, str | None, str | None]:
+        sent.append(subject)
+        return True, "ops@example.com", None
+
+    monkeypatch.setattr(delivery, "send_email_notification", ok_send)
+    worker = NotificationDeliveryWorker()
+
+    async def body(db_path: str) -> None:
+        await enqueue_notification_outbox(db_path, [_item("c1", "a")])
+        state = await get_incident_last_notification_state(db_path, central_id="c1", code="a")
+        assert state[("c1", "a")]["status"] == "queued"
+        assert state[("c1", "a")]["channel"] == "email"
+
+        await worker.deliver_due(db_path)
+        state = await get_incident_last_notification_state(db_path, central_id="c1", code="a")
+        assert state[("c1", "a")]["status"] == "sent"
+        snapshot = await worker.snapshot(db_path)
+        assert snapshot["outbox"]["pending"] == 0
+        assert snapshot["sent"] == 1
+        assert snapshot["latency_ms_p50"] is not None
+
+    try:
+        run_db(body)
+    finally:
+        worker.close()
+    assert len(sent) == 1
+
+
+def test_worker_owns_its_executor(run_db, monkeypatch) -> None:
+    threads: list[str] = []
+
+    def ok_send(text: str) -> tuple[bool, str | None, str | None]:
+        threads.append(threading.current_thread().name)
+        return True, "chat", None
+
+    monkeypatch.setattr(delivery, "send_telegram_notification", ok_send)
+    first = NotificationDeliveryWorker()
+    second = NotificationDeliveryWorker()
+
+    async def body(db_path: str) -> None:
+        assert await first.send_telegram("one") == (True, "chat", None)
+        first.close()
+        # Closing one worker leaves the other usable, and a closed worker starts a new pool.
+        assert await second.send_telegram("two") == (True, "chat", None)
+        assert await first.send_telegram("three") == (True, "chat", None)
+
+    try:
+        run_db(body)
+    finally:
+        first.close()
+        second.close()
+    assert len(threads) == 3
+    assert all(name.startswith("notify") for name in threads)
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import argparse
-import json
 import socket
 import time
 from dataclasses import dataclass
@@ -11,7 +10,8 @@ import depthai as dai
 import numpy as np
 
 from common import load_env_file, utc_now_iso
-from sqlite_store import connect, edge_next_seq, init_central_db, init_edge_db, meta_get, meta_set, store_event
+from depth_sampling import HeadDepthSampler
+from event_writer import EventWriter, exit_on_sigterm
 
 
 @dataclass
@@ -49,45 +49,6 @@ def clamp_pixel(value: float, max_value: int) -> int:
     return int(max(0, min(max_value - 1, round(value))))
 
 
-def estimate_head_shoulders_depth_m(
-    tracklet: dai.Tracklet,
-    depth_frame: np.ndarray | None,
-    head_fraction: float,
-    min_valid_px: int,
-) -> float | None:
-    if depth_frame is None or depth_frame.ndim != 2:
-        return None
-
-    frame_h, frame_w = depth_frame.shape[:2]
-    x1 = clamp_pixel(float(tracklet.roi.topLeft().x), frame_w)
-    y1 = clamp_pixel(float(tracklet.roi.topLeft().y), frame_h)
-    x2 = clamp_pixel(float(tracklet.roi.bottomRight().x), frame_w)
-    y2 = clamp_pixel(float(tracklet.roi.bottomRight().y), frame_h)
-
-    if x2 <= x1 or y2 <= y1:
-        return None
-
-    bbox_h = y2 - y1
-    head_h = max(1, int(round(bbox_h * head_fraction)))
-    y_head = min(y2, y1 + head_h)
-    if y_head <= y1:
-        return None
-
-    roi = depth_frame[y1:y_head, x1:x2]
-    if roi.size == 0:
-        return None
-
-    valid = roi[(roi >= 200) & (roi <= 10000)]
-    if valid.size < min_valid_px:
-        return None
-
-    depth_mm = float(np.median(valid))
-    if depth_mm <= 0:
-        return None
-
-    return depth_mm / 1000.0
-
-
 def transition_to_counts(prev_side: int, new_side: int, invert_direction: bool) -> tuple[int, int, str]:
     if prev_side == -1 and new_side == 1:
         in_count, out_count = (1, 0)
@@ -152,10 +113,20 @@ def build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument("--depth-max-m", type=float, default=1.50)
     parser.add_argument("--depth-head-fraction", type=float, default=0.45)
     parser.add_argument("--depth-min-valid-px", type=int, default=25)
+    parser.add_argument("--depth-sample-stride", type=int, default=1, help="Sample every Nth depth pixel in the head ROI")
+    parser.add_argument("--depth-percentile", type=float, default=50.0, help="Percentile of valid head depth (50 = median)")
     parser.set_defaults(depth_enable=True)
     parser.add_argument("--log-interval-sec", type=float, default=15.0)
     parser.add_argument("--run-seconds", type=float, default=0.0, help="0 = infinite")
     parser.add_argument("--dry-run", action="store_true", help="Do not write events into SQLite")
+    parser.add_argument("--write-max-events", type=int, default=64, help="Event writer: commit after N queued events")
+    parser.add_argument("--write-max-delay-ms", type=int, default=200, help="Event writer: commit after M ms")
+    parser.add_argument(
+        "--fsync-interval-sec",
+        type=float,
+        default=1.0,
+        help="Event writer: sync the WAL at most this often (bounds events lost on power cut)",
+    )
     return parser
 
 
@@ -222,12 +193,17 @@ def load_runtime_config(args: argparse.Namespace) -> argparse.Namespace:
     args.max_lifespan = int(env.get("CAM_COUNTER_TRACKER_LIFESPAN", str(args.max_lifespan)))
     args.occlusion_threshold = float(env.get("CAM_COUNTER_TRACKER_OCCLUSION", str(args.occlusion_threshold)))
     args.log_interval_sec = float(env.get("CAM_COUNTER_LOG_INTERVAL_SEC", str(args.log_interval_sec)))
+    args.write_max_events = int(env.get("CAM_COUNTER_WRITE_MAX_EVENTS", str(args.write_max_events)))
+    args.write_max_delay_ms = int(env.get("CAM_COUNTER_WRITE_MAX_DELAY_MS", str(args.write_max_delay_ms)))
+    args.fsync_interval_sec = float(env.get("CAM_COUNTER_FSYNC_INTERVAL_SEC", str(args.fsync_interval_sec)))
 
     args.depth_enable = parse_bool(env.get("CAM_DEPTH_ENABLE"), args.depth_enable)
     args.depth_min_m = float(env.get("CAM_DEPTH_MIN_M", str(args.depth_min_m)))
     args.depth_max_m = float(env.get("CAM_DEPTH_MAX_M", str(args.depth_max_m)))
     args.depth_head_fraction = float(env.get("CAM_DEPTH_HEAD_FRACTION", str(args.depth_head_fraction)))
     args.depth_min_valid_px = int(env.get("CAM_DEPTH_MIN_VALID_PX", str(args.depth_min_valid_px)))
+    args.depth_sample_stride = int(env.get("CAM_DEPTH_SAMPLE_STRIDE", str(args.depth_sample_stride)))
+    args.depth_percentile = float(env.get("CAM_DEPTH_PERCENTILE", str(args.depth_percentile)))
 
     if args.axis not in {"x", "y"}:
         raise ValueError(f"axis must be x|y (got {args.axis})")
@@ -243,27 +219,38 @@ def load_runtime_config(args: argparse.Namespace) -> argparse.Namespace:
         raise ValueError("depth head fraction must be in [0.2..1.0]")
     if args.depth_min_valid_px < 1:
         raise ValueError("depth min valid px must be >= 1")
+    if not (1 <= args.depth_sample_stride <= 8):
+        raise ValueError("depth sample stride must be in [1..8]")
+    if not (0.0 <= args.depth_percentile <= 100.0):
+        raise ValueError("depth percentile must be in [0..100]")
+    if not (1 <= args.write_max_events <= 1000):
+        raise ValueError("write max events must be in [1..1000]")
+    if not (0 <= args.write_max_delay_ms <= 5000):
+        raise ValueError("write max delay ms must be in [0..5000]")
+    if not (0.0 <= args.fsync_interval_sec <= 60.0):
+        raise ValueError("fsync interval sec must be in [0..60]")
 
     return args
 
 
-def next_seq(conn, key: str) -> int:
-    value = int(meta_get(conn, key, "1"))
-    meta_set(conn, key, str(value + 1))
-    return value
-
-
 def main() -> int:
     parser = build_arg_parser()
     args = parser.parse_args()
     args = load_runtime_config(args)
 
-    conn = connect(args.db)
-    seq_key = f"camera_next_seq::{args.node_id}"
-    if args.store == "central":
-        init_central_db(conn)
-    else:
-        init_edge_db(conn)
+    # Storage runs on its own thread: the tracklet loop only hands events over (seq is assigned in memory).
+    writer: EventWriter | None = None
+    if not args.dry_run:
+        writer = EventWriter(
+            args.db,
+            store=args.store,
+            node_id=args.node_id,
+            max_events=args.write_max_events,
+            max_delay_ms=args.write_max_delay_ms,
+            fsync_interval_sec=args.fsync_interval_sec,
+        )
+        writer.start()
+        exit_on_sigterm()
 
     print(
         "camera-counter config: "
@@ -271,11 +258,18 @@ def main() -> int:
         f"hyst={args.hysteresis} model={args.model} fps={args.fps} confidence={args.confidence} "
         f"tracker={args.tracker_type} depth_enable={args.depth_enable} "
         f"depth_range={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m depth_head_frac={args.depth_head_fraction:.2f} "
-        f"dry_run={args.dry_run}",
+        f"depth_stride={args.depth_sample_stride} depth_pct={args.depth_percentile:g} dry_run={args.dry_run} "
+        f"write_batch={args.write_max_events}/{args.write_max_delay_ms}ms fsync_interval={args.fsync_interval_sec:g}s",
         flush=True,
     )
 
     tracks: dict[int, TrackState] = {}
+    depth_sampler = HeadDepthSampler(
+        head_fraction=args.depth_head_fraction,
+        min_valid_px=args.depth_min_valid_px,
+        stride=args.depth_sample_stride,
+        percentile=args.depth_percentile,
+    )
     stats_msgs = 0
     stats_tracklets = 0
     stats_events = 0
@@ -285,195 +279,188 @@ def main() -> int:
     started = time.monotonic()
     last_log = started
 
-    with dai.Pipeline() as pipeline:
-        camera_node = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_A)
-        detection_network = pipeline.create(dai.node.DetectionNetwork).build(
-            camera_node,
-            dai.NNModelDescription(args.model),
-            fps=args.fps,
-        )
-        detection_network.setConfidenceThreshold(args.confidence)
-
-        tracker = pipeline.create(dai.node.ObjectTracker)
-        tracker.setDetectionLabelsToTrack([0])
-        tracker.setTrackerType(tracker_type_from_name(args.tracker_type))
-        tracker.setTrackerIdAssignmentPolicy(dai.TrackerIdAssignmentPolicy.UNIQUE_ID)
-        tracker.setTrackletBirthThreshold(args.birth_threshold)
-        tracker.setTrackletMaxLifespan(args.max_lifespan)
-        tracker.setOcclusionRatioThreshold(args.occlusion_threshold)
-
-        detection_network.out.link(tracker.inputDetections)
-        detection_network.passthrough.link(tracker.inputDetectionFrame)
-        detection_network.passthrough.link(tracker.inputTrackerFrame)
-
-        queue = tracker.out.createOutputQueue(maxSize=8, blocking=False)
-
-        depth_queue = None
-        if args.depth_enable:
-            left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
-            right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
-            stereo = pipeline.create(dai.node.StereoDepth)
-            configure_stereo(stereo)
-
-            left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
-            right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
-            depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
-
-        pipeline.start()
-        device = pipeline.getDefaultDevice()
-        print(
-            f"camera-counter device: name={device.getDeviceName()} usb_speed={device.getUsbSpeed().name}",
-            flush=True,
-        )
-
-        latest_depth_frame: np.ndarray | None = None
-
-        while pipeline.isRunning():
-            if args.run_seconds > 0 and (time.monotonic() - started) >= args.run_seconds:
-                print("camera-counter finished: run_seconds reached", flush=True)
-                break
-
-            if depth_queue is not None:
-                depth_msg = depth_queue.tryGet()
-                if depth_msg is not None:
-                    latest_depth_frame = depth_msg.getFrame()
-
-            msg = queue.tryGet()
-            now = time.monotonic()
-            if msg is None:
-                if now - last_log >= args.log_interval_sec:
-                    uptime = int(now - started)
-                    depth_info = ""
-                    if args.depth_enable:
-                        depth_info = (
-                            f" depth_pass={stats_depth_pass} depth_reject={stats_depth_reject} "
-                            f"depth_missing={stats_depth_missing}"
+    try:
+        with dai.Pipeline() as pipeline:
+            camera_node = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_A)
+            detection_network = pipeline.create(dai.node.DetectionNetwork).build(
+                camera_node,
+                dai.NNModelDescription(args.model),
+                fps=args.fps,
+            )
+            detection_network.setConfidenceThreshold(args.confidence)
+
+            tracker = pipeline.create(dai.node.ObjectTracker)
+            tracker.setDetectionLabelsToTrack([0])
+            tracker.setTrackerType(tracker_type_from_name(args.tracker_type))
+            tracker.setTrackerIdAssignmentPolicy(dai.TrackerIdAssignmentPolicy.UNIQUE_ID)
+            tracker.setTrackletBirthThreshold(args.birth_threshold)
+            tracker.setTrackletMaxLifespan(args.max_lifespan)
+            tracker.setOcclusionRatioThreshold(args.occlusion_threshold)
+
+            detection_network.out.link(tracker.inputDetections)
+            detection_network.passthrough.link(tracker.inputDetectionFrame)
+            detection_network.passthrough.link(tracker.inputTrackerFrame)
+
+            queue = tracker.out.createOutputQueue(maxSize=8, blocking=False)
+
+            depth_queue = None
+            if args.depth_enable:
+                left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
+                right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
+                stereo = pipeline.create(dai.node.StereoDepth)
+                configure_stereo(stereo)
+
+                left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
+                right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
+                depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
+
+            pipeline.start()
+            device = pipeline.getDefaultDevice()
+            print(
+                f"camera-counter device: name={device.getDeviceName()} usb_speed={device.getUsbSpeed().name}",
+                flush=True,
+            )
+
+            latest_depth_frame: np.ndarray | None = None
+
+            while pipeline.isRunning():
+                if args.run_seconds > 0 and (time.monotonic() - started) >= args.run_seconds:
+                    print("camera-counter finished: run_seconds reached", flush=True)
+                    break
+
+                if depth_queue is not None:
+                    depth_msg = depth_queue.tryGet()
+                    if depth_msg is not None:
+                        latest_depth_frame = depth_msg.getFrame()
+
+                msg = queue.tryGet()
+                now = time.monotonic()
+                if msg is None:
+                    if now - last_log >= args.log_interval_sec:
+                        uptime = int(now - started)
+                        depth_info = ""
+                        if args.depth_enable:
+                            depth_info = (
+                                f" depth_pass={stats_depth_pass} depth_reject={stats_depth_reject} "
+                                f"depth_missing={stats_depth_missing}"
+                            )
+                        if writer is not None:
+                            depth_info += f" {writer.heartbeat()}"
+                        print(
+                            f"camera-counter heartbeat: uptime={uptime}s msgs={stats_msgs} tracklets={stats_tracklets} "
+                            f"events={stats_events} active_tracks={len(tracks)}{depth_info}",
+                            flush=True,
                         )
-                    print(
-                        f"camera-counter heartbeat: uptime={uptime}s msgs={stats_msgs} tracklets={stats_tracklets} "
-                        f"events={stats_events} active_tracks={len(tracks)}{depth_info}",
-                        flush=True,
-                    )
-                    last_log = now
-                time.sleep(0.01)
-                continue
-
-            stats_msgs += 1
-            for tracklet in msg.tracklets:
-                tid = int(tracklet.id)
-                state = status_name(tracklet.status)
-
-                if tracklet.status in {dai.Tracklet.TrackingStatus.LOST, dai.Tracklet.TrackingStatus.REMOVED}:
-                    tracks.pop(tid, None)
+                        last_log = now
+                    time.sleep(0.01)
                     continue
 
-                if tracklet.status not in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}:
-                    continue
-
-                stats_tracklets += 1
-                centroid_x, centroid_y = centroid_from_tracklet(tracklet)
-                axis_value = centroid_x if args.axis == "y" else centroid_y
-                side = side_from_value(axis_value, args.line, args.hysteresis)
-
-                depth_m = None
-                depth_ok = True
+                stats_msgs += 1
+                head_depths: dict[int, float | None] = {}
                 if args.depth_enable:
-                    depth_m = estimate_head_shoulders_depth_m(
-                        tracklet,
+                    # One batched pass over the depth frame for every live tracklet of this message.
+                    head_depths = depth_sampler.sample(
                         latest_depth_frame,
-                        args.depth_head_fraction,
-                        args.depth_min_valid_px,
+                        [
+                            t
+                            for t in msg.tracklets
+                            if t.status in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}
+                        ],
                     )
-                    if depth_m is None:
-                        stats_depth_missing += 1
-                        depth_ok = False
-                    elif depth_m < args.depth_min_m or depth_m > args.depth_max_m:
-                        stats_depth_reject += 1
-                        depth_ok = False
-                    else:
-                        stats_depth_pass += 1
-
-                current = tracks.get(tid)
-
-                if not depth_ok:
-                    if current is None:
-                        tracks[tid] = TrackState(side=0, last_seen=now, depth_m=depth_m)
-                    else:
-                        current.side = 0
-                        current.last_seen = now
-                        current.depth_m = depth_m
-                    continue
+                for tracklet in msg.tracklets:
+                    tid = int(tracklet.id)
+                    state = status_name(tracklet.status)
 
-                if current is None:
-                    tracks[tid] = TrackState(side=side, last_seen=now, depth_m=depth_m)
-                    continue
+                    if tracklet.status in {dai.Tracklet.TrackingStatus.LOST, dai.Tracklet.TrackingStatus.REMOVED}:
+                        tracks.pop(tid, None)
+                        continue
 
-                previous_side = current.side
-                if side != 0:
-                    current.side = side
-                current.last_seen = now
-                current.depth_m = depth_m
+                    if tracklet.status not in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}:
+                        continue
 
-                if side == 0 or previous_side == 0 or side == previous_side:
-                    continue
+                    stats_tracklets += 1
+                    centroid_x, centroid_y = centroid_from_tracklet(tracklet)
+                    axis_value = centroid_x if args.axis == "y" else centroid_y
+                    side = side_from_value(axis_value, args.line, args.hysteresis)
 
-                if int(tracklet.age) < args.min_track_age:
-                    continue
-
-                in_count, out_count, direction = transition_to_counts(previous_side, side, args.invert_direction)
-                if in_count == 0 and out_count == 0:
-                    continue
-
-                if args.dry_run:
-                    stats_events += 1
-                    print(
-                        f"camera-counter dry-event: track_id={tid} direction={direction} in={in_count} out={out_count} "
-                        f"status={state} depth_m={depth_m if depth_m is None else round(depth_m, 3)}",
-                        flush=True,
-                    )
-                    continue
-
-                if args.store == "central":
-                    seq = next_seq(conn, seq_key)
-                else:
-                    seq = edge_next_seq(conn)
-                confidence = float(getattr(tracklet.srcImgDetection, "confidence", 0.0))
-                payload = {
-                    "schema_ver": 1,
-                    "source": "oakd-lite-v3",
-                    "node_id": args.node_id,
-                    "door_id": int(args.door_id),
-                    "seq": int(seq),
-                    "ts": utc_now_iso(),
-                    "in": int(in_count),
-                    "out": int(out_count),
-                    "confidence": confidence,
-                    "track_id": tid,
-                    "direction": direction,
-                    "axis": args.axis,
-                    "line": args.line,
-                }
-                if args.depth_enable:
-                    payload["depth_source"] = "stereo_head_shoulders"
-                    payload["depth_min_m"] = round(args.depth_min_m, 3)
-                    payload["depth_max_m"] = round(args.depth_max_m, 3)
-                    payload["depth_head_fraction"] = round(args.depth_head_fraction, 3)
-                if depth_m is not None:
-                    payload["depth_m"] = round(depth_m, 3)
-
-                stored = False
-                if args.store == "central":
-                    result = store_event(conn, payload, ts_received=utc_now_iso())
-                    stored = result.status == "stored"
-                else:
-                    raw_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
-                    conn.execute(
-                        "INSERT INTO outbox(created_at, seq, payload_json) VALUES (?, ?, ?);",
-                        (utc_now_iso(), int(seq), raw_json),
-                    )
-                    stored = True
+                    depth_m = None
+                    depth_ok = True
+                    if args.depth_enable:
+                        depth_m = head_depths.get(tid)
+                        if depth_m is None:
+                            stats_depth_missing += 1
+                            depth_ok = False
+                        elif depth_m < args.depth_min_m or depth_m > args.depth_max_m:
+                            stats_depth_reject += 1
+                            depth_ok = False
+                        else:
+                            stats_depth_pass += 1
+
+                    current = tracks.get(tid)
+
+                    if not depth_ok:
+                        if current is None:
+                            tracks[tid] = TrackState(side=0, last_seen=now, depth_m=depth_m)
+                        else:
+                            current.side = 0
+                            current.last_seen = now
+                            current.depth_m = depth_m
+                        continue
 
-                if stored:
+                    if current is None:
+                        tracks[tid] = TrackState(side=side, last_seen=now, depth_m=depth_m)
+                        continue
+
+                    previous_side = current.side
+                    if side != 0:
+                        current.side = side
+                    current.last_seen = now
+                    current.depth_m = depth_m
+
+                    if side == 0 or previous_side == 0 or side == previous_side:
+                        continue
+
+                    if int(tracklet.age) < args.min_track_age:
+                        continue
+
+                    in_count, out_count, direction = transition_to_counts(previous_side, side, args.invert_direction)
+                    if in_count == 0 and out_count == 0:
+                        continue
+
+                    if args.dry_run:
+                        stats_events += 1
+                        print(
+                            f"camera-counter dry-event: track_id={tid} direction={direction} in={in_count} out={out_count} "
+                            f"status={state} depth_m={depth_m if depth_m is None else round(depth_m, 3)}",
+                            flush=True,
+                        )
+                        continue
+
+                    confidence = float(getattr(tracklet.srcImgDetection, "confidence", 0.0))
+                    payload = {
+                        "schema_ver": 1,
+                        "source": "oakd-lite-v3",
+                        "node_id": args.node_id,
+                        "door_id": int(args.door_id),
+                        "ts": utc_now_iso(),
+                        "in": int(in_count),
+                        "out": int(out_count),
+                        "confidence": confidence,
+                        "track_id": tid,
+                        "direction": direction,
+                        "axis": args.axis,
+                        "line": args.line,
+                    }
+                    if args.depth_enable:
+                        payload["depth_source"] = "stereo_head_shoulders"
+                        payload["depth_min_m"] = round(args.depth_min_m, 3)
+                        payload["depth_max_m"] = round(args.depth_max_m, 3)
+                        payload["depth_head_fraction"] = round(args.depth_head_fraction, 3)
+                    if depth_m is not None:
+                        payload["depth_m"] = round(depth_m, 3)
+
+                    assert writer is not None
+                    seq = writer.submit(payload)
                     stats_events += 1
                     print(
                         f"camera-counter event: seq={seq} track_id={tid} direction={direction} in={in_count} out={out_count} "
@@ -481,26 +468,29 @@ def main() -> int:
                         flush=True,
                     )
 
-            expired = [tid for tid, st in tracks.items() if now - st.last_seen > args.prune_sec]
-            for tid in expired:
-                tracks.pop(tid, None)
+                expired = [tid for tid, st in tracks.items() if now - st.last_seen > args.prune_sec]
+                for tid in expired:
+                    tracks.pop(tid, None)
 
-            if now - last_log >= args.log_interval_sec:
-                uptime = int(now - started)
-                depth_info = ""
-                if args.depth_enable:
-                    depth_info = (
-                        f" depth_pass={stats_depth_pass} depth_reject={stats_depth_reject} "
-                        f"depth_missing={stats_depth_missing}"
+                if now - last_log >= args.log_interval_sec:
+                    uptime = int(now - started)
+                    depth_info = ""
+                    if args.depth_enable:
+                        depth_info = (
+                            f" depth_pass={stats_depth_pass} depth_reject={stats_depth_reject} "
+                            f"depth_missing={stats_depth_missing}"
+                        )
+                    if writer is not None:
+                        depth_info += f" {writer.heartbeat()}"
+                    print(
+                        f"camera-counter heartbeat: uptime={uptime}s msgs={stats_msgs} tracklets={stats_tracklets} "
+                        f"events={stats_events} active_tracks={len(tracks)}{depth_info}",
+                        flush=True,
                     )
-                print(
-                    f"camera-counter heartbeat: uptime={uptime}s msgs={stats_msgs} tracklets={stats_tracklets} "
-                    f"events={stats_events} active_tracks={len(tracks)}{depth_info}",
-                    flush=True,
-                )
-                last_log = now
-
-    conn.close()
+                    last_log = now
+    finally:
+        if writer is not None:
+            writer.close()
     return 0
 
 
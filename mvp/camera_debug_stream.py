@@ -15,13 +15,14 @@ import depthai as dai
 import numpy as np
 
 from common import load_env_file, utc_now_iso
+from depth_sampling import HeadDepthSampler
+from frame_broadcast import FrameBroadcaster, stream_mjpeg
 
 
 @dataclass
 class SharedState:
     lock: threading.Lock
-    jpg: bytes
-    last_frame_ts: float
+    broadcast: FrameBroadcaster
     stats: dict[str, Any]
 
 
@@ -47,45 +48,6 @@ def clamp_pixel(value: float, max_value: int) -> int:
     return int(max(0, min(max_value - 1, round(value))))
 
 
-def estimate_head_shoulders_depth_m(
-    tracklet: dai.Tracklet,
-    depth_frame: np.ndarray | None,
-    head_fraction: float,
-    min_valid_px: int,
-) -> float | None:
-    if depth_frame is None or depth_frame.ndim != 2:
-        return None
-
-    frame_h, frame_w = depth_frame.shape[:2]
-    x1 = clamp_pixel(float(tracklet.roi.topLeft().x), frame_w)
-    y1 = clamp_pixel(float(tracklet.roi.topLeft().y), frame_h)
-    x2 = clamp_pixel(float(tracklet.roi.bottomRight().x), frame_w)
-    y2 = clamp_pixel(float(tracklet.roi.bottomRight().y), frame_h)
-
-    if x2 <= x1 or y2 <= y1:
-        return None
-
-    bbox_h = y2 - y1
-    head_h = max(1, int(round(bbox_h * head_fraction)))
-    y_head = min(y2, y1 + head_h)
-    if y_head <= y1:
-        return None
-
-    roi = depth_frame[y1:y_head, x1:x2]
-    if roi.size == 0:
-        return None
-
-    valid = roi[(roi >= 200) & (roi <= 10000)]
-    if valid.size < min_valid_px:
-        return None
-
-    depth_mm = float(np.median(valid))
-    if depth_mm <= 0:
-        return None
-
-    return depth_mm / 1000.0
-
-
 def configure_stereo(stereo: dai.node.StereoDepth) -> None:
     if hasattr(stereo, "setDefaultProfilePreset"):
         try:
@@ -208,6 +170,8 @@ class Handler(BaseHTTPRequestHandler):
         state = self._state()
         with state.lock:
             payload = dict(state.stats)
+        payload["preview_frames"] = state.broadcast.published
+        payload["preview_viewers"] = state.broadcast.viewers()
         payload["ts"] = utc_now_iso()
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         self.send_response(HTTPStatus.OK)
@@ -218,8 +182,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def _send_snapshot(self) -> None:
         state = self._state()
-        with state.lock:
-            jpg = state.jpg
+        jpg = state.broadcast.snapshot()
         if not jpg:
             self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "no frame yet")
             return
@@ -240,20 +203,8 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
 
         state = self._state()
-        last_sent_ts = 0.0
         try:
-            while True:
-                with state.lock:
-                    jpg = state.jpg
-                    frame_ts = state.last_frame_ts
-                if jpg and frame_ts != last_sent_ts:
-                    self.wfile.write(b"--" + boundary + b"\r\n")
-                    self.wfile.write(b"Content-Type: image/jpeg\r\n")
-                    self.wfile.write(f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii"))
-                    self.wfile.write(jpg)
-                    self.wfile.write(b"\r\n")
-                    last_sent_ts = frame_ts
-                time.sleep(0.03)
+            stream_mjpeg(self.wfile, state.broadcast, boundary=boundary)
         except (BrokenPipeError, ConnectionResetError):
             return
 
@@ -280,6 +231,8 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--depth-max-m", type=float, default=1.50)
     parser.add_argument("--depth-head-fraction", type=float, default=0.45)
     parser.add_argument("--depth-min-valid-px", type=int, default=25)
+    parser.add_argument("--depth-sample-stride", type=int, default=1, help="Sample every Nth depth pixel in the head ROI")
+    parser.add_argument("--depth-percentile", type=float, default=50.0, help="Percentile of valid head depth (50 = median)")
     parser.set_defaults(depth_enable=True)
     parser.add_argument("--jpeg-quality", type=int, default=85)
     parser.add_argument("--log-interval-sec", type=float, default=10.0)
@@ -301,6 +254,13 @@ def load_runtime(args: argparse.Namespace) -> argparse.Namespace:
     args.depth_max_m = float(env.get("CAM_DEPTH_MAX_M", str(args.depth_max_m)))
     args.depth_head_fraction = float(env.get("CAM_DEPTH_HEAD_FRACTION", str(args.depth_head_fraction)))
     args.depth_min_valid_px = int(env.get("CAM_DEPTH_MIN_VALID_PX", str(args.depth_min_valid_px)))
+    args.depth_sample_stride = int(env.get("CAM_DEPTH_SAMPLE_STRIDE", str(args.depth_sample_stride)))
+    args.depth_percentile = float(env.get("CAM_DEPTH_PERCENTILE", str(args.depth_percentile)))
+    # Same bounds as camera_counter / transport_strict: they read the same env file.
+    if not (1 <= args.depth_sample_stride <= 8):
+        raise ValueError("depth sample stride must be in [1..8]")
+    if not (0.0 <= args.depth_percentile <= 100.0):
+        raise ValueError("depth percentile must be in [0..100]")
 
     args.debug_bind = env.get("CAM_DEBUG_BIND", args.bind)
     args.debug_port = int(env.get("CAM_DEBUG_PORT", str(args.port)))
@@ -315,8 +275,7 @@ def main() -> int:
 
     shared = SharedState(
         lock=threading.Lock(),
-        jpg=b"",
-        last_frame_ts=0.0,
+        broadcast=FrameBroadcaster(),
         stats={
             "status": "starting",
             "device": "",
@@ -403,6 +362,12 @@ def main() -> int:
 
         last_tracklets: list[dai.Tracklet] = []
         latest_depth_frame: np.ndarray | None = None
+        depth_sampler = HeadDepthSampler(
+            head_fraction=args.depth_head_fraction,
+            min_valid_px=args.depth_min_valid_px,
+            stride=args.depth_sample_stride,
+            percentile=args.depth_percentile,
+        )
         t0 = time.monotonic()
         last_log = t0
         frames = 0
@@ -448,11 +413,13 @@ def main() -> int:
 
                 frame = frame_msg.getCvFrame()
                 height, width = frame.shape[:2]
+                # Depth gating still runs every frame; drawing/encoding only while someone is watching.
+                draw = shared.broadcast.has_viewers()
 
-                if args.line_axis == "y":
+                if draw and args.line_axis == "y":
                     line_x = clamp_pixel(args.line_pos, width)
                     cv2.line(frame, (line_x, 0), (line_x, height - 1), (0, 255, 255), 2)
-                else:
+                elif draw:
                     line_y = clamp_pixel(args.line_pos, height)
                     cv2.line(frame, (0, line_y), (width - 1, line_y), (0, 255, 255), 2)
 
@@ -460,6 +427,17 @@ def main() -> int:
                 depth_reject_frame = 0
                 depth_missing_frame = 0
 
+                head_depths: dict[int, float | None] = {}
+                if args.depth_enable:
+                    head_depths = depth_sampler.sample(
+                        latest_depth_frame,
+                        [
+                            t
+                            for t in last_tracklets
+                            if t.status in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}
+                        ],
+                    )
+
                 for tracklet in last_tracklets:
                     if tracklet.status not in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}:
                         continue
@@ -467,12 +445,7 @@ def main() -> int:
                     depth_m = None
                     depth_ok = True
                     if args.depth_enable:
-                        depth_m = estimate_head_shoulders_depth_m(
-                            tracklet,
-                            latest_depth_frame,
-                            args.depth_head_fraction,
-                            args.depth_min_valid_px,
-                        )
+                        depth_m = head_depths.get(int(tracklet.id))
                         if depth_m is None:
                             depth_ok = False
                             depth_missing_frame += 1
@@ -487,6 +460,8 @@ def main() -> int:
                     x2 = clamp_pixel(tracklet.roi.bottomRight().x, width)
                     y2 = clamp_pixel(tracklet.roi.bottomRight().y, height)
 
+                    if not draw:
+                        continue
                     if args.depth_enable:
                         color = (0, 200, 0) if depth_ok else (0, 80, 255)
                     else:
@@ -514,33 +489,30 @@ def main() -> int:
                         shared.stats["depth_reject"] = int(shared.stats["depth_reject"]) + depth_reject_frame
                         shared.stats["depth_missing"] = int(shared.stats["depth_missing"]) + depth_missing_frame
 
-                overlay = f"model={args.model} fps={args.fps:.1f} tracklets={len(last_tracklets)}"
-                if args.depth_enable:
-                    overlay += f" depth={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m"
-
-                cv2.putText(
-                    frame,
-                    overlay,
-                    (10, 20),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.55,
-                    (255, 255, 255),
-                    1,
-                )
-
-                ok, encoded = cv2.imencode(
-                    ".jpg",
-                    frame,
-                    [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
-                )
-                if not ok:
-                    continue
-
                 now = time.monotonic()
                 frames += 1
-                with shared.lock:
-                    shared.jpg = encoded.tobytes()
-                    shared.last_frame_ts = now
+                if draw:
+                    overlay = f"model={args.model} fps={args.fps:.1f} tracklets={len(last_tracklets)}"
+                    if args.depth_enable:
+                        overlay += f" depth={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m"
+
+                    cv2.putText(
+                        frame,
+                        overlay,
+                        (10, 20),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.55,
+                        (255, 255, 255),
+                        1,
+                    )
+
+                    ok, encoded = cv2.imencode(
+                        ".jpg",
+                        frame,
+                        [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
+                    )
+                    if ok:
+                        shared.broadcast.publish(encoded.tobytes(), now)
 
                 if now - last_log >= args.log_interval_sec:
                     with shared.lock:
@@ -558,6 +530,7 @@ def main() -> int:
         finally:
             with shared.lock:
                 shared.stats["status"] = "stopping"
+            shared.broadcast.close()
             httpd.shutdown()
             httpd.server_close()
 
@@ -15,14 +15,18 @@ import cv2
 import depthai as dai
 import numpy as np
 
+from camera_replay import STREAM_DEPTH, Recorder, ReplaySource
 from common import load_env_file, utc_now_iso
+from event_writer import add_event_writer_args, counter_event, event_writer_from_args, load_event_writer_env
+from frame_broadcast import FrameBroadcaster, stream_mjpeg
+from stage_timers import StageTimers, device_age_ms
+from track_match import match_tracks, predict_offsets, smooth_velocity
 
 
 @dataclass
 class SharedState:
     lock: threading.Lock
-    jpg: bytes
-    last_frame_ts: float
+    broadcast: FrameBroadcaster
     stats: dict[str, Any]
 
 
@@ -49,6 +53,8 @@ class TrackState:
     seen_middle: bool
     entered_middle_ts: float | None
     last_event_ts: float
+    vx: float = 0.0
+    vy: float = 0.0
 
 
 def parse_bool(value: str | None, default: bool = False) -> bool:
@@ -124,37 +130,29 @@ def transition_to_counts(start_side: int, end_side: int, invert_direction: bool)
     return in_count, out_count, direction
 
 
-def distance_px(a: tuple[float, float], b: tuple[float, float]) -> float:
-    dx = a[0] - b[0]
-    dy = a[1] - b[1]
-    return float((dx * dx + dy * dy) ** 0.5)
-
-
 def assign_detections(
     tracks: dict[int, TrackState],
     detections: list[Detection],
     max_match_distance_px: float,
+    *,
+    now: float,
+    predict_velocity: bool = False,
 ) -> tuple[dict[int, int], set[int], set[int]]:
-    pairs: list[tuple[float, int, int]] = []
-    for track_id, track in tracks.items():
-        for det_index, detection in enumerate(detections):
-            dist = distance_px((track.cx, track.cy), (detection.cx, detection.cy))
-            if dist <= max_match_distance_px:
-                pairs.append((dist, track_id, det_index))
-
-    pairs.sort(key=lambda row: row[0])
-    matched_track_to_det: dict[int, int] = {}
-    used_tracks: set[int] = set()
-    used_detections: set[int] = set()
-    for _, track_id, det_index in pairs:
-        if track_id in used_tracks or det_index in used_detections:
-            continue
-        matched_track_to_det[track_id] = det_index
-        used_tracks.add(track_id)
-        used_detections.add(det_index)
-
-    unmatched_tracks = set(tracks.keys()) - used_tracks
-    unmatched_detections = set(range(len(detections))) - used_detections
+    track_ids = list(tracks.keys())
+    track_centers = np.array([(tracks[tid].cx, tracks[tid].cy) for tid in track_ids], dtype=np.float64).reshape(-1, 2)
+    if predict_velocity and track_ids:
+        track_centers = track_centers + predict_offsets(
+            np.array([(tracks[tid].vx, tracks[tid].vy) for tid in track_ids], dtype=np.float64),
+            np.array([now - tracks[tid].last_seen for tid in track_ids], dtype=np.float64),
+        )
+    det_centers = np.array([(d.cx, d.cy) for d in detections], dtype=np.float64).reshape(-1, 2)
+    matched_rows, unmatched_rows, unmatched_detections = match_tracks(
+        track_centers,
+        det_centers,
+        max_distance=max_match_distance_px,
+    )
+    matched_track_to_det = {track_ids[row]: det_index for row, det_index in matched_rows.items()}
+    unmatched_tracks = {track_ids[row] for row in unmatched_rows}
     return matched_track_to_det, unmatched_tracks, unmatched_detections
 
 
@@ -220,72 +218,93 @@ def split_components(
     roi_mask: np.ndarray,
     watershed_enabled: bool,
     watershed_distance_ratio: float,
-) -> np.ndarray:
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns (labels, stats) straight from cv2.connectedComponentsWithStats; row 0 is background."""
     if roi_mask.size == 0:
-        return np.zeros((1, 1), dtype=np.int32)
+        return np.zeros((1, 1), dtype=np.int32), np.zeros((1, 5), dtype=np.int32)
     if not watershed_enabled:
-        labels_count, labels, _, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
-        if labels_count <= 1:
-            return labels
-        return labels
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
+        return labels, stats
 
     distance = cv2.distanceTransform(roi_mask, cv2.DIST_L2, 5)
     max_distance = float(np.max(distance)) if distance.size else 0.0
     if max_distance <= 0.0:
-        _, labels, _, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
-        return labels
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
+        return labels, stats
 
     threshold_ratio = clamp_norm(watershed_distance_ratio, 0.10, 0.90)
     _, sure_fg = cv2.threshold(distance, threshold_ratio * max_distance, 255, 0)
     sure_fg_u8 = np.uint8(sure_fg)
-    labels_count, labels, _, _ = cv2.connectedComponentsWithStats(sure_fg_u8, connectivity=8)
+    labels_count, labels, stats, _ = cv2.connectedComponentsWithStats(sure_fg_u8, connectivity=8)
     if labels_count <= 1:
-        _, labels, _, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
-    return labels
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(roi_mask, connectivity=8)
+    return labels, stats
+
+
+def label_depth_medians(
+    roi_depth: np.ndarray,
+    labels_roi: np.ndarray,
+    labels_count: int,
+    depth_min_mm: int,
+    depth_max_mm: int,
+) -> np.ndarray:
+    """Median depth (mm) of the in-range pixels of every label; NaN where a label has none.
+
+    One sort of (label << 16 | depth) keys groups pixels by label with depths ascending, so every
+    median is read at a fixed offset inside its label's run instead of masking the ROI per label.
+    """
+    medians = np.full(labels_count, np.nan, dtype=np.float64)
+    labels_flat = labels_roi.reshape(-1)
+    depth_flat = roi_depth.reshape(-1)
+    selected = (labels_flat > 0) & (depth_flat >= depth_min_mm) & (depth_flat <= depth_max_mm)
+    if not np.any(selected):
+        return medians
+    keys = np.sort((labels_flat[selected].astype(np.int64) << 16) | depth_flat[selected].astype(np.int64))
+    counts = np.bincount(keys >> 16, minlength=labels_count)
+    present = np.flatnonzero(counts)
+    starts = np.cumsum(counts) - counts
+    depths = keys & 0xFFFF
+    low = depths[starts[present] + (counts[present] - 1) // 2]
+    high = depths[starts[present] + counts[present] // 2]
+    medians[present] = (low + high) / 2.0
+    return medians
 
 
 def extract_detections(
     depth_frame: np.ndarray,
     roi: tuple[int, int, int, int],
     labels_roi: np.ndarray,
+    stats: np.ndarray,
     depth_min_mm: int,
     depth_max_mm: int,
     area_min: float,
 ) -> list[Detection]:
-    x1, y1, _, _ = roi
+    x1, y1, x2, y2 = roi
+    labels_count = int(stats.shape[0])
+    if labels_count <= 1:
+        return []
+    # Label 0 is background; area is the component pixel count.
+    kept = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= area_min) + 1
+    if kept.size == 0:
+        return []
+    medians_mm = label_depth_medians(depth_frame[y1:y2, x1:x2], labels_roi, labels_count, depth_min_mm, depth_max_mm)
+
     detections: list[Detection] = []
-    label_ids = np.unique(labels_roi)
-    for label_id in label_ids:
-        if int(label_id) <= 0:
-            continue
-        label_mask = (labels_roi == label_id).astype(np.uint8) * 255
-        contours, _ = cv2.findContours(label_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if not contours:
-            continue
-        contour = max(contours, key=cv2.contourArea)
-        area = float(cv2.contourArea(contour))
-        if area < area_min:
-            continue
-        bx, by, bw, bh = cv2.boundingRect(contour)
+    for label_id in kept.tolist():
+        bx, by, bw, bh, area = (int(v) for v in stats[label_id])
         abs_x = int(x1 + bx)
         abs_y = int(y1 + by)
-        center_x = float(abs_x + bw / 2.0)
-        center_y = float(abs_y + bh / 2.0)
-
-        roi_depth = depth_frame[abs_y : abs_y + bh, abs_x : abs_x + bw]
-        valid_depth = roi_depth[(roi_depth >= depth_min_mm) & (roi_depth <= depth_max_mm)]
-        depth_m = float(np.median(valid_depth)) / 1000.0 if valid_depth.size > 0 else None
-
+        median_mm = float(medians_mm[label_id])
         detections.append(
             Detection(
-                cx=center_x,
-                cy=center_y,
+                cx=float(abs_x + bw / 2.0),
+                cy=float(abs_y + bh / 2.0),
                 x=abs_x,
                 y=abs_y,
-                w=int(bw),
-                h=int(bh),
-                area=area,
-                depth_m=depth_m,
+                w=bw,
+                h=bh,
+                area=float(area),
+                depth_m=None if np.isnan(median_mm) else median_mm / 1000.0,
             )
         )
     return detections
@@ -476,6 +495,8 @@ class Handler(BaseHTTPRequestHandler):
         state = self._state()
         with state.lock:
             payload = dict(state.stats)
+        payload["preview_frames"] = state.broadcast.published
+        payload["preview_viewers"] = state.broadcast.viewers()
         payload["ts"] = utc_now_iso()
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         self.send_response(HTTPStatus.OK)
@@ -486,8 +507,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def _send_snapshot(self) -> None:
         state = self._state()
-        with state.lock:
-            jpg = state.jpg
+        jpg = state.broadcast.snapshot()
         if not jpg:
             self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "no frame yet")
             return
@@ -511,20 +531,8 @@ class Handler(BaseHTTPRequestHandler):
         self.send_header("Pragma", "no-cache")
         self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={boundary.decode()}")
         self.end_headers()
-        last_sent_ts = 0.0
         try:
-            while True:
-                with state.lock:
-                    jpg = state.jpg
-                    frame_ts = state.last_frame_ts
-                if jpg and frame_ts != last_sent_ts:
-                    self.wfile.write(b"--" + boundary + b"\r\n")
-                    self.wfile.write(b"Content-Type: image/jpeg\r\n")
-                    self.wfile.write(f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii"))
-                    self.wfile.write(jpg)
-                    self.wfile.write(b"\r\n")
-                    last_sent_ts = frame_ts
-                time.sleep(0.03)
+            stream_mjpeg(self.wfile, state.broadcast, boundary=boundary)
         except (BrokenPipeError, ConnectionResetError):
             return
 
@@ -544,6 +552,11 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--kernel-size", type=int, default=7)
     parser.add_argument("--max-objects", type=int, default=20)
     parser.add_argument("--max-match-dist-px", type=float, default=40.0)
+    parser.add_argument(
+        "--predict-velocity",
+        action="store_true",
+        help="Shift tracks by their constant-velocity estimate before matching (fewer lost fast tracks).",
+    )
     parser.add_argument("--min-track-age", type=int, default=3)
     parser.add_argument("--max-lost-frames", type=int, default=6)
     parser.add_argument("--hang-timeout-sec", type=float, default=3.0)
@@ -559,6 +572,12 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--output-size", default="320x200")
     parser.add_argument("--jpeg-quality", type=int, default=58)
     parser.add_argument("--log-interval-sec", type=float, default=10.0)
+    parser.add_argument("--record", default="", help="Record depth queue messages to this file (see camera_replay.py).")
+    parser.add_argument("--record-max-mb", type=int, default=512, help="Stop recording once the file reaches this size.")
+    parser.add_argument("--replay", default="", help="Run the counting loop on a recording instead of the camera.")
+    parser.add_argument("--replay-realtime", action="store_true", help="Replay at the recorded pace (default: as fast as possible).")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Pace multiplier for --replay-realtime.")
+    add_event_writer_args(parser)
     return parser
 
 
@@ -577,6 +596,10 @@ def load_runtime(args: argparse.Namespace) -> argparse.Namespace:
     args.kernel_size = int(env.get("CAM_DEPTH_MULTI_KERNEL_SIZE", env.get("CAM_DEPTH_COUNT_KERNEL_SIZE", str(args.kernel_size))))
     args.max_objects = int(env.get("CAM_DEPTH_MULTI_MAX_OBJECTS", str(args.max_objects)))
     args.max_match_dist_px = float(env.get("CAM_DEPTH_MULTI_MATCH_DIST_PX", str(args.max_match_dist_px)))
+    args.predict_velocity = parse_bool(env.get("CAM_DEPTH_MULTI_PREDICT_VELOCITY"), args.predict_velocity)
+    args.record = env.get("CAM_DEPTH_MULTI_RECORD", args.record).strip()
+    args.record_max_mb = int(env.get("CAM_DEPTH_MULTI_RECORD_MAX_MB", str(args.record_max_mb)))
+    load_event_writer_env(args, env, prefix="CAM_DEPTH_MULTI")
     args.min_track_age = int(
         env.get("CAM_DEPTH_MULTI_MIN_TRACK_AGE", env.get("CAM_DEPTH_COUNT_MIN_TRACK_AGE", str(args.min_track_age)))
     )
@@ -649,6 +672,19 @@ def main() -> int:
 
     preview_w, preview_h = parse_size(args.preview_size)
     output_w, output_h = parse_size(args.output_size)
+    replay: ReplaySource | None = None
+    if args.replay:
+        # Offline run: recorded depth frames replace the device, the loop clock follows the recording.
+        replay = ReplaySource(
+            args.replay,
+            streams={STREAM_DEPTH},
+            realtime=args.replay_realtime,
+            speed=args.replay_speed,
+        )
+        if not replay.has_stream(STREAM_DEPTH):
+            raise SystemExit(f"{args.replay}: no depth stream (recorded: {replay.meta.get('streams')})")
+    clock = replay.monotonic if replay is not None else time.monotonic
+    writer = event_writer_from_args(args, label="depth-height-multi") if replay is None else None
 
     half_gap = args.line_gap_norm / 2.0
     line_a = clamp_norm(args.axis_pos - half_gap, 0.02, 0.98)
@@ -658,8 +694,7 @@ def main() -> int:
 
     shared = SharedState(
         lock=threading.Lock(),
-        jpg=b"",
-        last_frame_ts=0.0,
+        broadcast=FrameBroadcaster(),
         stats={
             "status": "starting",
             "device": "",
@@ -681,6 +716,7 @@ def main() -> int:
             "min_track_age": args.min_track_age,
             "max_lost_frames": args.max_lost_frames,
             "max_match_dist_px": args.max_match_dist_px,
+            "predict_velocity": bool(args.predict_velocity),
             "count_cooldown_sec": args.count_cooldown_sec,
             "per_track_rearm_sec": args.per_track_rearm_sec,
             "hang_timeout_sec": args.hang_timeout_sec,
@@ -720,17 +756,37 @@ def main() -> int:
         flush=True,
     )
 
-    with dai.Pipeline() as pipeline:
-        left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
-        right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
-        stereo = pipeline.create(dai.node.StereoDepth)
-        configure_stereo(stereo, output_size=(output_w, output_h))
-        left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
-        right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
-        depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
+    with (replay if replay is not None else dai.Pipeline()) as pipeline:
+        if replay is not None:
+            depth_queue = replay.queue(STREAM_DEPTH)
+        else:
+            left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
+            right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
+            stereo = pipeline.create(dai.node.StereoDepth)
+            configure_stereo(stereo, output_size=(output_w, output_h))
+            left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
+            right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
+            depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
 
         pipeline.start()
         device = pipeline.getDefaultDevice()
+        recorder: Recorder | None = None
+        if args.record and replay is None:
+            recorder = Recorder(
+                args.record,
+                {
+                    "script": "depth-height-multi",
+                    "created_at": utc_now_iso(),
+                    "device": device.getDeviceName(),
+                    "usb_speed": device.getUsbSpeed().name,
+                    "depth_output_size": [output_w, output_h],
+                    "streams": [STREAM_DEPTH],
+                    "args": {k: v for k, v in vars(args).items() if v is None or isinstance(v, (str, int, float, bool))},
+                },
+                max_bytes=int(args.record_max_mb) * 1024 * 1024,
+            )
+            depth_queue = recorder.wrap(depth_queue, STREAM_DEPTH)
+            print(f"depth-height-multi: recording depth to {args.record}", flush=True)
         with shared.lock:
             shared.stats["status"] = "running"
             shared.stats["device"] = device.getDeviceName()
@@ -754,294 +810,364 @@ def main() -> int:
         lost_timeout_sec = args.max_lost_frames / max(1.0, args.fps)
         last_global_event_ts = 0.0
         last_preview_ts = 0.0
-        last_log_ts = time.monotonic()
+        last_log_ts = clock()
+        last_latency_ts = 0.0
+        timers = StageTimers()
 
-        while pipeline.isRunning():
-            depth_msg = depth_queue.tryGet()
-            if depth_msg is None:
-                now_sleep = time.monotonic()
-                if now_sleep - last_log_ts >= args.log_interval_sec:
-                    with shared.lock:
-                        messages = int(shared.stats.get("messages", 0))
-                        detections = int(shared.stats.get("detections", 0))
-                        active_tracks = int(shared.stats.get("active_tracks", 0))
-                        depth_pass = int(shared.stats.get("depth_pass", 0))
-                        depth_reject = int(shared.stats.get("depth_reject", 0))
-                    print(
-                        f"depth-height-multi heartbeat: messages={messages} detections={detections} "
-                        f"active={active_tracks} in={count_in} out={count_out} events={events_total} "
-                        f"depth_pass={depth_pass} depth_reject={depth_reject}",
-                        flush=True,
-                    )
-                    last_log_ts = now_sleep
-                time.sleep(0.01)
-                continue
-
-            now = time.monotonic()
-            depth_frame = depth_msg.getFrame()
-            if depth_frame is None or depth_frame.size == 0:
-                continue
-
-            with shared.lock:
-                shared.stats["messages"] = int(shared.stats["messages"]) + 1
-
-            height, width = depth_frame.shape[:2]
-            roi = parse_roi(args.roi, width, height)
-            _, roi_mask = build_mask(
-                depth_frame=depth_frame,
-                roi=roi,
-                depth_min_mm=depth_min_mm,
-                depth_max_mm=depth_max_mm,
-                kernel_size=args.kernel_size,
-            )
-            labels_roi = split_components(
-                roi_mask=roi_mask,
-                watershed_enabled=args.watershed_enable,
-                watershed_distance_ratio=args.watershed_dist_ratio,
-            )
-            detections = extract_detections(
-                depth_frame=depth_frame,
-                roi=roi,
-                labels_roi=labels_roi,
-                depth_min_mm=depth_min_mm,
-                depth_max_mm=depth_max_mm,
-                area_min=args.area_min,
-            )
-            candidate_components = max(0, int(np.max(labels_roi)) if labels_roi.size else 0)
-
-            with shared.lock:
-                shared.stats["detections"] = int(shared.stats["detections"]) + len(detections)
-
-            matched, unmatched_tracks, unmatched_detections = assign_detections(
-                tracks=tracks,
-                detections=detections,
-                max_match_distance_px=args.max_match_dist_px,
-            )
-
-            for track_id in list(unmatched_tracks):
-                track_state = tracks.get(track_id)
-                if track_state is None:
+        try:
+            while pipeline.isRunning():
+                timers.begin()
+                depth_msg = depth_queue.tryGet()
+                if depth_msg is None:
+                    now_sleep = clock()
+                    if now_sleep - last_log_ts >= args.log_interval_sec:
+                        with shared.lock:
+                            messages = int(shared.stats.get("messages", 0))
+                            detections = int(shared.stats.get("detections", 0))
+                            active_tracks = int(shared.stats.get("active_tracks", 0))
+                            depth_pass = int(shared.stats.get("depth_pass", 0))
+                            depth_reject = int(shared.stats.get("depth_reject", 0))
+                        print(
+                            f"depth-height-multi heartbeat: messages={messages} detections={detections} "
+                            f"active={active_tracks} in={count_in} out={count_out} events={events_total} "
+                            f"depth_pass={depth_pass} depth_reject={depth_reject}",
+                            flush=True,
+                        )
+                        last_log_ts = now_sleep
+                    time.sleep(0.01)
                     continue
-                if now - track_state.last_seen > lost_timeout_sec:
-                    tracks.pop(track_id, None)
-                    with shared.lock:
-                        shared.stats["lost_prune"] = int(shared.stats["lost_prune"]) + 1
 
-            for track_id, det_index in matched.items():
-                track_state = tracks.get(track_id)
-                if track_state is None:
+                now = clock()
+                depth_frame = depth_msg.getFrame()
+                if depth_frame is None or depth_frame.size == 0:
                     continue
-                detection = detections[det_index]
-                track_state.cx = detection.cx
-                track_state.cy = detection.cy
-                track_state.last_seen = now
-                track_state.age += 1
-
-            for det_index in unmatched_detections:
-                if len(tracks) >= args.max_objects:
-                    continue
-                detection = detections[det_index]
-                track_id = next_track_id
-                next_track_id += 1
-                tracks[track_id] = TrackState(
-                    track_id=track_id,
-                    cx=detection.cx,
-                    cy=detection.cy,
-                    age=1,
-                    last_seen=now,
-                    side_start=None,
-                    seen_middle=False,
-                    entered_middle_ts=None,
-                    last_event_ts=0.0,
-                )
-                matched[track_id] = det_index
+                timers.lap("get")
+                age_ms = device_age_ms(depth_msg)
+                if age_ms is not None:
+                    timers.add("device_age", age_ms)
 
-            for track_id, det_index in matched.items():
-                track_state = tracks.get(track_id)
-                if track_state is None:
-                    continue
-                detection = detections[det_index]
-                axis_norm = (detection.cx / float(width)) if args.axis == "y" else (detection.cy / float(height))
-                zone = classify_zone(axis_norm, line_a, line_b, args.axis_hyst)
-                if zone == -1:
-                    with shared.lock:
-                        shared.stats["zone_neg_hits"] = int(shared.stats["zone_neg_hits"]) + 1
-                elif zone == 0:
-                    with shared.lock:
-                        shared.stats["zone_mid_hits"] = int(shared.stats["zone_mid_hits"]) + 1
-                else:
-                    with shared.lock:
-                        shared.stats["zone_pos_hits"] = int(shared.stats["zone_pos_hits"]) + 1
+                with shared.lock:
+                    shared.stats["messages"] = int(shared.stats["messages"]) + 1
+
+                height, width = depth_frame.shape[:2]
+                roi = parse_roi(args.roi, width, height)
+                _, roi_mask = build_mask(
+                    depth_frame=depth_frame,
+                    roi=roi,
+                    depth_min_mm=depth_min_mm,
+                    depth_max_mm=depth_max_mm,
+                    kernel_size=args.kernel_size,
+                )
+                timers.lap("mask")
+                labels_roi, component_stats = split_components(
+                    roi_mask=roi_mask,
+                    watershed_enabled=args.watershed_enable,
+                    watershed_distance_ratio=args.watershed_dist_ratio,
+                )
+                timers.lap("components")
+                detections = extract_detections(
+                    depth_frame=depth_frame,
+                    roi=roi,
+                    labels_roi=labels_roi,
+                    stats=component_stats,
+                    depth_min_mm=depth_min_mm,
+                    depth_max_mm=depth_max_mm,
+                    area_min=args.area_min,
+                )
+                candidate_components = max(0, int(component_stats.shape[0]) - 1)
+                timers.lap("blobs")
 
-                if track_state.side_start is None and zone != 0:
-                    track_state.side_start = zone
+                with shared.lock:
+                    shared.stats["detections"] = int(shared.stats["detections"]) + len(detections)
+
+                matched, unmatched_tracks, unmatched_detections = assign_detections(
+                    tracks=tracks,
+                    detections=detections,
+                    max_match_distance_px=args.max_match_dist_px,
+                    now=now,
+                    predict_velocity=args.predict_velocity,
+                )
 
-                if zone == 0:
-                    if not track_state.seen_middle:
-                        track_state.seen_middle = True
-                        track_state.entered_middle_ts = now
+                for track_id in list(unmatched_tracks):
+                    track_state = tracks.get(track_id)
+                    if track_state is None:
+                        continue
+                    if now - track_state.last_seen > lost_timeout_sec:
+                        tracks.pop(track_id, None)
                         with shared.lock:
-                            shared.stats["middle_entries"] = int(shared.stats["middle_entries"]) + 1
-                elif (
-                    track_state.seen_middle
-                    and track_state.entered_middle_ts is not None
-                    and (now - track_state.entered_middle_ts) > args.hang_timeout_sec
-                ):
-                    track_state.side_start = None
-                    track_state.seen_middle = False
-                    track_state.entered_middle_ts = None
-                    with shared.lock:
-                        shared.stats["hang_reject"] = int(shared.stats["hang_reject"]) + 1
+                            shared.stats["lost_prune"] = int(shared.stats["lost_prune"]) + 1
+
+                for track_id, det_index in matched.items():
+                    track_state = tracks.get(track_id)
+                    if track_state is None:
+                        continue
+                    detection = detections[det_index]
+                    track_state.vx, track_state.vy = smooth_velocity(
+                        (track_state.vx, track_state.vy),
+                        (track_state.cx, track_state.cy),
+                        (detection.cx, detection.cy),
+                        now - track_state.last_seen,
+                    )
+                    track_state.cx = detection.cx
+                    track_state.cy = detection.cy
+                    track_state.last_seen = now
+                    track_state.age += 1
+
+                for det_index in unmatched_detections:
+                    if len(tracks) >= args.max_objects:
+                        continue
+                    detection = detections[det_index]
+                    track_id = next_track_id
+                    next_track_id += 1
+                    tracks[track_id] = TrackState(
+                        track_id=track_id,
+                        cx=detection.cx,
+                        cy=detection.cy,
+                        age=1,
+                        last_seen=now,
+                        side_start=None,
+                        seen_middle=False,
+                        entered_middle_ts=None,
+                        last_event_ts=0.0,
+                    )
+                    matched[track_id] = det_index
+                timers.lap("match")
+
+                for track_id, det_index in matched.items():
+                    track_state = tracks.get(track_id)
+                    if track_state is None:
+                        continue
+                    detection = detections[det_index]
+                    axis_norm = (detection.cx / float(width)) if args.axis == "y" else (detection.cy / float(height))
+                    zone = classify_zone(axis_norm, line_a, line_b, args.axis_hyst)
+                    if zone == -1:
+                        with shared.lock:
+                            shared.stats["zone_neg_hits"] = int(shared.stats["zone_neg_hits"]) + 1
+                    elif zone == 0:
+                        with shared.lock:
+                            shared.stats["zone_mid_hits"] = int(shared.stats["zone_mid_hits"]) + 1
+                    else:
+                        with shared.lock:
+                            shared.stats["zone_pos_hits"] = int(shared.stats["zone_pos_hits"]) + 1
+
+                    if track_state.side_start is None and zone != 0:
+                        track_state.side_start = zone
+
+                    if zone == 0:
+                        if not track_state.seen_middle:
+                            track_state.seen_middle = True
+                            track_state.entered_middle_ts = now
+                            with shared.lock:
+                                shared.stats["middle_entries"] = int(shared.stats["middle_entries"]) + 1
+                    elif (
+                        track_state.seen_middle
+                        and track_state.entered_middle_ts is not None
+                        and (now - track_state.entered_middle_ts) > args.hang_timeout_sec
+                    ):
+                        track_state.side_start = None
+                        track_state.seen_middle = False
+                        track_state.entered_middle_ts = None
+                        with shared.lock:
+                            shared.stats["hang_reject"] = int(shared.stats["hang_reject"]) + 1
 
-                if track_state.side_start is None or zone == 0 or zone == track_state.side_start:
-                    continue
+                    if track_state.side_start is None or zone == 0 or zone == track_state.side_start:
+                        continue
 
-                if not track_state.seen_middle:
-                    track_state.side_start = zone
-                    with shared.lock:
-                        shared.stats["zone_flip_no_middle"] = int(shared.stats["zone_flip_no_middle"]) + 1
-                    continue
+                    if not track_state.seen_middle:
+                        track_state.side_start = zone
+                        with shared.lock:
+                            shared.stats["zone_flip_no_middle"] = int(shared.stats["zone_flip_no_middle"]) + 1
+                        continue
 
-                if track_state.age < args.min_track_age:
-                    with shared.lock:
-                        shared.stats["age_reject"] = int(shared.stats["age_reject"]) + 1
-                    continue
+                    if track_state.age < args.min_track_age:
+                        with shared.lock:
+                            shared.stats["age_reject"] = int(shared.stats["age_reject"]) + 1
+                        continue
 
-                if (now - last_global_event_ts) < args.count_cooldown_sec:
-                    with shared.lock:
-                        shared.stats["dup_reject"] = int(shared.stats["dup_reject"]) + 1
-                    continue
+                    if (now - last_global_event_ts) < args.count_cooldown_sec:
+                        with shared.lock:
+                            shared.stats["dup_reject"] = int(shared.stats["dup_reject"]) + 1
+                        continue
 
-                if args.per_track_rearm_sec > 0.0 and (now - track_state.last_event_ts) < args.per_track_rearm_sec:
-                    with shared.lock:
-                        shared.stats["rearm_reject"] = int(shared.stats["rearm_reject"]) + 1
-                    continue
+                    if args.per_track_rearm_sec > 0.0 and (now - track_state.last_event_ts) < args.per_track_rearm_sec:
+                        with shared.lock:
+                            shared.stats["rearm_reject"] = int(shared.stats["rearm_reject"]) + 1
+                        continue
+
+                    in_inc, out_inc, direction = transition_to_counts(track_state.side_start, zone, args.invert_direction)
+                    if in_inc == 0 and out_inc == 0:
+                        continue
+
+                    count_in += in_inc
+                    count_out += out_inc
+                    events_total += 1
+                    last_global_event_ts = now
+                    track_state.last_event_ts = now
+                    track_state.side_start = zone
+                    track_state.seen_middle = False
+                    track_state.entered_middle_ts = None
 
-                in_inc, out_inc, direction = transition_to_counts(track_state.side_start, zone, args.invert_direction)
-                if in_inc == 0 and out_inc == 0:
-                    continue
+                    depth_value = detection.depth_m if detection.depth_m is not None else -1.0
+                    seq = events_total
+                    if writer is not None:
+                        payload = {
+                            **counter_event(args, counter="depth-height-multi", in_inc=in_inc, out_inc=out_inc),
+                            "track_id": track_id,
+                            "direction": direction,
+                            "axis": args.axis,
+                            "line_a": round(line_a, 4),
+                            "line_b": round(line_b, 4),
+                            "area": round(float(detection.area), 1),
+                        }
+                        if detection.depth_m is not None:
+                            payload["depth_m"] = round(detection.depth_m, 3)
+                        seq = writer.submit(payload)
+                    print(
+                        f"depth-height-multi event: seq={seq} track_id={track_id} direction={direction} "
+                        f"in={in_inc} out={out_inc} depth_m={depth_value:.3f} age={track_state.age} area={detection.area:.1f}",
+                        flush=True,
+                    )
 
-                count_in += in_inc
-                count_out += out_inc
-                events_total += 1
-                last_global_event_ts = now
-                track_state.last_event_ts = now
-                track_state.side_start = zone
-                track_state.seen_middle = False
-                track_state.entered_middle_ts = None
-
-                depth_value = detection.depth_m if detection.depth_m is not None else -1.0
-                print(
-                    f"depth-height-multi event: seq={events_total} track_id={track_id} direction={direction} "
-                    f"in={in_inc} out={out_inc} depth_m={depth_value:.3f} age={track_state.age} area={detection.area:.1f}",
-                    flush=True,
-                )
+                with shared.lock:
+                    shared.stats["active_tracks"] = len(tracks)
+                    shared.stats["events_total"] = events_total
+                    shared.stats["count_in"] = count_in
+                    shared.stats["count_out"] = count_out
+                    shared.stats["depth_pass"] = int(shared.stats["depth_pass"]) + len(detections)
+                    shared.stats["depth_reject"] = int(shared.stats["depth_reject"]) + max(0, candidate_components - len(detections))
+                timers.lap("zones")
 
-            with shared.lock:
-                shared.stats["active_tracks"] = len(tracks)
-                shared.stats["events_total"] = events_total
-                shared.stats["count_in"] = count_in
-                shared.stats["count_out"] = count_out
-                shared.stats["depth_pass"] = int(shared.stats["depth_pass"]) + len(detections)
-                shared.stats["depth_reject"] = int(shared.stats["depth_reject"]) + max(0, candidate_components - len(detections))
+                with shared.lock:
+                    preview_enabled = bool(shared.stats.get("preview_enabled", True))
+
+                # Nothing is drawn or encoded unless a viewer is connected to /mjpeg or waits for a snapshot.
+                if preview_enabled and args.preview_fps > 0.0 and shared.broadcast.has_viewers():
+                    min_interval = 1.0 / max(0.1, args.preview_fps)
+                    if last_preview_ts <= 0.0 or (now - last_preview_ts) >= min_interval:
+                        overlay = normalize_depth_for_preview(depth_frame, depth_min_mm, depth_max_mm)
+                        if (overlay.shape[1], overlay.shape[0]) != (preview_w, preview_h):
+                            overlay = cv2.resize(overlay, (preview_w, preview_h), interpolation=cv2.INTER_AREA)
+                        sx = preview_w / float(width)
+                        sy = preview_h / float(height)
+                        x1, y1, x2, y2 = roi
+                        cv2.rectangle(
+                            overlay,
+                            (int(round(x1 * sx)), int(round(y1 * sy))),
+                            (int(round(x2 * sx)), int(round(y2 * sy))),
+                            (255, 200, 0),
+                            2,
+                        )
+                        if args.axis == "y":
+                            line_ax = int(round(line_a * preview_w))
+                            line_bx = int(round(line_b * preview_w))
+                            cv2.line(overlay, (line_ax, 0), (line_ax, preview_h - 1), (80, 180, 255), 2)
+                            cv2.line(overlay, (line_bx, 0), (line_bx, preview_h - 1), (255, 220, 80), 2)
+                        else:
+                            line_ay = int(round(line_a * preview_h))
+                            line_by = int(round(line_b * preview_h))
+                            cv2.line(overlay, (0, line_ay), (preview_w - 1, line_ay), (80, 180, 255), 2)
+                            cv2.line(overlay, (0, line_by), (preview_w - 1, line_by), (255, 220, 80), 2)
+
+                        for track_id, det_index in matched.items():
+                            if track_id not in tracks:
+                                continue
+                            detection = detections[det_index]
+                            rx1 = int(round(detection.x * sx))
+                            ry1 = int(round(detection.y * sy))
+                            rx2 = int(round((detection.x + detection.w) * sx))
+                            ry2 = int(round((detection.y + detection.h) * sy))
+                            cv2.rectangle(overlay, (rx1, ry1), (rx2, ry2), (60, 255, 120), 2)
+                            depth_label = "n/a" if detection.depth_m is None else f"{detection.depth_m:.2f}m"
+                            cv2.putText(
+                                overlay,
+                                f"id={track_id} z={depth_label}",
+                                (rx1 + 2, max(14, ry1 - 6)),
+                                cv2.FONT_HERSHEY_SIMPLEX,
+                                0.45,
+                                (255, 255, 255),
+                                1,
+                                cv2.LINE_AA,
+                            )
 
-            with shared.lock:
-                preview_enabled = bool(shared.stats.get("preview_enabled", True))
-
-            if preview_enabled and args.preview_fps > 0.0:
-                min_interval = 1.0 / max(0.1, args.preview_fps)
-                if last_preview_ts <= 0.0 or (now - last_preview_ts) >= min_interval:
-                    overlay = normalize_depth_for_preview(depth_frame, depth_min_mm, depth_max_mm)
-                    if (overlay.shape[1], overlay.shape[0]) != (preview_w, preview_h):
-                        overlay = cv2.resize(overlay, (preview_w, preview_h), interpolation=cv2.INTER_AREA)
-                    sx = preview_w / float(width)
-                    sy = preview_h / float(height)
-                    x1, y1, x2, y2 = roi
-                    cv2.rectangle(
-                        overlay,
-                        (int(round(x1 * sx)), int(round(y1 * sy))),
-                        (int(round(x2 * sx)), int(round(y2 * sy))),
-                        (255, 200, 0),
-                        2,
-                    )
-                    if args.axis == "y":
-                        line_ax = int(round(line_a * preview_w))
-                        line_bx = int(round(line_b * preview_w))
-                        cv2.line(overlay, (line_ax, 0), (line_ax, preview_h - 1), (80, 180, 255), 2)
-                        cv2.line(overlay, (line_bx, 0), (line_bx, preview_h - 1), (255, 220, 80), 2)
-                    else:
-                        line_ay = int(round(line_a * preview_h))
-                        line_by = int(round(line_b * preview_h))
-                        cv2.line(overlay, (0, line_ay), (preview_w - 1, line_ay), (80, 180, 255), 2)
-                        cv2.line(overlay, (0, line_by), (preview_w - 1, line_by), (255, 220, 80), 2)
-
-                    for track_id, det_index in matched.items():
-                        if track_id not in tracks:
-                            continue
-                        detection = detections[det_index]
-                        rx1 = int(round(detection.x * sx))
-                        ry1 = int(round(detection.y * sy))
-                        rx2 = int(round((detection.x + detection.w) * sx))
-                        ry2 = int(round((detection.y + detection.h) * sy))
-                        cv2.rectangle(overlay, (rx1, ry1), (rx2, ry2), (60, 255, 120), 2)
-                        depth_label = "n/a" if detection.depth_m is None else f"{detection.depth_m:.2f}m"
                         cv2.putText(
                             overlay,
-                            f"id={track_id} z={depth_label}",
-                            (rx1 + 2, max(14, ry1 - 6)),
+                            f"IN={count_in} OUT={count_out} events={events_total}",
+                            (10, 20),
                             cv2.FONT_HERSHEY_SIMPLEX,
-                            0.45,
+                            0.55,
                             (255, 255, 255),
+                            2,
+                            cv2.LINE_AA,
+                        )
+                        cv2.putText(
+                            overlay,
+                            f"depth={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m fps={args.fps:.1f}",
+                            (10, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX,
+                            0.45,
+                            (230, 230, 230),
                             1,
                             cv2.LINE_AA,
                         )
+                        timers.lap("preview_draw")
 
-                    cv2.putText(
-                        overlay,
-                        f"IN={count_in} OUT={count_out} events={events_total}",
-                        (10, 20),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.55,
-                        (255, 255, 255),
-                        2,
-                        cv2.LINE_AA,
-                    )
-                    cv2.putText(
-                        overlay,
-                        f"depth={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m fps={args.fps:.1f}",
-                        (10, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.45,
-                        (230, 230, 230),
-                        1,
-                        cv2.LINE_AA,
-                    )
+                        ok, encoded = cv2.imencode(
+                            ".jpg",
+                            overlay,
+                            [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
+                        )
+                        timers.lap("jpeg_encode")
+                        if ok:
+                            shared.broadcast.publish(encoded.tobytes(), now)
+                        last_preview_ts = now
+
+                timers.end()
+                if now - last_latency_ts >= 1.0:
+                    latency_ms = timers.summary()
+                    writer_stats = writer.snapshot() if writer is not None else None
+                    with shared.lock:
+                        shared.stats["latency_ms"] = latency_ms
+                        if writer_stats is not None:
+                            shared.stats["event_writer"] = writer_stats
+                    last_latency_ts = now
 
-                    ok, encoded = cv2.imencode(
-                        ".jpg",
-                        overlay,
-                        [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
+                if now - last_log_ts >= args.log_interval_sec:
+                    with shared.lock:
+                        messages = int(shared.stats.get("messages", 0))
+                        detections_total = int(shared.stats.get("detections", 0))
+                        active_tracks = int(shared.stats.get("active_tracks", 0))
+                        zone_mid = int(shared.stats.get("zone_mid_hits", 0))
+                        flip_no_middle = int(shared.stats.get("zone_flip_no_middle", 0))
+                        frame_latency = shared.stats.get("latency_ms", {}).get("frame", {})
+                    print(
+                        f"depth-height-multi heartbeat: messages={messages} detections={detections_total} "
+                        f"active={active_tracks} in={count_in} out={count_out} events={events_total} "
+                        f"zone_mid={zone_mid} flip_no_middle={flip_no_middle} "
+                        f"frame_ms_p50={frame_latency.get('p50', 'na')} frame_ms_p95={frame_latency.get('p95', 'na')}"
+                        f"{'' if writer is None else ' ' + writer.heartbeat()}",
+                        flush=True,
                     )
-                    if ok:
-                        with shared.lock:
-                            shared.jpg = encoded.tobytes()
-                            shared.last_frame_ts = now
-                    last_preview_ts = now
-
-            if now - last_log_ts >= args.log_interval_sec:
-                with shared.lock:
-                    messages = int(shared.stats.get("messages", 0))
-                    detections_total = int(shared.stats.get("detections", 0))
-                    active_tracks = int(shared.stats.get("active_tracks", 0))
-                    zone_mid = int(shared.stats.get("zone_mid_hits", 0))
-                    flip_no_middle = int(shared.stats.get("zone_flip_no_middle", 0))
-                print(
-                    f"depth-height-multi heartbeat: messages={messages} detections={detections_total} "
-                    f"active={active_tracks} in={count_in} out={count_out} events={events_total} "
-                    f"zone_mid={zone_mid} flip_no_middle={flip_no_middle}",
-                    flush=True,
-                )
-                last_log_ts = now
+                    last_log_ts = now
+        finally:
+            if recorder is not None:
+                recorder.close()
+                print(f"depth-height-multi: recorded {recorder.records} messages to {args.record}", flush=True)
+            if writer is not None:
+                writer.close()
+                print(f"depth-height-multi: event writer closed ({writer.heartbeat()})", flush=True)
+        if replay is not None:
+            with shared.lock:
+                messages = int(shared.stats.get("messages", 0))
+                detections_total = int(shared.stats.get("detections", 0))
+            summary = replay.summary(
+                count_in=count_in,
+                count_out=count_out,
+                events_total=events_total,
+                detections_total=detections_total,
+                depth_fps=round(messages / max(replay.wall_elapsed_sec(), 1e-9), 1),
+                latency_ms=timers.summary(),
+            )
+            print(f"replay-summary: {json.dumps(summary, ensure_ascii=False)}", flush=True)
 
     return 0
 
@@ -15,13 +15,14 @@ import depthai as dai
 import numpy as np
 
 from common import load_env_file, utc_now_iso
+from frame_broadcast import FrameBroadcaster, stream_mjpeg
+from stage_timers import StageTimers, device_age_ms
 
 
 @dataclass
 class SharedState:
     lock: threading.Lock
-    jpg: bytes
-    last_frame_ts: float
+    broadcast: FrameBroadcaster
     stats: dict[str, Any]
 
 
@@ -295,6 +296,8 @@ class Handler(BaseHTTPRequestHandler):
         state = self._state()
         with state.lock:
             payload = dict(state.stats)
+        payload["preview_frames"] = state.broadcast.published
+        payload["preview_viewers"] = state.broadcast.viewers()
         payload["ts"] = utc_now_iso()
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         self.send_response(HTTPStatus.OK)
@@ -305,8 +308,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def _send_snapshot(self) -> None:
         state = self._state()
-        with state.lock:
-            jpg = state.jpg
+        jpg = state.broadcast.snapshot()
         if not jpg:
             self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "no frame yet")
             return
@@ -327,20 +329,8 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
 
         state = self._state()
-        last_sent_ts = 0.0
         try:
-            while True:
-                with state.lock:
-                    jpg = state.jpg
-                    frame_ts = state.last_frame_ts
-                if jpg and frame_ts != last_sent_ts:
-                    self.wfile.write(b"--" + boundary + b"\r\n")
-                    self.wfile.write(b"Content-Type: image/jpeg\r\n")
-                    self.wfile.write(f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii"))
-                    self.wfile.write(jpg)
-                    self.wfile.write(b"\r\n")
-                    last_sent_ts = frame_ts
-                time.sleep(0.03)
+            stream_mjpeg(self.wfile, state.broadcast, boundary=boundary)
         except (BrokenPipeError, ConnectionResetError):
             return
 
@@ -427,8 +417,7 @@ def main() -> int:
 
     shared = SharedState(
         lock=threading.Lock(),
-        jpg=b"",
-        last_frame_ts=0.0,
+        broadcast=FrameBroadcaster(),
         stats={
             "status": "starting",
             "device": "",
@@ -535,6 +524,8 @@ def main() -> int:
         active_track: ActiveTrack | None = None
         frames = 0
         last_log = time.monotonic()
+        last_latency_ts = 0.0
+        timers = StageTimers()
 
         count_in = 0
         count_out = 0
@@ -542,6 +533,7 @@ def main() -> int:
         imu_gyro_norm = None
 
         while pipeline.isRunning():
+            timers.begin()
             new_acc_norm, new_gyro_norm = poll_imu_queue(imu_queue, shared)
             if new_acc_norm is not None:
                 imu_acc_norm = new_acc_norm
@@ -572,6 +564,10 @@ def main() -> int:
 
             disparity = to_u8_disparity(disparity_msg.getFrame())
             h, w = disparity.shape[:2]
+            timers.lap("get")
+            age_ms = device_age_ms(disparity_msg)
+            if age_ms is not None:
+                timers.add("device_age", age_ms)
 
             x1, y1, x2, y2 = parse_roi(args.roi, w, h)
             roi = disparity[y1:y2, x1:x2]
@@ -589,6 +585,7 @@ def main() -> int:
                 bx, by, bw, bh = cv2.boundingRect(contour)
                 best_rect = (x1 + bx, y1 + by, bw, bh)
                 best_area = area
+            timers.lap("blobs")
 
             now = time.monotonic()
             detection_center = None
@@ -634,51 +631,61 @@ def main() -> int:
                                 flush=True,
                             )
 
-            color = cv2.applyColorMap(disparity, cv2.COLORMAP_TURBO)
-            cv2.rectangle(color, (x1, y1), (x2, y2), (255, 200, 0), 2)
-
-            if args.axis == "y":
-                line_x = int(round(line_coord))
-                cv2.line(color, (line_x, 0), (line_x, h - 1), (0, 255, 255), 2)
-            else:
-                line_y = int(round(line_coord))
-                cv2.line(color, (0, line_y), (w - 1, line_y), (0, 255, 255), 2)
-
-            if best_rect is not None:
-                bx, by, bw, bh = best_rect
-                cv2.rectangle(color, (bx, by), (bx + bw, by + bh), (0, 255, 0), 2)
-                if detection_center is not None:
-                    cx, cy = detection_center
-                    cv2.circle(color, (cx, cy), 4, (255, 255, 255), -1)
-
-            cv2.putText(color, f"IN={count_in} OUT={count_out}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            cv2.putText(
-                color,
-                f"th={args.threshold_low}-{args.threshold_high} area>{int(args.area_min)}",
-                (10, 42),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                (235, 235, 235),
-                1,
-            )
-            if args.imu_enable:
-                imu_line = f"IMU a={imu_acc_norm:.2f} g={imu_gyro_norm:.2f}" if imu_acc_norm is not None and imu_gyro_norm is not None else "IMU waiting"
-                cv2.putText(color, imu_line, (10, 64), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (180, 255, 180), 1)
-
-            ok, encoded = cv2.imencode(
-                ".jpg",
-                color,
-                [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
-            )
-            if not ok:
-                continue
-
             with shared.lock:
-                shared.jpg = encoded.tobytes()
-                shared.last_frame_ts = now
                 shared.stats["track_active"] = active_track is not None
                 shared.stats["count_in"] = count_in
                 shared.stats["count_out"] = count_out
+            timers.lap("zones")
+
+            # Colorize/draw/encode only while a viewer is connected to /mjpeg or waits for a snapshot.
+            if shared.broadcast.has_viewers():
+                color = cv2.applyColorMap(disparity, cv2.COLORMAP_TURBO)
+                cv2.rectangle(color, (x1, y1), (x2, y2), (255, 200, 0), 2)
+
+                if args.axis == "y":
+                    line_x = int(round(line_coord))
+                    cv2.line(color, (line_x, 0), (line_x, h - 1), (0, 255, 255), 2)
+                else:
+                    line_y = int(round(line_coord))
+                    cv2.line(color, (0, line_y), (w - 1, line_y), (0, 255, 255), 2)
+
+                if best_rect is not None:
+                    bx, by, bw, bh = best_rect
+                    cv2.rectangle(color, (bx, by), (bx + bw, by + bh), (0, 255, 0), 2)
+                    if detection_center is not None:
+                        cx, cy = detection_center
+                        cv2.circle(color, (cx, cy), 4, (255, 255, 255), -1)
+
+                cv2.putText(color, f"IN={count_in} OUT={count_out}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                cv2.putText(
+                    color,
+                    f"th={args.threshold_low}-{args.threshold_high} area>{int(args.area_min)}",
+                    (10, 42),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5,
+                    (235, 235, 235),
+                    1,
+                )
+                if args.imu_enable:
+                    imu_line = f"IMU a={imu_acc_norm:.2f} g={imu_gyro_norm:.2f}" if imu_acc_norm is not None and imu_gyro_norm is not None else "IMU waiting"
+                    cv2.putText(color, imu_line, (10, 64), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (180, 255, 180), 1)
+                timers.lap("preview_draw")
+
+                ok, encoded = cv2.imencode(
+                    ".jpg",
+                    color,
+                    [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, args.jpeg_quality)))],
+                )
+                timers.lap("jpeg_encode")
+                if ok:
+                    shared.broadcast.publish(encoded.tobytes(), now)
+
+            timers.end()
+            if now - last_latency_ts >= 1.0:
+                latency_ms = timers.summary()
+                with shared.lock:
+                    shared.stats["latency_ms"] = latency_ms
+                last_latency_ts = now
 
             if now - last_log >= args.log_interval_sec:
                 with shared.lock:
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import struct
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Callable, Iterator
+
+import numpy as np
+
+
+# File layout: MAGIC, then records of <u32 header_len><u32 blob_len><header json><zlib blob>.
+# The first record is the recording metadata; every next one is a queue message:
+# header = {"s": stream, "t": host monotonic ts, "f": json fields, "a": [[name, dtype, shape], ...]},
+# blob = the raw bytes of the "a" arrays concatenated in order.
+MAGIC = b"PSGREC1\n"
+_RECORD_HEAD = struct.Struct("<II")
+
+STREAM_TRACKLETS = "tracklets"
+STREAM_NN = "nn"
+STREAM_DEPTH = "depth"
+STREAM_IMU = "imu"
+
+
+@dataclass
+class ReplayRecord:
+    stream: str
+    ts: float
+    fields: dict[str, Any]
+    arrays: dict[str, np.ndarray]
+
+
+def _write_record(fh: BinaryIO, header: dict[str, Any], arrays: dict[str, np.ndarray]) -> int:
+    specs: list[list[Any]] = []
+    chunks: list[bytes] = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        specs.append([name, array.dtype.str, list(array.shape)])
+        chunks.append(array.tobytes())
+    header = dict(header)
+    header["a"] = specs
+    head_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    blob = zlib.compress(b"".join(chunks), 1) if chunks else b""
+    fh.write(_RECORD_HEAD.pack(len(head_bytes), len(blob)))
+    fh.write(head_bytes)
+    fh.write(blob)
+    return _RECORD_HEAD.size + len(head_bytes) + len(blob)
+
+
+def read_records(path: str | Path) -> Iterator[ReplayRecord]:
+    """Yields the metadata record (stream "meta") and then every message in recording order."""
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a camera recording")
+        while True:
+            head = fh.read(_RECORD_HEAD.size)
+            if len(head) < _RECORD_HEAD.size:
+                return
+            head_len, blob_len = _RECORD_HEAD.unpack(head)
+            head_bytes = fh.read(head_len)
+            blob = fh.read(blob_len)
+            if len(head_bytes) < head_len or len(blob) < blob_len:
+                return  # truncated tail (recorder was killed mid-write)
+            header = json.loads(head_bytes.decode("utf-8"))
+            arrays: dict[str, np.ndarray] = {}
+            if header.get("a"):
+                raw = bytearray(zlib.decompress(blob))  # writable arrays, like frames from the device
+                offset = 0
+                for name, dtype_str, shape in header["a"]:
+                    dtype = np.dtype(dtype_str)
+                    size = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+                    arrays[name] = np.frombuffer(raw, dtype=dtype, count=size // dtype.itemsize, offset=offset).reshape(shape)
+                    offset += size
+            yield ReplayRecord(
+                stream=str(header.get("s", "")),
+                ts=float(header.get("t", 0.0)),
+                fields=dict(header.get("f") or {}),
+                arrays=arrays,
+            )
+
+
+def _status_name(status: Any) -> str:
+    name = getattr(status, "name", None)
+    return str(name) if name else str(status).rsplit(".", 1)[-1]
+
+
+def _vector(sample: Any) -> list[float] | None:
+    if sample is None:
+        return None
+    try:
+        return [float(sample.x), float(sample.y), float(sample.z)]
+    except Exception:
+        return None
+
+
+def encode_tracklets(msg: Any) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    rows: list[list[Any]] = []
+    for tracklet in msg.tracklets:
+        top_left = tracklet.roi.topLeft()
+        bottom_right = tracklet.roi.bottomRight()
+        src = getattr(tracklet, "srcImgDetection", None)
+        rows.append(
+            [
+                int(tracklet.id),
+                _status_name(tracklet.status),
+                int(tracklet.age),
+                float(top_left.x),
+                float(top_left.y),
+                float(bottom_right.x),
+                float(bottom_right.y),
+                float(getattr(src, "confidence", 0.0) or 0.0),
+                int(getattr(tracklet, "label", 0) or 0),
+            ]
+        )
+    return {"tracklets": rows}, {}
+
+
+def encode_nn(msg: Any) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    arrays: dict[str, np.ndarray] = {}
+    for name in list(getattr(msg, "getAllLayerNames", lambda: [])()):
+        try:
+            arrays[str(name)] = np.asarray(msg.getTensor(name))
+        except Exception:
+            continue
+    return {}, arrays
+
+
+def encode_depth(msg: Any) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    frame = msg.getFrame()
+    return {}, ({} if frame is None else {"frame": np.asarray(frame)})
+
+
+def encode_imu(msg: Any) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    packets: list[list[Any]] = []
+    for packet in list(getattr(msg, "packets", []) or getattr(msg, "imuPackets", [])):
+        accel = getattr(packet, "acceleroMeter", None) or getattr(packet, "accelerometer", None)
+        packets.append([_vector(accel), _vector(getattr(packet, "gyroscope", None))])
+    return {"packets": packets}, {}
+
+
+ENCODERS: dict[str, Callable[[Any], tuple[dict[str, Any], dict[str, np.ndarray]]]] = {
+    STREAM_TRACKLETS: encode_tracklets,
+    STREAM_NN: encode_nn,
+    STREAM_DEPTH: encode_depth,
+    STREAM_IMU: encode_imu,
+}
+
+
+class Recorder:
+    """Appends every message pulled from wrapped device queues to a recording file.
+
+    Timestamps are the host monotonic time at `tryGet()`, i.e. the `now` the counting loop saw,
+    so replay reproduces the loop's timing-dependent gates (cooldowns, hang/lost timeouts).
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        meta: dict[str, Any],
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        flush_interval_sec: float = 1.0,
+        max_bytes: int = 0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "wb")
+        self._fh.write(MAGIC)
+        self._clock = clock
+        self._flush_interval_sec = float(flush_interval_sec)
+        self._flushed_at = clock()
+        self._max_bytes = int(max_bytes)
+        self.streams: list[str] = []
+        self.records = 0
+        self.bytes_written = len(MAGIC)
+        self.bytes_written += _write_record(self._fh, {"s": "meta", "t": self._flushed_at, "f": meta}, {})
+
+    def write(self, stream: str, fields: dict[str, Any], arrays: dict[str, np.ndarray]) -> None:
+        if self._fh.closed:
+            return
+        now = self._clock()
+        self.bytes_written += _write_record(self._fh, {"s": stream, "t": now, "f": fields}, arrays)
+        self.records += 1
+        if self._max_bytes > 0 and self.bytes_written >= self._max_bytes:
+            self.close()  # size cap reached: the counting loop keeps running, recording just stops
+            return
+        if now - self._flushed_at >= self._flush_interval_sec:
+            self._fh.flush()
+            self._flushed_at = now
+
+    def wrap(self, queue: Any, stream: str) -> Any:
+        if queue is None:
+            return None
+        self.streams.append(stream)
+        return RecordingQueue(queue, stream, self)
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+
+
+class RecordingQueue:
+    def __init__(self, inner: Any, stream: str, recorder: Recorder) -> None:
+        self._inner = inner
+        self._stream = stream
+        self._encode = ENCODERS[stream]
+        self._recorder = recorder
+
+    def tryGet(self) -> Any:  # noqa: N802
+        msg = self._inner.tryGet()
+        if msg is not None:
+            fields, arrays = self._encode(msg)
+            self._recorder.write(self._stream, fields, arrays)
+        return msg
+
+
+@dataclass
+class _Point:
+    x: float
+    y: float
+
+
+class _Roi:
+    def __init__(self, x1: float, y1: float, x2: float, y2: float) -> None:
+        self._tl = _Point(x1, y1)
+        self._br = _Point(x2, y2)
+
+    def topLeft(self) -> _Point:  # noqa: N802
+        return self._tl
+
+    def bottomRight(self) -> _Point:  # noqa: N802
+        return self._br
+
+
+class ReplayTracklet:
+    def __init__(self, row: list[Any], status: Any) -> None:
+        tid, _, age, x1, y1, x2, y2, confidence, label = row
+        self.id = int(tid)
+        self.status = status
+        self.age = int(age)
+        self.label = int(label)
+        self.roi = _Roi(float(x1), float(y1), float(x2), float(y2))
+        self.srcImgDetection = SimpleNamespace(confidence=float(confidence))
+
+
+class ReplayMessage:
+    """Stands in for dai.Tracklets / NNData / ImgFrame / IMUData with just the accessors the scripts use."""
+
+    def __init__(self, record: ReplayRecord, status_lookup: Callable[[str], Any]) -> None:
+        self._record = record
+        self._status_lookup = status_lookup
+
+    @property
+    def tracklets(self) -> list[ReplayTracklet]:
+        return [ReplayTracklet(row, self._status_lookup(str(row[1]))) for row in self._record.fields.get("tracklets", [])]
+
+    @property
+    def packets(self) -> list[SimpleNamespace]:
+        result: list[SimpleNamespace] = []
+        for accel, gyro in self._record.fields.get("packets", []):
+            result.append(
+                SimpleNamespace(
+                    acceleroMeter=None if accel is None else SimpleNamespace(x=accel[0], y=accel[1], z=accel[2]),
+                    gyroscope=None if gyro is None else SimpleNamespace(x=gyro[0], y=gyro[1], z=gyro[2]),
+                )
+            )
+        return result
+
+    def getAllLayerNames(self) -> list[str]:  # noqa: N802
+        return list(self._record.arrays.keys())
+
+    def getTensor(self, name: str) -> np.ndarray:  # noqa: N802
+        return self._record.arrays[name]
+
+    def getFrame(self) -> np.ndarray | None:  # noqa: N802
+        return self._record.arrays.get("frame")
+
+    def getCvFrame(self) -> np.ndarray | None:  # noqa: N802
+        return self._record.arrays.get("frame")
+
+
+class ReplayQueue:
+    def __init__(self, max_size: int) -> None:
+        # Same drop-oldest behaviour as a non-blocking device queue when the loop does not drain it.
+        self._items: deque[ReplayMessage] = deque(maxlen=max(1, int(max_size)))
+
+    def push(self, msg: ReplayMessage) -> None:
+        self._items.append(msg)
+
+    def tryGet(self) -> ReplayMessage | None:  # noqa: N802
+        return self._items.popleft() if self._items else None
+
+
+class ReplayDevice:
+    def __init__(self, meta: dict[str, Any]) -> None:
+        self._meta = meta
+
+    def getDeviceName(self) -> str:  # noqa: N802
+        return f"replay:{self._meta.get('device', '') or 'unknown'}"
+
+    def getUsbSpeed(self) -> SimpleNamespace:  # noqa: N802
+        return SimpleNamespace(name="REPLAY")
+
+    def getConnectedIMU(self) -> str:  # noqa: N802
+        return str(self._meta.get("imu_type", ""))
+
+
+class ReplaySource:
+    """Feeds a recording back through the counting loop in place of dai.Pipeline.
+
+    Every `isRunning()` call (once per loop iteration) releases the next recorded message into its
+    queue and moves the replay clock to that message's timestamp; scripts read `now` from
+    `monotonic()`, so timeouts behave as they did live. `realtime=True` also sleeps to keep the
+    recorded pace (scaled by `speed`); otherwise messages are fed as fast as the loop consumes them.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        streams: set[str] | None = None,
+        realtime: bool = False,
+        speed: float = 1.0,
+        queue_size: int = 8,
+    ) -> None:
+        self.path = Path(path)
+        self._records = read_records(self.path)
+        first = next(self._records, None)
+        if first is None or first.stream != "meta":
+            raise ValueError(f"{self.path}: missing recording metadata")
+        self.meta: dict[str, Any] = first.fields
+        self._streams = streams
+        self._realtime = bool(realtime)
+        self._speed = max(0.01, float(speed))
+        self._queue_size = int(queue_size)
+        self._queues: dict[str, ReplayQueue] = {}
+        self._now = first.ts
+        self._first_ts: float | None = None
+        self._wall_started = 0.0
+        self._exhausted = False
+        self.released = 0
+        self._status_cache: dict[str, Any] = {}
+
+    def __enter__(self) -> ReplaySource:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._exhausted = True
+
+    def start(self) -> None:
+        self._wall_started = time.perf_counter()
+
+    def getDefaultDevice(self) -> ReplayDevice:  # noqa: N802
+        return ReplayDevice(self.meta)
+
+    def has_stream(self, stream: str) -> bool:
+        return stream in set(self.meta.get("streams", []))
+
+    def queue(self, stream: str) -> ReplayQueue:
+        if stream not in self._queues:
+            self._queues[stream] = ReplayQueue(self._queue_size)
+        return self._queues[stream]
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def wall_elapsed_sec(self) -> float:
+        return time.perf_counter() - self._wall_started if self._wall_started > 0.0 else 0.0
+
+    def _status(self, name: str) -> Any:
+        status = self._status_cache.get(name)
+        if status is None:
+            import depthai as dai
+
+            status = getattr(dai.Tracklet.TrackingStatus, name)
+            self._status_cache[name] = status
+        return status
+
+    def isRunning(self) -> bool:  # noqa: N802
+        if self._exhausted:
+            return False
+        for record in self._records:
+            if self._streams is not None and record.stream not in self._streams:
+                continue
+            if self._first_ts is None:
+                self._first_ts = record.ts
+                if self._wall_started <= 0.0:
+                    self._wall_started = time.perf_counter()
+            if self._realtime:
+                due = self._wall_started + (record.ts - self._first_ts) / self._speed
+                delay = due - time.perf_counter()
+                if delay > 0.0:
+                    time.sleep(delay)
+            self._now = record.ts
+            self.queue(record.stream).push(ReplayMessage(record, self._status))
+            self.released += 1
+            return True
+        self._exhausted = True
+        return False
+
+    def summary(self, **counters: Any) -> dict[str, Any]:
+        wall = self.wall_elapsed_sec()
+        recorded = (self._now - self._first_ts) if self._first_ts is not None else 0.0
+        result: dict[str, Any] = {
+            "recording": str(self.path),
+            "script": self.meta.get("script", ""),
+            "messages": self.released,
+            "recorded_sec": round(recorded, 3),
+            "wall_sec": round(wall, 3),
+            "messages_per_sec": round(self.released / wall, 1) if wall > 0.0 else None,
+        }
+        result.update(counters)
+        return result
@@ -16,17 +16,23 @@ import cv2
 import depthai as dai
 import numpy as np
 
+from camera_replay import STREAM_DEPTH, STREAM_IMU, STREAM_NN, STREAM_TRACKLETS, Recorder, ReplaySource
 from common import load_env_file, utc_now_iso
+from depth_sampling import HeadDepthSampler
+from event_writer import add_event_writer_args, counter_event, event_writer_from_args, load_event_writer_env
+from frame_broadcast import FrameBroadcaster, stream_mjpeg
+from pipeline_stats import PipelineStats
+from stage_timers import StageTimers, device_age_ms, merged_summary
+from track_match import match_tracks, predict_offsets, smooth_velocity
+from yolo_decode import YoloV8DflDecoder
 
 
 @dataclass
 class SharedState:
-    lock: threading.Lock
-    jpg: bytes
-    last_frame_ts: float
-    preview_frame: np.ndarray | None
-    preview_items: list[dict[str, Any]]
-    stats: dict[str, Any]
+    broadcast: FrameBroadcaster
+    preview: tuple[np.ndarray | None, list[dict[str, Any]]]
+    stats: PipelineStats
+    preview_enabled: bool
 
 
 @dataclass
@@ -54,26 +60,8 @@ class HostTrackState:
     cyn: float
     confidence: float
     age: int
-
-
-def bbox_iou(a: tuple[float, float, float, float], b: tuple[float, float, float, float]) -> float:
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-    ix1 = max(ax1, bx1)
-    iy1 = max(ay1, by1)
-    ix2 = min(ax2, bx2)
-    iy2 = min(ay2, by2)
-    iw = max(0.0, ix2 - ix1)
-    ih = max(0.0, iy2 - iy1)
-    inter = iw * ih
-    if inter <= 0.0:
-        return 0.0
-    area_a = max(0.0, ax2 - ax1) * max(0.0, ay2 - ay1)
-    area_b = max(0.0, bx2 - bx1) * max(0.0, by2 - by1)
-    denom = area_a + area_b - inter
-    if denom <= 0.0:
-        return 0.0
-    return float(inter / denom)
+    vx: float = 0.0
+    vy: float = 0.0
 
 
 @dataclass
@@ -110,117 +98,6 @@ class HostTrackletLike:
         self.age = int(age)
 
 
-def sigmoid(x: np.ndarray) -> np.ndarray:
-    x = np.clip(x, -50.0, 50.0)
-    return 1.0 / (1.0 + np.exp(-x))
-
-
-def softmax_last_axis(x: np.ndarray) -> np.ndarray:
-    x = x - np.max(x, axis=-1, keepdims=True)
-    exp = np.exp(np.clip(x, -50.0, 50.0))
-    denom = np.sum(exp, axis=-1, keepdims=True)
-    denom = np.where(denom == 0.0, 1.0, denom)
-    return exp / denom
-
-
-def decode_yolov8_dfl_outputs(
-    outputs: list[np.ndarray],
-    input_size: tuple[int, int],
-    confidence_min: float,
-    nms_iou: float,
-    max_det: int,
-) -> list[tuple[float, float, float, float, float]]:
-    """Decode YOLOv8 (DFL) raw outputs into XYXY boxes in *input pixel space*.
-
-    Returns: list of (x1, y1, x2, y2, conf)
-    """
-    input_w, input_h = input_size
-    reg_max = 15
-    bins = np.arange(reg_max + 1, dtype=np.float32)
-    boxes_xywh: list[list[float]] = []
-    scores: list[float] = []
-
-    for out in outputs:
-        if out.ndim != 4 or out.shape[0] != 1 or out.shape[1] < 5:
-            continue
-        _, ch, h, w = out.shape
-        if ch != 4 * (reg_max + 1) + 1:
-            continue
-        stride_w = input_w / float(w)
-        stride_h = input_h / float(h)
-        if abs(stride_w - stride_h) > 1e-3:
-            continue
-        stride = float(stride_w)
-
-        raw = out[0]  # (65, H, W)
-        box_raw = raw[: 4 * (reg_max + 1), :, :]  # (64, H, W)
-        cls_raw = raw[4 * (reg_max + 1) :, :, :]  # (1, H, W) for 1 class
-        cls_logits = cls_raw[0]  # (H, W)
-        cls_scores = sigmoid(cls_logits)
-
-        keep = cls_scores >= float(confidence_min)
-        if not np.any(keep):
-            continue
-
-        ys, xs = np.where(keep)
-        conf_sel = cls_scores[ys, xs].astype(np.float32)
-
-        # box_raw -> (4, 16, H, W) -> (H, W, 4, 16)
-        box_d = box_raw.reshape(4, reg_max + 1, h, w).transpose(2, 3, 0, 1)
-        dist_sel = box_d[ys, xs, :, :]  # (N, 4, 16)
-        probs = softmax_last_axis(dist_sel)
-        dist = (probs * bins).sum(axis=-1) * stride  # (N, 4) in pixels
-
-        cx = (xs.astype(np.float32) + 0.5) * stride
-        cy = (ys.astype(np.float32) + 0.5) * stride
-        l = dist[:, 0]
-        t = dist[:, 1]
-        r = dist[:, 2]
-        b = dist[:, 3]
-
-        x1 = np.clip(cx - l, 0.0, float(input_w - 1))
-        y1 = np.clip(cy - t, 0.0, float(input_h - 1))
-        x2 = np.clip(cx + r, 0.0, float(input_w - 1))
-        y2 = np.clip(cy + b, 0.0, float(input_h - 1))
-
-        w_px = np.maximum(0.0, x2 - x1)
-        h_px = np.maximum(0.0, y2 - y1)
-
-        for i in range(conf_sel.shape[0]):
-            if w_px[i] <= 1.0 or h_px[i] <= 1.0:
-                continue
-            boxes_xywh.append([float(x1[i]), float(y1[i]), float(w_px[i]), float(h_px[i])])
-            scores.append(float(conf_sel[i]))
-
-    if not boxes_xywh:
-        return []
-
-    indices = cv2.dnn.NMSBoxes(boxes_xywh, scores, float(confidence_min), float(nms_iou), top_k=int(max_det))
-    if indices is None:
-        return []
-    if isinstance(indices, (tuple, list)) and len(indices) == 0:
-        return []
-
-    flat: list[int] = []
-    try:
-        # OpenCV may return [[i],[j],...] or [i,j,...]
-        for item in indices:
-            if isinstance(item, (tuple, list, np.ndarray)):
-                flat.append(int(item[0]))
-            else:
-                flat.append(int(item))
-    except Exception:
-        flat = [int(i) for i in np.array(indices).reshape(-1).tolist()]
-
-    dets: list[tuple[float, float, float, float, float]] = []
-    for i in flat:
-        x, y, w_px, h_px = boxes_xywh[i]
-        conf = scores[i]
-        dets.append((x, y, x + w_px, y + h_px, conf))
-
-    return dets
-
-
 def parse_bool(value: str | None, default: bool = False) -> bool:
     if value is None:
         return default
@@ -270,48 +147,6 @@ def axis_span_from_tracklet(tracklet: dai.Tracklet, axis: str) -> tuple[float, f
     return axis_min, axis_max, axis_center
 
 
-def estimate_head_shoulders_depth_m(
-    tracklet: dai.Tracklet,
-    depth_frame: np.ndarray | None,
-    head_fraction: float,
-    min_valid_px: int,
-    head_region: str,
-) -> float | None:
-    if depth_frame is None or depth_frame.ndim != 2:
-        return None
-
-    frame_h, frame_w = depth_frame.shape[:2]
-    x1 = clamp_pixel(float(tracklet.roi.topLeft().x), frame_w)
-    y1 = clamp_pixel(float(tracklet.roi.topLeft().y), frame_h)
-    x2 = clamp_pixel(float(tracklet.roi.bottomRight().x), frame_w)
-    y2 = clamp_pixel(float(tracklet.roi.bottomRight().y), frame_h)
-    if x2 <= x1 or y2 <= y1:
-        return None
-
-    bbox_h = y2 - y1
-    head_h = max(1, int(round(bbox_h * head_fraction)))
-    if head_region == "bottom":
-        y0 = max(y1, y2 - head_h)
-        y1_roi, y2_roi = y0, y2
-    else:
-        y1_roi, y2_roi = y1, min(y2, y1 + head_h)
-    if y2_roi <= y1_roi:
-        return None
-
-    roi = depth_frame[y1_roi:y2_roi, x1:x2]
-    if roi.size == 0:
-        return None
-
-    valid = roi[(roi >= 200) & (roi <= 10000)]
-    if valid.size < min_valid_px:
-        return None
-
-    depth_mm = float(np.median(valid))
-    if depth_mm <= 0:
-        return None
-    return depth_mm / 1000.0
-
-
 def configure_stereo(stereo: dai.node.StereoDepth, output_size: tuple[int, int]) -> None:
     if hasattr(stereo, "setDefaultProfilePreset"):
         try:
@@ -368,7 +203,7 @@ def format_norm(vector: tuple[float, float, float] | None) -> float | None:
     return float((x * x + y * y + z * z) ** 0.5)
 
 
-def poll_imu_queue(imu_queue: Any, shared: SharedState) -> tuple[float | None, float | None]:
+def poll_imu_queue(imu_queue: Any, stats: PipelineStats) -> tuple[float | None, float | None]:
     if imu_queue is None:
         return None, None
 
@@ -397,23 +232,22 @@ def poll_imu_queue(imu_queue: Any, shared: SharedState) -> tuple[float | None, f
     acc_norm = format_norm(last_acc)
     gyro_norm = format_norm(last_gyro)
     now_ms = int(time.time() * 1000)
-    with shared.lock:
-        stats = shared.stats
-        stats["imu_present"] = True
-        stats["imu_updates"] = int(stats.get("imu_updates", 0)) + packets_read
-        stats["imu_last_ms"] = now_ms
-        if last_acc is not None:
-            ax, ay, az = last_acc
-            stats["imu_accel_x"] = round(ax, 5)
-            stats["imu_accel_y"] = round(ay, 5)
-            stats["imu_accel_z"] = round(az, 5)
-            stats["imu_accel_norm"] = round(float(acc_norm), 5) if acc_norm is not None else None
-        if last_gyro is not None:
-            gx, gy, gz = last_gyro
-            stats["imu_gyro_x"] = round(gx, 5)
-            stats["imu_gyro_y"] = round(gy, 5)
-            stats["imu_gyro_z"] = round(gz, 5)
-            stats["imu_gyro_norm"] = round(float(gyro_norm), 5) if gyro_norm is not None else None
+    values = stats.values
+    values["imu_present"] = True
+    values["imu_updates"] = int(values.get("imu_updates", 0)) + packets_read
+    values["imu_last_ms"] = now_ms
+    if last_acc is not None:
+        ax, ay, az = last_acc
+        values["imu_accel_x"] = round(ax, 5)
+        values["imu_accel_y"] = round(ay, 5)
+        values["imu_accel_z"] = round(az, 5)
+        values["imu_accel_norm"] = round(float(acc_norm), 5) if acc_norm is not None else None
+    if last_gyro is not None:
+        gx, gy, gz = last_gyro
+        values["imu_gyro_x"] = round(gx, 5)
+        values["imu_gyro_y"] = round(gy, 5)
+        values["imu_gyro_z"] = round(gz, 5)
+        values["imu_gyro_norm"] = round(float(gyro_norm), 5) if gyro_norm is not None else None
     return acc_norm, gyro_norm
 
 
@@ -623,9 +457,8 @@ class Handler(BaseHTTPRequestHandler):
 
         enabled = enabled_raw in {"1", "true", "on", "yes"}
         state = self._state()
-        with state.lock:
-            state.stats["preview_enabled"] = bool(enabled)
-            payload = {"preview_enabled": bool(enabled)}
+        state.preview_enabled = bool(enabled)
+        payload = {"preview_enabled": bool(enabled)}
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         self.send_response(HTTPStatus.OK)
         self.send_header("Content-Type", "application/json")
@@ -636,8 +469,10 @@ class Handler(BaseHTTPRequestHandler):
 
     def _send_health(self) -> None:
         state = self._state()
-        with state.lock:
-            payload = dict(state.stats)
+        payload = dict(state.stats.snapshot())
+        payload["preview_enabled"] = state.preview_enabled
+        payload["preview_frames"] = state.broadcast.published
+        payload["preview_viewers"] = state.broadcast.viewers()
         payload["ts"] = utc_now_iso()
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         self.send_response(HTTPStatus.OK)
@@ -648,8 +483,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def _send_snapshot(self) -> None:
         state = self._state()
-        with state.lock:
-            jpg = state.jpg
+        jpg = state.broadcast.snapshot()
         if not jpg:
             self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "no frame yet")
             return
@@ -663,30 +497,17 @@ class Handler(BaseHTTPRequestHandler):
     def _send_mjpeg(self) -> None:
         boundary = b"frame"
         state = self._state()
-        with state.lock:
-            if not bool(state.stats.get("preview_enabled", True)):
-                self.send_error(HTTPStatus.CONFLICT, "preview disabled")
-                return
+        if not state.preview_enabled:
+            self.send_error(HTTPStatus.CONFLICT, "preview disabled")
+            return
         self.send_response(HTTPStatus.OK)
         self.send_header("Age", "0")
         self.send_header("Cache-Control", "no-cache, private")
         self.send_header("Pragma", "no-cache")
         self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={boundary.decode()}")
         self.end_headers()
-        last_sent_ts = 0.0
         try:
-            while True:
-                with state.lock:
-                    jpg = state.jpg
-                    frame_ts = state.last_frame_ts
-                if jpg and frame_ts != last_sent_ts:
-                    self.wfile.write(b"--" + boundary + b"\r\n")
-                    self.wfile.write(b"Content-Type: image/jpeg\r\n")
-                    self.wfile.write(f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii"))
-                    self.wfile.write(jpg)
-                    self.wfile.write(b"\r\n")
-                    last_sent_ts = frame_ts
-                time.sleep(0.03)
+            stream_mjpeg(self.wfile, state.broadcast, boundary=boundary)
         except (BrokenPipeError, ConnectionResetError):
             return
 
@@ -726,6 +547,8 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--depth-head-fraction", type=float, default=0.45)
     parser.add_argument("--depth-min-valid-px", type=int, default=25)
     parser.add_argument("--depth-head-region", choices=["top", "bottom"], default="top")
+    parser.add_argument("--depth-sample-stride", type=int, default=1, help="Sample every Nth depth pixel in the head ROI")
+    parser.add_argument("--depth-percentile", type=float, default=50.0, help="Percentile of valid head depth (50 = median)")
     parser.add_argument("--imu-enable", action="store_true", default=True)
     parser.add_argument("--imu-rate-hz", type=int, default=100)
     parser.add_argument("--jpeg-quality", type=int, default=85)
@@ -764,6 +587,23 @@ def build_parser() -> argparse.ArgumentParser:
         default=0.0,
         help="Optional extra cap on host association jump distance in pixels (0 disables; used in host-yolov8-raw).",
     )
+    parser.add_argument(
+        "--raw-dump-npz",
+        default="",
+        help="host-yolov8-raw: save the first --raw-dump-frames raw NN outputs to this .npz (for scripts/yolo_decode_bench.py).",
+    )
+    parser.add_argument("--raw-dump-frames", type=int, default=200)
+    parser.add_argument("--record", default="", help="Record tracklets/NN/depth/IMU queue messages to this file (see camera_replay.py).")
+    parser.add_argument("--record-max-mb", type=int, default=512, help="Stop recording once the file reaches this size.")
+    parser.add_argument("--replay", default="", help="Run the counting loop on a recording instead of the camera.")
+    parser.add_argument("--replay-realtime", action="store_true", help="Replay at the recorded pace (default: as fast as possible).")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Pace multiplier for --replay-realtime.")
+    parser.add_argument(
+        "--predict-velocity",
+        action="store_true",
+        help="host-yolov8-raw: shift tracks by their constant-velocity estimate before matching (fewer lost fast tracks).",
+    )
+    add_event_writer_args(parser)
     parser.add_argument("--log-interval-sec", type=float, default=10.0)
     return parser
 
@@ -869,6 +709,8 @@ def load_runtime(args: argparse.Namespace) -> argparse.Namespace:
     args.depth_head_fraction = float(env.get("CAM_DEPTH_HEAD_FRACTION", str(args.depth_head_fraction)))
     args.depth_min_valid_px = int(env.get("CAM_DEPTH_MIN_VALID_PX", str(args.depth_min_valid_px)))
     args.depth_head_region = env.get("CAM_DEPTH_HEAD_REGION", args.depth_head_region).strip().lower()
+    args.depth_sample_stride = int(env.get("CAM_DEPTH_SAMPLE_STRIDE", str(args.depth_sample_stride)))
+    args.depth_percentile = float(env.get("CAM_DEPTH_PERCENTILE", str(args.depth_percentile)))
     args.imu_enable = parse_bool(env.get("CAM_IMU_ENABLE"), args.imu_enable)
     args.imu_rate_hz = int(env.get("CAM_IMU_RATE_HZ", str(args.imu_rate_hz)))
     args.jpeg_quality = int(env.get("CAM_JPEG_QUALITY", str(args.jpeg_quality)))
@@ -887,6 +729,11 @@ def load_runtime(args: argparse.Namespace) -> argparse.Namespace:
         env.get("CAM_DEPTH_COUNT_MIN_SIDE_FRAMES_BEFORE_MIDDLE", str(args.min_side_frames_before_middle)),
     )
     args.max_jump_px = float(env.get("CAM_DEPTH_COUNT_MAX_JUMP_PX", str(args.max_jump_px)))
+    args.predict_velocity = parse_bool(env.get("CAM_DEPTH_COUNT_PREDICT_VELOCITY"), args.predict_velocity)
+    args.raw_dump_npz = env.get("CAM_DEPTH_COUNT_RAW_DUMP_NPZ", args.raw_dump_npz).strip()
+    args.record = env.get("CAM_DEPTH_COUNT_RECORD", args.record).strip()
+    args.record_max_mb = int(env.get("CAM_DEPTH_COUNT_RECORD_MAX_MB", str(args.record_max_mb)))
+    load_event_writer_env(args, env, prefix="CAM_DEPTH_COUNT")
     args.bbox_min_w_px = parse_optional_int(env.get("CAM_DEPTH_COUNT_BBOX_MIN_W_PX"))
     args.bbox_min_h_px = parse_optional_int(env.get("CAM_DEPTH_COUNT_BBOX_MIN_H_PX"))
     args.bbox_max_w_px = parse_optional_int(env.get("CAM_DEPTH_COUNT_BBOX_MAX_W_PX"))
@@ -996,9 +843,180 @@ def load_runtime(args: argparse.Namespace) -> argparse.Namespace:
             raise ValueError(f"{name} must be >= 0")
     if args.depth_head_region not in {"top", "bottom"}:
         raise ValueError("depth-head-region must be top|bottom")
+    if not (1 <= args.depth_sample_stride <= 8):
+        raise ValueError("depth-sample-stride must be in [1..8]")
+    if not (0.0 <= args.depth_percentile <= 100.0):
+        raise ValueError("depth-percentile must be in [0..100]")
     return args
 
 
+@dataclass
+class CameraQueues:
+    track: Any
+    nn: Any
+    frame: Any
+    depth: Any
+    imu: Any
+    imu_available: bool
+    model_kind: str
+
+
+def build_device_queues(
+    pipeline: dai.Pipeline,
+    args: argparse.Namespace,
+    *,
+    model_input: tuple[int, int],
+    preview_size: tuple[int, int],
+    depth_output: tuple[int, int],
+) -> CameraQueues:
+    model_in_w, model_in_h = model_input
+    preview_w, preview_h = preview_size
+    depth_out_w, depth_out_h = depth_output
+    camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_A)
+    using_local_archive = is_local_nnarchive_model(args.model)
+    using_local_blob = is_local_blob_model(args.model)
+    local_model_kind = "zoo"
+    track_queue = None
+    nn_queue = None
+
+    if str(args.backend).strip() == "device":
+        detection_network = pipeline.create(dai.node.DetectionNetwork)
+        if using_local_archive:
+            local_model_kind = "archive"
+            nn_archive = dai.NNArchive(args.model)
+            detection_network.build(
+                camera,
+                nn_archive,
+                fps=args.fps,
+            )
+        elif using_local_blob:
+            local_model_kind = "blob"
+            camera.requestOutput(
+                size=(model_in_w, model_in_h),
+                type=dai.ImgFrame.Type.BGR888p,
+                fps=args.fps,
+            ).link(detection_network.input)
+            detection_network.setBlobPath(args.model)
+        else:
+            detection_network.build(
+                camera,
+                dai.NNModelDescription(args.model),
+                fps=args.fps,
+            )
+
+        dnn_conf = args.dnn_confidence_min
+        if dnn_conf is None:
+            dnn_conf = float(args.confidence_min) * 0.75
+        detection_network.setConfidenceThreshold(max(0.01, min(0.99, float(dnn_conf))))
+
+        tracker = pipeline.create(dai.node.ObjectTracker)
+        tracker.setDetectionLabelsToTrack(list(args.track_labels))
+        tracker.setTrackerType(tracker_type_from_name(args.tracker_type))
+        tracker.setTrackerIdAssignmentPolicy(dai.TrackerIdAssignmentPolicy.UNIQUE_ID)
+        tracker.setTrackletBirthThreshold(max(1, args.min_track_age // 2))
+        tracker.setTrackletMaxLifespan(max(10, args.max_lost_frames * 3))
+        tracker.setOcclusionRatioThreshold(float(args.tracker_occlusion_ratio))
+        if hasattr(tracker, "setMaxObjectsToTrack"):
+            try:
+                tracker.setMaxObjectsToTrack(int(args.tracker_max_objects))
+            except Exception:
+                pass
+
+        detection_network.out.link(tracker.inputDetections)
+        detection_network.passthrough.link(tracker.inputDetectionFrame)
+        detection_network.passthrough.link(tracker.inputTrackerFrame)
+        track_queue = tracker.out.createOutputQueue(maxSize=6, blocking=False)
+    else:
+        if not (using_local_archive or using_local_blob):
+            raise SystemExit("host-yolov8-raw backend requires CAM_DEPTH_COUNT_MODEL to be a local file (.tar.xz/.blob)")
+        if using_local_archive:
+            local_model_kind = "archive"
+        elif using_local_blob:
+            local_model_kind = "blob"
+        nn = pipeline.create(dai.node.NeuralNetwork)
+        camera.requestOutput(
+            size=(model_in_w, model_in_h),
+            type=dai.ImgFrame.Type.BGR888p,
+            fps=args.fps,
+        ).link(nn.input)
+        if using_local_archive:
+            nn.setNNArchive(dai.NNArchive(args.model))
+        else:
+            nn.setBlobPath(args.model)
+        nn_queue = nn.out.createOutputQueue(maxSize=4, blocking=False)
+
+    preview_stream_fps = max(1.0, min(float(args.fps), float(args.preview_fps)))
+    frame_queue = camera.requestOutput(
+        size=(preview_w, preview_h),
+        type=dai.ImgFrame.Type.BGR888p,
+        fps=preview_stream_fps,
+    ).createOutputQueue(
+        maxSize=6,
+        blocking=False,
+    )
+
+    depth_queue = None
+    if args.depth_enable:
+        left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
+        right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
+        stereo = pipeline.create(dai.node.StereoDepth)
+        configure_stereo(stereo, output_size=(depth_out_w, depth_out_h))
+        left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
+        right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
+        depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
+
+    imu_queue = None
+    imu_available = False
+    if args.imu_enable:
+        try:
+            imu_node = pipeline.create(dai.node.IMU)
+            accel_sensor = resolve_imu_sensor(["ACCELEROMETER_RAW", "ACCELEROMETER"])
+            gyro_sensor = resolve_imu_sensor(["GYROSCOPE_RAW", "GYROSCOPE_CALIBRATED", "GYROSCOPE"])
+            if accel_sensor is not None:
+                imu_node.enableIMUSensor(accel_sensor, args.imu_rate_hz)
+            if gyro_sensor is not None:
+                imu_node.enableIMUSensor(gyro_sensor, args.imu_rate_hz)
+            if accel_sensor is not None or gyro_sensor is not None:
+                imu_node.setBatchReportThreshold(1)
+                imu_node.setMaxBatchReports(10)
+                imu_queue = imu_node.out.createOutputQueue(maxSize=20, blocking=False)
+                imu_available = True
+        except Exception as exc:
+            print(f"transport-strict: imu disabled: {exc}", flush=True)
+            args.imu_enable = False
+
+    return CameraQueues(
+        track=track_queue,
+        nn=nn_queue,
+        frame=frame_queue,
+        depth=depth_queue,
+        imu=imu_queue,
+        imu_available=imu_available,
+        model_kind=local_model_kind,
+    )
+
+
+def replay_queues(replay: ReplaySource, args: argparse.Namespace, model_input: tuple[int, int]) -> CameraQueues:
+    backend = str(args.backend).strip()
+    stream = STREAM_TRACKLETS if backend == "device" else STREAM_NN
+    if not replay.has_stream(stream):
+        raise SystemExit(f"{replay.path}: no '{stream}' stream for backend={backend} (recorded: {replay.meta.get('streams')})")
+    recorded_input = replay.meta.get("model_input_size")
+    if stream == STREAM_NN and recorded_input and list(recorded_input) != list(model_input):
+        raise SystemExit(f"{replay.path}: recorded model input {recorded_input} != {list(model_input)}")
+    depth_queue = replay.queue(STREAM_DEPTH) if args.depth_enable else None
+    imu_queue = replay.queue(STREAM_IMU) if args.imu_enable and replay.has_stream(STREAM_IMU) else None
+    return CameraQueues(
+        track=replay.queue(STREAM_TRACKLETS) if backend == "device" else None,
+        nn=replay.queue(STREAM_NN) if backend != "device" else None,
+        frame=replay.queue("frame"),
+        depth=depth_queue,
+        imu=imu_queue,
+        imu_available=imu_queue is not None,
+        model_kind="replay",
+    )
+
+
 def main() -> int:
     args = load_runtime(build_parser().parse_args())
     line_a = clamp_norm(args.axis_pos - args.line_gap_norm / 2.0, 0.05, 0.95)
@@ -1006,20 +1024,24 @@ def main() -> int:
     preview_w, preview_h = parse_preview_size(args.preview_size)
     depth_out_w, depth_out_h = parse_preview_size(args.depth_output_size)
     model_in_w, model_in_h = parse_preview_size(args.model_input_size)
+    replay: ReplaySource | None = None
+    if args.replay:
+        # Offline run: recorded queue messages replace the device, the loop clock follows the recording.
+        replay = ReplaySource(
+            args.replay,
+            streams={STREAM_TRACKLETS if str(args.backend).strip() == "device" else STREAM_NN, STREAM_DEPTH, STREAM_IMU},
+            realtime=args.replay_realtime,
+            speed=args.replay_speed,
+        )
+    clock = replay.monotonic if replay is not None else time.monotonic
     roi = args.roi
+    writer = event_writer_from_args(args, label="transport-strict") if replay is None else None
 
-    shared = SharedState(
-        lock=threading.Lock(),
-        jpg=b"",
-        last_frame_ts=0.0,
-        preview_frame=None,
-        preview_items=[],
-        stats={
+    stats = PipelineStats(
+        {
             "status": "starting",
             "device": "",
             "usb_speed": "",
-            "preview_enabled": bool(getattr(args, "preview_enabled_default", True)),
-            "preview_frames": 0,
             "messages": 0,
             "tracklets_total": 0,
             "active_tracks": 0,
@@ -1075,6 +1097,7 @@ def main() -> int:
             "infer_middle_from_span": bool(getattr(args, "infer_middle_from_span", True)),
             "min_side_frames_before_middle": int(args.min_side_frames_before_middle),
             "max_jump_px": float(args.max_jump_px),
+            "predict_velocity": bool(args.predict_velocity),
             "roi_reject": 0,
             "middle_reject_side_frames": 0,
             "bbox_min_w_px": args.bbox_min_w_px,
@@ -1093,6 +1116,8 @@ def main() -> int:
             "depth_min_m": args.depth_min_m,
             "depth_max_m": args.depth_max_m,
             "depth_head_region": args.depth_head_region,
+            "depth_sample_stride": args.depth_sample_stride,
+            "depth_percentile": args.depth_percentile,
             "imu_enabled": args.imu_enable,
             "imu_type": "",
             "imu_present": False,
@@ -1110,6 +1135,12 @@ def main() -> int:
             "port": args.debug_port,
         },
     )
+    shared = SharedState(
+        broadcast=FrameBroadcaster(),
+        preview=(None, []),
+        stats=stats,
+        preview_enabled=bool(getattr(args, "preview_enabled_default", True)),
+    )
 
     httpd = ThreadingHTTPServer((args.debug_bind, args.debug_port), Handler)
     httpd.shared_state = shared  # type: ignore[attr-defined]
@@ -1123,28 +1154,35 @@ def main() -> int:
     )
 
     stop_event = threading.Event()
+    # Each thread owns its timers; the capture loop merges both into stats["latency_ms"].
+    loop_timers = StageTimers()
+    preview_timers = StageTimers(total_stage=None)
 
     def preview_worker() -> None:
         last_send_ts = 0.0
+        last_preview: tuple[np.ndarray | None, list[dict[str, Any]]] | None = None
         while not stop_event.is_set():
-            with shared.lock:
-                preview_enabled = bool(shared.stats.get("preview_enabled", True))
-                preview_fps = float(shared.stats.get("preview_fps", args.preview_fps))
-                jpeg_quality = int(shared.stats.get("jpeg_quality", args.jpeg_quality))
-                axis = str(shared.stats.get("axis", args.axis))
-                line_a_norm = float(shared.stats.get("line_a", line_a))
-                line_b_norm = float(shared.stats.get("line_b", line_b))
-                in_count = int(shared.stats.get("count_in", 0))
-                out_count = int(shared.stats.get("count_out", 0))
-                event_count = int(shared.stats.get("events_total", 0))
-                imu_acc_norm = shared.stats.get("imu_acc_norm")
-                imu_gyro_norm = shared.stats.get("imu_gyro_norm")
-                items = list(shared.preview_items)
-                frame = shared.preview_frame
-
-            if not preview_enabled or preview_fps <= 0.0 or frame is None:
+            if not shared.broadcast.has_viewers():
                 time.sleep(0.12)
                 continue
+            snapshot = shared.stats.snapshot()
+            preview_enabled = shared.preview_enabled
+            preview_fps = float(snapshot.get("preview_fps", args.preview_fps))
+            jpeg_quality = int(snapshot.get("jpeg_quality", args.jpeg_quality))
+            axis = str(snapshot.get("axis", args.axis))
+            line_a_norm = float(snapshot.get("line_a", line_a))
+            line_b_norm = float(snapshot.get("line_b", line_b))
+            in_count = int(snapshot.get("count_in", 0))
+            out_count = int(snapshot.get("count_out", 0))
+            event_count = int(snapshot.get("events_total", 0))
+            imu_acc_norm = snapshot.get("imu_acc_norm")
+            imu_gyro_norm = snapshot.get("imu_gyro_norm")
+            preview = shared.preview
+            frame, items = preview
+
+            if not preview_enabled or preview_fps <= 0.0 or frame is None or preview is last_preview:
+                time.sleep(0.02)
+                continue
 
             now = time.monotonic()
             min_interval = 1.0 / max(0.1, preview_fps)
@@ -1152,7 +1190,10 @@ def main() -> int:
                 time.sleep(0.02)
                 continue
 
-            draw = frame.copy()
+            # The capture loop hands over a fresh frame each time and never touches it again: draw in place.
+            last_preview = preview
+            preview_timers.begin()
+            draw = frame
             height, width = draw.shape[:2]
             if axis == "y":
                 line_ax = clamp_pixel(line_a_norm, width)
@@ -1193,16 +1234,16 @@ def main() -> int:
                     1,
                 )
 
+            preview_timers.lap("preview_draw")
             ok, encoded = cv2.imencode(
                 ".jpg",
                 draw,
                 [int(cv2.IMWRITE_JPEG_QUALITY), int(max(10, min(95, jpeg_quality)))],
             )
+            preview_timers.lap("jpeg_encode")
+            preview_timers.end()
             if ok:
-                with shared.lock:
-                    shared.jpg = encoded.tobytes()
-                    shared.last_frame_ts = now
-                    shared.stats["preview_frames"] = int(shared.stats.get("preview_frames", 0)) + 1
+                shared.broadcast.publish(encoded.tobytes(), now)
                 last_send_ts = now
             else:
                 time.sleep(0.05)
@@ -1215,129 +1256,38 @@ def main() -> int:
     last_tracklets: list[dai.Tracklet] = []
     host_tracks: dict[int, HostTrackState] = {}
     next_host_track_id = 1
+    yolo_decoder = YoloV8DflDecoder((model_in_w, model_in_h))
+    raw_dump: dict[str, list[np.ndarray]] = {}
+    raw_dump_frames = 0
     latest_depth_frame: np.ndarray | None = None
+    depth_sampler = HeadDepthSampler(
+        head_fraction=args.depth_head_fraction,
+        min_valid_px=args.depth_min_valid_px,
+        head_region=args.depth_head_region,
+        stride=args.depth_sample_stride,
+        percentile=args.depth_percentile,
+    )
     in_count = 0
     out_count = 0
     event_count = 0
-    last_log = time.monotonic()
+    last_log = clock()
+    last_latency_ts = 0.0
     imu_acc_norm = None
     imu_gyro_norm = None
     last_preview_ts = 0.0
 
-    with dai.Pipeline() as pipeline:
-        camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_A)
-        backend = str(args.backend).strip()
-        using_local_archive = is_local_nnarchive_model(args.model)
-        using_local_blob = is_local_blob_model(args.model)
-        local_model_kind = "zoo"
-        track_queue = None
-        nn_queue = None
-
-        if backend == "device":
-            detection_network = pipeline.create(dai.node.DetectionNetwork)
-            if using_local_archive:
-                local_model_kind = "archive"
-                nn_archive = dai.NNArchive(args.model)
-                detection_network.build(
-                    camera,
-                    nn_archive,
-                    fps=args.fps,
-                )
-            elif using_local_blob:
-                local_model_kind = "blob"
-                camera.requestOutput(
-                    size=(model_in_w, model_in_h),
-                    type=dai.ImgFrame.Type.BGR888p,
-                    fps=args.fps,
-                ).link(detection_network.input)
-                detection_network.setBlobPath(args.model)
-            else:
-                detection_network.build(
-                    camera,
-                    dai.NNModelDescription(args.model),
-                    fps=args.fps,
-                )
-
-            dnn_conf = args.dnn_confidence_min
-            if dnn_conf is None:
-                dnn_conf = float(args.confidence_min) * 0.75
-            detection_network.setConfidenceThreshold(max(0.01, min(0.99, float(dnn_conf))))
-
-            tracker = pipeline.create(dai.node.ObjectTracker)
-            tracker.setDetectionLabelsToTrack(list(args.track_labels))
-            tracker.setTrackerType(tracker_type_from_name(args.tracker_type))
-            tracker.setTrackerIdAssignmentPolicy(dai.TrackerIdAssignmentPolicy.UNIQUE_ID)
-            tracker.setTrackletBirthThreshold(max(1, args.min_track_age // 2))
-            tracker.setTrackletMaxLifespan(max(10, args.max_lost_frames * 3))
-            tracker.setOcclusionRatioThreshold(float(args.tracker_occlusion_ratio))
-            if hasattr(tracker, "setMaxObjectsToTrack"):
-                try:
-                    tracker.setMaxObjectsToTrack(int(args.tracker_max_objects))
-                except Exception:
-                    pass
-
-            detection_network.out.link(tracker.inputDetections)
-            detection_network.passthrough.link(tracker.inputDetectionFrame)
-            detection_network.passthrough.link(tracker.inputTrackerFrame)
-            track_queue = tracker.out.createOutputQueue(maxSize=6, blocking=False)
+    with (replay if replay is not None else dai.Pipeline()) as pipeline:
+        if replay is not None:
+            queues = replay_queues(replay, args, (model_in_w, model_in_h))
         else:
-            if not (using_local_archive or using_local_blob):
-                raise SystemExit("host-yolov8-raw backend requires CAM_DEPTH_COUNT_MODEL to be a local file (.tar.xz/.blob)")
-            if using_local_archive:
-                local_model_kind = "archive"
-            elif using_local_blob:
-                local_model_kind = "blob"
-            nn = pipeline.create(dai.node.NeuralNetwork)
-            camera.requestOutput(
-                size=(model_in_w, model_in_h),
-                type=dai.ImgFrame.Type.BGR888p,
-                fps=args.fps,
-            ).link(nn.input)
-            if using_local_archive:
-                nn.setNNArchive(dai.NNArchive(args.model))
-            else:
-                nn.setBlobPath(args.model)
-            nn_queue = nn.out.createOutputQueue(maxSize=4, blocking=False)
-
-        preview_stream_fps = max(1.0, min(float(args.fps), float(args.preview_fps)))
-        frame_queue = camera.requestOutput(
-            size=(preview_w, preview_h),
-            type=dai.ImgFrame.Type.BGR888p,
-            fps=preview_stream_fps,
-        ).createOutputQueue(
-            maxSize=6,
-            blocking=False,
-        )
-
-        depth_queue = None
-        if args.depth_enable:
-            left_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_B)
-            right_camera = pipeline.create(dai.node.Camera).build(dai.CameraBoardSocket.CAM_C)
-            stereo = pipeline.create(dai.node.StereoDepth)
-            configure_stereo(stereo, output_size=(depth_out_w, depth_out_h))
-            left_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.left)
-            right_camera.requestOutput(size=(640, 400), type=dai.ImgFrame.Type.RAW8, fps=args.fps).link(stereo.right)
-            depth_queue = stereo.depth.createOutputQueue(maxSize=4, blocking=False)
-
-        imu_queue = None
-        imu_available = False
-        if args.imu_enable:
-            try:
-                imu_node = pipeline.create(dai.node.IMU)
-                accel_sensor = resolve_imu_sensor(["ACCELEROMETER_RAW", "ACCELEROMETER"])
-                gyro_sensor = resolve_imu_sensor(["GYROSCOPE_RAW", "GYROSCOPE_CALIBRATED", "GYROSCOPE"])
-                if accel_sensor is not None:
-                    imu_node.enableIMUSensor(accel_sensor, args.imu_rate_hz)
-                if gyro_sensor is not None:
-                    imu_node.enableIMUSensor(gyro_sensor, args.imu_rate_hz)
-                if accel_sensor is not None or gyro_sensor is not None:
-                    imu_node.setBatchReportThreshold(1)
-                    imu_node.setMaxBatchReports(10)
-                    imu_queue = imu_node.out.createOutputQueue(maxSize=20, blocking=False)
-                    imu_available = True
-            except Exception as exc:
-                print(f"transport-strict: imu disabled: {exc}", flush=True)
-                args.imu_enable = False
+            queues = build_device_queues(
+                pipeline,
+                args,
+                model_input=(model_in_w, model_in_h),
+                preview_size=(preview_w, preview_h),
+                depth_output=(depth_out_w, depth_out_h),
+            )
+        backend = str(args.backend).strip()
 
         pipeline.start()
         device = pipeline.getDefaultDevice()
@@ -1348,13 +1298,43 @@ def main() -> int:
             except Exception:
                 imu_type = "unknown"
 
-        with shared.lock:
-            shared.stats["status"] = "running"
-            shared.stats["device"] = device.getDeviceName()
-            shared.stats["usb_speed"] = device.getUsbSpeed().name
-            shared.stats["imu_enabled"] = bool(args.imu_enable)
-            shared.stats["imu_type"] = imu_type
-            shared.stats["imu_present"] = bool(imu_available)
+        recorder: Recorder | None = None
+        if args.record and replay is None:
+            recorded_streams = {
+                STREAM_TRACKLETS: queues.track,
+                STREAM_NN: queues.nn,
+                STREAM_DEPTH: queues.depth,
+                STREAM_IMU: queues.imu,
+            }
+            recorder = Recorder(
+                args.record,
+                {
+                    "script": "transport-strict",
+                    "created_at": utc_now_iso(),
+                    "device": device.getDeviceName(),
+                    "usb_speed": device.getUsbSpeed().name,
+                    "imu_type": imu_type,
+                    "backend": backend,
+                    "model_input_size": [model_in_w, model_in_h],
+                    "depth_output_size": [depth_out_w, depth_out_h],
+                    "streams": [name for name, queue in recorded_streams.items() if queue is not None],
+                    "args": {k: v for k, v in vars(args).items() if v is None or isinstance(v, (str, int, float, bool))},
+                },
+                max_bytes=int(args.record_max_mb) * 1024 * 1024,
+            )
+            queues.track = recorder.wrap(queues.track, STREAM_TRACKLETS)
+            queues.nn = recorder.wrap(queues.nn, STREAM_NN)
+            queues.depth = recorder.wrap(queues.depth, STREAM_DEPTH)
+            queues.imu = recorder.wrap(queues.imu, STREAM_IMU)
+            print(f"transport-strict: recording {', '.join(recorder.streams)} to {args.record}", flush=True)
+
+        stats.values["status"] = "running"
+        stats.values["device"] = device.getDeviceName()
+        stats.values["usb_speed"] = device.getUsbSpeed().name
+        stats.values["imu_enabled"] = bool(args.imu_enable)
+        stats.values["imu_type"] = imu_type
+        stats.values["imu_present"] = bool(queues.imu_available)
+        stats.publish()
 
         print(
             f"transport-strict: device={device.getDeviceName()} usb_speed={device.getUsbSpeed().name} "
@@ -1364,51 +1344,75 @@ def main() -> int:
             f"depth={args.depth_min_m:.2f}-{args.depth_max_m:.2f}m "
             f"jpeg_q={args.jpeg_quality} preview={preview_w}x{preview_h}@{args.preview_fps:.1f} "
             f"depth_out={depth_out_w}x{depth_out_h} model_input={model_in_w}x{model_in_h} "
-            f"model_kind={local_model_kind} backend={backend}",
+            f"model_kind={queues.model_kind} backend={backend}",
             flush=True,
         )
 
         try:
             while pipeline.isRunning():
-                now = time.monotonic()
+                now = clock()
+                loop_timers.begin()
 
-                new_acc_norm, new_gyro_norm = poll_imu_queue(imu_queue, shared)
+                new_acc_norm, new_gyro_norm = poll_imu_queue(queues.imu, stats)
                 if new_acc_norm is not None:
                     imu_acc_norm = new_acc_norm
                 if new_gyro_norm is not None:
                     imu_gyro_norm = new_gyro_norm
 
-                if depth_queue is not None:
-                    depth_msg = depth_queue.tryGet()
+                if queues.depth is not None:
+                    depth_msg = queues.depth.tryGet()
                     if depth_msg is not None:
                         latest_depth_frame = depth_msg.getFrame()
 
                 incoming_tracklets: list[Any] | None = None
                 if backend == "device":
-                    track_msg = track_queue.tryGet() if track_queue is not None else None
+                    track_msg = queues.track.tryGet() if queues.track is not None else None
+                    loop_timers.lap("get")
                     if track_msg is not None:
+                        age_ms = device_age_ms(track_msg)
+                        if age_ms is not None:
+                            loop_timers.add("device_age", age_ms)
                         incoming_tracklets = list(track_msg.tracklets)
                 else:
-                    nn_msg = nn_queue.tryGet() if nn_queue is not None else None
+                    nn_msg = queues.nn.tryGet() if queues.nn is not None else None
+                    loop_timers.lap("get")
                     if nn_msg is not None:
+                        age_ms = device_age_ms(nn_msg)
+                        if age_ms is not None:
+                            loop_timers.add("device_age", age_ms)
                         det_conf = args.dnn_confidence_min
                         if det_conf is None:
                             det_conf = float(args.confidence_min) * 0.75
                         layer_names = list(getattr(nn_msg, "getAllLayerNames", lambda: [])())
                         outputs: list[np.ndarray] = []
+                        output_names: list[str] = []
                         for name in layer_names:
                             try:
                                 outputs.append(np.asarray(nn_msg.getTensor(name), dtype=np.float32))
+                                output_names.append(str(name))
                             except Exception:
                                 continue
 
-                        dets = decode_yolov8_dfl_outputs(
+                        if args.raw_dump_npz and raw_dump_frames < int(args.raw_dump_frames):
+                            for name, out in zip(output_names, outputs):
+                                raw_dump.setdefault(name, []).append(out.copy())
+                            raw_dump_frames += 1
+                            if raw_dump_frames >= int(args.raw_dump_frames):
+                                np.savez_compressed(
+                                    args.raw_dump_npz,
+                                    input_size=np.asarray([model_in_w, model_in_h], dtype=np.int32),
+                                    **{f"out_{name}": np.stack(frames) for name, frames in raw_dump.items()},
+                                )
+                                raw_dump.clear()
+                                print(f"[raw-dump] saved {raw_dump_frames} frames to {args.raw_dump_npz}", flush=True)
+
+                        dets = yolo_decoder.decode(
                             outputs,
-                            input_size=(model_in_w, model_in_h),
                             confidence_min=float(det_conf),
                             nms_iou=float(args.nms_iou),
                             max_det=int(args.max_det),
                         )
+                        loop_timers.lap("decode")
 
                         detections: list[tuple[float, float, float, float, float]] = []
                         for x1, y1, x2, y2, conf in dets:
@@ -1421,58 +1425,41 @@ def main() -> int:
                             detections.append((x1n, y1n, x2n, y2n, float(conf)))
 
                         det_centers = [((d[0] + d[2]) / 2.0, (d[1] + d[3]) / 2.0) for d in detections]
-                        det_boxes = [(d[0], d[1], d[2], d[3]) for d in detections]
-
-                        matched_track_to_det: dict[int, int] = {}
-                        used_tracks: set[int] = set()
-                        used_dets: set[int] = set()
-
-                        # Stage 1: IoU-first matching (reduces ID swaps on crossing).
-                        iou_pairs: list[tuple[float, int, int]] = []
-                        for tid, st in host_tracks.items():
-                            t_box = (float(st.x1n), float(st.y1n), float(st.x2n), float(st.y2n))
-                            for di, d_box in enumerate(det_boxes):
-                                iou = bbox_iou(t_box, d_box)
-                                if iou >= float(args.match_iou_min):
-                                    iou_pairs.append((iou, tid, di))
-                        iou_pairs.sort(key=lambda row: row[0], reverse=True)
-                        for _, tid, di in iou_pairs:
-                            if tid in used_tracks or di in used_dets:
-                                continue
-                            matched_track_to_det[tid] = di
-                            used_tracks.add(tid)
-                            used_dets.add(di)
 
-                        # Stage 2: centroid distance matching for remaining.
+                        track_ids = list(host_tracks.keys())
+                        track_states = [host_tracks[tid] for tid in track_ids]
+                        track_boxes = np.array(
+                            [(st.x1n, st.y1n, st.x2n, st.y2n) for st in track_states], dtype=np.float64
+                        ).reshape(-1, 4)
+                        track_centers = np.array([(st.cxn, st.cyn) for st in track_states], dtype=np.float64).reshape(-1, 2)
+                        if args.predict_velocity and track_states:
+                            offsets = predict_offsets(
+                                np.array([(st.vx, st.vy) for st in track_states], dtype=np.float64),
+                                np.array([now - st.last_seen for st in track_states], dtype=np.float64),
+                            )
+                            track_centers = track_centers + offsets
+                            track_boxes = track_boxes + np.tile(offsets, 2)
+
                         jump_cap_px = float(args.match_dist_px)
                         if float(args.max_jump_px) > 0.0:
                             jump_cap_px = min(jump_cap_px, float(args.max_jump_px))
-                        dist_pairs: list[tuple[float, int, int]] = []
-                        for tid, st in host_tracks.items():
-                            if tid in used_tracks:
-                                continue
-                            for di, (cxn, cyn) in enumerate(det_centers):
-                                if di in used_dets:
-                                    continue
-                                dist_px = float(
-                                    (((st.cxn - cxn) * float(model_in_w)) ** 2 + ((st.cyn - cyn) * float(model_in_h)) ** 2)
-                                    ** 0.5
-                                )
-                                if dist_px <= float(jump_cap_px):
-                                    dist_pairs.append((dist_px, tid, di))
-                        dist_pairs.sort(key=lambda row: row[0])
-                        for _, tid, di in dist_pairs:
-                            if tid in used_tracks or di in used_dets:
-                                continue
-                            matched_track_to_det[tid] = di
-                            used_tracks.add(tid)
-                            used_dets.add(di)
+                        matched_rows, _, unmatched_dets = match_tracks(
+                            track_centers,
+                            np.array(det_centers, dtype=np.float64).reshape(-1, 2),
+                            max_distance=jump_cap_px,
+                            scale=(float(model_in_w), float(model_in_h)),
+                            track_boxes=track_boxes,
+                            det_boxes=np.array([d[:4] for d in detections], dtype=np.float64).reshape(-1, 4),
+                            iou_min=float(args.match_iou_min),
+                        )
+                        matched_track_to_det = {track_ids[row]: di for row, di in matched_rows.items()}
 
                         updated_ids: set[int] = set()
                         for tid, di in matched_track_to_det.items():
                             x1n, y1n, x2n, y2n, conf = detections[di]
                             cxn, cyn = det_centers[di]
                             st = host_tracks[tid]
+                            st.vx, st.vy = smooth_velocity((st.vx, st.vy), (st.cxn, st.cyn), (cxn, cyn), now - st.last_seen)
                             st.last_seen = now
                             st.x1n = x1n
                             st.y1n = y1n
@@ -1485,9 +1472,7 @@ def main() -> int:
                             updated_ids.add(tid)
 
                         # Create new tracks for unmatched detections
-                        for di in range(len(detections)):
-                            if di in used_dets:
-                                continue
+                        for di in sorted(unmatched_dets):
                             x1n, y1n, x2n, y2n, conf = detections[di]
                             cxn, cyn = det_centers[di]
                             tid = next_host_track_id
@@ -1513,8 +1498,7 @@ def main() -> int:
                             tracks.pop(tid, None)
                             overlay_meta.pop(tid, None)
                         if stale_ids:
-                            with shared.lock:
-                                shared.stats["lost_prune"] = int(shared.stats["lost_prune"]) + len(stale_ids)
+                            stats.incr("lost_prune", len(stale_ids))
 
                         # Build "tracklets-like" objects for the existing strict logic/drawing.
                         incoming_tracklets = []
@@ -1533,11 +1517,24 @@ def main() -> int:
                                     age=int(st.age),
                                 )
                             )
+                        loop_timers.lap("match")
 
                 if incoming_tracklets is not None:
                     last_tracklets = list(incoming_tracklets)
-                    with shared.lock:
-                        shared.stats["messages"] = int(shared.stats["messages"]) + 1
+                    stats.incr("messages")
+
+                    head_depths: dict[int, float | None] = {}
+                    if args.depth_enable:
+                        # Depth for every live tracklet in one batched pass; the gates below only read it.
+                        head_depths = depth_sampler.sample(
+                            latest_depth_frame,
+                            [
+                                t
+                                for t in last_tracklets
+                                if t.status in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}
+                            ],
+                        )
+                        loop_timers.lap("depth")
 
                     for tracklet in last_tracklets:
                         tid = int(tracklet.id)
@@ -1548,8 +1545,7 @@ def main() -> int:
                         if tracklet.status not in {dai.Tracklet.TrackingStatus.NEW, dai.Tracklet.TrackingStatus.TRACKED}:
                             continue
 
-                        with shared.lock:
-                            shared.stats["tracklets_total"] = int(shared.stats["tracklets_total"]) + 1
+                        stats.incr("tracklets_total")
 
                         confidence = float(getattr(tracklet.srcImgDetection, "confidence", 0.0))
                         track_age = int(getattr(tracklet, "age", 0))
@@ -1559,8 +1555,7 @@ def main() -> int:
                             cx, cy = centroid_norm(tracklet)
                             roi_ok = (roi[0] <= cx <= roi[2]) and (roi[1] <= cy <= roi[3])
                             if not roi_ok:
-                                with shared.lock:
-                                    shared.stats["roi_reject"] = int(shared.stats.get("roi_reject", 0)) + 1
+                                stats.incr("roi_reject")
                                 if state is not None:
                                     state.last_seen = now
                                     state.age = track_age
@@ -1605,8 +1600,7 @@ def main() -> int:
                         if args.bbox_max_area_px2 is not None and bbox_area_px2 > float(args.bbox_max_area_px2):
                             bbox_size_ok = False
                         if not bbox_size_ok:
-                            with shared.lock:
-                                shared.stats["bbox_reject_size"] = int(shared.stats.get("bbox_reject_size", 0)) + 1
+                            stats.incr("bbox_reject_size")
                             if state is not None:
                                 state.last_seen = now
                                 state.age = track_age
@@ -1642,8 +1636,7 @@ def main() -> int:
                                 if args.bbox_max_ar is not None and bbox_ar > float(args.bbox_max_ar):
                                     bbox_ar_ok = False
                         if not bbox_ar_ok:
-                            with shared.lock:
-                                shared.stats["bbox_reject_ar"] = int(shared.stats.get("bbox_reject_ar", 0)) + 1
+                            stats.incr("bbox_reject_ar")
                             if state is not None:
                                 state.last_seen = now
                                 state.age = track_age
@@ -1675,35 +1668,25 @@ def main() -> int:
                             axis_value = axis_max if state.side_start == -1 else axis_min
                         zone = classify_zone(axis_value, line_a, line_b, args.axis_hyst)
                         span_mid = (axis_min <= (line_b - args.axis_hyst)) and (axis_max >= (line_a + args.axis_hyst))
-                        with shared.lock:
-                            if zone == -1:
-                                shared.stats["zone_neg_hits"] = int(shared.stats["zone_neg_hits"]) + 1
-                            elif zone == 0:
-                                shared.stats["zone_mid_hits"] = int(shared.stats["zone_mid_hits"]) + 1
-                            else:
-                                shared.stats["zone_pos_hits"] = int(shared.stats["zone_pos_hits"]) + 1
+                        if zone == -1:
+                            stats.incr("zone_neg_hits")
+                        elif zone == 0:
+                            stats.incr("zone_mid_hits")
+                        else:
+                            stats.incr("zone_pos_hits")
 
                         depth_m = None
                         depth_ok = True
                         if args.depth_enable:
-                            depth_m = estimate_head_shoulders_depth_m(
-                                tracklet,
-                                latest_depth_frame,
-                                args.depth_head_fraction,
-                                args.depth_min_valid_px,
-                                args.depth_head_region,
-                            )
+                            depth_m = head_depths.get(tid)
                             if depth_m is None:
                                 depth_ok = False
-                                with shared.lock:
-                                    shared.stats["depth_missing"] = int(shared.stats["depth_missing"]) + 1
+                                stats.incr("depth_missing")
                             elif depth_m < args.depth_min_m or depth_m > args.depth_max_m:
                                 depth_ok = False
-                                with shared.lock:
-                                    shared.stats["depth_reject"] = int(shared.stats["depth_reject"]) + 1
+                                stats.incr("depth_reject")
                             else:
-                                with shared.lock:
-                                    shared.stats["depth_pass"] = int(shared.stats["depth_pass"]) + 1
+                                stats.incr("depth_pass")
 
                         bbox_wz = None
                         bbox_wz_ok = True
@@ -1717,13 +1700,11 @@ def main() -> int:
                                 if args.bbox_max_wz is not None and bbox_wz > float(args.bbox_max_wz):
                                     bbox_wz_ok = False
                             if not bbox_wz_ok:
-                                with shared.lock:
-                                    shared.stats["bbox_reject_wz"] = int(shared.stats.get("bbox_reject_wz", 0)) + 1
+                                stats.incr("bbox_reject_wz")
 
                         conf_ok = confidence >= args.confidence_min
                         if not conf_ok:
-                            with shared.lock:
-                                shared.stats["conf_reject"] = int(shared.stats["conf_reject"]) + 1
+                            stats.incr("conf_reject")
 
                         if state is None:
                             side_frames = 1 if zone in {-1, 1} else 0
@@ -1773,16 +1754,11 @@ def main() -> int:
                                 if state.side_start is not None and int(getattr(state, "side_frames", 0)) >= min_side_frames:
                                     state.seen_middle = True
                                     state.entered_middle_ts = now
-                                    with shared.lock:
-                                        shared.stats["middle_entries"] = int(shared.stats["middle_entries"]) + 1
+                                    stats.incr("middle_entries")
                                 else:
-                                    with shared.lock:
-                                        shared.stats["middle_reject_side_frames"] = int(
-                                            shared.stats.get("middle_reject_side_frames", 0),
-                                        ) + 1
+                                    stats.incr("middle_reject_side_frames")
                             elif state.entered_middle_ts is not None and (now - state.entered_middle_ts) > args.hang_timeout_sec:
-                                with shared.lock:
-                                    shared.stats["hang_reject"] = int(shared.stats["hang_reject"]) + 1
+                                stats.incr("hang_reject")
                                 state.side_start = None
                                 state.seen_middle = False
                                 state.entered_middle_ts = None
@@ -1810,14 +1786,12 @@ def main() -> int:
 
                         if not state.seen_middle:
                             if span_mid and bool(getattr(args, "infer_middle_from_span", True)):
-                                with shared.lock:
-                                    shared.stats["middle_inferred"] = int(shared.stats["middle_inferred"]) + 1
+                                stats.incr("middle_inferred")
                                 state.seen_middle = True
                                 state.entered_middle_ts = now
                                 state.middle_frames = 1
                             else:
-                                with shared.lock:
-                                    shared.stats["zone_flip_no_middle"] = int(shared.stats["zone_flip_no_middle"]) + 1
+                                stats.incr("zone_flip_no_middle")
                                 state.side_start = zone
                                 state.first_side_axis = axis_value
                                 state.entered_middle_ts = None
@@ -1836,8 +1810,7 @@ def main() -> int:
                             continue
 
                         if track_age < args.min_track_age:
-                            with shared.lock:
-                                shared.stats["age_reject"] = int(shared.stats["age_reject"]) + 1
+                            stats.incr("age_reject")
                             state.side_start = zone
                             state.first_side_axis = axis_value
                             state.seen_middle = False
@@ -1847,8 +1820,7 @@ def main() -> int:
                             continue
 
                         if state.entered_middle_ts is not None and (now - state.entered_middle_ts) > args.hang_timeout_sec:
-                            with shared.lock:
-                                shared.stats["hang_reject"] = int(shared.stats["hang_reject"]) + 1
+                            stats.incr("hang_reject")
                             state.side_start = zone
                             state.first_side_axis = axis_value
                             state.seen_middle = False
@@ -1862,8 +1834,7 @@ def main() -> int:
                             and state.last_event_direction is not None
                             and (now - state.last_event_ts) < args.per_track_rearm_sec
                         ):
-                            with shared.lock:
-                                shared.stats["rearm_reject"] = int(shared.stats["rearm_reject"]) + 1
+                            stats.incr("rearm_reject")
                             state.side_start = zone
                             state.first_side_axis = axis_value
                             state.seen_middle = False
@@ -1873,8 +1844,7 @@ def main() -> int:
                             continue
 
                         if (now - state.last_event_ts) < args.count_cooldown_sec:
-                            with shared.lock:
-                                shared.stats["dup_reject"] = int(shared.stats["dup_reject"]) + 1
+                            stats.incr("dup_reject")
                             state.side_start = zone
                             state.first_side_axis = axis_value
                             state.seen_middle = False
@@ -1884,8 +1854,7 @@ def main() -> int:
                             continue
 
                         if abs(axis_value - state.first_side_axis) < args.min_move_norm:
-                            with shared.lock:
-                                shared.stats["move_reject"] = int(shared.stats["move_reject"]) + 1
+                            stats.incr("move_reject")
                             state.side_start = zone
                             state.first_side_axis = axis_value
                             state.seen_middle = False
@@ -1900,8 +1869,22 @@ def main() -> int:
                             event_count += 1
                             state.last_event_ts = now
                             state.last_event_direction = direction
+                            seq_label = ""
+                            if writer is not None:
+                                payload = {
+                                    **counter_event(args, counter="transport-strict", in_inc=in_inc, out_inc=out_inc),
+                                    "confidence": round(confidence, 4),
+                                    "track_id": tid,
+                                    "direction": direction,
+                                    "axis": args.axis,
+                                    "line_a": round(line_a, 4),
+                                    "line_b": round(line_b, 4),
+                                }
+                                if depth_m is not None:
+                                    payload["depth_m"] = round(depth_m, 3)
+                                seq_label = f"seq={writer.submit(payload)} "
                             print(
-                                f"transport-strict event: track_id={tid} direction={direction} in={in_inc} out={out_inc} "
+                                f"transport-strict event: {seq_label}track_id={tid} direction={direction} in={in_inc} out={out_inc} "
                                 f"conf={confidence:.3f} depth_m={depth_m if depth_m is None else round(depth_m, 3)} age={track_age}",
                                 flush=True,
                             )
@@ -1919,25 +1902,33 @@ def main() -> int:
                         tracks.pop(tid, None)
                         overlay_meta.pop(tid, None)
                     if stale:
-                        with shared.lock:
-                            shared.stats["lost_prune"] = int(shared.stats["lost_prune"]) + len(stale)
-
-                with shared.lock:
-                    shared.stats["active_tracks"] = len(tracks)
-                    shared.stats["count_in"] = in_count
-                    shared.stats["count_out"] = out_count
-                    shared.stats["events_total"] = event_count
-
-                with shared.lock:
-                    preview_enabled = bool(shared.stats.get("preview_enabled", True))
+                        stats.incr("lost_prune", len(stale))
+                    loop_timers.lap("zones")
+
+                stats.values["active_tracks"] = len(tracks)
+                stats.values["count_in"] = in_count
+                stats.values["count_out"] = out_count
+                stats.values["events_total"] = event_count
+                stats.values["imu_acc_norm"] = imu_acc_norm
+                stats.values["imu_gyro_norm"] = imu_gyro_norm
+                if now - last_latency_ts >= 1.0:
+                    stats.values["latency_ms"] = merged_summary(loop_timers, preview_timers)
+                    if writer is not None:
+                        stats.values["event_writer"] = writer.snapshot()
+                    last_latency_ts = now
+                stats.maybe_publish(now)
+                loop_timers.lap("publish")
+
+                # Frames are pulled and annotated only while someone watches /mjpeg or asks for a snapshot.
+                preview_enabled = shared.preview_enabled and shared.broadcast.has_viewers()
 
                 frame_msg = None
                 if preview_enabled and args.preview_fps > 0.0:
                     min_interval = 1.0 / max(0.1, float(args.preview_fps))
                     if last_preview_ts <= 0.0 or (now - last_preview_ts) >= min_interval:
-                        frame_msg = frame_queue.tryGet()
+                        frame_msg = queues.frame.tryGet()
                         while True:
-                            nxt = frame_queue.tryGet()
+                            nxt = queues.frame.tryGet()
                             if nxt is None:
                                 break
                             frame_msg = nxt
@@ -1993,43 +1984,62 @@ def main() -> int:
                             }
                         )
 
-                    with shared.lock:
-                        shared.preview_frame = frame
-                        shared.preview_items = preview_items
-                        shared.stats["imu_acc_norm"] = imu_acc_norm
-                        shared.stats["imu_gyro_norm"] = imu_gyro_norm
+                    # One reference swap: the preview worker always sees a matching frame/items pair.
+                    shared.preview = (frame, preview_items)
                     last_preview_ts = now
+                    loop_timers.lap("preview")
+
+                if incoming_tracklets is not None or frame_msg is not None:
+                    loop_timers.end()
 
                 if now - last_log >= args.log_interval_sec:
-                    with shared.lock:
-                        preview_frames = int(shared.stats.get("preview_frames", 0))
-                        messages = int(shared.stats["messages"])
-                        tracklets_total = int(shared.stats["tracklets_total"])
-                        active_tracks = int(shared.stats["active_tracks"])
-                        depth_pass = int(shared.stats["depth_pass"])
-                        depth_reject = int(shared.stats["depth_reject"])
-                        depth_missing = int(shared.stats["depth_missing"])
-                        conf_reject = int(shared.stats["conf_reject"])
-                        age_reject = int(shared.stats["age_reject"])
-                        hang_reject = int(shared.stats["hang_reject"])
-                        move_reject = int(shared.stats["move_reject"])
-                        dup_reject = int(shared.stats["dup_reject"])
-                        rearm_reject = int(shared.stats["rearm_reject"])
+                    preview_frames = shared.broadcast.published
+                    messages = int(stats.values["messages"])
+                    tracklets_total = int(stats.values["tracklets_total"])
+                    active_tracks = int(stats.values["active_tracks"])
+                    depth_pass = int(stats.values["depth_pass"])
+                    depth_reject = int(stats.values["depth_reject"])
+                    depth_missing = int(stats.values["depth_missing"])
+                    conf_reject = int(stats.values["conf_reject"])
+                    age_reject = int(stats.values["age_reject"])
+                    hang_reject = int(stats.values["hang_reject"])
+                    move_reject = int(stats.values["move_reject"])
+                    dup_reject = int(stats.values["dup_reject"])
+                    rearm_reject = int(stats.values["rearm_reject"])
+                    frame_latency = stats.values.get("latency_ms", {}).get("frame", {})
                     print(
                         f"transport-strict heartbeat: frames={preview_frames} msgs={messages} tracklets={tracklets_total} "
                         f"active={active_tracks} in={in_count} out={out_count} events={event_count} "
                         f"depth_ok={depth_pass} depth_reject={depth_reject} depth_missing={depth_missing} "
                         f"reject_conf={conf_reject} reject_age={age_reject} reject_hang={hang_reject} "
-                        f"reject_move={move_reject} reject_dup={dup_reject} reject_rearm={rearm_reject}",
+                        f"reject_move={move_reject} reject_dup={dup_reject} reject_rearm={rearm_reject} "
+                        f"frame_ms_p50={frame_latency.get('p50', 'na')} frame_ms_p95={frame_latency.get('p95', 'na')}"
+                        f"{'' if writer is None else ' ' + writer.heartbeat()}",
                         flush=True,
                     )
                     last_log = now
         finally:
             stop_event.set()
-            with shared.lock:
-                shared.stats["status"] = "stopping"
+            shared.broadcast.close()
+            stats.values["status"] = "stopping"
+            stats.publish()
             httpd.shutdown()
             httpd.server_close()
+            if writer is not None:
+                writer.close()
+                print(f"transport-strict: event writer closed ({writer.heartbeat()})", flush=True)
+            if recorder is not None:
+                recorder.close()
+                print(f"transport-strict: recorded {recorder.records} messages to {args.record}", flush=True)
+            if replay is not None:
+                summary = replay.summary(
+                    count_in=in_count,
+                    count_out=out_count,
+                    events_total=event_count,
+                    tracklets_total=int(stats.values["tracklets_total"]),
+                    latency_ms=merged_summary(loop_timers, preview_timers),
+                )
+                print(f"replay-summary: {json.dumps(summary, ensure_ascii=False)}", flush=True)
 
     return 0
 
@@ -6,11 +6,19 @@ import json
 import socket
 import subprocess
 import time
-from collections import defaultdict
 from typing import Any
 
 from common import http_post_json, load_env_file, utc_now_iso
-from sqlite_store import connect, enqueue_batch, init_central_db, mark_batch_sent, meta_get, meta_set
+from sqlite_store import (
+    connect,
+    enqueue_batch,
+    init_central_db,
+    mark_batch_sent,
+    meta_get,
+    meta_set,
+    take_pending_door_counts,
+    transaction,
+)
 
 
 def hostname_static() -> str:
@@ -109,47 +117,38 @@ def main() -> int:
     conn = connect(args.db)
     init_central_db(conn)
 
-    last_flushed_id = int(meta_get(conn, "last_flushed_event_id", "0"))
-    stop_counter = int(meta_get(conn, "stop_counter", "0")) + 1
-
-    rows = conn.execute(
-        "SELECT id, door_id, in_count, out_count FROM events WHERE id > ? ORDER BY id ASC;",
-        (last_flushed_id,),
-    ).fetchall()
-
-    if not rows:
-        print("nothing_to_flush")
-        return 0
-
-    totals: dict[int, dict[str, int]] = defaultdict(lambda: {"in": 0, "out": 0})
-    max_id = last_flushed_id
-    for row in rows:
-        event_id = int(row[0])
-        door_id = int(row[1])
-        totals[door_id]["in"] += int(row[2])
-        totals[door_id]["out"] += int(row[3])
-        max_id = max(max_id, event_id)
-
     ts_sent = utc_now_iso()
-    batch_id = f"{central_id}:{ts_sent}:{stop_mode}:{stop_counter:04d}"
     gps = load_latest_gps()
-    payload: dict[str, Any] = {
-        "schema_ver": 1,
-        "vehicle_id": vehicle_id,
-        "batch_id": batch_id,
-        "ts_sent": ts_sent,
-        "stop": {
-            "stop_id": f"{stop_counter:04d}",
-            "method": stop_mode,
-            "ts_start": None,
-            "ts_end": ts_sent,
-            "gps": gps,
-        },
-        "doors": [{"door_id": d, "in": v["in"], "out": v["out"]} for d, v in sorted(totals.items())],
-    }
-
-    payload_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
-    enqueue_batch(conn, batch_id=batch_id, created_at=ts_sent, payload_json=payload_json)
+    # Counters are taken and reset in the same write transaction that enqueues the batch,
+    # so events stored concurrently land either in this batch or the next one.
+    with transaction(conn):
+        totals = take_pending_door_counts(conn)
+        if not totals:
+            print("nothing_to_flush")
+            return 0
+
+        max_id = int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM events;").fetchone()[0])
+        stop_counter = int(meta_get(conn, "stop_counter", "0")) + 1
+        batch_id = f"{central_id}:{ts_sent}:{stop_mode}:{stop_counter:04d}"
+        payload: dict[str, Any] = {
+            "schema_ver": 1,
+            "vehicle_id": vehicle_id,
+            "batch_id": batch_id,
+            "ts_sent": ts_sent,
+            "stop": {
+                "stop_id": f"{stop_counter:04d}",
+                "method": stop_mode,
+                "ts_start": None,
+                "ts_end": ts_sent,
+                "gps": gps,
+            },
+            "doors": [{"door_id": d, "in": v["in"], "out": v["out"]} for d, v in sorted(totals.items())],
+        }
+
+        payload_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        enqueue_batch(conn, batch_id=batch_id, created_at=ts_sent, payload_json=payload_json)
+        meta_set(conn, "last_flushed_event_id", str(max_id))
+        meta_set(conn, "stop_counter", str(stop_counter))
 
     if send_now:
         headers = {"Authorization": f"Bearer {backend_api_key}"}
@@ -159,10 +158,6 @@ def main() -> int:
         else:
             mark_batch_sent(conn, batch_id=batch_id, sent_at=utc_now_iso())
 
-    meta_set(conn, "last_flushed_event_id", str(max_id))
-    meta_set(conn, "stop_counter", str(stop_counter))
-    conn.commit()
-
     print(json.dumps({"status": "queued", "batch_id": batch_id, "max_event_id": max_id}, ensure_ascii=False))
     return 0
 
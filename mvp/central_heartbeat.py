@@ -8,7 +8,7 @@ import socket
 import sqlite3
 import subprocess
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from common import http_post_json, load_env_file, utc_now_iso
@@ -19,6 +19,9 @@ EXPECTED_DOORS: list[tuple[str, int, str]] = [
     ("door-2", 3, "192.168.10.12"),
 ]
 
+# Drain rate is measured over recently sent outbox rows; ETA assumes that rate holds.
+DRAIN_WINDOW_SEC = 600
+
 SERVICES: list[tuple[str, str]] = [
     ("passengers-collector", "passengers-collector.service"),
     ("passengers-central-uplink", "passengers-central-uplink.service"),
@@ -172,19 +175,36 @@ def derive_heartbeat_url(explicit: str | None, backend_url: str | None) -> str |
 
 
 def queue_snapshot(conn: sqlite3.Connection) -> dict[str, Any]:
-    events_total = int(conn.execute("SELECT COUNT(*) FROM events;").fetchone()[0])
-    last_event_ts = conn.execute("SELECT MAX(ts_received) FROM events;").fetchone()[0]
+    # door_counters is maintained on every stored event, so this stays O(doors).
+    events_total_row = conn.execute(
+        "SELECT COALESCE(SUM(total_events), 0), MAX(last_event_ts_received) FROM door_counters;"
+    ).fetchone()
+    events_total = int(events_total_row[0])
+    last_event_ts = events_total_row[1]
     pending_batches = int(conn.execute("SELECT COUNT(*) FROM batches_outbox WHERE status='pending';").fetchone()[0])
     sent_batches = int(conn.execute("SELECT COUNT(*) FROM batches_outbox WHERE status='sent';").fetchone()[0])
     pending_oldest = conn.execute(
         "SELECT MIN(created_at) FROM batches_outbox WHERE status='pending';"
     ).fetchone()[0]
+    drain_since = (datetime.now(timezone.utc) - timedelta(seconds=DRAIN_WINDOW_SEC)).isoformat().replace("+00:00", "Z")
+    drained_recent = int(
+        conn.execute(
+            "SELECT COUNT(*) FROM batches_outbox WHERE status='sent' AND sent_at >= ?;",
+            (drain_since,),
+        ).fetchone()[0]
+    )
+    drain_rate_per_min = round(drained_recent * 60.0 / DRAIN_WINDOW_SEC, 2)
+    if pending_batches == 0:
+        backlog_eta_sec: int | None = 0
+    elif drained_recent > 0:
+        backlog_eta_sec = int(pending_batches * DRAIN_WINDOW_SEC / drained_recent)
+    else:
+        backlog_eta_sec = None
 
     rows = conn.execute(
         """
-        SELECT node_id, door_id, MAX(ts_received) AS last_ts
-        FROM events
-        GROUP BY node_id, door_id
+        SELECT node_id, door_id, last_event_ts_received AS last_ts
+        FROM door_counters
         ORDER BY door_id ASC, node_id ASC;
         """
     ).fetchall()
@@ -230,6 +250,8 @@ def queue_snapshot(conn: sqlite3.Connection) -> dict[str, Any]:
         "last_event_ts_received": last_event_ts,
         "pending_oldest_created_at": pending_oldest,
         "pending_oldest_age_sec": age_sec(pending_oldest),
+        "drain_rate_per_min": drain_rate_per_min,
+        "backlog_eta_sec": backlog_eta_sec,
         "wg_latest_handshake_age_sec": wg_latest_handshake_age_sec(),
         "doors": doors,
     }
@@ -281,6 +303,8 @@ def main() -> int:
             "last_event_ts_received": queue["last_event_ts_received"],
             "pending_oldest_created_at": queue["pending_oldest_created_at"],
             "pending_oldest_age_sec": queue["pending_oldest_age_sec"],
+            "drain_rate_per_min": queue["drain_rate_per_min"],
+            "backlog_eta_sec": queue["backlog_eta_sec"],
             "wg_latest_handshake_age_sec": queue["wg_latest_handshake_age_sec"],
             "stop_mode": stop_mode,
         },
@@ -4,10 +4,262 @@ from __future__ import annotations
 import argparse
 import json
 import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any
 
-from common import http_post_json, load_env_file, sleep_backoff, utc_now_iso
-from sqlite_store import connect, init_central_db, mark_batch_attempt, mark_batch_sent
+from common import HttpResponse, KeepAliveHttpClient, http_post_json, load_env_file, sleep_backoff, utc_now_iso
+from sqlite_store import (
+    connect,
+    init_central_db,
+    mark_batch_attempt,
+    mark_batch_sent,
+    mark_batches_attempt,
+    mark_batches_sent,
+    transaction,
+)
+
+# Failure classes: (base_sec, max_sec). Link-level classes pause all sending; "payload"
+# only defers the rejected batch so the rest of the backlog keeps draining.
+BACKOFF_CLASSES: dict[str, tuple[float, float]] = {
+    "network": (0.5, 15.0),
+    "server": (2.0, 60.0),
+    "throttle": (5.0, 120.0),
+    "auth": (30.0, 300.0),
+    "payload": (5.0, 600.0),
+}
+LINK_CLASSES = ("network", "server", "throttle", "auth")
+
+
+def batch_url_for(backend_url: str) -> str:
+    return backend_url.rstrip("/") + ":batch"
+
+
+def fetch_pending(
+    conn: sqlite3.Connection,
+    limit: int,
+    *,
+    skip: set[str] | None = None,
+) -> list[tuple[str, str]]:
+    skip = skip or set()
+    rows = conn.execute(
+        "SELECT batch_id, payload_json FROM batches_outbox WHERE status='pending' ORDER BY created_at ASC LIMIT ?;",
+        (max(1, int(limit)) + len(skip),),
+    ).fetchall()
+    return [(str(row[0]), str(row[1])) for row in rows if str(row[0]) not in skip][: max(1, int(limit))]
+
+
+def decode_pending(conn: sqlite3.Connection, rows: list[tuple[str, str]]) -> list[tuple[str, dict[str, Any]]]:
+    decoded: list[tuple[str, dict[str, Any]]] = []
+    for batch_id, payload_json in rows:
+        try:
+            payload: dict[str, Any] = json.loads(payload_json)
+        except Exception:
+            # malformed; mark attempt and skip forever by setting sent
+            now = utc_now_iso()
+            mark_batch_attempt(conn, batch_id=batch_id, attempt_at=now, error="bad_json")
+            mark_batch_sent(conn, batch_id=batch_id, sent_at=now)
+            continue
+        decoded.append((batch_id, payload))
+    conn.commit()
+    return decoded
+
+
+def send_single(
+    conn: sqlite3.Connection,
+    *,
+    backend_url: str,
+    headers: dict[str, str],
+    batch_id: str,
+    payload: dict[str, Any],
+) -> bool:
+    resp = http_post_json(backend_url, payload, headers=headers, timeout_sec=10)
+    if resp.status == 200:
+        mark_batch_sent(conn, batch_id=batch_id, sent_at=utc_now_iso())
+        conn.commit()
+        return True
+
+    mark_batch_attempt(conn, batch_id=batch_id, attempt_at=utc_now_iso(), error=f"http_{resp.status}")
+    conn.commit()
+    return False
+
+
+def send_batch(
+    conn: sqlite3.Connection,
+    *,
+    batch_url: str,
+    headers: dict[str, str],
+    items: list[tuple[str, dict[str, Any]]],
+) -> int:
+    # Returns the HTTP status; 200 means every batch_id got a stored/duplicate verdict.
+    resp = http_post_json(batch_url, {"stops": [payload for _, payload in items]}, headers=headers, timeout_sec=30)
+    now = utc_now_iso()
+    if resp.status == 200:
+        try:
+            results = json.loads(resp.body).get("results") or []
+        except Exception:
+            results = []
+        acked = {str(item.get("batch_id")) for item in results if item.get("status") in ("stored", "duplicate")}
+        for batch_id, _ in items:
+            if batch_id in acked:
+                mark_batch_sent(conn, batch_id=batch_id, sent_at=now)
+            else:
+                mark_batch_attempt(conn, batch_id=batch_id, attempt_at=now, error="batch_no_ack")
+        conn.commit()
+        return 200 if len(acked) == len({batch_id for batch_id, _ in items}) else 0
+
+    for batch_id, _ in items:
+        mark_batch_attempt(conn, batch_id=batch_id, attempt_at=now, error=f"http_{resp.status}")
+    conn.commit()
+    return resp.status
+
+
+def failure_class(status: int) -> str:
+    if status == 0:
+        return "network"
+    if status in (401, 403):
+        return "auth"
+    if status == 429:
+        return "throttle"
+    if status >= 500:
+        return "server"
+    return "payload"
+
+
+class FailureBackoff:
+    def __init__(self) -> None:
+        self.attempts = {name: 0 for name in BACKOFF_CLASSES}
+        self.link_paused_until = 0.0
+        self.deferred: dict[str, tuple[int, float]] = {}
+
+    def _delay(self, name: str, attempt: int) -> float:
+        base_sec, max_sec = BACKOFF_CLASSES[name]
+        return min(max_sec, base_sec * (2**attempt))
+
+    def link_failed(self, name: str) -> None:
+        delay = self._delay(name, self.attempts[name])
+        self.attempts[name] += 1
+        self.link_paused_until = max(self.link_paused_until, time.monotonic() + delay)
+
+    def link_ok(self) -> None:
+        for name in LINK_CLASSES:
+            self.attempts[name] = 0
+
+    def link_wait_sec(self) -> float:
+        return max(0.0, self.link_paused_until - time.monotonic())
+
+    def defer(self, batch_id: str) -> None:
+        attempt = self.deferred.get(batch_id, (0, 0.0))[0]
+        self.deferred[batch_id] = (attempt + 1, time.monotonic() + self._delay("payload", attempt))
+
+    def deferred_ids(self) -> set[str]:
+        now = time.monotonic()
+        return {batch_id for batch_id, (_, ready_at) in self.deferred.items() if ready_at > now}
+
+
+def run_pipelined(
+    conn: sqlite3.Connection,
+    *,
+    backend_url: str,
+    batch_url: str,
+    headers: dict[str, str],
+    batch_size: int,
+    inflight: int,
+) -> None:
+    local = threading.local()
+
+    def post(url: str, payload: dict[str, Any]) -> HttpResponse:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = KeepAliveHttpClient(timeout_sec=30)
+            local.client = client
+        return client.post_json(url, payload, headers=headers)
+
+    backoff = FailureBackoff()
+    pending: dict[Future[HttpResponse], tuple[bool, list[tuple[str, dict[str, Any]]]]] = {}
+    isolate: set[str] = set()
+
+    with ThreadPoolExecutor(max_workers=inflight, thread_name_prefix="uplink") as pool:
+        while True:
+            busy = {batch_id for _, items in pending.values() for batch_id, _ in items}
+            while len(pending) < inflight and backoff.link_wait_sec() == 0.0:
+                limit = batch_size * (inflight - len(pending))
+                items = decode_pending(conn, fetch_pending(conn, limit, skip=busy | backoff.deferred_ids()))
+                if not items:
+                    break
+                for start in range(0, len(items), batch_size):
+                    if len(pending) >= inflight:
+                        break
+                    chunk = items[start : start + batch_size]
+                    isolated = [item for item in chunk if item[0] in isolate]
+                    if isolated:
+                        chunk = isolated[:1]
+                    as_batch = batch_size > 1 and len(chunk) > 1
+                    if as_batch:
+                        future = pool.submit(post, batch_url, {"stops": [payload for _, payload in chunk]})
+                    else:
+                        future = pool.submit(post, backend_url, chunk[0][1])
+                    pending[future] = (as_batch, chunk)
+                    busy.update(batch_id for batch_id, _ in chunk)
+
+            if not pending:
+                time.sleep(backoff.link_wait_sec() or 1.0)
+                continue
+
+            done, _ = wait(list(pending), timeout=1.0, return_when=FIRST_COMPLETED)
+            if not done:
+                continue
+
+            # All responses that completed together are marked in one transaction.
+            now = utc_now_iso()
+            sent_ids: list[str] = []
+            failed: dict[str, list[str]] = {}
+            for future in done:
+                as_batch, chunk = pending.pop(future)
+                resp = future.result()
+                chunk_ids = [batch_id for batch_id, _ in chunk]
+                if resp.status == 200:
+                    backoff.link_ok()
+                    if not as_batch:
+                        sent_ids.extend(chunk_ids)
+                        continue
+                    try:
+                        results = json.loads(resp.body).get("results") or []
+                    except Exception:
+                        results = []
+                    acked = {
+                        str(item.get("batch_id")) for item in results if item.get("status") in ("stored", "duplicate")
+                    }
+                    sent_ids.extend(batch_id for batch_id in chunk_ids if batch_id in acked)
+                    for batch_id in chunk_ids:
+                        if batch_id not in acked:
+                            failed.setdefault("batch_no_ack", []).append(batch_id)
+                            backoff.defer(batch_id)
+                    continue
+
+                if as_batch and resp.status in (404, 405):
+                    # Backend predates the batch endpoint: keep draining one stop per request.
+                    batch_size = 1
+                    continue
+                name = failure_class(resp.status)
+                failed.setdefault(f"http_{resp.status}", []).extend(chunk_ids)
+                if name in LINK_CLASSES:
+                    backoff.link_failed(name)
+                elif as_batch:
+                    # One bad payload rejects the whole request; resend these one by one.
+                    isolate.update(chunk_ids)
+                else:
+                    for batch_id in chunk_ids:
+                        backoff.defer(batch_id)
+
+            with transaction(conn):
+                mark_batches_sent(conn, batch_ids=sent_ids, sent_at=now)
+                for error, batch_ids in failed.items():
+                    mark_batches_attempt(conn, batch_ids=batch_ids, attempt_at=now, error=error)
+            isolate.difference_update(sent_ids)
+            for batch_id in sent_ids:
+                backoff.deferred.pop(batch_id, None)
 
 
 def main() -> int:
@@ -16,6 +268,18 @@ def main() -> int:
     parser.add_argument("--env", default="/etc/passengers/passengers.env")
     parser.add_argument("--backend-url", default=None)
     parser.add_argument("--backend-api-key", default=None)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Ship up to N pending batches per request via <backend-url>:batch (default: UPLINK_BATCH_SIZE or 1).",
+    )
+    parser.add_argument(
+        "--inflight",
+        type=int,
+        default=None,
+        help="Pipelined mode: N requests in flight over keep-alive connections (default: UPLINK_INFLIGHT or 1).",
+    )
     args = parser.parse_args()
 
     env_file = load_env_file(args.env)
@@ -24,50 +288,64 @@ def main() -> int:
     if not backend_url or not backend_api_key:
         raise SystemExit("Missing BACKEND_URL/BACKEND_API_KEY (see /etc/passengers/passengers.env)")
 
+    batch_size = args.batch_size
+    if batch_size is None:
+        try:
+            batch_size = int(env_file.get("UPLINK_BATCH_SIZE", "1"))
+        except ValueError:
+            batch_size = 1
+    batch_size = max(1, min(int(batch_size), 500))
+    batch_url = batch_url_for(backend_url)
+
+    inflight = args.inflight
+    if inflight is None:
+        try:
+            inflight = int(env_file.get("UPLINK_INFLIGHT", "1"))
+        except ValueError:
+            inflight = 1
+    inflight = max(1, min(int(inflight), 16))
+
     conn = connect(args.db)
     init_central_db(conn)
 
+    headers = {"Authorization": f"Bearer {backend_api_key}"}
+    if inflight > 1:
+        run_pipelined(
+            conn,
+            backend_url=backend_url,
+            batch_url=batch_url,
+            headers=headers,
+            batch_size=batch_size,
+            inflight=inflight,
+        )
+        return 0
+
     attempt = 0
     while True:
-        row = conn.execute(
-            "SELECT batch_id, payload_json, attempts FROM batches_outbox WHERE status='pending' ORDER BY created_at ASC LIMIT 1;"
-        ).fetchone()
-        if not row:
+        items = decode_pending(conn, fetch_pending(conn, batch_size))
+        if not items:
             attempt = 0
-            import time
-
             time.sleep(1.0)
             continue
 
-        batch_id = str(row[0])
-        payload_json = str(row[1])
-
-        try:
-            payload: dict[str, Any] = json.loads(payload_json)
-        except Exception:
-            # malformed; mark attempt and skip forever by setting sent
-            now = utc_now_iso()
-            mark_batch_attempt(conn, batch_id=batch_id, attempt_at=now, error="bad_json")
-            mark_batch_sent(conn, batch_id=batch_id, sent_at=now)
-            conn.commit()
-            attempt = 0
-            continue
-
-        now = utc_now_iso()
-        headers = {"Authorization": f"Bearer {backend_api_key}"}
-        resp = http_post_json(backend_url, payload, headers=headers, timeout_sec=10)
-        if resp.status == 200:
-            mark_batch_sent(conn, batch_id=batch_id, sent_at=utc_now_iso())
-            conn.commit()
-            attempt = 0
-            continue
+        if batch_size > 1 and len(items) > 1:
+            status = send_batch(conn, batch_url=batch_url, headers=headers, items=items)
+            if status == 200:
+                attempt = 0
+                continue
+            if status in (404, 405):
+                # Backend predates the batch endpoint: keep draining one stop per request.
+                batch_size = 1
+                continue
+        else:
+            batch_id, payload = items[0]
+            if send_single(conn, backend_url=backend_url, headers=headers, batch_id=batch_id, payload=payload):
+                attempt = 0
+                continue
 
-        mark_batch_attempt(conn, batch_id=batch_id, attempt_at=utc_now_iso(), error=f"http_{resp.status}")
-        conn.commit()
         attempt += 1
         sleep_backoff(attempt)
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
@@ -3,26 +3,168 @@ from __future__ import annotations
 
 import argparse
 import json
+import queue
 import sqlite3
 import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any
 
-from common import utc_now_iso
-from sqlite_store import connect, init_central_db, store_event
+from common import LATENCY_SAMPLES, percentile, utc_now_iso
+from sqlite_store import connect, init_central_db, insert_events
+
+
+EDGE_BATCH_MAX = 500
+
+
+class WriterBusy(Exception):
+    pass
+
+
+@dataclass
+class WriteRequest:
+    payloads: list[Any]
+    done: threading.Event = field(default_factory=threading.Event)
+    statuses: list[str] = field(default_factory=list)
+    ts_received: str | None = None
+    error: str | None = None
+
+
+class GroupCommitWriter:
+    """Single owner of the SQLite connection: drains queued events and commits them in groups."""
+
+    def __init__(self, conn: sqlite3.Connection, *, max_events: int, max_delay_ms: int, queue_max: int) -> None:
+        self.conn = conn
+        self.max_events = max(1, max_events)
+        self.max_delay_sec = max(0, max_delay_ms) / 1000.0
+        self.queue_max = max(1, queue_max)
+        self._queue: queue.Queue[WriteRequest | None] = queue.Queue(maxsize=self.queue_max)
+        self._stats_lock = threading.Lock()
+        self.commits = 0
+        self.events = 0
+        self.errors = 0
+        self.last_batch_events = 0
+        self.max_batch_events = 0
+        self.fsync_ms: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="collector-writer", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def submit(self, payloads: list[Any], *, timeout_sec: float = 10.0) -> WriteRequest:
+        # Blocks until the group holding these events is committed (or failed).
+        request = WriteRequest(payloads=payloads)
+        try:
+            self._queue.put(request, timeout=min(2.0, timeout_sec))
+        except queue.Full:
+            raise WriterBusy() from None
+        if not request.done.wait(timeout_sec):
+            raise WriterBusy()
+        return request
+
+    def _collect(self, first: WriteRequest) -> tuple[list[WriteRequest], bool]:
+        group = [first]
+        pending_events = len(first.payloads)
+        deadline = time.monotonic() + self.max_delay_sec
+        while pending_events < self.max_events:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return group, True
+            group.append(item)
+            pending_events += len(item.payloads)
+        return group, False
+
+    def _commit(self, group: list[WriteRequest]) -> None:
+        ts_received = utc_now_iso()
+        payloads = [payload for request in group for payload in request.payloads]
+        try:
+            self.conn.execute("BEGIN IMMEDIATE;")
+            try:
+                statuses = insert_events(self.conn, payloads, ts_received=ts_received)
+                started = time.perf_counter()
+                self.conn.execute("COMMIT;")
+                fsync_ms = (time.perf_counter() - started) * 1000.0
+            except BaseException:
+                self.conn.execute("ROLLBACK;")
+                raise
+        except Exception as e:
+            # Anything else would end the only writer thread and leave every later request waiting for 503s.
+            with self._stats_lock:
+                self.errors += 1
+            for request in group:
+                request.error = str(e)
+                request.done.set()
+            return
+
+        with self._stats_lock:
+            self.commits += 1
+            self.events += len(payloads)
+            self.last_batch_events = len(payloads)
+            self.max_batch_events = max(self.max_batch_events, len(payloads))
+            self.fsync_ms.append(fsync_ms)
+        offset = 0
+        for request in group:
+            request.statuses = statuses[offset : offset + len(request.payloads)]
+            request.ts_received = ts_received
+            offset += len(request.payloads)
+            request.done.set()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group, stopping = self._collect(first)
+            self._commit(group)
+            if stopping:
+                return
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._stats_lock:
+            commits = self.commits
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self.queue_max,
+                "commits": commits,
+                "events": self.events,
+                "errors": self.errors,
+                "batch_events_last": self.last_batch_events,
+                "batch_events_avg": round(self.events / commits, 2) if commits else 0.0,
+                "batch_events_max": self.max_batch_events,
+                "fsync_ms_p50": percentile(self.fsync_ms, 50),
+                "fsync_ms_p95": percentile(self.fsync_ms, 95),
+                "fsync_ms_max": round(max(self.fsync_ms), 3) if self.fsync_ms else 0.0,
+                "flush_max_events": self.max_events,
+                "flush_max_delay_ms": int(self.max_delay_sec * 1000),
+            }
 
 
 class Handler(BaseHTTPRequestHandler):
     server_version = "PassengersCollector/0.1"
+    # HTTP/1.1 lets edge senders keep one connection open; idle sockets are dropped after `timeout`.
+    protocol_version = "HTTP/1.1"
+    timeout = 30
 
     def do_GET(self) -> None:  # noqa: N802
         if self.path == "/health":
-            self._send_json(200, {"status": "ok"})
+            self._send_json(200, {"status": "ok", "writer": self.server.writer.snapshot()})  # type: ignore[attr-defined]
             return
         self._send_json(404, {"error": "not_found"})
 
     def do_POST(self) -> None:  # noqa: N802
-        if self.path != "/api/v1/edge/events":
+        if self.path not in ("/api/v1/edge/events", "/api/v1/edge/events:batch"):
+            # The request body was not read, so this connection cannot be reused.
+            self.close_connection = True
             self._send_json(404, {"error": "not_found"})
             return
 
@@ -34,18 +176,43 @@ class Handler(BaseHTTPRequestHandler):
             self._send_json(400, {"error": "bad_json"})
             return
 
-        try:
-            ts_received = utc_now_iso()
-            with self.server.db_lock:  # type: ignore[attr-defined]
-                result = store_event(self.server.db, payload, ts_received=ts_received)  # type: ignore[attr-defined]
-        except (KeyError, ValueError, TypeError):
+        if self.path.endswith(":batch"):
+            self._store_batch(payload)
+            return
+
+        request = self._submit([payload])
+        if request is None:
+            return
+        if request.statuses[0] == "invalid":
             self._send_json(422, {"error": "invalid_payload"})
             return
-        except sqlite3.Error:
+        self._send_json(200, {"status": request.statuses[0], "ts_received": request.ts_received})
+
+    def _submit(self, payloads: list[Any]) -> WriteRequest | None:
+        try:
+            request = self.server.writer.submit(payloads)  # type: ignore[attr-defined]
+        except WriterBusy:
+            self._send_json(503, {"error": "writer_busy"})
+            return None
+        if request.error is not None:
             self._send_json(500, {"error": "db_error"})
+            return None
+        return request
+
+    def _store_batch(self, payload: Any) -> None:
+        events = payload.get("events") if isinstance(payload, dict) else None
+        if not isinstance(events, list) or not events or len(events) > EDGE_BATCH_MAX:
+            self._send_json(422, {"error": "invalid_payload"})
             return
 
-        self._send_json(200, {"status": result.status, "ts_received": ts_received})
+        request = self._submit(events)
+        if request is None:
+            return
+        results = [
+            {"seq": event.get("seq") if isinstance(event, dict) else None, "status": status}
+            for event, status in zip(events, request.statuses)
+        ]
+        self._send_json(200, {"status": "ok", "ts_received": request.ts_received, "results": results})
 
     def log_message(self, fmt: str, *args: Any) -> None:
         if self.path == "/health":
@@ -57,6 +224,8 @@ class Handler(BaseHTTPRequestHandler):
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
         self.end_headers()
         self.wfile.write(body)
 
@@ -66,22 +235,34 @@ def main() -> int:
     parser.add_argument("--bind", default="192.168.10.1")
     parser.add_argument("--port", type=int, default=8080)
     parser.add_argument("--db", default="/var/lib/passengers/central.sqlite3")
+    parser.add_argument("--commit-max-events", type=int, default=200, help="Group commit: flush after N events.")
+    parser.add_argument("--commit-max-delay-ms", type=int, default=10, help="Group commit: flush after M ms.")
+    parser.add_argument("--queue-max", type=int, default=1000, help="Pending write requests before answering 503.")
     args = parser.parse_args()
 
     db = connect(args.db)
     init_central_db(db)
+    # A response means the event is on disk: each group commit pays one fsync.
+    db.execute("PRAGMA synchronous=FULL;")
+
+    writer = GroupCommitWriter(
+        db,
+        max_events=args.commit_max_events,
+        max_delay_ms=args.commit_max_delay_ms,
+        queue_max=args.queue_max,
+    )
+    writer.start()
 
     httpd = ThreadingHTTPServer((args.bind, args.port), Handler)
-    httpd.db = db  # type: ignore[attr-defined]
-    httpd.db_lock = threading.Lock()  # type: ignore[attr-defined]
+    httpd.writer = writer  # type: ignore[attr-defined]
 
     try:
         httpd.serve_forever()
     finally:
+        writer.stop()
         db.close()
     return 0
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
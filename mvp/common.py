@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import http.client
 import json
 import os
 import time
 import urllib.error
+import urllib.parse
 import urllib.request
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any
@@ -14,6 +17,17 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+LATENCY_SAMPLES = 512
+
+
+def percentile(samples: deque[float], pct: int) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round((pct / 100.0) * (len(ordered) - 1)))))
+    return round(ordered[index], 3)
+
+
 def load_env_file(path: str) -> dict[str, str]:
     env: dict[str, str] = {}
     try:
@@ -62,6 +76,61 @@ def http_post_json(
         return HttpResponse(status=0, body=str(e))
 
 
+class KeepAliveHttpClient:
+    """Reuses one HTTP/1.1 connection per origin; not thread-safe (use one per thread)."""
+
+    def __init__(self, *, timeout_sec: int = 10) -> None:
+        self.timeout_sec = timeout_sec
+        self._origin: tuple[str, str] | None = None
+        self._conn: http.client.HTTPConnection | None = None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        if self._conn is None or self._origin != (scheme, netloc):
+            self.close()
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            self._conn = conn_cls(netloc, timeout=self.timeout_sec)
+            self._origin = (scheme, netloc)
+        return self._conn
+
+    def post_json(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        *,
+        headers: dict[str, str] | None = None,
+    ) -> HttpResponse:
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        request_headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        request_headers.update(headers or {})
+        for retry in (False, True):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("POST", path, body=data, headers=request_headers)
+                resp = conn.getresponse()
+                body = resp.read().decode("utf-8", errors="replace")
+                if resp.will_close:
+                    self.close()
+                return HttpResponse(status=resp.status, body=body)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                # The server may drop an idle keep-alive socket; reconnect once.
+                self.close()
+                if retry:
+                    return HttpResponse(status=0, body=str(e))
+            except (http.client.HTTPException, TimeoutError, OSError) as e:
+                self.close()
+                return HttpResponse(status=0, body=str(e))
+        return HttpResponse(status=0, body="unreachable")
+
+
 def sleep_backoff(attempt: int, *, base_sec: float = 0.5, max_sec: float = 15.0) -> None:
     delay = min(max_sec, base_sec * (2**attempt))
     time.sleep(delay)
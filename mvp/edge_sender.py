@@ -7,7 +7,7 @@ import socket
 import time
 from typing import Any
 
-from common import http_post_json, load_env_file, sleep_backoff
+from common import KeepAliveHttpClient, load_env_file, sleep_backoff
 from sqlite_store import connect, init_edge_db
 
 
@@ -22,12 +22,47 @@ def parse_payload(raw_json: str) -> dict[str, Any]:
     return payload
 
 
+def batch_url_for(url: str) -> str:
+    return url.rstrip("/") + ":batch"
+
+
+def acked_prefix_id(items: list[tuple[int, dict[str, Any] | None]], body: str) -> int | None:
+    # Outbox rows are drained oldest-first, so everything up to the first un-acked row
+    # can be removed with one range delete.
+    try:
+        results = json.loads(body).get("results") or []
+    except Exception:
+        results = []
+    acked = {item.get("seq") for item in results if item.get("status") in ("stored", "duplicate", "invalid")}
+    last_id: int | None = None
+    for item_id, payload in items:
+        if payload is not None and payload.get("seq") not in acked:
+            break
+        last_id = item_id
+    return last_id
+
+
+def post_single(client: KeepAliveHttpClient, url: str, items: list[tuple[int, dict[str, Any] | None]]) -> int | None:
+    # Sends the oldest valid event; returns the outbox id to delete through, or None on failure.
+    for item_id, payload in items:
+        if payload is not None:
+            resp = client.post_json(url, payload)
+            return item_id if resp.status == 200 else None
+    return items[-1][0]
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Passengers edge sender (SQLite outbox → Central HTTP).")
     parser.add_argument("--db", default="/var/lib/passengers/edge.sqlite3")
     parser.add_argument("--env", default="/etc/passengers/passengers.env")
     parser.add_argument("--central-url", default=None)
     parser.add_argument("--node-id", default=None)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Events per request to <central-url>:batch (default: EDGE_BATCH_SIZE or 50; 1 = one POST per event).",
+    )
     args = parser.parse_args()
 
     env_file = load_env_file(args.env)
@@ -43,37 +78,60 @@ def main() -> int:
     node_id = args.node_id or env_file.get("NODE_ID") or hostname_default()
     door_id_override = env_file.get("DOOR_ID")
 
+    batch_size = args.batch_size
+    if batch_size is None:
+        try:
+            batch_size = int(env_file.get("EDGE_BATCH_SIZE", "50"))
+        except ValueError:
+            batch_size = 50
+    batch_size = max(1, min(int(batch_size), 500))
+    # One kept-alive connection per URL; the primary link gets the short timeout.
+    clients = [KeepAliveHttpClient(timeout_sec=1 if idx == 0 else 3) for idx in range(len(central_urls))]
+    batch_supported = [True for _ in central_urls]
+
     conn = connect(args.db)
     init_edge_db(conn)
 
     attempt = 0
     while True:
-        row = conn.execute("SELECT id, payload_json FROM outbox ORDER BY id ASC LIMIT 1;").fetchone()
-        if not row:
+        rows = conn.execute("SELECT id, payload_json FROM outbox ORDER BY id ASC LIMIT ?;", (batch_size,)).fetchall()
+        if not rows:
             attempt = 0
             time.sleep(0.5)
             continue
 
-        item_id = int(row[0])
-        raw_json = str(row[1])
-        try:
-            payload = parse_payload(raw_json)
-            payload["node_id"] = node_id
-            if door_id_override:
-                payload["door_id"] = int(door_id_override)
-        except Exception:
-            conn.execute("DELETE FROM outbox WHERE id = ?;", (item_id,))
-            attempt = 0
+        items: list[tuple[int, dict[str, Any] | None]] = []
+        for row in rows:
+            try:
+                payload = parse_payload(str(row[1]))
+                payload["node_id"] = node_id
+                if door_id_override:
+                    payload["door_id"] = int(door_id_override)
+            except Exception:
+                # malformed; dropped together with the acknowledged rows
+                payload = None
+            items.append((int(row[0]), payload))
+        payloads = [payload for _, payload in items if payload is not None]
+        if not payloads:
+            conn.execute("DELETE FROM outbox WHERE id <= ?;", (items[-1][0],))
             continue
 
         now = time.monotonic()
         for idx, url in enumerate(central_urls):
             if now < url_down_until[idx]:
                 continue
-            timeout_sec = 1 if idx == 0 else 3
-            resp = http_post_json(url, payload, timeout_sec=timeout_sec)
-            if resp.status == 200:
-                conn.execute("DELETE FROM outbox WHERE id = ?;", (item_id,))
+            if len(payloads) > 1 and batch_supported[idx]:
+                resp = clients[idx].post_json(batch_url_for(url), {"events": payloads})
+                if resp.status == 404:
+                    # Collector predates the batch endpoint.
+                    batch_supported[idx] = False
+                    delete_through = post_single(clients[idx], url, items)
+                else:
+                    delete_through = acked_prefix_id(items, resp.body) if resp.status == 200 else None
+            else:
+                delete_through = post_single(clients[idx], url, items)
+            if delete_through is not None:
+                conn.execute("DELETE FROM outbox WHERE id <= ?;", (delete_through,))
                 attempt = 0
                 break
             url_down_until[idx] = time.monotonic() + max(1, url_cooldown_sec)
@@ -6,7 +6,7 @@ import json
 import sqlite3
 
 from common import utc_now_iso
-from sqlite_store import connect, edge_next_seq, init_edge_db
+from sqlite_store import connect, edge_next_seq, init_edge_db, transaction
 
 
 def main() -> int:
@@ -23,19 +23,21 @@ def main() -> int:
     conn = connect(args.db)
     init_edge_db(conn)
 
-    seq = args.seq or edge_next_seq(conn)
-    payload = {
-        "door_id": args.door_id,
-        "ts": args.ts or utc_now_iso(),
-        "in": max(0, int(args.in_count)),
-        "out": max(0, int(args.out_count)),
-        "confidence": float(args.confidence),
-        "seq": int(seq),
-    }
-    conn.execute(
-        "INSERT INTO outbox(created_at, seq, payload_json) VALUES (?, ?, ?);",
-        (utc_now_iso(), int(seq), json.dumps(payload, ensure_ascii=False, separators=(",", ":"))),
-    )
+    # Same write lock as the camera EventWriter: the seq is taken and used in one transaction.
+    with transaction(conn):
+        seq = args.seq or edge_next_seq(conn)
+        payload = {
+            "door_id": args.door_id,
+            "ts": args.ts or utc_now_iso(),
+            "in": max(0, int(args.in_count)),
+            "out": max(0, int(args.out_count)),
+            "confidence": float(args.confidence),
+            "seq": int(seq),
+        }
+        conn.execute(
+            "INSERT INTO outbox(created_at, seq, payload_json) VALUES (?, ?, ?);",
+            (utc_now_iso(), int(seq), json.dumps(payload, ensure_ascii=False, separators=(",", ":"))),
+        )
     print(f"enqueued seq={seq}")
     return 0
 
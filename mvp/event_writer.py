@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from common import LATENCY_SAMPLES, percentile, utc_now_iso
+from sqlite_store import connect, init_central_db, init_edge_db, insert_events, meta_get, meta_set, transaction
+
+EDGE_SEQ_KEY = "next_seq"
+
+
+def central_seq_key(node_id: str) -> str:
+    return f"camera_next_seq::{node_id}"
+
+
+def add_event_writer_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--events-db",
+        default="",
+        help="Persist counted events to this SQLite DB via the background event writer (empty = log only).",
+    )
+    parser.add_argument("--events-store", choices=["edge", "central"], default="edge", help="edge=outbox for edge_sender; central=events")
+    parser.add_argument("--node-id", default=None)
+    parser.add_argument("--door-id", type=int, default=1)
+    parser.add_argument("--fsync-interval-sec", type=float, default=1.0, help="Event writer: sync the WAL at most this often.")
+
+
+def load_event_writer_env(args: argparse.Namespace, env: dict[str, str], *, prefix: str) -> None:
+    # `prefix` is the counter's own env namespace (CAM_DEPTH_COUNT, CAM_DEPTH_MULTI); node/door ids
+    # and the store fall back to the CAM_COUNTER_* values shared by every counter on the node.
+    args.events_db = env.get(f"{prefix}_EVENTS_DB", args.events_db).strip()
+    args.events_store = env.get(f"{prefix}_EVENTS_STORE", env.get("CAM_COUNTER_STORE", args.events_store)).strip().lower()
+    if args.node_id is None:
+        args.node_id = env.get("CAM_COUNTER_NODE_ID") or env.get("NODE_ID") or f"{socket.gethostname()}-cam"
+    args.door_id = int(env.get("CAM_COUNTER_DOOR_ID", str(args.door_id)))
+    args.fsync_interval_sec = float(
+        env.get(f"{prefix}_FSYNC_INTERVAL_SEC", env.get("CAM_COUNTER_FSYNC_INTERVAL_SEC", str(args.fsync_interval_sec))),
+    )
+    if args.events_store not in {"edge", "central"}:
+        raise ValueError(f"events-store must be edge|central (got {args.events_store})")
+    if not (0.0 <= args.fsync_interval_sec <= 60.0):
+        raise ValueError("fsync-interval-sec must be in [0..60]")
+
+
+def event_writer_from_args(args: argparse.Namespace, *, label: str) -> EventWriter | None:
+    if not args.events_db:
+        return None
+    # Storage runs on its own thread: counted events are handed over, the frame loop never waits on SQLite.
+    writer = EventWriter(
+        args.events_db,
+        store=args.events_store,
+        node_id=args.node_id,
+        fsync_interval_sec=args.fsync_interval_sec,
+    )
+    writer.start()
+    exit_on_sigterm()
+    print(
+        f"{label}: events -> {args.events_db} store={args.events_store} node_id={args.node_id} door_id={args.door_id}",
+        flush=True,
+    )
+    return writer
+
+
+def counter_event(args: argparse.Namespace, *, counter: str, in_inc: int, out_inc: int) -> dict[str, Any]:
+    # Common head of a counted event; callers append their counter-specific fields.
+    return {
+        "schema_ver": 1,
+        "source": "oakd-lite-v3",
+        "counter": counter,
+        "node_id": args.node_id,
+        "door_id": int(args.door_id),
+        "ts": utc_now_iso(),
+        "in": int(in_inc),
+        "out": int(out_inc),
+    }
+
+
+def exit_on_sigterm() -> None:
+    # systemd stops units with SIGTERM; turn it into SystemExit so `finally` drains the writer queue.
+    def _handler(signum: int, frame: Any) -> None:
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _handler)
+
+
+class EventWriter:
+    """Background owner of a counter's SQLite connection: the frame loop only enqueues events.
+
+    `submit()` assigns the next `seq` in memory and returns immediately. The writer thread inserts
+    queued events into `outbox` (store=edge) or `events` (store=central) in grouped transactions and
+    checkpoints the next seq in `meta` inside the same transaction, so a restart never reuses a seq
+    that reached the disk. Inside that BEGIN IMMEDIATE transaction the batch is checked against the
+    shared `meta` counter and MAX(seq): if another writer (enqueue_event.py) took those seqs in the
+    meantime, the batch is renumbered instead of being dropped as duplicates. Commits run with
+    synchronous=NORMAL (no fsync); the WAL is synced by a passive checkpoint at most every
+    `fsync_interval_sec`, which bounds what a power cut can lose.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        store: str,
+        node_id: str,
+        max_events: int = 64,
+        max_delay_ms: int = 200,
+        fsync_interval_sec: float = 1.0,
+        queue_max: int = 10000,
+    ) -> None:
+        if store not in {"central", "edge"}:
+            raise ValueError(f"store must be central|edge (got {store})")
+        self.db_path = db_path
+        self.store = store
+        self.node_id = node_id
+        self.seq_key = EDGE_SEQ_KEY if store == "edge" else central_seq_key(node_id)
+        self.max_events = max(1, int(max_events))
+        self.max_delay_sec = max(0, int(max_delay_ms)) / 1000.0
+        self.fsync_interval_sec = max(0.0, float(fsync_interval_sec))
+        self.queue_max = max(1, int(queue_max))
+        self._queue: queue.Queue[tuple[str, int, dict[str, Any]] | None] = queue.Queue(maxsize=self.queue_max)
+        self._seq_lock = threading.Lock()
+        self._next_seq = 1
+        self._conn: sqlite3.Connection | None = None
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.duplicates = 0
+        self.renumbered = 0
+        self.dropped = 0
+        self.commits = 0
+        self.errors = 0
+        self.syncs = 0
+        self.last_error: str | None = None
+        self.commit_ms: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def start(self) -> None:
+        # Schema and the seq checkpoint are read synchronously: submit() must never hand out a used seq.
+        conn = connect(self.db_path)
+        if self.store == "central":
+            init_central_db(conn)
+            row = conn.execute("SELECT MAX(seq) FROM events WHERE node_id = ?;", (self.node_id,)).fetchone()
+        else:
+            init_edge_db(conn)
+            row = conn.execute("SELECT MAX(seq) FROM outbox;").fetchone()
+        max_seq = int(row[0]) if row and row[0] is not None else 0
+        self._next_seq = max(int(meta_get(conn, self.seq_key, "1")), max_seq + 1)
+        self._conn = conn
+        self._thread.start()
+
+    def submit(self, payload: dict[str, Any]) -> int | None:
+        # Never blocks: if the writer is stuck long enough to fill the queue, the event is dropped and
+        # counted (returns None). The seq is only taken once the event is queued, so drops leave no gaps.
+        with self._seq_lock:
+            seq = self._next_seq
+            payload["seq"] = seq
+            try:
+                self._queue.put_nowait((utc_now_iso(), seq, payload))
+            except queue.Full:
+                payload.pop("seq", None)
+                with self._stats_lock:
+                    self.dropped += 1
+                return None
+            self._next_seq += 1
+        with self._stats_lock:
+            self.submitted += 1
+        return seq
+
+    def close(self, timeout_sec: float = 10.0) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout_sec)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout_sec)
+
+    def _collect(self, first: tuple[str, int, dict[str, Any]]) -> tuple[list[tuple[str, int, dict[str, Any]]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay_sec
+        while len(batch) < self.max_events:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _reserve_seqs(
+        self, conn: sqlite3.Connection, batch: list[tuple[str, int, dict[str, Any]]]
+    ) -> list[tuple[str, int, dict[str, Any]]]:
+        # Runs inside the write transaction, so no other writer can take seqs until COMMIT.
+        if self.store == "edge":
+            row = conn.execute("SELECT MAX(seq) FROM outbox;").fetchone()
+        else:
+            row = conn.execute("SELECT MAX(seq) FROM events WHERE node_id = ?;", (self.node_id,)).fetchone()
+        max_seq = int(row[0]) if row and row[0] is not None else 0
+        floor = max(int(meta_get(conn, self.seq_key, "1")), max_seq + 1)
+        if batch[0][1] >= floor:
+            return batch
+        renumbered: list[tuple[str, int, dict[str, Any]]] = []
+        for offset, (created_at, _, payload) in enumerate(batch):
+            payload["seq"] = floor + offset
+            renumbered.append((created_at, floor + offset, payload))
+        # Events still queued behind this batch hold seqs below the new floor; they get renumbered
+        # on their own commit. New submits start above it.
+        with self._seq_lock:
+            self._next_seq = max(self._next_seq, floor + len(batch))
+        with self._stats_lock:
+            self.renumbered += len(batch)
+        print(
+            f"event-writer: seq {batch[0][1]}..{batch[-1][1]} already taken by another writer, "
+            f"stored as {floor}..{floor + len(batch) - 1}",
+            flush=True,
+        )
+        return renumbered
+
+    def _commit(self, batch: list[tuple[str, int, dict[str, Any]]]) -> bool:
+        conn = self._conn
+        assert conn is not None
+        started = time.perf_counter()
+        try:
+            with transaction(conn):
+                batch = self._reserve_seqs(conn, batch)
+                if self.store == "edge":
+                    cur = conn.executemany(
+                        "INSERT INTO outbox(created_at, seq, payload_json) VALUES (?, ?, ?) ON CONFLICT(seq) DO NOTHING;",
+                        [
+                            (created_at, seq, json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+                            for created_at, seq, payload in batch
+                        ],
+                    )
+                    stored = max(0, int(cur.rowcount))
+                else:
+                    statuses = insert_events(conn, [payload for _, _, payload in batch], ts_received=utc_now_iso())
+                    stored = statuses.count("stored")
+                meta_set(conn, self.seq_key, str(max(seq for _, seq, _ in batch) + 1))
+        except sqlite3.Error as e:
+            with self._stats_lock:
+                self.errors += 1
+                self.last_error = str(e)
+            return False
+        with self._stats_lock:
+            self.commits += 1
+            self.written += stored
+            self.duplicates += len(batch) - stored
+            self.commit_ms.append((time.perf_counter() - started) * 1000.0)
+        return True
+
+    def _sync(self) -> None:
+        try:
+            assert self._conn is not None
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+        except sqlite3.Error as e:
+            with self._stats_lock:
+                self.errors += 1
+                self.last_error = str(e)
+            return
+        with self._stats_lock:
+            self.syncs += 1
+
+    def _run(self) -> None:
+        pending: list[tuple[str, int, dict[str, Any]]] = []
+        stopping = False
+        dirty = False
+        last_sync = time.monotonic()
+        retry_delay = 0.0
+        while True:
+            if not pending and not stopping:
+                try:
+                    # Idle with unsynced commits: wake up in time for the bounded fsync.
+                    first = self._queue.get(timeout=self.fsync_interval_sec if dirty else None)
+                    if first is None:
+                        stopping = True
+                    else:
+                        pending, stopping = self._collect(first)
+                except queue.Empty:
+                    pass
+
+            if pending:
+                if self._commit(pending):
+                    pending = []
+                    dirty = True
+                    retry_delay = 0.0
+                elif not stopping:
+                    # Keep the batch (SD card hiccup, sender holding the lock) and retry with backoff.
+                    retry_delay = min(5.0, max(0.25, retry_delay * 2.0))
+                    time.sleep(retry_delay)
+                    continue
+
+            now = time.monotonic()
+            if dirty and (stopping or (now - last_sync) >= self.fsync_interval_sec):
+                self._sync()
+                dirty = False
+                last_sync = now
+
+            if stopping:
+                if pending:
+                    with self._stats_lock:
+                        self.dropped += len(pending)
+                    print(f"event-writer: {len(pending)} events not written at shutdown: {self.last_error}", flush=True)
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                return
+
+    def heartbeat(self) -> str:
+        with self._stats_lock:
+            return (
+                f"db_written={self.written} db_queue={self._queue.qsize()} "
+                f"db_dropped={self.dropped} db_errors={self.errors}"
+            )
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "store": self.store,
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self.queue_max,
+                "next_seq": self._next_seq,
+                "submitted": self.submitted,
+                "written": self.written,
+                "duplicates": self.duplicates,
+                "renumbered": self.renumbered,
+                "dropped": self.dropped,
+                "commits": self.commits,
+                "syncs": self.syncs,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "commit_ms_p50": percentile(self.commit_ms, 50),
+                "commit_ms_p95": percentile(self.commit_ms, 95),
+            }
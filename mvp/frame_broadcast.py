@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+class FrameBroadcaster:
+    """Latest preview JPEG shared by every viewer.
+
+    The producer encodes a frame once and `publish()`es it; MJPEG clients block in `wait_next()`
+    on a condition variable instead of polling. Producers check `has_viewers()` first and skip
+    drawing/encoding entirely while nobody is subscribed.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._jpg = b""
+        self._ts = 0.0
+        self._seq = 0
+        self._viewers = 0
+        self._closed = False
+        self.published = 0
+
+    def has_viewers(self) -> bool:
+        return self._viewers > 0
+
+    def viewers(self) -> int:
+        return self._viewers
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def publish(self, jpg: bytes, ts: float) -> None:
+        with self._cond:
+            self._jpg = jpg
+            self._ts = ts
+            self._seq += 1
+            self.published += 1
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[None]:
+        with self._cond:
+            self._viewers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._viewers -= 1
+
+    def wait_next(self, last_seq: int, timeout_sec: float = 5.0) -> tuple[int, bytes] | None:
+        """Blocks until a frame newer than `last_seq` exists; None on timeout or close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or (self._seq != last_seq and bool(self._jpg)), timeout_sec):
+                return None
+            if self._closed:
+                return None
+            return self._seq, self._jpg
+
+    def snapshot(self, *, max_age_sec: float = 1.0, timeout_sec: float = 2.0) -> bytes:
+        # A snapshot request is a one-frame viewer: reuse a fresh frame or wait for the next one.
+        with self._cond:
+            if self._jpg and (time.monotonic() - self._ts) <= max_age_sec:
+                return self._jpg
+            last_seq = self._seq
+        with self.subscribe():
+            frame = self.wait_next(last_seq, timeout_sec)
+        if frame is not None:
+            return frame[1]
+        with self._cond:
+            return self._jpg
+
+
+def stream_mjpeg(wfile: Any, broadcaster: FrameBroadcaster, *, boundary: bytes = b"frame") -> None:
+    """Writes frames to one MJPEG client until it disconnects (the HTTP headers are already sent)."""
+    last_seq = 0
+    with broadcaster.subscribe():
+        while True:
+            frame = broadcaster.wait_next(last_seq)
+            if frame is None:
+                if broadcaster.closed:
+                    return
+                continue
+            last_seq, jpg = frame
+            wfile.write(
+                b"--" + boundary + b"\r\nContent-Type: image/jpeg\r\n"
+                + f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii")
+                + jpg
+                + b"\r\n"
+            )
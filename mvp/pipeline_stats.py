@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import time
+from types import MappingProxyType
+from typing import Any, Mapping
+
+
+class PipelineStats:
+    """Counters owned by the capture thread, published to other threads as immutable snapshots.
+
+    The owner updates `values` with no locking; `maybe_publish()` swaps in a read-only copy at most
+    every `interval_sec`. Readers (HTTP handlers, preview worker) only ever call `snapshot()`, which
+    is a single reference read, so they never contend with the frame loop.
+    """
+
+    def __init__(self, initial: dict[str, Any], *, interval_sec: float = 0.25) -> None:
+        self.values: dict[str, Any] = dict(initial)
+        self.interval_sec = max(0.0, float(interval_sec))
+        self._published_at = 0.0
+        self._snapshot: Mapping[str, Any] = MappingProxyType(dict(self.values))
+
+    def incr(self, key: str, amount: int = 1) -> None:
+        self.values[key] = int(self.values.get(key, 0)) + amount
+
+    def publish(self, now: float | None = None) -> None:
+        self._published_at = time.monotonic() if now is None else now
+        self._snapshot = MappingProxyType(dict(self.values))
+
+    def maybe_publish(self, now: float) -> bool:
+        if (now - self._published_at) < self.interval_sec:
+            return False
+        self.publish(now)
+        return True
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self._snapshot
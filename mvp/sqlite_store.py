@@ -3,8 +3,8 @@ from __future__ import annotations
 import json
 import os
 import sqlite3
-from dataclasses import dataclass
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Iterator
 
 
 def ensure_parent_dir(path: str) -> None:
@@ -22,6 +22,18 @@ def connect(db_path: str) -> sqlite3.Connection:
     return conn
 
 
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # connect() opens connections in autocommit mode; group multi-row writes explicitly.
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
+
+
 def init_edge_db(conn: sqlite3.Connection) -> None:
     conn.execute(
         """
@@ -97,33 +109,180 @@ def init_central_db(conn: sqlite3.Connection) -> None:
         """
     )
 
+    with transaction(conn):
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='door_counters';").fetchone()
+        if not exists:
+            conn.execute(
+                """
+                CREATE TABLE door_counters (
+                  node_id TEXT NOT NULL,
+                  door_id INTEGER NOT NULL,
+                  pending_in INTEGER NOT NULL DEFAULT 0, -- since last central_flush
+                  pending_out INTEGER NOT NULL DEFAULT 0,
+                  pending_events INTEGER NOT NULL DEFAULT 0,
+                  total_in INTEGER NOT NULL DEFAULT 0,
+                  total_out INTEGER NOT NULL DEFAULT 0,
+                  total_events INTEGER NOT NULL DEFAULT 0,
+                  last_event_ts_received TEXT,
+                  PRIMARY KEY(node_id, door_id)
+                );
+                """
+            )
+            # One-time seed from events already on disk (pending = not yet flushed).
+            last_flushed_id = int(meta_get(conn, "last_flushed_event_id", "0"))
+            conn.execute(
+                """
+                INSERT INTO door_counters(
+                  node_id, door_id, pending_in, pending_out, pending_events,
+                  total_in, total_out, total_events, last_event_ts_received
+                )
+                SELECT
+                  node_id, door_id,
+                  SUM(CASE WHEN id > ? THEN in_count ELSE 0 END),
+                  SUM(CASE WHEN id > ? THEN out_count ELSE 0 END),
+                  SUM(id > ?),
+                  SUM(in_count), SUM(out_count), COUNT(*), MAX(ts_received)
+                FROM events
+                GROUP BY node_id, door_id;
+                """,
+                (last_flushed_id, last_flushed_id, last_flushed_id),
+            )
+
+
+_DOOR_COUNTERS_UPSERT_SQL = """
+    INSERT INTO door_counters(
+      node_id, door_id, pending_in, pending_out, pending_events,
+      total_in, total_out, total_events, last_event_ts_received
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(node_id, door_id) DO UPDATE SET
+      pending_in = pending_in + excluded.pending_in,
+      pending_out = pending_out + excluded.pending_out,
+      pending_events = pending_events + excluded.pending_events,
+      total_in = total_in + excluded.total_in,
+      total_out = total_out + excluded.total_out,
+      total_events = total_events + excluded.total_events,
+      last_event_ts_received = MAX(COALESCE(last_event_ts_received, ''), excluded.last_event_ts_received);
+"""
+
+
+def _bump_door_counters(conn: sqlite3.Connection, rows: list[tuple[Any, ...]]) -> None:
+    # rows are events table tuples (see _event_row); must run in the transaction that inserted them.
+    sums: dict[tuple[str, int], list[Any]] = {}
+    for row in rows:
+        item = sums.setdefault((row[1], row[2]), [0, 0, 0, row[0]])
+        item[0] += row[5]
+        item[1] += row[6]
+        item[2] += 1
+        item[3] = max(item[3], row[0])
+    conn.executemany(
+        _DOOR_COUNTERS_UPSERT_SQL,
+        [
+            (node_id, door_id, in_sum, out_sum, count, in_sum, out_sum, count, last_ts)
+            for (node_id, door_id), (in_sum, out_sum, count, last_ts) in sums.items()
+        ],
+    )
+
+
+def take_pending_door_counts(conn: sqlite3.Connection) -> dict[int, dict[str, int]]:
+    # Returns per-door in/out accumulated since the last call and resets them; call inside transaction().
+    rows = conn.execute(
+        """
+        SELECT door_id, SUM(pending_in), SUM(pending_out), SUM(pending_events)
+        FROM door_counters
+        GROUP BY door_id
+        HAVING SUM(pending_events) > 0;
+        """
+    ).fetchall()
+    conn.execute(
+        "UPDATE door_counters SET pending_in = 0, pending_out = 0, pending_events = 0 WHERE pending_events > 0;"
+    )
+    return {int(row[0]): {"in": int(row[1]), "out": int(row[2]), "events": int(row[3])} for row in rows}
 
-@dataclass(frozen=True)
-class StoreResult:
-    status: str  # "stored" | "duplicate"
-    id: int | None
 
+_EVENT_INSERT_SQL = """
+    INSERT INTO events(ts_received, node_id, door_id, seq, ts_event, in_count, out_count, confidence, raw_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
 
-def store_event(conn: sqlite3.Connection, payload: dict[str, Any], *, ts_received: str) -> StoreResult:
+
+_SQLITE_INT_MIN = -(2**63)
+_SQLITE_INT_MAX = 2**63 - 1
+
+
+def _sqlite_int(value: Any) -> int:
+    # sqlite3 raises OverflowError on bind for ints outside int64; reject them with the payload instead.
+    number = int(value)
+    if not _SQLITE_INT_MIN <= number <= _SQLITE_INT_MAX:
+        raise ValueError("integer out of range")
+    return number
+
+
+def _sqlite_scalar(value: Any) -> Any:
+    if value is None or isinstance(value, (str, float)):
+        return value
+    if isinstance(value, int):
+        return _sqlite_int(value)
+    raise TypeError("unsupported value type")
+
+
+def _event_row(payload: dict[str, Any], *, ts_received: str) -> tuple[Any, ...]:
+    # Raises KeyError/ValueError/TypeError for anything that would fail at bind time, so one bad
+    # payload is reported as "invalid" instead of failing the statement for the whole group.
     raw_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
-    node_id = str(payload["node_id"])
-    door_id = int(payload["door_id"])
-    seq = int(payload["seq"])
-    ts_event = payload.get("ts")
-    in_count = int(payload.get("in", 0))
-    out_count = int(payload.get("out", 0))
-    confidence = payload.get("confidence")
-    try:
-        cur = conn.execute(
-            """
-            INSERT INTO events(ts_received, node_id, door_id, seq, ts_event, in_count, out_count, confidence, raw_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (ts_received, node_id, door_id, seq, ts_event, in_count, out_count, confidence, raw_json),
-        )
-        return StoreResult(status="stored", id=int(cur.lastrowid))
-    except sqlite3.IntegrityError:
-        return StoreResult(status="duplicate", id=None)
+    return (
+        ts_received,
+        str(payload["node_id"]),
+        _sqlite_int(payload["door_id"]),
+        _sqlite_int(payload["seq"]),
+        _sqlite_scalar(payload.get("ts")),
+        _sqlite_int(payload.get("in", 0)),
+        _sqlite_int(payload.get("out", 0)),
+        _sqlite_scalar(payload.get("confidence")),
+        raw_json,
+    )
+
+
+def insert_events(conn: sqlite3.Connection, payloads: list[Any], *, ts_received: str) -> list[str]:
+    # Caller owns the transaction. One status per payload, in order: "stored" | "duplicate" | "invalid".
+    statuses: list[str] = []
+    rows: list[tuple[Any, ...] | None] = []
+    for payload in payloads:
+        try:
+            rows.append(_event_row(payload, ts_received=ts_received))
+            statuses.append("stored")
+        except (KeyError, ValueError, TypeError):
+            rows.append(None)
+            statuses.append("invalid")
+
+    seqs_by_node: dict[str, set[int]] = {}
+    for row in rows:
+        if row is not None:
+            seqs_by_node.setdefault(row[1], set()).add(row[3])
+
+    seen: set[tuple[str, int]] = set()
+    for node_id, seqs in seqs_by_node.items():
+        ordered = sorted(seqs)
+        for offset in range(0, len(ordered), 500):
+            chunk = ordered[offset : offset + 500]
+            existing = conn.execute(
+                f"SELECT seq FROM events WHERE node_id = ? AND seq IN ({', '.join('?' for _ in chunk)});",
+                (node_id, *chunk),
+            ).fetchall()
+            seen.update((node_id, int(item[0])) for item in existing)
+
+    new_rows: list[tuple[Any, ...]] = []
+    for index, row in enumerate(rows):
+        if row is None:
+            continue
+        key = (row[1], row[3])
+        if key in seen:
+            statuses[index] = "duplicate"
+            continue
+        seen.add(key)
+        new_rows.append(row)
+    conn.executemany(_EVENT_INSERT_SQL, new_rows)
+    _bump_door_counters(conn, new_rows)
+    return statuses
 
 
 def meta_get(conn: sqlite3.Connection, key: str, default: str) -> str:
@@ -178,3 +337,35 @@ def mark_batch_sent(conn: sqlite3.Connection, *, batch_id: str, sent_at: str) ->
         """,
         (sent_at, batch_id),
     )
+
+
+def mark_batches_attempt(
+    conn: sqlite3.Connection,
+    *,
+    batch_ids: list[str],
+    attempt_at: str,
+    error: str | None,
+) -> None:
+    conn.executemany(
+        """
+        UPDATE batches_outbox
+        SET attempts = attempts + 1,
+            last_attempt_at = ?,
+            last_error = ?
+        WHERE batch_id = ?;
+        """,
+        [(attempt_at, error, batch_id) for batch_id in batch_ids],
+    )
+
+
+def mark_batches_sent(conn: sqlite3.Connection, *, batch_ids: list[str], sent_at: str) -> None:
+    conn.executemany(
+        """
+        UPDATE batches_outbox
+        SET status='sent',
+            sent_at=?,
+            last_error=NULL
+        WHERE batch_id = ?;
+        """,
+        [(sent_at, batch_id) for batch_id in batch_ids],
+    )
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import numpy as np
+
+FRAME_STAGE = "frame"
+
+
+class StageTimers:
+    """Rolling per-stage latency windows (milliseconds) for one frame loop.
+
+    Single-writer: each thread that times work owns its own instance. `begin()` opens a loop pass,
+    `lap(stage)` charges the time since the previous lap to `stage`, `end()` commits the laps plus the
+    whole pass under `total_stage`. Passes that are never ended (idle polls) are dropped by the next
+    `begin()`, so the windows describe only passes that actually handled a message or a frame.
+    """
+
+    def __init__(self, *, window: int = 512, total_stage: str | None = FRAME_STAGE) -> None:
+        self.window = max(16, int(window))
+        self.total_stage = total_stage
+        self._rings: dict[str, np.ndarray] = {}
+        self._counts: dict[str, int] = {}
+        self._pending: list[tuple[str, float]] = []
+        self._begin_ts = 0.0
+        self._lap_ts = 0.0
+
+    def begin(self) -> None:
+        self._pending.clear()
+        self._begin_ts = self._lap_ts = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._pending.append((stage, (now - self._lap_ts) * 1000.0))
+        self._lap_ts = now
+
+    def end(self) -> None:
+        for stage, elapsed_ms in self._pending:
+            self.add(stage, elapsed_ms)
+        self._pending.clear()
+        if self.total_stage:
+            self.add(self.total_stage, (time.perf_counter() - self._begin_ts) * 1000.0)
+
+    def add(self, stage: str, elapsed_ms: float) -> None:
+        ring = self._rings.get(stage)
+        if ring is None:
+            ring = self._rings[stage] = np.zeros(self.window, dtype=np.float64)
+            self._counts[stage] = 0
+        count = self._counts[stage]
+        ring[count % self.window] = elapsed_ms
+        self._counts[stage] = count + 1
+
+    def summary(self) -> dict[str, dict[str, float | int]]:
+        out: dict[str, dict[str, float | int]] = {}
+        for stage, ring in list(self._rings.items()):
+            count = self._counts.get(stage, 0)
+            if count <= 0:
+                continue
+            p50, p95, p99 = np.percentile(ring[: min(count, self.window)], (50, 95, 99))
+            out[stage] = {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3), "n": count}
+        return out
+
+
+def device_age_ms(msg: Any) -> float | None:
+    # Sensor-to-host age of a device message; replayed messages carry no device timestamp.
+    try:
+        import depthai as dai
+
+        return float((dai.Clock.now() - msg.getTimestamp()).total_seconds() * 1000.0)
+    except Exception:
+        return None
+
+
+def merged_summary(*timers: StageTimers) -> dict[str, dict[str, float | int]]:
+    out: dict[str, dict[str, float | int]] = {}
+    for timer in timers:
+        out.update(timer.summary())
+    return out
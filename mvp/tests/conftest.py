@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# mvp scripts import each other as top-level modules (they run from the mvp directory on the device).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import threading
+
+import collector
+from collector import GroupCommitWriter
+from sqlite_store import connect, init_central_db
+
+
+def _writer(tmp_path, *, max_events: int = 100, max_delay_ms: int = 200) -> GroupCommitWriter:
+    conn = connect(str(tmp_path / "central.sqlite3"))
+    init_central_db(conn)
+    return GroupCommitWriter(conn, max_events=max_events, max_delay_ms=max_delay_ms, queue_max=64)
+
+
+def _event(node_id: str, seq: int, **extra) -> dict:
+    return {"node_id": node_id, "door_id": 1, "seq": seq, "in": 1, "out": 0, **extra}
+
+
+def _submit_concurrently(writer: GroupCommitWriter, batches: list[list]) -> list:
+    results: list = [None] * len(batches)
+    start = threading.Barrier(len(batches))
+
+    def submit(index: int) -> None:
+        start.wait()
+        results[index] = writer.submit(batches[index])
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(batches))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_group_commit_splits_statuses_back_per_request(tmp_path) -> None:
+    writer = _writer(tmp_path)
+    writer.start()
+    try:
+        results = _submit_concurrently(
+            writer,
+            [
+                [_event("a", 1), _event("a", 2)],
+                [_event("b", 1), _event("b", 1)],
+                [{"node_id": "c"}, _event("c", 1)],
+            ],
+        )
+        assert [request.error for request in results] == [None, None, None]
+        assert [request.statuses for request in results] == [
+            ["stored", "stored"],
+            ["stored", "duplicate"],
+            ["invalid", "stored"],
+        ]
+        snapshot = writer.snapshot()
+        assert snapshot["commits"] <= 3
+        assert snapshot["events"] == 6
+        rows = writer.conn.execute("SELECT node_id, seq FROM events ORDER BY node_id, seq;").fetchall()
+        assert rows == [("a", 1), ("a", 2), ("b", 1), ("c", 1)]
+    finally:
+        writer.stop()
+
+
+def test_requests_in_one_group_get_their_own_slice(tmp_path) -> None:
+    writer = _writer(tmp_path, max_delay_ms=0)
+    first = collector.WriteRequest(payloads=[_event("a", 1), _event("a", 1)])
+    second = collector.WriteRequest(payloads=[_event("b", 5)])
+    third = collector.WriteRequest(payloads=[{"seq": 3}, _event("a", 2), _event("b", 5)])
+
+    writer._commit([first, second, third])
+
+    assert first.statuses == ["stored", "duplicate"]
+    assert second.statuses == ["stored"]
+    assert third.statuses == ["invalid", "stored", "duplicate"]
+    assert all(request.done.is_set() and request.error is None for request in (first, second, third))
+    assert first.ts_received == second.ts_received == third.ts_received
+    assert writer.snapshot()["commits"] == 1
+
+
+def test_poison_payloads_are_invalid_and_do_not_fail_the_group(tmp_path) -> None:
+    writer = _writer(tmp_path, max_delay_ms=0)
+    good = collector.WriteRequest(payloads=[_event("a", 1)])
+    poison = collector.WriteRequest(
+        payloads=[
+            _event("x", 2**70),
+            _event("x", 1, door_id=2**64),
+            _event("x", 2, ts={"at": "now"}),
+            _event("x", 3, confidence=[0.9]),
+            _event("x", 4, **{"in": 10**30}),
+        ]
+    )
+
+    writer._commit([good, poison])
+
+    assert good.error is None and good.statuses == ["stored"]
+    assert poison.error is None and poison.statuses == ["invalid"] * 5
+    counters = writer.conn.execute("SELECT node_id, total_events FROM door_counters;").fetchall()
+    assert counters == [("a", 1)]
+
+
+def test_unexpected_error_fails_the_group_but_keeps_the_writer_running(tmp_path, monkeypatch) -> None:
+    writer = _writer(tmp_path, max_delay_ms=0)
+    real_insert = collector.insert_events
+    calls = {"n": 0}
+
+    def flaky_insert(conn, payloads, *, ts_received):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("boom")
+        return real_insert(conn, payloads, ts_received=ts_received)
+
+    monkeypatch.setattr(collector, "insert_events", flaky_insert)
+    writer.start()
+    try:
+        failed = writer.submit([_event("a", 1)], timeout_sec=5)
+        assert failed.error == "boom"
+        assert failed.statuses == []
+        ok = writer.submit([_event("a", 1)], timeout_sec=5)
+        assert ok.error is None and ok.statuses == ["stored"]
+        assert writer.snapshot()["errors"] == 1
+        assert writer._thread.is_alive()
+        assert not writer.conn.in_transaction
+    finally:
+        writer.stop()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from depth_sampling import HeadDepthSampler, partition_percentile
+
+
+def _tracklet(tid: int, x1: float, y1: float, x2: float, y2: float) -> SimpleNamespace:
+    roi = SimpleNamespace(
+        topLeft=lambda: SimpleNamespace(x=x1, y=y1),
+        bottomRight=lambda: SimpleNamespace(x=x2, y=y2),
+    )
+    return SimpleNamespace(id=tid, roi=roi)
+
+
+def _clamp_pixel(value: float, max_value: int) -> int:
+    if value <= 1.5:
+        value = value * max_value
+    return int(max(0, min(max_value - 1, round(value))))
+
+
+def _reference_depth_m(
+    tracklet: SimpleNamespace,
+    depth_frame: np.ndarray,
+    head_fraction: float,
+    min_valid_px: int,
+    *,
+    stride: int = 1,
+    percentile: float = 50.0,
+) -> float | None:
+    # estimate_head_shoulders_depth_m() as it was before depth_sampling.py, extended with the
+    # frame-anchored stride grid (pixels p with p % stride == 0) for stride > 1.
+    frame_h, frame_w = depth_frame.shape[:2]
+    x1 = _clamp_pixel(float(tracklet.roi.topLeft().x), frame_w)
+    y1 = _clamp_pixel(float(tracklet.roi.topLeft().y), frame_h)
+    x2 = _clamp_pixel(float(tracklet.roi.bottomRight().x), frame_w)
+    y2 = _clamp_pixel(float(tracklet.roi.bottomRight().y), frame_h)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    head_h = max(1, int(round((y2 - y1) * head_fraction)))
+    y_head = min(y2, y1 + head_h)
+    sx1 = -(-x1 // stride) * stride
+    sy1 = -(-y1 // stride) * stride
+    roi = depth_frame[sy1:y_head:stride, sx1:x2:stride]
+    valid = roi[(roi >= 200) & (roi <= 10000)]
+    if valid.size == 0 or valid.size * stride * stride < min_valid_px:
+        return None
+    depth_mm = float(np.median(valid)) if percentile == 50.0 else float(np.percentile(valid, percentile))
+    if depth_mm <= 0:
+        return None
+    return depth_mm / 1000.0
+
+
+def _depth_frame(rng: np.random.Generator, h: int = 400, w: int = 640) -> np.ndarray:
+    frame = rng.integers(150, 4000, size=(h, w), dtype=np.uint16)
+    frame[rng.random((h, w)) < 0.2] = 0  # stereo holes
+    return frame
+
+
+def _random_tracklets(rng: np.random.Generator, count: int) -> list[SimpleNamespace]:
+    tracklets = []
+    for tid in range(count):
+        x1, x2 = sorted(rng.random(2))
+        y1, y2 = sorted(rng.random(2))
+        tracklets.append(_tracklet(tid, float(x1), float(y1), float(x2), float(y2)))
+    return tracklets
+
+
+@pytest.mark.parametrize("stride", [1, 2, 3])
+@pytest.mark.parametrize("percentile", [50.0, 30.0])
+def test_sampler_matches_reference_on_random_frames(stride: int, percentile: float) -> None:
+    rng = np.random.default_rng(1000 + stride)
+    sampler = HeadDepthSampler(head_fraction=0.35, min_valid_px=40, stride=stride, percentile=percentile)
+    for _ in range(50):
+        frame = _depth_frame(rng)
+        tracklets = _random_tracklets(rng, 4)
+        got = sampler.sample(frame, tracklets)
+        for tracklet in tracklets:
+            expected = _reference_depth_m(tracklet, frame, 0.35, 40, stride=stride, percentile=percentile)
+            if expected is None:
+                assert got[tracklet.id] is None
+            else:
+                assert got[tracklet.id] == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize("stride", [1, 2])
+def test_roi_touching_frame_edge(stride: int) -> None:
+    rng = np.random.default_rng(7)
+    frame = _depth_frame(rng)
+    # Normalized boxes running past the bottom-right corner and starting at the top-left one.
+    tracklets = [
+        _tracklet(1, 0.8, 0.7, 1.0, 1.0),
+        _tracklet(2, 0.0, 0.0, 0.25, 0.5),
+        _tracklet(3, 500.0, 0.0, 700.0, 120.0),
+    ]
+    sampler = HeadDepthSampler(head_fraction=0.5, min_valid_px=10, stride=stride)
+    got = sampler.sample(frame, tracklets)
+    for tracklet in tracklets:
+        expected = _reference_depth_m(tracklet, frame, 0.5, 10, stride=stride)
+        assert expected is not None
+        assert got[tracklet.id] == pytest.approx(expected, abs=1e-9)
+
+
+def test_all_zero_roi_has_no_depth() -> None:
+    frame = np.full((400, 640), 1500, dtype=np.uint16)
+    frame[0:200, 0:320] = 0
+    sampler = HeadDepthSampler(head_fraction=0.5, min_valid_px=1, stride=2)
+    got = sampler.sample(frame, [_tracklet(1, 0.0, 0.0, 0.4, 0.4), _tracklet(2, 0.6, 0.6, 0.9, 0.9)])
+    assert got[1] is None
+    assert got[2] == pytest.approx(1.5)
+
+
+def test_empty_and_missing_inputs() -> None:
+    sampler = HeadDepthSampler(head_fraction=0.5, min_valid_px=1)
+    assert sampler.sample(None, [_tracklet(1, 0.1, 0.1, 0.5, 0.5)]) == {1: None}
+    frame = np.full((100, 100), 1000, dtype=np.uint16)
+    # Degenerate box (x2 <= x1) is skipped without affecting the others.
+    got = sampler.sample(frame, [_tracklet(1, 0.5, 0.1, 0.5, 0.5), _tracklet(2, 0.1, 0.1, 0.5, 0.5)])
+    assert got == {1: None, 2: pytest.approx(1.0)}
+
+
+@pytest.mark.parametrize("percentile", [0.0, 10.0, 50.0, 62.5, 90.0, 100.0])
+def test_partition_percentile_matches_numpy(percentile: float) -> None:
+    rng = np.random.default_rng(3)
+    for size in (1, 2, 5, 64, 1001):
+        values = rng.integers(200, 3000, size=size, dtype=np.uint16)
+        assert partition_percentile(values, percentile) == pytest.approx(float(np.percentile(values, percentile)))
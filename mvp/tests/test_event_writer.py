@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+
+import pytest
+
+from event_writer import EventWriter, add_event_writer_args, counter_event, load_event_writer_env
+from sqlite_store import connect, edge_next_seq, transaction
+
+
+def _enqueue_like_tool(db_path: str, door_id: int) -> int:
+    # What enqueue_event.py does: take the next seq from meta and insert it in one transaction.
+    conn = connect(db_path)
+    with transaction(conn):
+        seq = edge_next_seq(conn)
+        conn.execute(
+            "INSERT INTO outbox(created_at, seq, payload_json) VALUES (?, ?, ?);",
+            ("2026-01-01T00:00:00Z", seq, json.dumps({"door_id": door_id, "seq": seq})),
+        )
+    conn.close()
+    return seq
+
+
+def test_seqs_taken_by_another_writer_are_renumbered_not_dropped(tmp_path) -> None:
+    db_path = str(tmp_path / "edge.sqlite3")
+    writer = EventWriter(db_path, store="edge", node_id="edge-1", max_delay_ms=0)
+    writer.start()
+    # The writer seeded its in-memory counter at start(); the tool now takes seqs 1 and 2 behind its back.
+    taken = [_enqueue_like_tool(db_path, 2), _enqueue_like_tool(db_path, 2)]
+    first = [writer.submit({"door_id": 1, "in": 1, "out": 0}) for _ in range(3)]
+    writer.close()
+
+    assert first == [1, 2, 3]
+    assert taken == [1, 2]
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT seq, payload_json FROM outbox ORDER BY seq;").fetchall()
+    assert [seq for seq, _ in rows] == [1, 2, 3, 4, 5]
+    assert [json.loads(payload)["door_id"] for _, payload in rows] == [2, 2, 1, 1, 1]
+    assert all(json.loads(payload)["seq"] == seq for seq, payload in rows)
+    assert conn.execute("SELECT v FROM meta WHERE k = 'next_seq';").fetchone()[0] == "6"
+    snapshot = writer.snapshot()
+    assert snapshot["written"] == 3
+    assert snapshot["duplicates"] == 0
+    assert snapshot["renumbered"] == 3
+
+
+def test_dropped_submit_does_not_consume_a_seq(tmp_path) -> None:
+    writer = EventWriter(str(tmp_path / "edge.sqlite3"), store="edge", node_id="edge-1", queue_max=1)
+    # Not started: the queue fills after one event.
+    assert writer.submit({"door_id": 1}) == 1
+    payload: dict[str, object] = {"door_id": 1}
+    assert writer.submit(payload) is None
+    assert "seq" not in payload
+    assert writer.snapshot()["next_seq"] == 2
+    assert writer.snapshot()["dropped"] == 1
+
+
+def test_event_writer_args_resolve_from_counter_and_shared_env() -> None:
+    parser = argparse.ArgumentParser()
+    add_event_writer_args(parser)
+    args = parser.parse_args([])
+    env = {
+        "CAM_DEPTH_MULTI_EVENTS_DB": " /tmp/edge.sqlite3 ",
+        "CAM_COUNTER_STORE": "Central",
+        "CAM_COUNTER_NODE_ID": "door-2",
+        "CAM_COUNTER_DOOR_ID": "3",
+        "CAM_COUNTER_FSYNC_INTERVAL_SEC": "0.5",
+    }
+    load_event_writer_env(args, env, prefix="CAM_DEPTH_MULTI")
+
+    assert (args.events_db, args.events_store, args.node_id, args.door_id) == ("/tmp/edge.sqlite3", "central", "door-2", 3)
+    assert args.fsync_interval_sec == 0.5
+    event = counter_event(args, counter="depth-height-multi", in_inc=1, out_inc=0)
+    assert {key: event[key] for key in ("counter", "node_id", "door_id", "in", "out")} == {
+        "counter": "depth-height-multi",
+        "node_id": "door-2",
+        "door_id": 3,
+        "in": 1,
+        "out": 0,
+    }
+
+    args = parser.parse_args(["--node-id", "cli-node"])
+    with pytest.raises(ValueError):
+        load_event_writer_env(args, {"CAM_DEPTH_COUNT_FSYNC_INTERVAL_SEC": "90"}, prefix="CAM_DEPTH_COUNT")
+    assert args.node_id == "cli-node"
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import numpy as np
+
+
+VELOCITY_SMOOTHING = 0.5
+VELOCITY_MAX_GAP_SEC = 1.0
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of XYXY boxes: (T, 4) x (D, 4) -> (T, D)."""
+    iw = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.maximum(iw, 0.0) * np.maximum(ih, 0.0)
+    area_a = np.maximum(a[:, 2] - a[:, 0], 0.0) * np.maximum(a[:, 3] - a[:, 1], 0.0)
+    area_b = np.maximum(b[:, 2] - b[:, 0], 0.0) * np.maximum(b[:, 3] - b[:, 1], 0.0)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=(inter > 0.0) & (union > 0.0))
+
+
+def distance_matrix(a: np.ndarray, b: np.ndarray, *, scale: tuple[float, float] = (1.0, 1.0)) -> np.ndarray:
+    """Pairwise euclidean distance of (x, y) points, each axis multiplied by `scale` (e.g. norm -> px)."""
+    dx = (a[:, None, 0] - b[None, :, 0]) * float(scale[0])
+    dy = (a[:, None, 1] - b[None, :, 1]) * float(scale[1])
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def greedy_assign(cost: np.ndarray, allowed: np.ndarray) -> list[tuple[int, int]]:
+    """One-to-one matching by ascending cost over `allowed` pairs.
+
+    Same result as sorting all allowed (cost, row, col) pairs and taking each pair whose row and col
+    are still free (ties resolve row-major), but every step is one argmin over the masked matrix,
+    so the Python loop runs at most min(rows, cols) times.
+    """
+    if cost.size == 0:
+        return []
+    work = np.where(allowed, cost.astype(np.float64, copy=False), np.inf)
+    cols = work.shape[1]
+    pairs: list[tuple[int, int]] = []
+    for _ in range(min(work.shape)):
+        flat = int(np.argmin(work))
+        if not np.isfinite(work.flat[flat]):
+            break
+        row, col = divmod(flat, cols)
+        pairs.append((row, col))
+        work[row, :] = np.inf
+        work[:, col] = np.inf
+    return pairs
+
+
+def match_tracks(
+    track_centers: np.ndarray,
+    det_centers: np.ndarray,
+    *,
+    max_distance: float,
+    scale: tuple[float, float] = (1.0, 1.0),
+    track_boxes: np.ndarray | None = None,
+    det_boxes: np.ndarray | None = None,
+    iou_min: float = 0.0,
+) -> tuple[dict[int, int], set[int], set[int]]:
+    """Track-to-detection assignment: IoU-first (when boxes are given), then centroid distance.
+
+    Returns (track_row -> det_index, unmatched track rows, unmatched det indices).
+    """
+    tracks_n = int(track_centers.shape[0])
+    dets_n = int(det_centers.shape[0])
+    matched: dict[int, int] = {}
+    if tracks_n and dets_n:
+        free = np.ones((tracks_n, dets_n), dtype=bool)
+        if track_boxes is not None and det_boxes is not None:
+            # Stage 1: IoU-first matching (reduces ID swaps on crossing).
+            iou = iou_matrix(track_boxes, det_boxes)
+            for row, col in greedy_assign(-iou, iou >= float(iou_min)):
+                matched[row] = col
+            if matched:
+                rows = np.fromiter(matched.keys(), dtype=np.int64)
+                cols = np.fromiter(matched.values(), dtype=np.int64)
+                free[rows, :] = False
+                free[:, cols] = False
+
+        # Stage 2: centroid distance matching for the rest.
+        dist = distance_matrix(track_centers, det_centers, scale=scale)
+        for row, col in greedy_assign(dist, free & (dist <= float(max_distance))):
+            matched[row] = col
+
+    unmatched_tracks = set(range(tracks_n)) - set(matched.keys())
+    unmatched_dets = set(range(dets_n)) - set(matched.values())
+    return matched, unmatched_tracks, unmatched_dets
+
+
+def predict_offsets(velocities: np.ndarray, elapsed_sec: np.ndarray) -> np.ndarray:
+    """Constant-velocity shift (T, 2) for tracks last seen `elapsed_sec` ago; long gaps are not extrapolated."""
+    dt = np.clip(elapsed_sec, 0.0, VELOCITY_MAX_GAP_SEC)
+    return velocities * dt[:, None]
+
+
+def smooth_velocity(
+    velocity: tuple[float, float],
+    old_center: tuple[float, float],
+    new_center: tuple[float, float],
+    elapsed_sec: float,
+) -> tuple[float, float]:
+    if elapsed_sec <= 0.0 or elapsed_sec > VELOCITY_MAX_GAP_SEC:
+        return 0.0, 0.0
+    vx = (new_center[0] - old_center[0]) / elapsed_sec
+    vy = (new_center[1] - old_center[1]) / elapsed_sec
+    k = VELOCITY_SMOOTHING
+    return k * vx + (1.0 - k) * velocity[0], k * vy + (1.0 - k) * velocity[1]
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+REG_MAX = 15
+
+
+@dataclass
+class HeadGrid:
+    stride: float
+    centers: np.ndarray  # (H*W, 2) anchor centers in input pixels, row-major like the output tensor
+
+
+def nms_xyxy(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, top_k: int = 0) -> np.ndarray:
+    """Greedy NMS over XYXY boxes; same ordering/top_k semantics as cv2.dnn.NMSBoxes.
+
+    Candidates are taken in descending score order (stable on ties), `top_k` limits the
+    candidates before suppression. Returns indices into `boxes`.
+    """
+    if boxes.shape[0] == 0:
+        return np.zeros((0,), dtype=np.int64)
+    order = np.argsort(-scores, kind="stable")
+    if top_k > 0:
+        order = order[:top_k]
+
+    # Candidates are capped by top_k, so the full pairwise IoU matrix stays small.
+    cand = boxes[order]
+    areas = (cand[:, 2] - cand[:, 0]) * (cand[:, 3] - cand[:, 1])
+    iw = np.minimum(cand[:, None, 2], cand[None, :, 2]) - np.maximum(cand[:, None, 0], cand[None, :, 0])
+    ih = np.minimum(cand[:, None, 3], cand[None, :, 3]) - np.maximum(cand[:, None, 1], cand[None, :, 1])
+    inter = np.maximum(iw, 0.0) * np.maximum(ih, 0.0)
+    union = areas[:, None] + areas[None, :] - inter
+    overlaps = inter > iou_threshold * np.maximum(union, 1e-12)
+    suppressed = np.zeros(order.shape[0], dtype=bool)
+    keep: list[int] = []
+    for i in range(order.shape[0]):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= overlaps[i]
+    return order[np.asarray(keep, dtype=np.int64)]
+
+
+class YoloV8DflDecoder:
+    """Host decoder for raw single-class YOLOv8 DFL heads (64 box + 1 class channel).
+
+    Anchor grids are built once per output shape; every frame is decoded with array ops only:
+    the class threshold is applied on logits, the DFL softmax runs on the surviving anchors of all
+    heads at once, then NMS. Output matches `decode_yolov8_dfl_reference` (the previous decoder).
+    """
+
+    def __init__(self, input_size: tuple[int, int], *, reg_max: int = REG_MAX) -> None:
+        self.input_w, self.input_h = int(input_size[0]), int(input_size[1])
+        self.reg_max = int(reg_max)
+        self.channels = 4 * (self.reg_max + 1) + 1
+        self.bins = np.arange(self.reg_max + 1, dtype=np.float32)
+        self._grids: dict[tuple[int, ...], HeadGrid | None] = {}
+        self._logit_cache: tuple[float, float] = (-1.0, 0.0)
+
+    def _grid(self, shape: tuple[int, ...]) -> HeadGrid | None:
+        if shape in self._grids:
+            return self._grids[shape]
+        grid: HeadGrid | None = None
+        if len(shape) == 4 and shape[0] == 1 and shape[1] == self.channels:
+            _, _, h, w = shape
+            stride_w = self.input_w / float(w)
+            stride_h = self.input_h / float(h)
+            if abs(stride_w - stride_h) <= 1e-3:
+                ys, xs = np.meshgrid(np.arange(h, dtype=np.float32), np.arange(w, dtype=np.float32), indexing="ij")
+                centers = np.stack([xs.reshape(-1), ys.reshape(-1)], axis=1)
+                grid = HeadGrid(stride=float(stride_w), centers=(centers + 0.5) * float(stride_w))
+        self._grids[shape] = grid
+        return grid
+
+    def _logit_threshold(self, confidence_min: float) -> float:
+        # sigmoid(x) >= c  <=>  x >= log(c / (1 - c)); a small margin keeps float32 rounding on the safe side.
+        cached_conf, cached_logit = self._logit_cache
+        if cached_conf != confidence_min:
+            c = min(max(float(confidence_min), 1e-7), 1.0 - 1e-7)
+            cached_logit = float(np.log(c / (1.0 - c))) - 1e-4
+            self._logit_cache = (confidence_min, cached_logit)
+        return cached_logit
+
+    def decode(
+        self,
+        outputs: list[np.ndarray],
+        *,
+        confidence_min: float,
+        nms_iou: float,
+        max_det: int,
+    ) -> np.ndarray:
+        """Returns (N, 5) float32 rows of x1, y1, x2, y2, conf in input pixel space."""
+        logit_min = self._logit_threshold(float(confidence_min))
+        dist_parts: list[np.ndarray] = []
+        logit_parts: list[np.ndarray] = []
+        center_parts: list[np.ndarray] = []
+        stride_parts: list[np.ndarray] = []
+        box_ch = 4 * (self.reg_max + 1)
+        for out in outputs:
+            grid = self._grid(tuple(out.shape))
+            if grid is None:
+                continue
+            raw = out[0].reshape(self.channels, -1)  # (65, H*W)
+            logits = raw[box_ch]
+            idx = np.flatnonzero(logits >= logit_min)
+            if idx.shape[0] == 0:
+                continue
+            dist_parts.append(raw[:box_ch, idx])  # (64, n)
+            logit_parts.append(logits[idx])
+            center_parts.append(grid.centers[idx])
+            stride_parts.append(np.full(idx.shape[0], grid.stride, dtype=np.float32))
+
+        if not dist_parts:
+            return np.zeros((0, 5), dtype=np.float32)
+
+        scores = sigmoid(np.concatenate(logit_parts).astype(np.float32, copy=False))
+        # cv2.dnn.NMSBoxes keeps scores strictly above the threshold.
+        passed = scores > float(confidence_min)
+        if not np.any(passed):
+            return np.zeros((0, 5), dtype=np.float32)
+
+        dist_raw = np.concatenate(dist_parts, axis=1)[:, passed]  # (64, N)
+        n = dist_raw.shape[1]
+        dist_raw = dist_raw.astype(np.float32, copy=False).reshape(4, self.reg_max + 1, n).transpose(2, 0, 1)
+        probs = softmax_last_axis(dist_raw)  # (N, 4, 16)
+        stride = np.concatenate(stride_parts)[passed]
+        dist = (probs @ self.bins) * stride[:, None]  # (N, 4): l, t, r, b in pixels
+        centers = np.concatenate(center_parts)[passed]
+        scores = scores[passed]
+
+        boxes = np.empty((n, 4), dtype=np.float32)
+        boxes[:, 0:2] = centers - dist[:, 0:2]
+        boxes[:, 2:4] = centers + dist[:, 2:4]
+        np.clip(boxes[:, 0::2], 0.0, float(self.input_w - 1), out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0.0, float(self.input_h - 1), out=boxes[:, 1::2])
+        sized = ((boxes[:, 2] - boxes[:, 0]) > 1.0) & ((boxes[:, 3] - boxes[:, 1]) > 1.0)
+        boxes = boxes[sized]
+        scores = scores[sized]
+
+        keep = nms_xyxy(boxes, scores, float(nms_iou), top_k=int(max_det))
+        dets = np.empty((keep.shape[0], 5), dtype=np.float32)
+        dets[:, :4] = boxes[keep]
+        dets[:, 4] = scores[keep]
+        return dets
+
+
+def sigmoid(x: np.ndarray) -> np.ndarray:
+    x = np.clip(x, -50.0, 50.0)
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def softmax_last_axis(x: np.ndarray) -> np.ndarray:
+    x = x - np.max(x, axis=-1, keepdims=True)
+    exp = np.exp(np.clip(x, -50.0, 50.0))
+    denom = np.sum(exp, axis=-1, keepdims=True)
+    denom = np.where(denom == 0.0, 1.0, denom)
+    return exp / denom
+
+
+def decode_yolov8_dfl_reference(
+    outputs: list[np.ndarray],
+    input_size: tuple[int, int],
+    confidence_min: float,
+    nms_iou: float,
+    max_det: int,
+) -> list[tuple[float, float, float, float, float]]:
+    """Previous per-frame decoder (Python box loop + cv2.dnn.NMSBoxes), kept as the benchmark baseline.
+
+    Returns: list of (x1, y1, x2, y2, conf)
+    """
+    import cv2
+
+    input_w, input_h = input_size
+    reg_max = REG_MAX
+    bins = np.arange(reg_max + 1, dtype=np.float32)
+    boxes_xywh: list[list[float]] = []
+    scores: list[float] = []
+
+    for out in outputs:
+        if out.ndim != 4 or out.shape[0] != 1 or out.shape[1] < 5:
+            continue
+        _, ch, h, w = out.shape
+        if ch != 4 * (reg_max + 1) + 1:
+            continue
+        stride_w = input_w / float(w)
+        stride_h = input_h / float(h)
+        if abs(stride_w - stride_h) > 1e-3:
+            continue
+        stride = float(stride_w)
+
+        raw = out[0]  # (65, H, W)
+        box_raw = raw[: 4 * (reg_max + 1), :, :]  # (64, H, W)
+        cls_raw = raw[4 * (reg_max + 1) :, :, :]  # (1, H, W) for 1 class
+        cls_logits = cls_raw[0]  # (H, W)
+        cls_scores = sigmoid(cls_logits)
+
+        keep = cls_scores >= float(confidence_min)
+        if not np.any(keep):
+            continue
+
+        ys, xs = np.where(keep)
+        conf_sel = cls_scores[ys, xs].astype(np.float32)
+
+        # box_raw -> (4, 16, H, W) -> (H, W, 4, 16)
+        box_d = box_raw.reshape(4, reg_max + 1, h, w).transpose(2, 3, 0, 1)
+        dist_sel = box_d[ys, xs, :, :]  # (N, 4, 16)
+        probs = softmax_last_axis(dist_sel)
+        dist = (probs * bins).sum(axis=-1) * stride  # (N, 4) in pixels
+
+        cx = (xs.astype(np.float32) + 0.5) * stride
+        cy = (ys.astype(np.float32) + 0.5) * stride
+        l = dist[:, 0]
+        t = dist[:, 1]
+        r = dist[:, 2]
+        b = dist[:, 3]
+
+        x1 = np.clip(cx - l, 0.0, float(input_w - 1))
+        y1 = np.clip(cy - t, 0.0, float(input_h - 1))
+        x2 = np.clip(cx + r, 0.0, float(input_w - 1))
+        y2 = np.clip(cy + b, 0.0, float(input_h - 1))
+
+        w_px = np.maximum(0.0, x2 - x1)
+        h_px = np.maximum(0.0, y2 - y1)
+
+        for i in range(conf_sel.shape[0]):
+            if w_px[i] <= 1.0 or h_px[i] <= 1.0:
+                continue
+            boxes_xywh.append([float(x1[i]), float(y1[i]), float(w_px[i]), float(h_px[i])])
+            scores.append(float(conf_sel[i]))
+
+    if not boxes_xywh:
+        return []
+
+    indices = cv2.dnn.NMSBoxes(boxes_xywh, scores, float(confidence_min), float(nms_iou), top_k=int(max_det))
+    if indices is None:
+        return []
+    if isinstance(indices, (tuple, list)) and len(indices) == 0:
+        return []
+
+    flat: list[int] = []
+    try:
+        # OpenCV may return [[i],[j],...] or [i,j,...]
+        for item in indices:
+            if isinstance(item, (tuple, list, np.ndarray)):
+                flat.append(int(item[0]))
+            else:
+                flat.append(int(item))
+    except Exception:
+        flat = [int(i) for i in np.array(indices).reshape(-1).tolist()]
+
+    dets: list[tuple[float, float, float, float, float]] = []
+    for i in flat:
+        x, y, w_px, h_px = boxes_xywh[i]
+        conf = scores[i]
+        dets.append((x, y, x + w_px, y + h_px, conf))
+
+    return dets
@@ -77,7 +77,7 @@ while true; do
     printf '%s\n' "${sample}" >> "${OUT_FILE}"
   fi
   echo "${sample}" | jq -rc --arg ts "${ts}" \
-    '{ts:$ts,events_total,count_in,count_out,zone_neg_hits,zone_mid_hits,zone_pos_hits,middle_entries,middle_inferred,zone_flip_no_middle,age_reject,move_reject,hang_reject,conf_reject,depth_reject,depth_missing}'
+    '{ts:$ts,events_total,count_in,count_out,zone_neg_hits,zone_mid_hits,zone_pos_hits,middle_entries,middle_inferred,zone_flip_no_middle,age_reject,move_reject,hang_reject,conf_reject,depth_reject,depth_missing,frame_p95_ms:.latency_ms.frame.p95}'
 
   iter_end_epoch="$(date -u +%s)"
   elapsed="$(( iter_end_epoch - iter_start_epoch ))"
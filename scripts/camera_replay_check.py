@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Replay a camera recording through a counting script and check the in/out counts.
+
+Recordings come from `--record PATH` (or CAM_DEPTH_COUNT_RECORD / CAM_DEPTH_MULTI_RECORD) on the
+camera node. The script is picked from the recording metadata; tuning is taken from `--env`
+plus `--set KEY=VALUE` overrides, so a tuning change can be regression-tested on a laptop:
+
+  ./scripts/camera_replay_check.py rec.bin --env passengers.env --set CAM_DEPTH_MAX_M=1.3 --expect-in 10 --expect-out 10
+  ./scripts/camera_replay_check.py rec.bin --expect-in 10 -- --predict-velocity
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+MVP_DIR = ROOT / "mvp"
+if str(MVP_DIR) not in sys.path:
+    sys.path.insert(0, str(MVP_DIR))
+
+from camera_replay import ReplaySource  # noqa: E402
+from common import load_env_file  # noqa: E402
+
+SCRIPTS = {
+    "transport-strict": "camera_transport_strict_counting.py",
+    "depth-height-multi": "camera_depth_height_multi.py",
+}
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def run_replay(script: Path, recording: Path, env: dict[str, str], *, realtime: bool, extra: list[str]) -> dict:
+    with tempfile.NamedTemporaryFile("w", suffix=".env", encoding="utf-8", delete=False) as fh:
+        for key, value in env.items():
+            fh.write(f"{key}={value}\n")
+        env_path = fh.name
+    try:
+        cmd = [
+            sys.executable,
+            str(script),
+            "--env",
+            env_path,
+            "--bind",
+            "127.0.0.1",
+            "--port",
+            str(free_port()),
+            "--replay",
+            str(recording),
+            *(["--replay-realtime"] if realtime else []),
+            *extra,
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    finally:
+        os.unlink(env_path)
+
+    summary = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("replay-summary: "):
+            summary = json.loads(line[len("replay-summary: ") :])
+    if proc.returncode != 0 or summary is None:
+        sys.stderr.write(proc.stdout[-4000:])
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"replay failed (exit {proc.returncode})")
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a camera recording and check in/out counts.")
+    parser.add_argument("recording")
+    parser.add_argument("--env", default="", help="Base env file (e.g. a copy of /etc/passengers/passengers.env).")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Env override (repeatable).")
+    parser.add_argument("--script", choices=sorted(SCRIPTS), default="", help="Default: from the recording metadata.")
+    parser.add_argument("--realtime", action="store_true", help="Replay at the recorded pace.")
+    parser.add_argument("--expect-in", type=int, default=None)
+    parser.add_argument("--expect-out", type=int, default=None)
+    parser.add_argument("--tolerance", type=int, default=0, help="Allowed |actual - expected| per direction.")
+    parser.add_argument("--json", action="store_true", help="Print the replay summary as JSON only.")
+    argv = sys.argv[1:]
+    # Everything after "--" goes to the counting script unchanged.
+    extra: list[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, extra = argv[:split], argv[split + 1 :]
+    args = parser.parse_args(argv)
+
+    recording = Path(args.recording)
+    meta = ReplaySource(recording).meta
+    script_name = args.script or str(meta.get("script", ""))
+    if script_name not in SCRIPTS:
+        raise SystemExit(f"{recording}: unknown script {script_name!r}; pass --script")
+
+    env = load_env_file(args.env) if args.env else {}
+    for item in args.set:
+        if "=" not in item:
+            raise SystemExit(f"--set expects KEY=VALUE (got {item!r})")
+        key, value = item.split("=", 1)
+        env[key.strip()] = value.strip()
+    # Never let a copied production env start a new recording during replay.
+    env.pop("CAM_DEPTH_COUNT_RECORD", None)
+    env.pop("CAM_DEPTH_MULTI_RECORD", None)
+
+    summary = run_replay(MVP_DIR / SCRIPTS[script_name], recording, env, realtime=args.realtime, extra=extra)
+
+    failures: list[str] = []
+    for direction, expected in (("in", args.expect_in), ("out", args.expect_out)):
+        if expected is None:
+            continue
+        actual = int(summary.get(f"count_{direction}", 0))
+        if abs(actual - expected) > args.tolerance:
+            failures.append(f"{direction}: expected {expected}, got {actual}")
+    summary["ok"] = not failures
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        print(
+            f"{script_name}: in={summary.get('count_in')} out={summary.get('count_out')} "
+            f"events={summary.get('events_total')} messages={summary.get('messages')} "
+            f"recorded={summary.get('recorded_sec')}s wall={summary.get('wall_sec')}s "
+            f"rate={summary.get('messages_per_sec')} msg/s"
+        )
+        for failure in failures:
+            print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import json
-import re
+import argparse
+import sys
 from dataclasses import dataclass
 from pathlib import Path
 
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from camera_tuning_summarize import build_index  # noqa: E402
+
 
 @dataclass
 class RunRow:
@@ -19,64 +25,36 @@ class RunRow:
     d_out: int | None
 
 
-def read_json(path: Path) -> dict:
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
-
-
-def parse_summary(summary_path: Path) -> tuple[int | None, int | None, int | None]:
-    text = summary_path.read_text(encoding="utf-8", errors="replace")
-    # Table rows like: | `events_total` | 6 |
-    def find(metric: str) -> int | None:
-        m = re.search(rf"\|\s*`{re.escape(metric)}`\s*\|\s*([-0-9]+)\s*\|", text)
-        if not m:
-            return None
-        try:
-            return int(m.group(1))
-        except Exception:
-            return None
-
-    return find("events_total"), find("count_in"), find("count_out")
-
-
-def collect(root: Path) -> list[RunRow]:
+def collect(root: Path, *, jobs: int = 0) -> list[RunRow]:
+    # Rows come from the machine-readable index (rebuilt incrementally), not from summary.md.
     rows: list[RunRow] = []
-    for ip_dir in sorted([p for p in root.glob("*") if p.is_dir()]):
-        ip = ip_dir.name
-        for run_dir in sorted([p for p in ip_dir.glob("*") if p.is_dir()]):
-            meta = read_json(run_dir / "meta.json")
-            summary = run_dir / "summary.md"
-            d_events, d_in, d_out = (None, None, None)
-            if summary.exists():
-                d_events, d_in, d_out = parse_summary(summary)
-            label = str(meta.get("label") or run_dir.name)
-            start_utc = meta.get("start_utc")
-            seconds = meta.get("seconds")
-            try:
-                seconds_i = int(seconds) if seconds is not None else None
-            except Exception:
-                seconds_i = None
-            rows.append(
-                RunRow(
-                    ip=ip,
-                    folder=run_dir,
-                    label=label,
-                    start_utc=str(start_utc) if start_utc is not None else None,
-                    seconds=seconds_i,
-                    d_events=d_events,
-                    d_in=d_in,
-                    d_out=d_out,
-                ),
-            )
+    for entry in build_index(root, jobs=jobs):
+        # A metric missing from the summary stays None (blank cell), never a zero-count run.
+        deltas = (entry.get("summary") or {}).get("deltas") or {}
+        rows.append(
+            RunRow(
+                ip=str(entry.get("ip") or ""),
+                folder=root / str(entry["folder"]),
+                label=str(entry.get("label") or entry.get("run") or ""),
+                start_utc=entry.get("start_utc"),
+                seconds=entry.get("seconds"),
+                d_events=deltas.get("events_total"),
+                d_in=deltas.get("count_in"),
+                d_out=deltas.get("count_out"),
+            ),
+        )
     return rows
 
 
 def main() -> int:
-    root = Path("Docs/auto/camera-tuning")
+    parser = argparse.ArgumentParser(description="Rebuild index.json and INDEX.md for camera tuning runs.")
+    parser.add_argument("--root", default="Docs/auto/camera-tuning")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes for stale runs (default: CPU count).")
+    args = parser.parse_args()
+
+    root = Path(args.root)
     root.mkdir(parents=True, exist_ok=True)
-    rows = collect(root)
+    rows = collect(root, jobs=args.jobs)
 
     out = root / "INDEX.md"
     lines: list[str] = []
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import json
+import os
+import statistics
 import sys
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
+
+INDEX_VERSION = 1
 
 
 @dataclass
@@ -17,6 +23,7 @@ class RunSummary:
     max_active_tracks: int
     max_tracklets_total: int
     dominant_rejects: list[tuple[str, int]]
+    latency: dict[str, dict[str, float]]
 
 
 DEFAULT_KEYS: list[str] = [
@@ -44,18 +51,38 @@ DEFAULT_KEYS: list[str] = [
     "depth_missing",
 ]
 
+# Stage order of the /health `latency_ms` block (camera loops + preview); unknown stages go last.
+LATENCY_STAGES: list[str] = [
+    "frame",
+    "device_age",
+    "get",
+    "decode",
+    "match",
+    "mask",
+    "components",
+    "blobs",
+    "depth",
+    "zones",
+    "publish",
+    "preview",
+    "preview_draw",
+    "jpeg_encode",
+]
 
-def load_jsonl(path: Path) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
-    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
-        s = line.strip()
-        if not s:
-            continue
-        try:
-            rows.append(json.loads(s))
-        except Exception:
-            continue
-    return rows
+
+def iter_jsonl(path: Path) -> Iterator[dict[str, Any]]:
+    # Line by line: overnight runs produce files far larger than we want in memory.
+    with path.open("r", encoding="utf-8", errors="replace") as fh:
+        for line in fh:
+            s = line.strip()
+            if not s:
+                continue
+            try:
+                row = json.loads(s)
+            except Exception:
+                continue
+            if isinstance(row, dict):
+                yield row
 
 
 def as_int(x: Any) -> int | None:
@@ -67,8 +94,81 @@ def as_int(x: Any) -> int | None:
         return None
 
 
-def summarize(rows: list[dict[str, Any]]) -> RunSummary:
-    if not rows:
+def as_float(x: Any) -> float | None:
+    try:
+        if x is None:
+            return None
+        return float(x)
+    except Exception:
+        return None
+
+
+REJECT_KEYS: list[str] = [
+    "roi_reject",
+    "bbox_reject_size",
+    "bbox_reject_ar",
+    "bbox_reject_wz",
+    "conf_reject",
+    "age_reject",
+    "move_reject",
+    "hang_reject",
+    "dup_reject",
+    "rearm_reject",
+    "depth_reject",
+    "depth_missing",
+]
+
+
+def add_latency_sample(series: dict[str, dict[str, list[float]]], row: dict[str, Any]) -> None:
+    block = row.get("latency_ms")
+    if not isinstance(block, dict):
+        return
+    for stage, values in block.items():
+        if not isinstance(values, dict):
+            continue
+        stage_series = series.setdefault(str(stage), {"p50": [], "p95": [], "p99": []})
+        for key in ("p50", "p95", "p99"):
+            v = as_float(values.get(key))
+            if v is not None:
+                stage_series[key].append(v)
+
+
+def finish_latency(series: dict[str, dict[str, list[float]]]) -> dict[str, dict[str, float]]:
+    # Each /health sample carries rolling percentiles; typical = median over samples, p99 = worst sample.
+    out: dict[str, dict[str, float]] = {}
+    for stage, stage_series in series.items():
+        if not stage_series["p50"]:
+            continue
+        out[stage] = {
+            "p50": round(statistics.median(stage_series["p50"]), 3),
+            "p95": round(statistics.median(stage_series["p95"]), 3) if stage_series["p95"] else 0.0,
+            "p99_max": round(max(stage_series["p99"]), 3) if stage_series["p99"] else 0.0,
+        }
+    return out
+
+
+def summarize(rows: Iterable[dict[str, Any]]) -> RunSummary:
+    # Single pass: only the first/last sample, running maxima and per-stage latency series are kept.
+    samples = 0
+    first: dict[str, Any] | None = None
+    last: dict[str, Any] | None = None
+    max_active_tracks = 0
+    max_tracklets_total = 0
+    latency_series: dict[str, dict[str, list[float]]] = {}
+    for r in rows:
+        samples += 1
+        if first is None:
+            first = r
+        last = r
+        a = as_int(r.get("active_tracks"))
+        if a is not None:
+            max_active_tracks = max(max_active_tracks, a)
+        t = as_int(r.get("tracklets_total"))
+        if t is not None:
+            max_tracklets_total = max(max_tracklets_total, t)
+        add_latency_sample(latency_series, r)
+
+    if first is None or last is None:
         return RunSummary(
             samples=0,
             start_ts=None,
@@ -77,11 +177,9 @@ def summarize(rows: list[dict[str, Any]]) -> RunSummary:
             max_active_tracks=0,
             max_tracklets_total=0,
             dominant_rejects=[],
+            latency={},
         )
 
-    first = rows[0]
-    last = rows[-1]
-
     deltas: dict[str, int] = {}
     for key in DEFAULT_KEYS:
         a = as_int(first.get(key))
@@ -90,44 +188,18 @@ def summarize(rows: list[dict[str, Any]]) -> RunSummary:
             continue
         deltas[key] = b - a
 
-    max_active_tracks = 0
-    max_tracklets_total = 0
-    for r in rows:
-        a = as_int(r.get("active_tracks"))
-        if a is not None:
-            max_active_tracks = max(max_active_tracks, a)
-        t = as_int(r.get("tracklets_total"))
-        if t is not None:
-            max_tracklets_total = max(max_tracklets_total, t)
-
-    reject_keys = [
-        "roi_reject",
-        "bbox_reject_size",
-        "bbox_reject_ar",
-        "bbox_reject_wz",
-        "conf_reject",
-        "age_reject",
-        "move_reject",
-        "hang_reject",
-        "dup_reject",
-        "rearm_reject",
-        "depth_reject",
-        "depth_missing",
-    ]
-    rejects: list[tuple[str, int]] = []
-    for k in reject_keys:
-        if k in deltas:
-            rejects.append((k, deltas[k]))
+    rejects = [(k, deltas[k]) for k in REJECT_KEYS if k in deltas]
     rejects.sort(key=lambda kv: kv[1], reverse=True)
 
     return RunSummary(
-        samples=len(rows),
+        samples=samples,
         start_ts=str(first.get("ts")) if first.get("ts") is not None else None,
         end_ts=str(last.get("ts")) if last.get("ts") is not None else None,
         deltas=deltas,
         max_active_tracks=max_active_tracks,
         max_tracklets_total=max_tracklets_total,
         dominant_rejects=rejects[:6],
+        latency=finish_latency(latency_series),
     )
 
 
@@ -139,23 +211,25 @@ def md_table(d: dict[str, int], keys: list[str]) -> str:
     return "\n".join(lines)
 
 
-def main() -> int:
-    if len(sys.argv) != 2:
-        print("Usage: camera_tuning_summarize.py <health.jsonl>", file=sys.stderr)
-        return 2
+def md_latency_table(latency: dict[str, dict[str, float]]) -> str:
+    stages = [k for k in LATENCY_STAGES if k in latency] + sorted(k for k in latency if k not in LATENCY_STAGES)
+    lines = ["| Stage | p50 ms | p95 ms | p99 ms (max) |", "|---|---:|---:|---:|"]
+    for k in stages:
+        v = latency[k]
+        lines.append(f"| `{k}` | {v['p50']:.3f} | {v['p95']:.3f} | {v['p99_max']:.3f} |")
+    return "\n".join(lines)
 
-    path = Path(sys.argv[1])
-    rows = load_jsonl(path)
-    s = summarize(rows)
 
-    print("# Camera tuning run summary")
-    print()
-    print(f"- samples: `{s.samples}`")
+def render_markdown(s: RunSummary) -> str:
+    lines: list[str] = []
+    lines.append("# Camera tuning run summary")
+    lines.append("")
+    lines.append(f"- samples: `{s.samples}`")
     if s.start_ts or s.end_ts:
-        print(f"- window: `{s.start_ts}` → `{s.end_ts}`")
-    print(f"- max active tracks: `{s.max_active_tracks}`")
-    print(f"- max tracklets_total: `{s.max_tracklets_total}`")
-    print()
+        lines.append(f"- window: `{s.start_ts}` → `{s.end_ts}`")
+    lines.append(f"- max active tracks: `{s.max_active_tracks}`")
+    lines.append(f"- max tracklets_total: `{s.max_tracklets_total}`")
+    lines.append("")
 
     core = [
         "events_total",
@@ -168,15 +242,20 @@ def main() -> int:
         "middle_inferred",
         "zone_flip_no_middle",
     ]
-    print("## Core deltas")
-    print(md_table(s.deltas, core))
-    print()
+    lines.append("## Core deltas")
+    lines.append(md_table(s.deltas, core))
+    lines.append("")
 
     rej_keys = [k for k, _ in s.dominant_rejects]
     if rej_keys:
-        print("## Dominant rejects (top)")
-        print(md_table(s.deltas, rej_keys))
-        print()
+        lines.append("## Dominant rejects (top)")
+        lines.append(md_table(s.deltas, rej_keys))
+        lines.append("")
+
+    if s.latency:
+        lines.append("## Latency (ms)")
+        lines.append(md_latency_table(s.latency))
+        lines.append("")
 
     # Hints
     d_events = s.deltas.get("events_total", 0)
@@ -185,24 +264,163 @@ def main() -> int:
     d_roi = s.deltas.get("roi_reject", 0)
     d_conf = s.deltas.get("conf_reject", 0)
 
-    print("## Quick interpretation")
+    lines.append("## Quick interpretation")
     if d_events > 0:
-        print("- events are increasing: OK (continue tightening step-by-step).")
+        lines.append("- events are increasing: OK (continue tightening step-by-step).")
     else:
         if d_mid == 0:
-            print("- `zone_mid_hits` stays 0: lines/axis/axis_pos likely miss the trajectory.")
+            lines.append("- `zone_mid_hits` stays 0: lines/axis/axis_pos likely miss the trajectory.")
         if d_flip > 0 and s.deltas.get("middle_entries", 0) == 0:
-            print("- flips without middle: increase `LINE_GAP_NORM` and keep `ANCHOR_MODE=center`.")
+            lines.append("- flips without middle: increase `LINE_GAP_NORM` and keep `ANCHOR_MODE=center`.")
         if d_roi > 0:
-            print("- many `roi_reject`: ROI is too tight (or people leave ROI before crossing).")
+            lines.append("- many `roi_reject`: ROI is too tight (or people leave ROI before crossing).")
         if d_conf > 0 and d_mid > 0:
-            print("- many `conf_reject` with mid hits: lower confidence or improve lighting/model.")
+            lines.append("- many `conf_reject` with mid hits: lower confidence or improve lighting/model.")
         if d_events == 0 and d_mid > 0:
-            print("- mid hits exist but no events: check `MIN_TRACK_AGE`, `MIN_MOVE_NORM`, cooldown/rearm.")
+            lines.append("- mid hits exist but no events: check `MIN_TRACK_AGE`, `MIN_MOVE_NORM`, cooldown/rearm.")
+
+    stage_p95 = [(k, v["p95"]) for k, v in s.latency.items() if k not in {"frame", "device_age"}]
+    if stage_p95:
+        slowest, slowest_p95 = max(stage_p95, key=lambda kv: kv[1])
+        lines.append(f"- slowest stage: `{slowest}` (p95 {slowest_p95:.1f} ms).")
+    device_age = s.latency.get("device_age")
+    if device_age and device_age["p50"] > 100.0:
+        lines.append("- `device_age` p50 > 100 ms: host falls behind the camera (USB2/CPU); lower FPS or preview load.")
+
+    return "\n".join(lines) + "\n"
+
+
+def read_json(path: Path) -> dict[str, Any]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
 
+
+def source_stamp(run_dir: Path) -> dict[str, Any]:
+    # An index entry is reused while health.jsonl and meta.json are unchanged.
+    health = run_dir / "health.jsonl"
+    try:
+        size = health.stat().st_size
+    except OSError:
+        size = None
+    return {"health_size": size, "health_mtime_ns": mtime_ns(health), "meta_mtime_ns": mtime_ns(run_dir / "meta.json")}
+
+
+def summarize_run(run_dir: str, root: str, write_md: bool) -> dict[str, Any]:
+    # Top-level so it can run in a worker process; returns one index entry.
+    folder = Path(run_dir)
+    meta = read_json(folder / "meta.json")
+    stamp = source_stamp(folder)
+    health = folder / "health.jsonl"
+    summary: RunSummary | None = None
+    if stamp["health_size"] is not None:
+        summary = summarize(iter_jsonl(health))
+        if write_md:
+            (folder / "summary.md").write_text(render_markdown(summary), encoding="utf-8")
+    seconds = as_int(meta.get("seconds"))
+    return {
+        "folder": folder.relative_to(root).as_posix(),
+        "ip": folder.parent.name,
+        "run": folder.name,
+        "label": str(meta.get("label") or folder.name),
+        "start_utc": str(meta["start_utc"]) if meta.get("start_utc") is not None else None,
+        "seconds": seconds,
+        "source": stamp,
+        "summary": asdict(summary) if summary is not None else None,
+    }
+
+
+def find_run_dirs(root: Path) -> list[Path]:
+    # Layout written by camera_tuning_run.sh: <root>/<camera-ip>/<UTC>_<label>/
+    return [run for ip_dir in sorted(p for p in root.glob("*") if p.is_dir()) for run in sorted(p for p in ip_dir.glob("*") if p.is_dir())]
+
+
+def load_index(path: Path) -> list[dict[str, Any]]:
+    data = read_json(path)
+    if data.get("version") != INDEX_VERSION:
+        return []
+    runs = data.get("runs")
+    return [r for r in runs if isinstance(r, dict)] if isinstance(runs, list) else []
+
+
+def build_index(
+    root: Path,
+    *,
+    index_path: Path | None = None,
+    jobs: int = 0,
+    write_md: bool = False,
+    force: bool = False,
+) -> list[dict[str, Any]]:
+    """Summarize every run folder under `root` into `index.json`; unchanged runs are taken from the previous index."""
+    index_path = index_path or (root / "index.json")
+    previous = {str(r.get("folder")): r for r in load_index(index_path)}
+
+    entries: dict[str, dict[str, Any]] = {}
+    stale: list[Path] = []
+    for run_dir in find_run_dirs(root):
+        key = run_dir.relative_to(root).as_posix()
+        old = previous.get(key)
+        if not force and not write_md and old is not None and old.get("source") == source_stamp(run_dir):
+            entries[key] = old
+        else:
+            stale.append(run_dir)
+
+    workers = jobs if jobs > 0 else (os.cpu_count() or 1)
+    if len(stale) <= 1 or workers <= 1:
+        results = [summarize_run(str(run_dir), str(root), write_md) for run_dir in stale]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale))) as pool:
+            results = list(
+                pool.map(summarize_run, [str(d) for d in stale], [str(root)] * len(stale), [write_md] * len(stale))
+            )
+    for entry in results:
+        entries[entry["folder"]] = entry
+
+    runs = [entries[k] for k in sorted(entries)]
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": INDEX_VERSION, "runs": runs}, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+    os.replace(tmp, index_path)
+    return runs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarize camera tuning /health samples (JSONL).")
+    parser.add_argument("jsonl", nargs="?", help="One run: print its Markdown summary to stdout.")
+    parser.add_argument("--runs", default="", metavar="ROOT", help="Summarize every run folder under ROOT into ROOT/index.json.")
+    parser.add_argument("--index", default="", help="Index path (default: ROOT/index.json).")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes for --runs (default: CPU count).")
+    parser.add_argument("--write-md", action="store_true", help="With --runs: also rewrite each run's summary.md.")
+    parser.add_argument("--force", action="store_true", help="With --runs: ignore the previous index.")
+    args = parser.parse_args()
+
+    if args.runs:
+        root = Path(args.runs)
+        runs = build_index(
+            root,
+            index_path=Path(args.index) if args.index else None,
+            jobs=args.jobs,
+            write_md=args.write_md,
+            force=args.force,
+        )
+        print(f"{len(runs)} runs -> {Path(args.index) if args.index else root / 'index.json'}")
+        return 0
+
+    if not args.jsonl:
+        parser.print_usage(sys.stderr)
+        return 2
+    sys.stdout.write(render_markdown(summarize(iter_jsonl(Path(args.jsonl)))))
     return 0
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
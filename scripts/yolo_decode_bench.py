@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: YoloV8DflDecoder vs the previous per-frame YOLOv8 DFL decoder.
+
+Uses raw NN outputs recorded by `camera_transport_strict_counting.py --raw-dump-npz PATH`
+(host-yolov8-raw backend) or synthetic heads when no recording is given.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+MVP_DIR = ROOT / "mvp"
+if str(MVP_DIR) not in sys.path:
+    sys.path.insert(0, str(MVP_DIR))
+
+from yolo_decode import REG_MAX, YoloV8DflDecoder, decode_yolov8_dfl_reference  # noqa: E402
+
+
+def load_recording(path: Path) -> tuple[tuple[int, int], list[list[np.ndarray]]]:
+    data = np.load(path)
+    input_w, input_h = (int(v) for v in data["input_size"])
+    heads = [data[key] for key in sorted(data.files) if key.startswith("out_")]
+    if not heads:
+        raise SystemExit(f"{path}: no out_* arrays")
+    frames = [[np.ascontiguousarray(head[i], dtype=np.float32) for head in heads] for i in range(heads[0].shape[0])]
+    return (input_w, input_h), frames
+
+
+def synthetic_frames(
+    input_size: tuple[int, int],
+    *,
+    frames: int,
+    people: int,
+    seed: int,
+) -> list[list[np.ndarray]]:
+    # Background logits well below any threshold plus a few "people" blobs that fire neighbouring anchors.
+    rng = np.random.default_rng(seed)
+    input_w, input_h = input_size
+    channels = 4 * (REG_MAX + 1) + 1
+    result: list[list[np.ndarray]] = []
+    for _ in range(frames):
+        heads: list[np.ndarray] = []
+        for stride in (8, 16, 32):
+            h, w = input_h // stride, input_w // stride
+            out = rng.normal(0.0, 1.0, size=(1, channels, h, w)).astype(np.float32)
+            out[0, -1] = rng.normal(-6.0, 1.5, size=(h, w))
+            for _ in range(people):
+                cy, cx = int(rng.integers(0, h)), int(rng.integers(0, w))
+                out[0, -1, max(0, cy - 1) : cy + 2, max(0, cx - 1) : cx + 2] += rng.uniform(4.0, 9.0)
+            heads.append(out)
+        result.append(heads)
+    return result
+
+
+def time_per_frame_ms(fn, frames: list[list[np.ndarray]], repeats: int) -> tuple[float, float]:
+    samples: list[float] = []
+    for _ in range(repeats):
+        for outputs in frames:
+            started = time.perf_counter()
+            fn(outputs)
+            samples.append((time.perf_counter() - started) * 1000.0)
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def compare(reference: list[tuple[float, ...]], vectorized: np.ndarray, *, tol_px: float) -> bool:
+    if len(reference) != vectorized.shape[0]:
+        return False
+    if not reference:
+        return True
+    ref = np.asarray(reference, dtype=np.float32)
+    return bool(np.allclose(ref[:, :4], vectorized[:, :4], atol=tol_px) and np.allclose(ref[:, 4], vectorized[:, 4], atol=1e-5))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the host YOLOv8 DFL decoder.")
+    parser.add_argument("--npz", default="", help="Recording from --raw-dump-npz (default: synthetic heads).")
+    parser.add_argument("--input-size", default="512x288", help="Synthetic input size WxH.")
+    parser.add_argument("--frames", type=int, default=100, help="Synthetic frame count.")
+    parser.add_argument("--people", type=int, default=4, help="Synthetic people per frame.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--confidence-min", type=float, default=0.4875)
+    parser.add_argument("--nms-iou", type=float, default=0.5)
+    parser.add_argument("--max-det", type=int, default=80)
+    args = parser.parse_args()
+
+    if args.npz:
+        input_size, frames = load_recording(Path(args.npz))
+        source = args.npz
+    else:
+        w_s, h_s = args.input_size.lower().split("x", 1)
+        input_size = (int(w_s), int(h_s))
+        frames = synthetic_frames(input_size, frames=args.frames, people=args.people, seed=args.seed)
+        source = f"synthetic {args.frames} frames, {args.people} people"
+
+    decoder = YoloV8DflDecoder(input_size)
+    params = {"confidence_min": args.confidence_min, "nms_iou": args.nms_iou, "max_det": args.max_det}
+
+    def run_vectorized(outputs: list[np.ndarray]) -> np.ndarray:
+        return decoder.decode(outputs, **params)
+
+    def run_reference(outputs: list[np.ndarray]) -> list[tuple[float, float, float, float, float]]:
+        return decode_yolov8_dfl_reference(outputs, input_size, **params)
+
+    print(f"source: {source}; input {input_size[0]}x{input_size[1]}")
+    vec_p50, vec_p95 = time_per_frame_ms(run_vectorized, frames, args.repeats)
+    print(f"vectorized: p50={vec_p50:.3f}ms p95={vec_p95:.3f}ms")
+
+    try:
+        import cv2  # noqa: F401
+    except ImportError:
+        print("reference: skipped (cv2 is not installed)")
+        return 0
+
+    ref_p50, ref_p95 = time_per_frame_ms(run_reference, frames, args.repeats)
+    print(f"reference:  p50={ref_p50:.3f}ms p95={ref_p95:.3f}ms")
+    print(f"speedup p50: x{ref_p50 / max(vec_p50, 1e-9):.1f}")
+
+    mismatched = sum(1 for outputs in frames if not compare(run_reference(outputs), run_vectorized(outputs), tol_px=0.05))
+    print(f"mismatched frames: {mismatched}/{len(frames)}")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())